@@ -7,9 +7,18 @@ __version__ = "1.0.0"
 __author__ = "Todo API"
 __description__ = "A modern REST API for managing todos"
 
-from app.models.todo import Base, Todo
-from app.models.schemas import TodoCreate, TodoUpdate, TodoResponse
-from app.routes import todos
+import importlib
+
+# Re-exports are resolved on first access so that importing any `app.*`
+# module does not pull in every model, schema and route
+_LAZY_EXPORTS = {
+    'Base': 'app.models.todo',
+    'Todo': 'app.models.todo',
+    'TodoCreate': 'app.models.schemas',
+    'TodoUpdate': 'app.models.schemas',
+    'TodoResponse': 'app.models.schemas',
+    'todos': 'app.routes.todos',
+}
 
 __all__ = [
     'Base',
@@ -19,3 +28,10 @@ __all__ = [
     'TodoResponse',
     'todos',
 ]
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(_LAZY_EXPORTS[name])
+    return module if module.__name__.endswith(f".{name}") else getattr(module, name)
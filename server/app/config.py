@@ -26,7 +26,7 @@ if USE_POSTGRESQL:
         DB_PORT = os.getenv("DB_PORT", "5432")
         DB_NAME = os.getenv("DB_NAME", "todoapp")
         
-        DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+        DATABASE_URL = f"postgresql+psycopg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 else:
     # SQLite (default)
     DATABASE_URL = "sqlite:///./todos.db"
@@ -82,9 +82,183 @@ ENABLE_STATS = True
 ENABLE_SEARCH = True
 ENABLE_HEALTH_CHECK = True
 
-# Timeouts
-REQUEST_TIMEOUT = 30
-DB_CONNECTION_TIMEOUT = 10
+# Timeouts (seconds). Each request gets a deadline from its route class; the
+# remaining budget becomes the DB statement timeout and exceeding it gives 504
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+ROUTE_TIMEOUTS = {
+    "read": float(os.getenv("READ_TIMEOUT", str(REQUEST_TIMEOUT))),
+    "write": float(os.getenv("WRITE_TIMEOUT", str(REQUEST_TIMEOUT))),
+    "search": float(os.getenv("SEARCH_TIMEOUT", "10")),
+}
+DB_CONNECTION_TIMEOUT = int(os.getenv("DB_CONNECTION_TIMEOUT", "10"))
+
+# Response compression (zstd/br need the optional zstandard/brotli packages)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVELS = {
+    "zstd": int(os.getenv("COMPRESSION_LEVEL_ZSTD", "3")),
+    "br": int(os.getenv("COMPRESSION_LEVEL_BR", "4")),
+    "gzip": int(os.getenv("COMPRESSION_LEVEL_GZIP", "6")),
+}
+# Bodies (or streamed chunks) at least this large are compressed on a worker
+# thread so the event loop keeps serving other requests meanwhile
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(64 * 1024)))
+# Memory for compressed bodies cached by ETag
+COMPRESSION_CACHE_BYTES = int(os.getenv("COMPRESSION_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+# Export streams rows in id-ordered batches of this size
+EXPORT_BATCH_SIZE = 1000
+
+# Stats time series read daily rollups; cap the buckets per request
+STATS_MAX_BUCKETS = int(os.getenv("STATS_MAX_BUCKETS", "1000"))
+
+# Pagination envelopes (?envelope=true) report totals from the rollup
+# counters or planner estimates (app/utils/counts.py) instead of COUNT(*).
+# Shapes the counters cannot answer exactly are counted up to
+# COUNT_EXACT_UP_TO rows (0 = never) before an estimate is used
+COUNT_EXACT_UP_TO = int(os.getenv("COUNT_EXACT_UP_TO", "10000"))
+
+# In-process columnar mirror of the todos table (app/utils/mirror.py) serving
+# stats, filtered counts and search from memory. Each worker loads its own
+# copy and picks up other processes' writes every TODO_MIRROR_REFRESH seconds
+TODO_MIRROR_ENABLED = os.getenv("TODO_MIRROR_ENABLED", "false").lower() == "true"
+TODO_MIRROR_REFRESH = float(os.getenv("TODO_MIRROR_REFRESH", "2"))
+# Seconds between count(*)/sum(id) comparisons (full scans) that catch
+# inserts and deletes made elsewhere without a new updated_at
+TODO_MIRROR_RECONCILE = float(os.getenv("TODO_MIRROR_RECONCILE", "60"))
+
+# Per-owner title index behind GET /api/todos/suggest (app/utils/suggest.py).
+# Owners are indexed on first use and rebuilt after SUGGEST_TTL seconds to
+# pick up other processes' writes; least recently used owners are evicted
+# once the indexes exceed SUGGEST_MEMORY_MB per worker
+SUGGEST_MEMORY_MB = float(os.getenv("SUGGEST_MEMORY_MB", "64"))
+SUGGEST_TTL = float(os.getenv("SUGGEST_TTL", "60"))
+
+# Sharding of todos by owner (database/shards.py): "name=url,name=url,...".
+# Empty keeps every todo in the main database. Owners are placed on a
+# consistent-hash ring (SHARD_VNODES points per shard), overridden by the
+# tenant_shards directory, which each process re-reads every
+# SHARD_DIRECTORY_TTL seconds. Each shard allocates todo ids from its own
+# block of SHARD_ID_SPAN ids so they stay unique when tenants move.
+SHARD_URLS = os.getenv("SHARD_URLS", "")
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+SHARD_DIRECTORY_TTL = float(os.getenv("SHARD_DIRECTORY_TTL", "5"))
+SHARD_ID_SPAN = int(os.getenv("SHARD_ID_SPAN", "100000000"))
+
+# SQLite backups (app/utils/backup.py): snapshots are written to BACKUP_DIR;
+# online backups copy BACKUP_PAGES_PER_STEP pages per step under a shared
+# lock and pause BACKUP_STEP_PAUSE seconds between steps so writers get in
+BACKUP_DIR = os.getenv("BACKUP_DIR", "./backups")
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_PAUSE = float(os.getenv("BACKUP_STEP_PAUSE", "0.01"))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "5"))
+
+# On-demand profiling (app/utils/profiling.py); when disabled nothing is
+# installed. A request is profiled when it sends "X-Profile: 1" with an
+# X-Profile-Token matching PROFILE_TOKEN, or at random 1 in
+# PROFILE_SAMPLE_RATE requests (0 = never). Stacks are sampled every
+# PROFILE_INTERVAL_MS; the newest PROFILE_KEEP profiles are kept in
+# PROFILE_DIR and served from /debug/profiles to holders of the token
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+# Memory (app/utils/memory.py). MEMORY_PROFILING starts tracemalloc
+# (MEMORY_TRACE_FRAMES frames per allocation), counts RSS growth and traced
+# allocations per route and serves /debug/memory to holders of PROFILE_TOKEN.
+# MEMORY_LIMIT_MB > 0 recycles a worker whose RSS is still above the limit
+# after a full collection (checked every MEMORY_CHECK_INTERVAL seconds)
+MEMORY_PROFILING = os.getenv("MEMORY_PROFILING", "false").lower() == "true"
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+MEMORY_LIMIT_MB = float(os.getenv("MEMORY_LIMIT_MB", "0"))
+MEMORY_CHECK_INTERVAL = float(os.getenv("MEMORY_CHECK_INTERVAL", "10"))
+
+# Clear-completed deletes this many ids per transaction, pausing in between
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+PURGE_PAUSE_SECONDS = float(os.getenv("PURGE_PAUSE_SECONDS", "0.05"))
+
+# Transactional outbox (app/utils/outbox.py): each todo write also inserts an
+# outbox row in its transaction; a relay thread per worker claims up to
+# OUTBOX_BATCH_SIZE rows for OUTBOX_LEASE_SECONDS, delivers them to every sink
+# in OUTBOX_SINKS ("file", "http", "pubsub") and deletes them. It polls every
+# OUTBOX_POLL_INTERVAL seconds and is woken by this worker's writes. Readiness
+# fails once more than OUTBOX_PENDING_THRESHOLD rows wait
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+OUTBOX_SINKS = [name.strip() for name in os.getenv("OUTBOX_SINKS", "file").split(",") if name.strip()]
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", "./outbox.ndjson")
+OUTBOX_HTTP_URL = os.getenv("OUTBOX_HTTP_URL", "http://127.0.0.1:9000/events")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "30"))
+OUTBOX_PENDING_THRESHOLD = int(os.getenv("OUTBOX_PENDING_THRESHOLD", "100000"))
+
+# Stale-while-revalidate for todo reads (app/utils/swr.py): identical reads
+# share one refresh. When it takes longer than SWR_LATENCY_BUDGET seconds or
+# fails, the last good response (at most SWR_MAX_STALE seconds old,
+# SWR_CACHE_MB per worker) is served instead. Refreshes behind a stored
+# response run on SWR_REFRESH_THREADS threads, by default as many as the
+# threadpool serving sync routes (anyio's 40), so capacity is unchanged
+SWR_ENABLED = os.getenv("SWR_ENABLED", "true").lower() == "true"
+SWR_LATENCY_BUDGET = float(os.getenv("SWR_LATENCY_BUDGET", "0.5"))
+SWR_MAX_STALE = float(os.getenv("SWR_MAX_STALE", "300"))
+SWR_CACHE_BYTES = int(float(os.getenv("SWR_CACHE_MB", "32")) * 1024 * 1024)
+SWR_REFRESH_THREADS = int(os.getenv("SWR_REFRESH_THREADS", "40"))
+
+# Background jobs: pool sizes per worker process (JOB_PROCESSES=0 disables
+# process jobs), how often progress is persisted / cancellation checked, and
+# when a running job whose runner stopped heartbeating is recovered
+JOB_THREADS = int(os.getenv("JOB_THREADS", "4"))
+JOB_PROCESSES = int(os.getenv("JOB_PROCESSES", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.5"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Health probes (/livez, /readyz) are served from state refreshed in the background
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+HEALTH_STALE_AFTER = float(os.getenv("HEALTH_STALE_AFTER", str(HEALTH_CHECK_INTERVAL * 3)))
+POOL_SATURATION_THRESHOLD = float(os.getenv("POOL_SATURATION_THRESHOLD", "0.9"))
+QUEUE_DEPTH_THRESHOLD = int(os.getenv("QUEUE_DEPTH_THRESHOLD", "1000"))
+
+# Warm-up before readiness (app/utils/warmup.py): open WARMUP_CONNECTIONS
+# pooled connections per engine, configure mappers and send each hot route
+# through the app once, anonymously and as each of the WARMUP_TOP_TENANTS
+# owners with the most todos. Startup waits at most WARMUP_TIMEOUT seconds
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+WARMUP_TOP_TENANTS = int(os.getenv("WARMUP_TOP_TENANTS", "5"))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "20"))
+
+# Admission control: token buckets per user (or client IP) and route class,
+# given as "<tokens per second>/<burst>"
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMITS = {
+    "read": os.getenv("RATE_LIMIT_READ", "50/100"),
+    "write": os.getenv("RATE_LIMIT_WRITE", "20/40"),
+    "search": os.getenv("RATE_LIMIT_SEARCH", "5/10"),
+}
+# Optional shared bucket store so limits hold across workers (redis://...,
+# needs requirements-redis.txt); while it fails, buckets are per worker and
+# the store is retried every RATE_LIMIT_BACKEND_RETRY seconds
+RATE_LIMIT_BACKEND_URL = os.getenv("RATE_LIMIT_BACKEND_URL")
+RATE_LIMIT_BACKEND_RETRY = float(os.getenv("RATE_LIMIT_BACKEND_RETRY", "5"))
+# Concurrent requests allowed per route class before shedding with 503
+CLASS_CONCURRENCY = {
+    "read": int(os.getenv("MAX_CONCURRENT_READS", "64")),
+    "write": int(os.getenv("MAX_CONCURRENT_WRITES", "32")),
+    "search": int(os.getenv("MAX_CONCURRENT_SEARCHES", "8")),
+}
+# Load shedding: expensive classes are shed first at the soft limit,
+# everything at the hard limit or when pool checkout waits get long (their
+# average halves every DB_POOL_WAIT_HALF_LIFE seconds, see database/config.py)
+SHED_SOFT_IN_FLIGHT = int(os.getenv("SHED_SOFT_IN_FLIGHT", "96"))
+SHED_HARD_IN_FLIGHT = int(os.getenv("SHED_HARD_IN_FLIGHT", "128"))
+SHED_POOL_WAIT_MS = float(os.getenv("SHED_POOL_WAIT_MS", "250"))
 
 # Print config info on startup
 def print_config():
@@ -1,6 +1,13 @@
 # This module is deprecated. Use database.config instead.
 # Kept for backward compatibility.
+from database.config import SessionLocal, get_db
 
-from database.config import engine, SessionLocal, get_db
+__all__ = ['engine', 'SessionLocal', 'get_db']  # noqa: F822 (engine comes from __getattr__)
 
-__all__ = ['engine', 'SessionLocal', 'get_db']
+
+def __getattr__(name):
+    # Resolve lazily so importing this module does not create the engine
+    if name == "engine":
+        from database.config import get_engine
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,284 @@
+"""
+Admission control and rate limiting
+
+Requests are classified as read, write or search. Each class has:
+  * a token bucket per caller (user id from the bearer token, else client IP)
+    -> 429 with Retry-After when empty
+  * a concurrency cap -> 503 when full, so a flood of expensive searches
+    cannot take every worker thread and pool connection
+
+On top of that, adaptive load shedding answers 503 early when the number of
+in-flight requests passes a soft limit (search only) or a hard limit (all
+classes), or when DB pool checkouts are waiting too long.
+
+Bucket state lives in-process by default; set RATE_LIMIT_BACKEND_URL to a
+redis:// URL to share buckets across workers and hosts (optional `redis`
+package: pip install -r requirements-redis.txt). While the shared store is
+missing or unreachable, buckets fall back to in-process ones, rechecked
+every RATE_LIMIT_BACKEND_RETRY seconds.
+"""
+import json
+import logging
+import math
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from app import config
+from database.config import pool_wait
+
+logger = logging.getLogger(__name__)
+
+EXEMPT_PATHS = ("/livez", "/readyz", "/health", "/docs", "/redoc", "/openapi.json")
+SHED_ORDER = ("search", "write", "read")  # first shed first
+
+
+def parse_rate(spec: str) -> Tuple[float, float]:
+    """'50/100' -> (50 tokens per second, burst of 100)"""
+    rate, _, burst = spec.partition("/")
+    rate = float(rate)
+    return rate, float(burst) if burst else rate
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Route class for a request, or None if it is exempt from admission control"""
+    if path.startswith(EXEMPT_PATHS) or method == "OPTIONS":
+        return None
+    if path.startswith("/api/todos/search"):
+        return "search"
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return "write"
+    return "read"
+
+
+@lru_cache(maxsize=4096)
+def _user_from_token(token: str) -> Optional[int]:
+    from app.utils.auth import decode_access_token
+
+    payload = decode_access_token(token)
+    return payload.get("user_id") if payload else None
+
+
+def caller_identity(scope: Dict) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            user_id = _user_from_token(value[7:].decode("latin-1"))
+            if user_id is not None:
+                return f"user:{user_id}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+# ============================================================================
+# BUCKET BACKENDS
+# ============================================================================
+
+class MemoryBackend:
+    """In-process token buckets, pruned when they grow past max_keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """Take one token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now)
+            return 0.0
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self._prune(now)
+        return (1 - tokens) / rate if rate > 0 else math.inf
+
+    def _prune(self, now: float) -> None:
+        # Drop the least recently touched half; a dropped bucket starts full again
+        ordered = sorted(self.buckets.items(), key=lambda item: item[1][1])
+        for key, _ in ordered[: len(ordered) // 2]:
+            del self.buckets[key]
+
+
+class RedisBackend:
+    """Token buckets shared through Redis (requires the optional `redis` package)"""
+
+    SCRIPT = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or ARGV[2])
+    local updated = tonumber(redis.call('HGET', KEYS[1], 'u') or ARGV[3])
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND_URL requires the 'redis' package") from e
+        # Short timeouts: a request waits on the store before falling back
+        self.client = redis.from_url(url, socket_connect_timeout=0.25, socket_timeout=0.25)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        wait = await self.script(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()])
+        return float(wait)
+
+
+def create_backend(url: Optional[str]):
+    if not url:
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported rate limit backend: {url}")
+
+
+# ============================================================================
+# CONTROLLER
+# ============================================================================
+
+class AdmissionController:
+    """Admission decisions and the counters they are based on"""
+
+    def __init__(
+        self,
+        enabled: bool = config.RATE_LIMIT_ENABLED,
+        rate_limits: Optional[Dict[str, str]] = None,
+        class_concurrency: Optional[Dict[str, int]] = None,
+        soft_in_flight: int = config.SHED_SOFT_IN_FLIGHT,
+        hard_in_flight: int = config.SHED_HARD_IN_FLIGHT,
+        pool_wait_ms: float = config.SHED_POOL_WAIT_MS,
+        backend=None,
+        backend_retry: float = config.RATE_LIMIT_BACKEND_RETRY,
+    ):
+        self.enabled = enabled
+        self.rates = {name: parse_rate(spec) for name, spec in (rate_limits or config.RATE_LIMITS).items()}
+        self.class_concurrency = dict(class_concurrency or config.CLASS_CONCURRENCY)
+        self.soft_in_flight = soft_in_flight
+        self.hard_in_flight = hard_in_flight
+        self.pool_wait_ms = pool_wait_ms
+        self._backend = backend
+        self.backend_retry = backend_retry
+        self.backend_errors = 0
+        # Per-worker buckets used while the shared backend fails
+        self._fallback = MemoryBackend()
+        self._backend_down_until = 0.0
+        self.in_flight = 0
+        self.active: Dict[str, int] = {name: 0 for name in self.class_concurrency}
+        self.rejected: Dict[str, int] = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            try:
+                self._backend = create_backend(config.RATE_LIMIT_BACKEND_URL)
+            except (RuntimeError, ValueError) as e:
+                logger.error(f"✗ {e}; rate limiting with in-process buckets")
+                self._backend = self._fallback
+        return self._backend
+
+    async def _take(self, key: str, rate: float, burst: float) -> float:
+        """Take a token from the backend, or from in-process buckets while it fails"""
+        if time.monotonic() >= self._backend_down_until:
+            try:
+                return await self.backend.take(key, rate, burst)
+            except Exception as e:
+                self.backend_errors += 1
+                self._backend_down_until = time.monotonic() + self.backend_retry
+                logger.warning(f"Rate limit backend failed ({e}); using in-process buckets "
+                               f"for {self.backend_retry:g}s")
+        return await self._fallback.take(key, rate, burst)
+
+    def _shed_reason(self, route_class: str) -> Optional[str]:
+        if self.active.get(route_class, 0) >= self.class_concurrency.get(route_class, math.inf):
+            return f"too many concurrent {route_class} requests"
+        if self.in_flight >= self.hard_in_flight:
+            return "server overloaded"
+        overloaded = self.in_flight >= self.soft_in_flight or pool_wait.ewma_ms >= self.pool_wait_ms
+        if overloaded and route_class == SHED_ORDER[0]:
+            return "server busy; try again shortly"
+        if pool_wait.ewma_ms >= self.pool_wait_ms * 2 and route_class != SHED_ORDER[-1]:
+            return "database busy; try again shortly"
+        return None
+
+    async def admit(self, route_class: str, identity: str) -> Optional[Tuple[int, str, float]]:
+        """None if admitted, else (status, detail, retry_after_seconds)"""
+        reason = self._shed_reason(route_class)
+        if reason:
+            return 503, reason, 1.0
+        rate, burst = self.rates.get(route_class, (0, 0))
+        if rate > 0:
+            wait = await self._take(f"{route_class}:{identity}", rate, burst)
+            if wait > 0:
+                return 429, "Rate limit exceeded", wait
+        return None
+
+    def record_rejection(self, route_class: str, status: int) -> None:
+        key = f"{route_class}:{status}"
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "active": dict(self.active),
+            "rejected": dict(self.rejected),
+            "backend": type(self._backend).__name__ if self._backend is not None else None,
+            "backend_errors": self.backend_errors,
+            "pool_wait_ewma_ms": round(pool_wait.ewma_ms, 2),
+        }
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """Pure ASGI middleware applying AdmissionController decisions"""
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if scope["type"] != "http" or not controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        rejection = await controller.admit(route_class, caller_identity(scope))
+        if rejection is not None:
+            status, detail, retry_after = rejection
+            controller.record_rejection(route_class, status)
+            await self._reject(send, status, detail, retry_after)
+            return
+
+        controller.in_flight += 1
+        controller.active[route_class] = controller.active.get(route_class, 0) + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.in_flight -= 1
+            controller.active[route_class] -= 1
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
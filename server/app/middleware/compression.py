@@ -0,0 +1,322 @@
+"""
+Response compression
+
+Negotiates zstd, brotli or gzip from Accept-Encoding (zstd and brotli need
+the optional `zstandard` / `brotli` packages) and compresses JSON and text
+responses above COMPRESSION_MIN_SIZE:
+
+  * complete bodies get a strong ETag (hash of the uncompressed body plus
+    the encoding); compressed bodies are cached by ETag so hot list pages
+    are compressed once, and If-None-Match answers 304
+  * streamed bodies (e.g. export) are compressed chunk by chunk and flushed
+    after each chunk so clients receive rows as they are produced
+  * bodies and chunks of COMPRESSION_THREAD_MIN_SIZE or more are compressed
+    on a worker thread (zlib, brotli and zstandard release the GIL), so a
+    large cache miss does not stall every other request on the event loop
+"""
+import hashlib
+import logging
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anyio
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+# ============================================================================
+# ENCODERS
+# ============================================================================
+
+class GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, level: int):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level: int):
+        import zstandard
+
+        self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(self._flush_mode)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _brotli(data: bytes, level: int) -> bytes:
+    import brotli
+
+    return brotli.compress(data, quality=level)
+
+
+def _zstd(data: bytes, level: int) -> bytes:
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _available(module: str) -> bool:
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+# name -> (one-shot compressor, streaming compressor), in server preference order
+ENCODERS: Dict[str, Tuple[Callable[[bytes, int], bytes], Callable]] = {}
+if _available("zstandard"):
+    ENCODERS["zstd"] = (_zstd, ZstdStream)
+if _available("brotli"):
+    ENCODERS["br"] = (_brotli, BrotliStream)
+ENCODERS["gzip"] = (_gzip, GzipStream)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """'gzip, br;q=0.8, *;q=0' -> {'gzip': 1.0, 'br': 0.8, '*': 0.0}"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header: str, enabled: Optional[List[str]] = None) -> Optional[str]:
+    """Best encoding both sides support: highest q, ties broken by ENCODERS order"""
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        if enabled is not None and name not in enabled:
+            continue
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+# ============================================================================
+# PRECOMPRESSED CACHE
+# ============================================================================
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by (ETag, encoding), bounded in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key: Tuple[str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes // 4 or key in self._entries:
+            return
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+compressed_cache = CompressedCache(config.COMPRESSION_CACHE_BYTES)
+
+
+def make_etag(body: bytes, encoding: Optional[str] = None) -> str:
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+class CompressionMiddleware:
+    """Pure ASGI middleware applying negotiated compression"""
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = config.COMPRESSION_MIN_SIZE,
+        levels: Optional[Dict[str, int]] = None,
+        cache: CompressedCache = compressed_cache,
+        thread_min_size: int = config.COMPRESSION_THREAD_MIN_SIZE,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+        self.levels = dict(levels or config.COMPRESSION_LEVELS)
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        headers = {name.decode(): value.decode("latin-1") for name, value in scope["headers"]
+                   if name in (b"accept-encoding", b"if-none-match")}
+        encoding = choose_encoding(headers.get("accept-encoding", ""), list(self.levels))
+        responder = _Responder(self, send, encoding, headers.get("if-none-match"),
+                               conditional=scope["method"] in ("GET", "HEAD"))
+        await self.app(scope, receive, responder.send)
+
+    async def run(self, function: Callable, data: bytes, *args):
+        """function(data, *args), on a worker thread when data is large"""
+        if len(data) >= self.thread_min_size:
+            return await anyio.to_thread.run_sync(function, data, *args)
+        return function(data, *args)
+
+
+class _Responder:
+    """Per-response state: decides between pass-through, one-shot and streaming"""
+
+    def __init__(self, middleware: CompressionMiddleware, send, encoding: Optional[str],
+                 if_none_match: Optional[str], conditional: bool):
+        self.middleware = middleware
+        self._send = send
+        self.encoding = encoding
+        self.if_none_match = if_none_match
+        self.conditional = conditional
+        self.start: Optional[Dict] = None
+        self.mode: Optional[str] = None  # "passthrough", "stream"
+        self.stream = None
+
+    async def send(self, message: Dict) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            if not self._eligible(message):
+                self.mode = "passthrough"
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body" or self.mode == "passthrough":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.mode == "stream":
+            chunk = await self.middleware.run(self.stream.compress, body) if body else b""
+            if not more_body:
+                chunk += self.stream.finish()
+            if chunk or not more_body:
+                await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        if more_body:
+            await self._start_stream(body)
+        else:
+            await self._send_complete(body)
+
+    def _eligible(self, start: Dict) -> bool:
+        if start["status"] != 200:
+            return False
+        headers = dict(start.get("headers", ()))
+        if b"content-encoding" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        length = headers.get(b"content-length")
+        return length is None or int(length) >= self.middleware.minimum_size or self.conditional
+
+    def _headers(self, drop=(b"content-length",)) -> List[Tuple[bytes, bytes]]:
+        headers = [(name, value) for name, value in self.start.get("headers", ()) if name not in drop]
+        headers.append((b"vary", b"Accept-Encoding"))
+        return headers
+
+    async def _start_stream(self, first_chunk: bytes) -> None:
+        if self.encoding is None:
+            self.mode = "passthrough"
+            await self._send(self.start)
+            await self._send({"type": "http.response.body", "body": first_chunk, "more_body": True})
+            return
+        self.mode = "stream"
+        level = self.middleware.levels[self.encoding]
+        self.stream = ENCODERS[self.encoding][1](level)
+        headers = self._headers()
+        headers.append((b"content-encoding", self.encoding.encode()))
+        await self._send({**self.start, "headers": headers})
+        await self.send({"type": "http.response.body", "body": first_chunk, "more_body": True})
+
+    async def _send_complete(self, body: bytes) -> None:
+        compress = self.encoding is not None and len(body) >= self.middleware.minimum_size
+        etag = make_etag(body, self.encoding if compress else None)
+        headers = self._headers(drop=(b"content-length", b"etag"))
+        headers.append((b"etag", etag.encode()))
+
+        if self.conditional and self.if_none_match and etag_matches(self.if_none_match, etag):
+            await self._send({**self.start, "status": 304, "headers": headers})
+            await self._send({"type": "http.response.body", "body": b""})
+            return
+
+        if compress:
+            key = (etag, self.encoding)
+            cached = self.middleware.cache.get(key)
+            if cached is None:
+                level = self.middleware.levels[self.encoding]
+                cached = await self.middleware.run(ENCODERS[self.encoding][0], body, level)
+                self.middleware.cache.put(key, cached)
+            body = cached
+            headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await self._send({**self.start, "headers": headers})
+        await self._send({"type": "http.response.body", "body": body})
@@ -0,0 +1,120 @@
+"""
+Request deadlines
+
+Every request gets a time budget from its route class (ROUTE_TIMEOUTS),
+optionally tightened by the client with an `X-Request-Timeout: <seconds>`
+header. The deadline is published through database.deadline so queries are
+cancelled by the database once it passes, which frees the worker thread and
+the pooled connection.
+
+If no response has started when the budget runs out, or the route failed
+with a 5xx after the deadline (the cancelled query surfacing as an error),
+the client gets 504.
+"""
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+import anyio
+
+from app import config
+from app.middleware.admission import classify
+from database.deadline import request_deadline
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+
+def requested_timeout(scope: Dict) -> Optional[float]:
+    """Client-supplied budget in seconds, if present and valid"""
+    for name, value in scope.get("headers", ()):
+        if name == TIMEOUT_HEADER:
+            try:
+                timeout = float(value)
+            except ValueError:
+                return None
+            return timeout if timeout > 0 else None
+    return None
+
+
+class DeadlineMiddleware:
+    """Pure ASGI middleware enforcing per-request deadlines"""
+
+    def __init__(self, app, timeouts: Optional[Dict[str, float]] = None):
+        self.app = app
+        self.timeouts = dict(timeouts or config.ROUTE_TIMEOUTS)
+
+    def timeout_for(self, scope: Dict) -> Optional[float]:
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            return None
+        timeout = self.timeouts.get(route_class, config.REQUEST_TIMEOUT)
+        requested = requested_timeout(scope)
+        # Clients may shorten the budget, never extend it
+        return min(timeout, requested) if requested else timeout
+
+    async def __call__(self, scope, receive, send):
+        timeout = self.timeout_for(scope) if scope["type"] == "http" else None
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = time.monotonic() + timeout
+        response_started = False
+        timed_out = False
+
+        async def send_timeout():
+            nonlocal timed_out
+            timed_out = True
+            logger.warning(f"Deadline of {timeout:.1f}s exceeded: {scope['method']} {scope['path']}")
+            await self._timeout_response(send)
+
+        async def send_within_deadline(message):
+            nonlocal response_started
+            if timed_out:
+                return
+            if message["type"] == "http.response.start":
+                if message["status"] >= 500 and time.monotonic() >= deadline:
+                    # The failure is the cancelled query surfacing as an error
+                    await send_timeout()
+                    return
+                response_started = True
+                # The budget covers producing the response; a streamed body
+                # (export) may take longer and must not be interrupted
+                request_deadline.set(None)
+            await send(message)
+
+        async def watchdog():
+            await anyio.sleep(timeout)
+            if not response_started and not timed_out:
+                await send_timeout()
+
+        # The app is not cancelled at the deadline: sync routes cannot be
+        # interrupted, and cancelling would skip FastAPI's dependency
+        # teardown (leaking the session). The database cancels the query
+        # instead, so the route finishes promptly and its output is dropped.
+        token = request_deadline.set(deadline)
+        try:
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(watchdog)
+                try:
+                    await self.app(scope, receive, send_within_deadline)
+                finally:
+                    task_group.cancel_scope.cancel()
+        finally:
+            request_deadline.reset(token)
+
+    @staticmethod
+    async def _timeout_response(send) -> None:
+        body = json.dumps({"detail": "Request deadline exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
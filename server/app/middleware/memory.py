@@ -0,0 +1,33 @@
+"""
+Per-route memory counters
+
+Reads RSS (and traced memory while tracemalloc runs) before and after each
+request and records the difference against the route template, e.g.
+"GET /api/todos/search/{query}" (see app/utils/memory.py). Only installed
+when MEMORY_PROFILING.
+"""
+import tracemalloc
+
+from app.utils.memory import route_memory, rss_bytes
+
+
+class MemoryMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracing = tracemalloc.is_tracing()
+        rss_before = rss_bytes() or 0
+        traced_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            name = f"{scope['method']} {route.path}" if route is not None else "unmatched"
+            traced_net = tracemalloc.get_traced_memory()[0] - traced_before if tracing else None
+            route_memory.record(name, (rss_bytes() or 0) - rss_before, traced_net)
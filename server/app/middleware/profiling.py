@@ -0,0 +1,85 @@
+"""
+Per-request profiling trigger
+
+Decides whether a request is profiled (see app/utils/profiling.py):
+
+  * "X-Profile: 1" with an X-Profile-Token header matching PROFILE_TOKEN
+    (without a configured token the header is ignored)
+  * otherwise at random, 1 in PROFILE_SAMPLE_RATE requests
+
+Profiled responses carry an X-Profile-Id header naming the stored profile.
+Only installed when PROFILING_ENABLED; added outermost so the time spent in
+the other middleware is part of the profile.
+"""
+import hmac
+import logging
+import random
+import sys
+
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.utils import profiling
+
+logger = logging.getLogger(__name__)
+
+# Fetching a profile is not itself worth profiling
+SKIP_PREFIXES = ("/debug/profiles",)
+
+
+def token_matches(token: str) -> bool:
+    return bool(config.PROFILE_TOKEN) and hmac.compare_digest(token.encode(), config.PROFILE_TOKEN.encode())
+
+
+class ProfilerMiddleware:
+    def __init__(self, app, sample_rate: int = config.PROFILE_SAMPLE_RATE, directory: str = config.PROFILE_DIR):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.directory = directory
+
+    def _trigger(self, scope) -> str:
+        """'header', 'sample' or '' when the request is not profiled"""
+        if scope["path"].startswith(SKIP_PREFIXES):
+            return ""
+        requested, token = False, ""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = value == b"1"
+            elif name == b"x-profile-token":
+                token = value.decode("latin-1")
+        if requested and token_matches(token):
+            return "header"
+        if self.sample_rate > 0 and random.random() * self.sample_rate < 1:
+            return "sample"
+        return ""
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else ""
+        if not trigger:
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiling.Profile(scope["method"], scope["path"], trigger)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile.id.encode())
+                ]
+            await send(message)
+
+        try:
+            with profiling.profiled(profile, sys._getframe()):
+                await self.app(scope, receive, send_with_id)
+        finally:
+            # Failed requests are stored too; an exception means a 500
+            profile.status = profile.status or 500
+            await self._store(profile, trigger)
+
+    async def _store(self, profile: profiling.Profile, trigger: str) -> None:
+        try:
+            await run_in_threadpool(profiling.store, profile, self.directory)
+            logger.info(f"Profiled {profile.method} {profile.path} ({trigger}) as {profile.id}")
+        except Exception as e:
+            logger.error(f"Error storing profile {profile.id}: {str(e)}")
@@ -0,0 +1,73 @@
+"""
+SQLAlchemy model for background jobs
+"""
+from datetime import datetime
+
+from sqlalchemy import JSON, Boolean, Column, DateTime, Index, Integer, String, Text
+
+from .todo import Base
+
+
+class JobRecord(Base):
+    """Persistent status, progress and result of a background job"""
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(64), nullable=False)
+    params = Column(JSON, nullable=False, default=dict)
+    status = Column(String(16), nullable=False, default="pending")
+    progress = Column(JSON, nullable=False, default=dict)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+
+    # Claim token of the runner executing the job ("host:pid:nonce")
+    worker = Column(String(128), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_jobs_status_created', 'status', 'created_at'),
+        Index('idx_jobs_kind_status', 'kind', 'status'),
+    )
+
+    def __repr__(self):
+        """String representation of job"""
+        return f"<JobRecord(id={self.id}, kind='{self.kind}', status='{self.status}')>"
+
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "attempts": self.attempts,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class JobKindLock(Base):
+    """
+    One row per job kind. Claims and deduplicated submits update it first,
+    which holds the row (PostgreSQL) or the write lock (SQLite) until their
+    transaction ends, so they count running and active jobs one at a time
+    """
+    __tablename__ = "job_kinds"
+
+    kind = Column(String(64), primary_key=True)
+    locked_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        """String representation of a job kind lock"""
+        return f"<JobKindLock(kind='{self.kind}')>"
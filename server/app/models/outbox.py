@@ -0,0 +1,44 @@
+"""
+SQLAlchemy model for the transactional outbox of todo changes
+"""
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String
+
+from .todo import Base
+
+
+class OutboxEvent(Base):
+    """
+    A todo change waiting for delivery, written in the transaction that made
+    it and deleted by app/utils/outbox.py once every sink has it
+    """
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # todo.created, todo.updated or todo.deleted
+    event = Column(String(32), nullable=False)
+    todo_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=True)
+    # The todo as written (null for todos removed by clear-completed)
+    payload = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Lease of the relay delivering the row ("host:pid:nonce")
+    claimed_by = Column(String(128), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        """String representation of an outbox row"""
+        return f"<OutboxEvent(id={self.id}, event='{self.event}', todo_id={self.todo_id})>"
+
+    def to_dict(self):
+        """Convert outbox row to the dictionary delivered to sinks"""
+        return {
+            "id": self.id,
+            "event": self.event,
+            "todo_id": self.todo_id,
+            "owner_id": self.owner_id,
+            "payload": self.payload,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
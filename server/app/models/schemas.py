@@ -2,9 +2,15 @@
 Pydantic schemas for request/response validation
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import Optional
 from datetime import datetime
+from typing import Annotated, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, TypeAdapter, field_validator
+
+# Whitespace is stripped before the length checks, all inside pydantic-core,
+# so routes receive clean values and need no second validation pass
+TodoTitle = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=255)]
+TodoDescription = Annotated[str, StringConstraints(strip_whitespace=True, max_length=500)]
 
 
 # User schemas for authentication
@@ -19,9 +25,9 @@ class UserLogin(BaseModel):
     password: str
 
 class UserResponse(UserBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
-    class Config:
-        orm_mode = True
 
 class Token(BaseModel):
     access_token: str
@@ -30,24 +36,10 @@ class Token(BaseModel):
 
 class TodoBase(BaseModel):
     """Base todo schema with common fields"""
-    title: str = Field(..., min_length=1, max_length=255, description="Todo title")
-    description: Optional[str] = Field(None, max_length=500, description="Todo description")
+    title: TodoTitle = Field(..., description="Todo title")
+    description: Optional[TodoDescription] = Field(None, description="Todo description")
     completed: bool = Field(False, description="Completion status")
 
-    @validator('title')
-    def title_not_empty(cls, v):
-        """Ensure title is not empty after stripping"""
-        if not v or not v.strip():
-            raise ValueError('Title cannot be empty')
-        return v.strip()
-
-    @validator('description')
-    def description_strip(cls, v):
-        """Strip whitespace from description"""
-        if v:
-            return v.strip()
-        return v
-
 
 class TodoCreate(TodoBase):
     """Schema for creating a new todo"""
@@ -56,45 +48,62 @@ class TodoCreate(TodoBase):
 
 class TodoUpdate(BaseModel):
     """Schema for updating a todo (all fields optional)"""
-    title: Optional[str] = Field(None, min_length=1, max_length=255)
-    description: Optional[str] = Field(None, max_length=500)
+    title: Optional[TodoTitle] = None
+    description: Optional[TodoDescription] = None
     completed: Optional[bool] = None
 
-    @validator('title')
-    def title_not_empty(cls, v):
-        """Ensure title is not empty after stripping"""
-        if v is not None and not v.strip():
-            raise ValueError('Title cannot be empty')
-        if v:
-            return v.strip()
-        return v
-
-    @validator('description')
-    def description_strip(cls, v):
-        """Strip whitespace from description"""
-        if v:
-            return v.strip()
+    @field_validator('title', 'completed')
+    @classmethod
+    def not_null(cls, v):
+        """Fields may be omitted but not set to null"""
+        if v is None:
+            raise ValueError('may be omitted but not null')
         return v
 
 
 class TodoResponse(TodoBase):
     """Schema for todo response with metadata"""
-    id: int = Field(..., description="Todo ID")
-    created_at: datetime = Field(..., description="Creation timestamp")
-    updated_at: datetime = Field(..., description="Last update timestamp")
-
-    class Config:
-        from_attributes = True
-        json_schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
             "example": {
                 "id": 1,
                 "title": "Buy groceries",
                 "description": "Milk, eggs, bread",
                 "completed": False,
                 "created_at": "2024-02-01T10:30:00",
-                "updated_at": "2024-02-01T10:30:00"
+                "updated_at": "2024-02-01T10:30:00",
+                "completed_at": None
             }
-        }
+        },
+    )
+
+    id: int = Field(..., description="Todo ID")
+    created_at: datetime = Field(..., description="Creation timestamp")
+    updated_at: datetime = Field(..., description="Last update timestamp")
+    completed_at: Optional[datetime] = Field(None, description="Completion timestamp")
+
+
+# Compiled validators for whole lists: one pydantic-core call per list
+# instead of one per item, and JSON is written directly by dump_json()
+TodoCreateList = TypeAdapter(List[TodoCreate])
+TodoResponseList = TypeAdapter(List[TodoResponse])
+
+
+class TodoPage(BaseModel):
+    """Schema for a page of todos with pagination info (?envelope=true)"""
+    model_config = ConfigDict(from_attributes=True)
+
+    items: List[TodoResponse] = Field(..., description="Todos on this page")
+    total: Optional[int] = Field(None, description="Matching todos; null when no estimate exists")
+    total_exact: bool = Field(..., description="False when total is an estimate")
+    total_source: str = Field(..., description="count, mirror, counters, estimate, page or unavailable")
+    skip: int = Field(..., description="Offset of the first item")
+    limit: int = Field(..., description="Page size")
+    page: int = Field(..., description="1-based page number")
+    pages: Optional[int] = Field(None, description="Pages at this page size, from total")
+    has_next: bool = Field(..., description="More todos follow (always exact)")
+    has_prev: bool = Field(..., description="Todos precede this page")
 
 
 class TodoStats(BaseModel):
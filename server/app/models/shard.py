@@ -0,0 +1,27 @@
+"""
+SQLAlchemy model for the tenant shard directory
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String
+
+from .todo import Base
+
+
+class TenantShard(Base):
+    """
+    Owner -> shard override, kept in the main database.
+
+    Owners without a row live on the shard the hash ring picks for them;
+    rows pin hot tenants elsewhere and mark tenants being moved by
+    database/move_tenant.py.
+    """
+    __tablename__ = "tenant_shards"
+
+    owner_id = Column(Integer, primary_key=True)
+    # Shard currently serving the owner's todos
+    shard = Column(String(64), nullable=False)
+    # "active", or "moving" while the owner's rows are copied to `target`
+    state = Column(String(16), nullable=False, default="active")
+    target = Column(String(64), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
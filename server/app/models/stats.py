@@ -0,0 +1,46 @@
+"""
+SQLAlchemy model for pre-aggregated todo statistics
+"""
+from sqlalchemy import Column, Date, Float, Integer
+
+from .todo import Base
+
+
+class DailyTodoStats(Base):
+    """Per-day rollup of the todos table, maintained by app/utils/rollups.py"""
+    __tablename__ = "todo_stats_daily"
+
+    # UTC day
+    day = Column(Date, primary_key=True)
+    # Todos created on this day
+    created = Column(Integer, nullable=False, default=0)
+    # Todos completed on this day, and the sum of their time to complete
+    completed = Column(Integer, nullable=False, default=0)
+    completion_seconds = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        """String representation of a rollup row"""
+        return f"<DailyTodoStats(day={self.day}, created={self.created}, completed={self.completed})>"
+
+    def to_dict(self):
+        """Convert rollup row to dictionary"""
+        return {
+            "day": self.day.isoformat(),
+            "created": self.created,
+            "completed": self.completed,
+            "completion_seconds": self.completion_seconds,
+        }
+
+
+class OwnerTodoStats(Base):
+    """Per-owner todo counts, maintained by app/utils/rollups.py"""
+    __tablename__ = "todo_stats_owner"
+
+    owner_id = Column(Integer, primary_key=True)
+    # Current todos of this owner, and how many of them are completed
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        """String representation of a per-owner rollup row"""
+        return f"<OwnerTodoStats(owner_id={self.owner_id}, total={self.total}, completed={self.completed})>"
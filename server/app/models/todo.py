@@ -2,7 +2,7 @@
 SQLAlchemy models for todo application
 """
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index, Text
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -27,6 +27,8 @@ class Todo(Base):
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Set when the todo is marked completed, cleared when it is reopened
+    completed_at = Column(DateTime, nullable=True)
 
     # Indexes for common queries
     __table_args__ = (
@@ -34,6 +36,17 @@ class Todo(Base):
         Index('idx_todos_created_at', 'created_at'),
         Index('idx_todos_title', 'title'),
         Index('idx_todos_completed_created', 'completed', 'created_at'),
+        # Supporting indexes for the listing filter/sort grammar (app/utils/filters.py)
+        Index('idx_todos_updated_at', 'updated_at'),
+        Index('idx_todos_title_lower', func.lower(title)),
+        Index('idx_todos_completed_updated', 'completed', 'updated_at'),
+        Index('idx_todos_completed_title_lower', 'completed', func.lower(title)),
+        Index('idx_todos_owner_created', 'owner_id', 'created_at'),
+        Index('idx_todos_owner_updated', 'owner_id', 'updated_at'),
+        Index('idx_todos_owner_title_lower', 'owner_id', func.lower(title)),
+        Index('idx_todos_owner_completed_created', 'owner_id', 'completed', 'created_at'),
+        Index('idx_todos_owner_completed_updated', 'owner_id', 'completed', 'updated_at'),
+        Index('idx_todos_owner_completed_title_lower', 'owner_id', 'completed', func.lower(title)),
     )
 
     def __repr__(self):
@@ -49,7 +62,29 @@ class Todo(Base):
             "completed": self.completed,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
         }
 
     class Config:
         from_attributes = True
+
+
+class ArchivedTodo(Base):
+    """Cold storage for todos removed by clear-completed with archive=true"""
+    __tablename__ = "todos_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Id of the original row; SQLite may reuse ids, so it is not unique here
+    todo_id = Column(Integer, nullable=False, index=True)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    completed = Column(Boolean, nullable=False)
+    owner_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        """String representation of archived todo"""
+        return f"<ArchivedTodo(todo_id={self.todo_id}, title='{self.title}')>"
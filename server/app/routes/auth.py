@@ -3,17 +3,10 @@ from sqlalchemy.orm import Session
 from app.models import user as user_model
 from app.models import schemas
 from app.utils import auth as auth_utils
-from app.database import db
+from app.database.db import get_db
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-def get_db():
-    db_session = db.SessionLocal()
-    try:
-        yield db_session
-    finally:
-        db_session.close()
-
 @router.post("/register", response_model=schemas.UserResponse)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     existing = db.query(user_model.User).filter(user_model.User.username == user.username).first()
@@ -0,0 +1,54 @@
+"""
+SQLite backup routes
+"""
+import logging
+from typing import Dict, List
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from app import config
+from app.utils import backup
+from app.utils.jobs import job_runner
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/backups", tags=["backups"])
+
+
+@router.get("/", response_model=List[Dict])
+def list_backups():
+    """Snapshots in BACKUP_DIR, newest first"""
+    try:
+        return backup.snapshots(config.BACKUP_DIR)
+    except Exception as e:
+        logger.error(f"Error listing backups: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to list backups")
+
+
+@router.post("/", status_code=202)
+def create_backup(
+    mode: str = Query("online", regex="^(online|vacuum)$", description="online backup steps or VACUUM INTO"),
+):
+    """
+    Snapshot every SQLite database in the background.
+
+    Poll the returned job at /api/jobs/{id}; if a backup is already running,
+    that job is returned. Restores are only done with database/backup.py.
+    """
+    try:
+        if not backup.databases():
+            raise HTTPException(status_code=400, detail="Backups are only supported for SQLite databases")
+        job = job_runner.submit("backup", {"mode": mode}, dedupe=True)
+        logger.info(f"Backup queued as job {job['id']} (mode={mode})")
+        return JSONResponse(
+            status_code=202,
+            content=job,
+            headers={"Location": f"/api/jobs/{job['id']}"},
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting backup job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to start backup")
@@ -0,0 +1,25 @@
+"""
+Liveness and readiness probes
+
+Both endpoints answer from HealthMonitor state and never touch the database.
+"""
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.utils.health import health_monitor
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/livez")
+async def liveness():
+    """Process is up and the background health checker is running"""
+    state = health_monitor.liveness()
+    return JSONResponse(status_code=200 if state["alive"] else 503, content=state)
+
+
+@router.get("/readyz")
+async def readiness():
+    """Instance can take traffic: database reachable, pool and queues below limits"""
+    state = health_monitor.readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
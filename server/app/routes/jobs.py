@@ -0,0 +1,58 @@
+"""
+Background job status routes
+"""
+import logging
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from app.utils.jobs import job_runner
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.get("/", response_model=List[Dict])
+def list_jobs(
+    kind: Optional[str] = Query(None, description="Filter by job type"),
+    status: Optional[str] = Query(None, regex="^(pending|running|succeeded|failed|cancelled)$"),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Most recent jobs first"""
+    try:
+        return job_runner.list(kind=kind, status=status, limit=limit)
+    except Exception as e:
+        logger.error(f"Error listing jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to list jobs")
+
+
+@router.get("/{job_id}", response_model=Dict)
+def get_job(job_id: str):
+    """Status, progress and result of a background job"""
+    try:
+        job = job_runner.get(job_id)
+    except Exception as e:
+        logger.error(f"Error fetching job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch job")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/{job_id}/cancel", status_code=202)
+def cancel_job(job_id: str):
+    """
+    Cancel a job. Pending jobs are cancelled immediately; running jobs stop
+    at their next checkpoint.
+    """
+    try:
+        job = job_runner.cancel(job_id)
+    except Exception as e:
+        logger.error(f"Error cancelling job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to cancel job")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    logger.info(f"Cancellation requested for job {job_id}")
+    return JSONResponse(status_code=202, content=job)
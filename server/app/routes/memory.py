@@ -0,0 +1,51 @@
+"""
+Worker memory routes (only registered when MEMORY_PROFILING)
+
+Every response describes the worker that served it (see "pid"); with several
+workers, repeat a snapshot until the same worker answers twice.
+"""
+import logging
+from typing import Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+from app.routes.profiles import require_profile_token
+from app.utils import memory
+from database.config import identity_maps
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/debug/memory", tags=["profiling"], dependencies=[Depends(require_profile_token)])
+
+
+@router.get("/", response_model=Dict)
+def memory_stats():
+    """RSS against the limit, tracemalloc totals, per-route counters and session identity-map sizes"""
+    try:
+        return {
+            **memory.memory_monitor.stats(),
+            "identity_maps": identity_maps.stats(),
+            "routes": memory.route_memory.stats(),
+        }
+    except Exception as e:
+        logger.error(f"Error reading memory stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to read memory stats")
+
+
+@router.post("/snapshot", response_model=Dict)
+async def memory_snapshot(
+    group_by: str = Query("lineno", regex="^(lineno|filename|traceback)$"),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """
+    Take a tracemalloc snapshot: the top allocations now, and the largest
+    changes since this worker's previous snapshot.
+    """
+    try:
+        return await run_in_threadpool(memory.take_snapshot, group_by, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error taking memory snapshot: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to take memory snapshot")
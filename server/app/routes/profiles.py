@@ -0,0 +1,58 @@
+"""
+Request profile routes (only registered when PROFILING_ENABLED)
+"""
+import logging
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.middleware.profiling import token_matches
+from app.utils import profiling
+
+logger = logging.getLogger(__name__)
+
+
+def require_profile_token(x_profile_token: str = Header("", description="PROFILE_TOKEN")) -> None:
+    if not token_matches(x_profile_token):
+        raise HTTPException(status_code=403, detail="Profile access requires a valid X-Profile-Token")
+
+
+router = APIRouter(prefix="/debug/profiles", tags=["profiling"], dependencies=[Depends(require_profile_token)])
+
+
+@router.get("/", response_model=List[Dict])
+def list_profiles():
+    """Summaries of the stored profiles, newest first"""
+    try:
+        return profiling.summaries()
+    except Exception as e:
+        logger.error(f"Error listing profiles: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to list profiles")
+
+
+@router.get("/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("speedscope", regex="^(speedscope|collapsed|summary)$",
+                        description="speedscope JSON, collapsed stacks for flamegraph.pl, or the summary"),
+):
+    """
+    A stored profile.
+
+    Open the speedscope JSON at https://www.speedscope.app, or render the
+    collapsed stacks with `flamegraph.pl profile.txt > profile.svg`.
+    """
+    try:
+        stored = profiling.load(profile_id)
+    except Exception as e:
+        logger.error(f"Error loading profile {profile_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to load profile")
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "summary":
+        return stored["summary"]
+    if format == "collapsed":
+        return PlainTextResponse(profiling.to_collapsed(stored))
+    return profiling.to_speedscope(stored)
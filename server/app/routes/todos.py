@@ -1,22 +1,27 @@
 """
 Todo API routes with CRUD operations and advanced features
 """
+import heapq
+import itertools
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import desc, or_
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import case, delete, func, insert, select, update
 from app.models.todo import Todo
-from app.models.schemas import TodoCreate, TodoUpdate, TodoResponse
-from app.database.db import get_db
-from app.utils.validators import (
-    validate_todo_title,
-    validate_todo_description,
-    sanitize_title,
-    sanitize_description,
-    normalize_query,
-)
-from typing import List, Dict, Optional
-from datetime import datetime
+from app.models.schemas import TodoCreate, TodoUpdate, TodoPage, TodoResponse, TodoResponseList
+from app import config
+from database.shards import ShardSessions, TenantMovingError, get_shards, shard_router
+from app.utils.auth import get_current_user_id, get_optional_user_id
+from app.utils.filters import QueryShapeError, TodoFilter
+from app.utils.jobs import job_runner
+from app.utils.mirror import FIELD_SEPARATOR, ROW_SEPARATOR, todo_mirror
+from app.utils.suggest import title_index
+from app.utils.swr import stale_cache
+from app.utils import purge  # noqa: F401  (registers the clear_completed job type)
+from app.utils import counts, outbox, rollups, statements
+from app.utils.validators import normalize_query
+from typing import Callable, List, Dict, Optional, Union
+from datetime import date, datetime, timedelta
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,18 +29,157 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/todos", tags=["todos"])
 
+# Writes go through Core INSERT/UPDATE/DELETE ... RETURNING: one statement
+# per write, no SELECT before it and no refresh after it (SQLite >= 3.35)
+todos_table = Todo.__table__
+
+
+def _todo_list_response(todos: List[Todo]) -> Response:
+    """
+    Serialize a list of todos in one pydantic-core pass.
+
+    Returning the ORM objects would make FastAPI validate each item, dump it
+    to Python objects and then json.dumps() the result; the TypeAdapter
+    validates the list and writes JSON bytes directly.
+    """
+    validated = TodoResponseList.validate_python(todos, from_attributes=True)
+    return Response(content=TodoResponseList.dump_json(validated), media_type="application/json")
+
+
+def _todo_page_response(todos: List, total: counts.Total, skip: int, limit: int, has_next: bool) -> Response:
+    """Serialize a page of todos with its pagination info (?envelope=true)"""
+    # Imported on first use: helpers stays out of startup (see app/utils/__init__.py)
+    from app.utils.helpers import PaginationUtils
+
+    total = counts.page_total(total, skip, len(todos), has_next)
+    info = PaginationUtils.get_pagination_info(total.value or 0, skip // limit + 1, limit)
+    page = TodoPage.model_validate({
+        "items": todos,
+        "total": total.value,
+        "total_exact": total.exact,
+        "total_source": total.source,
+        "skip": skip,
+        "limit": limit,
+        "page": info["page"],
+        "pages": info["pages"] if total.value is not None else None,
+        # Read, not derived from an estimated total
+        "has_next": has_next,
+        "has_prev": skip > 0,
+    })
+    return Response(content=page.model_dump_json(), media_type="application/json")
+
+
+def _tenant_moving(e: TenantMovingError) -> HTTPException:
+    # database/move_tenant.py holds writes for seconds, not minutes
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+
+def _writable(statement, todo_id: int):
+    """Restrict a by-id write to owners that are not being moved"""
+    moving = shard_router.moving()
+    statement = statement.where(todos_table.c.id == todo_id)
+    return statement.where(todos_table.c.owner_id.not_in(moving)) if moving else statement
+
+
+def _check_moving(shards: ShardSessions, todo_id: int) -> None:
+    """After a by-id write matched nothing: 503 if the todo's owner is being moved"""
+    moving = set(shard_router.moving())
+    if not moving:
+        return
+    for _, db in shards.candidates(todo_id):
+        owner_id = db.execute(select(todos_table.c.owner_id).where(todos_table.c.id == todo_id)).scalar()
+        if owner_id in moving:
+            raise _tenant_moving(TenantMovingError(f"Owner {owner_id} is being moved to another shard"))
+
+
+def _with_own_shards(fetch: Callable[[ShardSessions], Response]) -> Response:
+    """Run a read with sessions of its own (a stale-while-revalidate refresh outlives the request)"""
+    shards = ShardSessions(shard_router)
+    try:
+        return fetch(shards)
+    finally:
+        shards.close()
+
+
+def _todo_key(todo_id: int) -> tuple:
+    """stale_cache key of GET /api/todos/{todo_id}"""
+    return ("todo", todo_id)
+
+
+def _list_group(owner_id: Optional[int]) -> tuple:
+    """stale_cache group of GET /api/todos listings for owner_id (None: everyone's todos)"""
+    return ("todos", owner_id)
+
+
+def _discard_lists(owner_id: int) -> None:
+    """Forget stored listings a write to one of owner_id's todos may change"""
+    stale_cache.discard_group(_list_group(owner_id))
+    stale_cache.discard_group(_list_group(None))
+
+
+def _list_todos(shards: ShardSessions, todo_filter: TodoFilter, skip: int, limit: int,
+                envelope: bool, exact: bool) -> Response:
+    """One page of todo_filter's todos, as a list or an envelope"""
+    statement = todo_filter.statement()
+    # The envelope reads one row past the page to know whether another follows
+    fetch = limit + 1 if envelope else limit
+    db = shards.home(todo_filter.equals.get("owner_id"))
+    if db is not None:
+        todos = db.execute(statement, todo_filter.params(skip, fetch)).scalars().all()
+    else:
+        # Each shard returns its first skip + fetch rows in order; merge them
+        pages = shards.scatter(lambda name, db: shards.owned(
+            name, db.execute(statement, todo_filter.params(0, skip + fetch)).scalars().all()
+        ))
+        merged = heapq.merge(*pages.values(), key=todo_filter.row_key, reverse=todo_filter.descending)
+        todos = list(itertools.islice(merged, skip, skip + fetch))
+
+    logger.info(f"Retrieved {len(todos[:limit])} todos (skip={skip}, limit={limit}, index={todo_filter.index})")
+    if envelope:
+        has_next = len(todos) > limit
+        # A short page already pins the total; only ask for it when rows may follow
+        if has_next or (skip and not todos):
+            total = counts.listing_total(shards, todo_filter, exact)
+        else:
+            total = counts.Total(None, False, "page")
+        return _todo_page_response(todos[:limit], total, skip, limit, has_next)
+    return _todo_list_response(todos)
+
+
+def _fetch_todo(shards: ShardSessions, todo_id: int) -> Response:
+    """The todo with todo_id, serialized; 404 if no shard owns it"""
+    for name, db in shards.candidates(todo_id):
+        todo = db.execute(statements.TODO_BY_ID, {"todo_id": todo_id}).scalar_one_or_none()
+        if todo is not None and shard_router.owns(name, todo.owner_id):
+            logger.info(f"Retrieved todo with ID {todo_id}")
+            return Response(content=TodoResponse.model_validate(todo, from_attributes=True).model_dump_json(),
+                            media_type="application/json")
+    logger.warning(f"Todo with ID {todo_id} not found")
+    raise HTTPException(status_code=404, detail="Todo not found")
+
 
 # ============================================================================
 # GET ENDPOINTS
 # ============================================================================
 
-@router.get("/", response_model=List[TodoResponse])
+@router.get("/", response_model=Union[List[TodoResponse], TodoPage])
 def get_todos(
     skip: int = Query(0, ge=0, description="Number of todos to skip"),
     limit: int = Query(10, ge=1, le=100, description="Maximum todos to return"),
     completed: Optional[bool] = Query(None, description="Filter by completion status"),
-    sort: str = Query("date", regex="^(date|title)$", description="Sort by date or title"),
-    db: Session = Depends(get_db)
+    owner: Optional[str] = Query(None, regex="^me$", description="'me' to list only your todos"),
+    created_after: Optional[datetime] = Query(None, description="created_at >= this (ISO 8601)"),
+    created_before: Optional[datetime] = Query(None, description="created_at < this (ISO 8601)"),
+    updated_after: Optional[datetime] = Query(None, description="updated_at >= this (ISO 8601)"),
+    updated_before: Optional[datetime] = Query(None, description="updated_at < this (ISO 8601)"),
+    title_prefix: Optional[str] = Query(None, min_length=1, max_length=255,
+                                        description="Case-insensitive title prefix"),
+    sort: Optional[str] = Query(None, max_length=100,
+                                description="Comma-separated keys, '-' for descending"),
+    envelope: bool = Query(False, description="Wrap the todos with total and has_next"),
+    exact: bool = Query(False, description="Count the total exactly (COUNT(*)) in the envelope"),
+    user_id: Optional[int] = Depends(get_optional_user_id),
+    shards: ShardSessions = Depends(get_shards)
 ):
     """
     Get all todos with pagination, filtering, and sorting.
@@ -43,26 +187,46 @@ def get_todos(
     - **skip**: Offset for pagination (default: 0)
     - **limit**: Max results (default: 10, max: 100)
     - **completed**: Filter by true/false (optional)
-    - **sort**: Sort by 'date' (default) or 'title'
+    - **owner**: 'me' for the authenticated user's todos (optional)
+    - **created_after / created_before / updated_after / updated_before**: Time ranges (optional)
+    - **title_prefix**: Titles starting with this, ignoring case (optional)
+    - **sort**: Keys from created_at, updated_at, title, completed, e.g. '-updated_at'
+      ('date' is accepted for '-created_at'; default: newest first)
+    - **envelope**: Return {items, total, has_next, ...} instead of a bare list
+    - **exact**: With envelope, count the total instead of estimating it
+
+    Only combinations served by an index are accepted; others return 400.
+    Envelope totals come from counters or planner statistics (see
+    app/utils/counts.py); total_exact says which.
     """
+    if owner == "me" and user_id is None:
+        raise HTTPException(
+            status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"}
+        )
     try:
-        query = db.query(Todo)
-        
-        # Apply status filter
-        if completed is not None:
-            query = query.filter(Todo.completed == completed)
-        
-        # Apply sorting
-        if sort == "title":
-            query = query.order_by(Todo.title.asc())
-        else:  # default: date
-            query = query.order_by(desc(Todo.created_at))
-        
-        # Apply pagination
-        todos = query.offset(skip).limit(limit).all()
-        
-        logger.info(f"Retrieved {len(todos)} todos (skip={skip}, limit={limit})")
-        return todos
+        todo_filter = TodoFilter(
+            owner_id=user_id if owner == "me" else None,
+            completed=completed,
+            created_after=created_after,
+            created_before=created_before,
+            updated_after=updated_after,
+            updated_before=updated_before,
+            title_prefix=title_prefix,
+            sort=sort,
+            dialect=shards.dialect,
+        )
+    except QueryShapeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if exact or not stale_cache.enabled:
+            return _list_todos(shards, todo_filter, skip, limit, envelope, exact)
+        owner_id = todo_filter.equals.get("owner_id")
+        key = ("todos", owner_id, stale_cache.generation(_list_group(owner_id)), skip, limit, completed,
+               created_after, created_before, updated_after, updated_before, title_prefix, sort, envelope)
+        return stale_cache.serve(key, lambda: _with_own_shards(
+            lambda own: _list_todos(own, todo_filter, skip, limit, envelope, exact)
+        ))
     
     except Exception as e:
         logger.error(f"Error fetching todos: {str(e)}")
@@ -70,11 +234,47 @@ def get_todos(
 
 
 @router.get("/stats", response_model=Dict)
-def get_todo_stats(db: Session = Depends(get_db)):
-    """Get statistics about todos"""
+def get_todo_stats(
+    owner: Optional[str] = Query(None, regex="^me$", description="'me' to count only your todos"),
+    created_after: Optional[datetime] = Query(None, description="created_at >= this (ISO 8601)"),
+    created_before: Optional[datetime] = Query(None, description="created_at < this (ISO 8601)"),
+    user_id: Optional[int] = Depends(get_optional_user_id),
+    shards: ShardSessions = Depends(get_shards)
+):
+    """
+    Get statistics about todos (all shards).
+    
+    - **owner**: 'me' to count only the authenticated user's todos (optional)
+    - **created_after / created_before**: Creation time range (optional)
+
+    Answered from the in-memory mirror when TODO_MIRROR_ENABLED is set.
+    """
+    if owner == "me" and user_id is None:
+        raise HTTPException(
+            status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"}
+        )
+    filters = {
+        "owner_id": user_id if owner == "me" else None,
+        "created_after": created_after,
+        "created_before": created_before,
+    }
     try:
-        total = db.query(Todo).count()
-        completed = db.query(Todo).filter(Todo.completed == True).count()
+        if todo_mirror.ready:
+            total = todo_mirror.count(**filters)
+            completed = todo_mirror.count(completed=True, **filters)
+        else:
+            conditions = []
+            if filters["owner_id"] is not None:
+                conditions.append(Todo.owner_id == filters["owner_id"])
+            if created_after:
+                conditions.append(Todo.created_at >= created_after)
+            if created_before:
+                conditions.append(Todo.created_at < created_before)
+            per_shard = shards.scatter(lambda name, db: db.execute(
+                select(func.count(), func.count().filter(Todo.completed.is_(True))).where(*conditions)
+            ).one())
+            total = sum(count for count, _ in per_shard.values())
+            completed = sum(done for _, done in per_shard.values())
         pending = total - completed
         
         stats = {
@@ -92,49 +292,180 @@ def get_todo_stats(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Failed to fetch stats")
 
 
-@router.get("/search/{query}", response_model=List[TodoResponse])
+@router.get("/stats/timeseries", response_model=Dict)
+def get_todo_timeseries(
+    bucket: str = Query("day", regex="^(day|week|month)$", description="Bucket size"),
+    start: Optional[date] = Query(None, alias="from", description="First day (default: 30 buckets back)"),
+    end: Optional[date] = Query(None, alias="to", description="Last day, inclusive (default: today)"),
+    shards: ShardSessions = Depends(get_shards)
+):
+    """
+    Created vs completed todos and average time to complete per bucket.
+    
+    Answered from the daily rollup table, so cost grows with the range,
+    not with the number of todos. Days are UTC; weeks start on Monday.
+    """
+    end = end or datetime.utcnow().date()
+    if start is None:
+        start = rollups.bucket_start(end, bucket)
+        for _ in range(29):
+            if start == date.min:
+                break
+            start = rollups.bucket_start(start - timedelta(days=1), bucket)
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if rollups.bucket_count(start, end, bucket) > config.STATS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large: at most {config.STATS_MAX_BUCKETS} {bucket} buckets"
+        )
+
+    try:
+        sums = shards.scatter(lambda name, db: rollups.bucket_sums(db.connection(), bucket, start, end))
+        series = rollups.build_series(rollups.merge_sums(list(sums.values())), bucket, start, end)
+        completed = sum(point["completed"] for point in series)
+        return {
+            "bucket": bucket,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "totals": {
+                "created": sum(point["created"] for point in series),
+                "completed": completed,
+            },
+            "series": series,
+        }
+    
+    except Exception as e:
+        logger.error(f"Error fetching stats timeseries: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch stats timeseries")
+
+
+@router.get("/suggest", response_model=List[str])
+def suggest_titles(
+    prefix: str = Query(..., min_length=1, max_length=255, description="Start of the title"),
+    limit: int = Query(10, ge=1, le=50),
+    shards: ShardSessions = Depends(get_shards),
+    owner_id: int = Depends(get_current_user_id)
+):
+    """
+    Titles of your todos starting with prefix, ignoring case (autocomplete).
+    
+    - **prefix**: Start of the title
+    - **limit**: Max suggestions (default: 10, max: 50)
+
+    Served from a per-owner in-memory index (app/utils/suggest.py) built on
+    first use; distinct titles in alphabetical order.
+    """
+    try:
+        def load():
+            _, db = shards.for_owner(owner_id)
+            return db.execute(select(Todo.id, Todo.title).where(Todo.owner_id == owner_id)).all()
+
+        return title_index.suggest(owner_id, prefix, limit, load)
+    
+    except Exception as e:
+        logger.error(f"Error suggesting titles for '{prefix}': {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to suggest titles")
+
+
+@router.get("/search/{query}", response_model=Union[List[TodoResponse], TodoPage])
 def search_todos(
     query: str,
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    envelope: bool = Query(False, description="Wrap the todos with total and has_next"),
+    exact: bool = Query(False, description="Count the total exactly in the envelope"),
+    shards: ShardSessions = Depends(get_shards)
 ):
     """
     Search todos by title or description.
     
     - **query**: Search term
     - **limit**: Max results (default: 10, max: 100)
+    - **envelope**: Return {items, total, has_next, ...} instead of a bare list
+    - **exact**: With envelope, count all matches (a full scan)
+
+    Scans the in-memory mirror when TODO_MIRROR_ENABLED is set. Substring
+    matches have no cheap total: without exact it is an estimate on
+    PostgreSQL and null on SQLite, unless this page holds every match.
     """
     if not query or len(query.strip()) < 1:
         raise HTTPException(status_code=400, detail="Search query cannot be empty")
     
     try:
         search_term = normalize_query(query)
-        todos = db.query(Todo).filter(
-            or_(
-                Todo.title.ilike(f"%{search_term}%"),
-                Todo.description.ilike(f"%{search_term}%")
-            )
-        ).limit(limit).all()
+        fetch = limit + 1 if envelope else limit
+        if todo_mirror.ready and ROW_SEPARATOR not in search_term and FIELD_SEPARATOR not in search_term:
+            todos = todo_mirror.search(search_term, fetch)
+        else:
+            params = {"pattern": f"%{search_term}%", "limit": fetch}
+            found = shards.scatter(lambda name, db: shards.owned(
+                name, db.execute(statements.SEARCH_TODOS, params).scalars().all()
+            ))
+            todos = list(itertools.islice(itertools.chain(*found.values()), fetch))
         
-        logger.info(f"Search results for '{query}': {len(todos)} todos found")
-        return todos
+        logger.info(f"Search results for '{query}': {len(todos[:limit])} todos found")
+        if envelope:
+            has_next = len(todos) > limit
+            # The last page already counted every match
+            total = counts.search_total(shards, search_term, exact) if has_next else counts.Total(None, False, "page")
+            return _todo_page_response(todos[:limit], total, 0, limit, has_next)
+        return _todo_list_response(todos)
     
     except Exception as e:
         logger.error(f"Error searching todos: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to search todos")
 
 
+def _export_lines(completed: Optional[bool], batch_size: int = config.EXPORT_BATCH_SIZE):
+    """Yield todos as NDJSON, one keyset-paginated batch per chunk, shard after shard"""
+    shard_router.configure()
+    shards = ShardSessions(shard_router)
+    try:
+        for name in list(shard_router.shards):
+            db = shards.get(name)
+            last_id = 0
+            while True:
+                if completed is None:
+                    params = {"last_id": last_id, "limit": batch_size}
+                    batch = db.execute(statements.EXPORT_BATCH, params).scalars().all()
+                else:
+                    params = {"last_id": last_id, "limit": batch_size, "completed": completed}
+                    batch = db.execute(statements.EXPORT_BATCH_BY_STATUS, params).scalars().all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                validated = TodoResponseList.validate_python(shards.owned(name, batch), from_attributes=True)
+                yield "".join(todo.model_dump_json() + "\n" for todo in validated)
+                db.expunge_all()
+    finally:
+        shards.close()
+
+
+@router.get("/export")
+def export_todos(
+    completed: Optional[bool] = Query(None, description="Filter by completion status")
+):
+    """
+    Export todos as newline-delimited JSON, streamed in batches.
+    
+    - **completed**: Filter by true/false (optional)
+    """
+    return StreamingResponse(
+        _export_lines(completed),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="todos.ndjson"'},
+    )
+
+
 @router.get("/{todo_id}", response_model=TodoResponse)
-def get_todo(todo_id: int, db: Session = Depends(get_db)):
+def get_todo(todo_id: int, shards: ShardSessions = Depends(get_shards)):
     """Get a specific todo by ID"""
     try:
-        todo = db.query(Todo).filter(Todo.id == todo_id).first()
-        if not todo:
-            logger.warning(f"Todo with ID {todo_id} not found")
-            raise HTTPException(status_code=404, detail="Todo not found")
-        
-        logger.info(f"Retrieved todo with ID {todo_id}")
-        return todo
+        if not stale_cache.enabled:
+            return _fetch_todo(shards, todo_id)
+        return stale_cache.serve(_todo_key(todo_id), lambda: _with_own_shards(
+            lambda own: _fetch_todo(own, todo_id)
+        ))
     
     except HTTPException:
         raise
@@ -148,45 +479,52 @@ def get_todo(todo_id: int, db: Session = Depends(get_db)):
 # ============================================================================
 
 @router.post("/", response_model=TodoResponse, status_code=201)
-def create_todo(todo: TodoCreate, db: Session = Depends(get_db)):
+def create_todo(
+    todo: TodoCreate,
+    shards: ShardSessions = Depends(get_shards),
+    owner_id: int = Depends(get_current_user_id)
+):
     """
-    Create a new todo.
+    Create a new todo owned by the authenticated user.
     
     - **title**: Todo title (required, 1-255 chars)
     - **description**: Optional description (max 500 chars)
     - **completed**: Completion status (default: false)
     """
     try:
-        # Validate input
-        if not validate_todo_title(todo.title):
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid title. Must be 1-255 characters"
-            )
-        
-        if not validate_todo_description(todo.description):
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid description. Max 500 characters"
+        shard_router.check_writable(owner_id)
+    except TenantMovingError as e:
+        raise _tenant_moving(e)
+
+    name, db = shards.for_owner(owner_id)
+    try:
+        # TodoCreate has already stripped and length-checked the fields;
+        # RETURNING hands back the stored row, defaults included
+        now = datetime.utcnow()
+        todo_id = shard_router.allocate_id(name, db)
+        row = db.execute(
+            insert(todos_table)
+            .values(
+                **({"id": todo_id} if todo_id is not None else {}),
+                title=todo.title,
+                description=todo.description,
+                completed=todo.completed,
+                completed_at=now if todo.completed else None,
+                owner_id=owner_id,
+                created_at=now,
+                updated_at=now,
             )
-        
-        # Sanitize input
-        title = sanitize_title(todo.title)
-        description = sanitize_description(todo.description)
-        
-        # Create todo
-        db_todo = Todo(
-            title=title,
-            description=description,
-            completed=todo.completed or False
-        )
-        
-        db.add(db_todo)
+            .returning(*todos_table.c)
+        ).one()
+        outbox.record(db, "todo.created", row)
         db.commit()
-        db.refresh(db_todo)
+        outbox.outbox_relay.notify()
+        todo_mirror.apply(name, row)
+        _discard_lists(owner_id)
+        title_index.upsert(owner_id, row.id, row.title)
         
-        logger.info(f"Created new todo with ID {db_todo.id}: {title}")
-        return db_todo
+        logger.info(f"Created new todo with ID {row.id}: {todo.title}")
+        return row._asdict()
     
     except HTTPException:
         raise
@@ -204,7 +542,7 @@ def create_todo(todo: TodoCreate, db: Session = Depends(get_db)):
 def update_todo(
     todo_id: int,
     todo_update: TodoUpdate,
-    db: Session = Depends(get_db)
+    shards: ShardSessions = Depends(get_shards)
 ):
     """
     Update a todo. Only provided fields are updated.
@@ -214,48 +552,47 @@ def update_todo(
     - **completed**: Optional completion status
     """
     try:
-        db_todo = db.query(Todo).filter(Todo.id == todo_id).first()
-        if not db_todo:
+        # TodoUpdate has already stripped and length-checked the fields
+        values = todo_update.model_dump(exclude_unset=True)
+        values["updated_at"] = datetime.utcnow()
+        if "completed" in values:
+            # SET expressions see the old row: keep the original completion
+            # time when a completed todo is marked completed again
+            values["completed_at"] = case(
+                (todos_table.c.completed.is_(True), todos_table.c.completed_at),
+                else_=values["updated_at"],
+            ) if values["completed"] else None
+        
+        statement = _writable(update(todos_table), todo_id).values(**values).returning(*todos_table.c)
+        for name, db in shards.candidates(todo_id):
+            row = db.execute(statement).first()
+            if row is None:
+                continue
+            if not shard_router.owns(name, row.owner_id):
+                # Stale copy left behind by a tenant move
+                db.rollback()
+                continue
+            outbox.record(db, "todo.updated", row, changed=sorted(todo_update.model_dump(exclude_unset=True)))
+            db.commit()
+            outbox.outbox_relay.notify()
+            todo_mirror.apply(name, row)
+            stale_cache.discard(_todo_key(todo_id))
+            _discard_lists(row.owner_id)
+            if "title" in values:
+                title_index.upsert(row.owner_id, row.id, row.title)
+            break
+        else:
+            _check_moving(shards, todo_id)
             logger.warning(f"Todo with ID {todo_id} not found for update")
             raise HTTPException(status_code=404, detail="Todo not found")
         
-        update_data = todo_update.dict(exclude_unset=True)
-        
-        # Validate and sanitize updates
-        if "title" in update_data:
-            if not validate_todo_title(update_data["title"]):
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid title. Must be 1-255 characters"
-                )
-            update_data["title"] = sanitize_title(update_data["title"])
-        
-        if "description" in update_data:
-            if not validate_todo_description(update_data["description"]):
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid description. Max 500 characters"
-                )
-            update_data["description"] = sanitize_description(update_data["description"])
-        
-        # Update timestamp
-        update_data["updated_at"] = datetime.utcnow()
-        
-        for field, value in update_data.items():
-            setattr(db_todo, field, value)
-        
-        db.add(db_todo)
-        db.commit()
-        db.refresh(db_todo)
-        
         logger.info(f"Updated todo with ID {todo_id}")
-        return db_todo
+        return row._asdict()
     
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error updating todo {todo_id}: {str(e)}")
-        db.rollback()
         raise HTTPException(status_code=500, detail="Failed to update todo")
 
 
@@ -263,18 +600,55 @@ def update_todo(
 # DELETE ENDPOINTS
 # ============================================================================
 
+@router.delete("/clear-completed", status_code=202)
+def delete_all_completed(
+    archive: bool = Query(False, description="Move rows to todos_archive instead of deleting them")
+):
+    """
+    Delete all completed todos in the background.
+    
+    Runs in bounded id-range batches; poll the returned job at
+    /api/jobs/{id}. If a purge is already running, that job is returned.
+    """
+    try:
+        job = job_runner.submit("clear_completed", {"archive": archive}, dedupe=True)
+        logger.info(f"Clear completed todos queued as job {job['id']} (archive={archive})")
+        return JSONResponse(
+            status_code=202,
+            content=job,
+            headers={"Location": f"/api/jobs/{job['id']}"},
+        )
+    
+    except Exception as e:
+        logger.error(f"Error starting clear completed job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to clear completed todos")
+
+
 @router.delete("/{todo_id}", status_code=204)
-def delete_todo(todo_id: int, db: Session = Depends(get_db)):
+def delete_todo(todo_id: int, shards: ShardSessions = Depends(get_shards)):
     """Delete a specific todo by ID"""
     try:
-        db_todo = db.query(Todo).filter(Todo.id == todo_id).first()
-        if not db_todo:
+        statement = _writable(delete(todos_table), todo_id).returning(*todos_table.c)
+        for name, db in shards.candidates(todo_id):
+            row = db.execute(statement).first()
+            if row is None:
+                continue
+            if not shard_router.owns(name, row.owner_id):
+                db.rollback()
+                continue
+            outbox.record(db, "todo.deleted", row)
+            db.commit()
+            outbox.outbox_relay.notify()
+            todo_mirror.discard(name, todo_id)
+            title_index.remove(row.owner_id, todo_id)
+            stale_cache.discard(_todo_key(todo_id))
+            _discard_lists(row.owner_id)
+            break
+        else:
+            _check_moving(shards, todo_id)
             logger.warning(f"Todo with ID {todo_id} not found for deletion")
             raise HTTPException(status_code=404, detail="Todo not found")
         
-        db.delete(db_todo)
-        db.commit()
-        
         logger.info(f"Deleted todo with ID {todo_id}")
         return None
     
@@ -282,46 +656,5 @@ def delete_todo(todo_id: int, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         logger.error(f"Error deleting todo {todo_id}: {str(e)}")
-        db.rollback()
         raise HTTPException(status_code=500, detail="Failed to delete todo")
 
-
-@router.delete("/clear-completed", status_code=204)
-def delete_all_completed(db: Session = Depends(get_db)):
-    """Delete all completed todos"""
-    try:
-        deleted_count = db.query(Todo).filter(Todo.completed == True).delete()
-        db.commit()
-        
-        logger.info(f"Deleted {deleted_count} completed todos")
-        return None
-    
-    except Exception as e:
-        logger.error(f"Error clearing completed todos: {str(e)}")
-        db.rollback()
-        raise HTTPException(status_code=500, detail="Failed to clear completed todos")
-
-
-# ============================================================================
-# HEALTH CHECK
-# ============================================================================
-
-@router.get("/health", response_model=Dict)
-def health_check(db: Session = Depends(get_db)):
-    """Health check endpoint"""
-    try:
-        # Test database connection
-        db.query(Todo).first()
-        
-        return {
-            "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
-            "database": "connected"
-        }
-    
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(
-            status_code=503,
-            detail="Service unavailable - database connection failed"
-        )
@@ -1,12 +1,4 @@
 """Utility modules for the application"""
-from app.utils.helpers import (
-    DateTimeUtils,
-    StringUtils,
-    ListUtils,
-    DictUtils,
-    ValidationUtils,
-    PaginationUtils,
-)
 from app.utils.validators import (
     validate_todo_title,
     validate_todo_description,
@@ -28,3 +20,20 @@ __all__ = [
     'sanitize_description',
     'normalize_query',
 ]
+
+# helpers is rarely used at request time; import it on first access
+_HELPERS = {
+    'DateTimeUtils',
+    'StringUtils',
+    'ListUtils',
+    'DictUtils',
+    'ValidationUtils',
+    'PaginationUtils',
+}
+
+
+def __getattr__(name):
+    if name in _HELPERS:
+        from app.utils import helpers
+        return getattr(helpers, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
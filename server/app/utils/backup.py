@@ -0,0 +1,267 @@
+"""
+Online backups and snapshots of the SQLite databases
+
+Copying todos.db while the API runs either blocks writers for the whole copy
+or produces a torn file. Two consistent ways to copy a live database:
+
+  * online backup (SQLite backup API): BACKUP_PAGES_PER_STEP pages are copied
+    per step under a shared lock, with a BACKUP_STEP_PAUSE pause between
+    steps in which writers commit. With the default rollback journal, a
+    commit by another connection restarts the copy, so every restart doubles
+    the step size; a busy database still finishes, with longer steps. In WAL
+    mode the copy reads one snapshot from start to end, so writers are never
+    blocked and nothing restarts
+  * VACUUM INTO: a compacted, defragmented copy made in one read
+    transaction. It is smaller and restores faster, but outside WAL mode
+    writers wait for the whole copy
+
+Copies are written as <snapshot>.partial, checked with PRAGMA quick_check and
+then renamed, so every file in BACKUP_DIR is complete. restore() writes a
+snapshot back into the live file through the backup API, so connections
+that are already open see the restored pages instead of a replaced file.
+PostgreSQL databases are skipped (use pg_dump).
+"""
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+
+from app import config
+from app.utils.jobs import JobContext, job_type
+
+logger = logging.getLogger(__name__)
+
+MODES = ("online", "vacuum")
+
+
+class BackupError(RuntimeError):
+    """A copy failed its integrity check or could not be made"""
+
+
+class _Restarted(Exception):
+    """Another connection wrote to the source between two backup steps"""
+
+
+# ============================================================================
+# DATABASES
+# ============================================================================
+
+def sqlite_path(engine: Engine) -> Optional[str]:
+    """Absolute path of a file-backed SQLite engine, else None"""
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(engine.url.database)
+
+
+def databases() -> List[Tuple[str, str]]:
+    """(name, path) of every SQLite file the app uses: the main database and todo shards"""
+    from database.config import init_engine
+    from database.shards import shard_router
+
+    shard_router.configure()
+    found: Dict[str, str] = {}
+    for name, engine in [("main", init_engine())] + shard_router.engines():
+        path = sqlite_path(engine)
+        if path and path not in found:
+            found[path] = name
+    return [(name, path) for path, name in found.items()]
+
+
+def snapshot_path(source: str, directory: str = config.BACKUP_DIR, when: Optional[datetime] = None) -> str:
+    """<directory>/<source stem>-<UTC timestamp>.db"""
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(directory, f"{stem}-{(when or datetime.utcnow()):%Y%m%dT%H%M%SZ}.db")
+
+
+def snapshots(directory: str = config.BACKUP_DIR) -> List[Dict]:
+    """Complete snapshots in directory, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(".db"):
+            stat = entry.stat()
+            files.append({
+                "name": entry.name,
+                "bytes": stat.st_size,
+                "modified": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+            })
+    return sorted(files, key=lambda f: f["modified"], reverse=True)
+
+
+def verify(path: str) -> None:
+    """Raise BackupError unless path is a readable SQLite database that passes quick_check"""
+    try:
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+            result = connection.execute("PRAGMA quick_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{path} is not a usable SQLite database: {e}") from e
+    if result != "ok":
+        raise BackupError(f"{path} failed quick_check: {result}")
+
+
+def _finish(partial: str, target: str) -> int:
+    verify(partial)
+    os.replace(partial, target)
+    return os.path.getsize(target)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ============================================================================
+# COPIES
+# ============================================================================
+
+def _copy_steps(source: sqlite3.Connection, target: sqlite3.Connection, pages: int, pause: float,
+                stats: Dict, on_step: Optional[Callable[[int, int], None]]) -> None:
+    """One pass of the backup API; raises _Restarted when the source changed under it"""
+    state = {"remaining": None, "at": time.perf_counter()}
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        # Time since the previous step ended = how long this step held the source lock
+        stats["steps"] += 1
+        stats["longest_step_ms"] = max(stats["longest_step_ms"], (time.perf_counter() - state["at"]) * 1000)
+        stats["pages"] = total
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            raise _Restarted()
+        state["remaining"] = remaining
+        if on_step is not None:
+            on_step(remaining, total)
+        if remaining and pause:
+            time.sleep(pause)
+        state["at"] = time.perf_counter()
+
+    source.backup(target, pages=pages, progress=progress, sleep=max(pause, 0.001))
+
+
+def online_backup(
+    source: str,
+    target: str,
+    pages: int = config.BACKUP_PAGES_PER_STEP,
+    pause: float = config.BACKUP_STEP_PAUSE,
+    max_restarts: int = config.BACKUP_MAX_RESTARTS,
+    on_step: Optional[Callable[[int, int], None]] = None,
+) -> Dict:
+    """
+    Copy a live database with the backup API, a few pages at a time.
+
+    on_step(remaining, total) is called after every step and may raise to
+    abort (job cancellation). After max_restarts the rest is copied in a
+    single step.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    partial = f"{target}.partial"
+    _remove(partial)
+    stats = {"mode": "online", "steps": 0, "restarts": 0, "pages": 0, "longest_step_ms": 0.0}
+    started = time.perf_counter()
+    try:
+        with closing(sqlite3.connect(source, timeout=config.DB_CONNECTION_TIMEOUT, isolation_level=None)) as src, \
+                closing(sqlite3.connect(partial)) as dst:
+            stats["wal"] = src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+            if stats["wal"]:
+                # Hold one read snapshot for the whole copy: commits go to the WAL
+                # and neither wait for the copy nor restart it
+                src.execute("BEGIN")
+                src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            step = pages
+            while True:
+                try:
+                    _copy_steps(src, dst, step, pause, stats, on_step)
+                    break
+                except _Restarted:
+                    stats["restarts"] += 1
+                    step = -1 if stats["restarts"] >= max_restarts else step * 2
+                    logger.info(f"Backup of {source} restarted by a concurrent write; {step} pages per step now")
+            if stats["wal"]:
+                src.execute("COMMIT")
+        stats["bytes"] = _finish(partial, target)
+    finally:
+        # Left behind only by a failed or cancelled copy
+        _remove(partial)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["longest_step_ms"] = round(stats["longest_step_ms"], 3)
+    stats["mb_per_second"] = round(stats["bytes"] / 1e6 / stats["seconds"], 1) if stats["seconds"] else None
+    stats["file"] = os.path.basename(target)
+    logger.info(f"✓ Backed up {source} to {target} ({stats['bytes']:,} bytes, {stats['seconds']}s)")
+    return stats
+
+
+def vacuum_into(source: str, target: str) -> Dict:
+    """Compacted snapshot of a live database with VACUUM INTO (one read transaction)"""
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    partial = f"{target}.partial"
+    _remove(partial)
+    started = time.perf_counter()
+    try:
+        with closing(sqlite3.connect(source, timeout=config.DB_CONNECTION_TIMEOUT, isolation_level=None)) as src:
+            src.execute("VACUUM INTO ?", (partial,))
+        seconds = time.perf_counter() - started
+        size = _finish(partial, target)
+    finally:
+        _remove(partial)
+    logger.info(f"✓ Snapshot of {source} written to {target} ({size:,} bytes, {seconds:.3f}s)")
+    return {
+        "mode": "vacuum",
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        # The copy is a single read transaction
+        "longest_step_ms": round(seconds * 1000, 3),
+        "mb_per_second": round(size / 1e6 / seconds, 1) if seconds else None,
+        "file": os.path.basename(target),
+    }
+
+
+def restore(snapshot: str, database: str) -> Dict:
+    """
+    Overwrite a database with a snapshot, through the backup API.
+
+    The copy is one step: the live file is locked once, for the whole
+    restore, and other connections wait for it (up to their busy timeout).
+    """
+    verify(snapshot)
+    started = time.perf_counter()
+    with closing(sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)) as src, \
+            closing(sqlite3.connect(database, timeout=config.DB_CONNECTION_TIMEOUT)) as dst:
+        src.backup(dst)
+    seconds = time.perf_counter() - started
+    verify(database)
+    logger.info(f"✓ Restored {database} from {snapshot} in {seconds:.3f}s")
+    return {"bytes": os.path.getsize(database), "seconds": round(seconds, 3)}
+
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+@job_type("backup", executor="thread", max_concurrency=1)
+def backup_databases(job: JobContext) -> Dict:
+    """Snapshot every SQLite database into BACKUP_DIR ("online" or "vacuum" in job.params["mode"])"""
+    mode = job.params.get("mode", "online")
+    if mode not in MODES:
+        raise ValueError(f"Unknown backup mode '{mode}'")
+    when = datetime.utcnow()
+    results: Dict[str, Dict] = {}
+    for name, path in databases():
+        job.check()
+        target = snapshot_path(path, when=when)
+
+        def on_step(remaining: int, total: int, name: str = name) -> None:
+            job.check()
+            job.update(database=name, remaining_pages=remaining, total_pages=total)
+
+        if mode == "online":
+            results[name] = online_backup(path, target, on_step=on_step)
+        else:
+            results[name] = vacuum_into(path, target)
+        job.update(databases=dict(results))
+    return {"mode": mode, "databases": results}
@@ -0,0 +1,231 @@
+"""
+Totals for pagination envelopes without COUNT(*)
+
+A COUNT(*) walks every matching index entry, so on a large table the total
+would cost far more than the page it describes. Totals come from the
+cheapest source that can answer the shape, in this order:
+
+  * exact=true: COUNT(*) with the listing's own conditions (escape hatch)
+  * mirror: the in-memory mirror's sorted created_at index, when it is
+    loaded and the shape only uses owner, completed and a created range
+  * counters: the rollups kept by triggers (app/utils/rollups.py). Owner
+    and completed filters are answered exactly, from todo_stats_owner for
+    one owner and from todo_stats_daily for everyone. A created range
+    without those filters is summed from the daily rows, pro-rating days
+    it only partly covers
+  * capped count: COUNT over at most COUNT_EXACT_UP_TO entries of the
+    serving index - exact below the cap, a floor for the estimate above it
+  * estimate: on PostgreSQL the planner's row estimate (EXPLAIN, i.e.
+    pg_class.reltuples times the selectivities from pg_statistic). On
+    SQLite the counters' rows for the owner/completed filters, scaled by
+    the share of todos created in the created range, with each other range
+    bound keeping 1/4 of the rows as SQLite's planner assumes. sqlite_stat1
+    only holds average rows per index prefix, which the counters know per
+    owner (the average is far off for a skewed owner)
+
+The route still fetches one row past the page, so has_next is always exact
+and the last page pins the total exactly (see page_total()).
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import config
+from app.models.stats import DailyTodoStats, OwnerTodoStats
+from app.models.todo import Todo
+from app.utils import statements
+from app.utils.filters import TodoFilter
+from app.utils.mirror import FIELD_SEPARATOR, ROW_SEPARATOR, todo_mirror
+
+T = TypeVar("T")
+
+# Share of rows kept per inequality bound without a histogram
+RANGE_BOUND_SELECTIVITY = 0.25
+
+# Filters the mirror's count index can answer
+MIRROR_EQUALS = {"owner_id", "completed"}
+MIRROR_RANGES = {"created_at"}
+
+
+class Total(NamedTuple):
+    value: Optional[int]
+    exact: bool
+    source: str
+
+
+# ============================================================================
+# SOURCES
+# ============================================================================
+
+def _for_filter(shards, todo_filter: TodoFilter, fn: Callable[[str, Session], T]) -> List[T]:
+    """fn on the owner's shard, or on every shard"""
+    owner_id = todo_filter.equals.get("owner_id")
+    if owner_id is not None:
+        return [fn(*shards.for_owner(owner_id))]
+    return list(shards.scatter(fn).values())
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Rollup days and stored timestamps are naive UTC"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _created_between(db: Session, low: Optional[datetime], high: Optional[datetime]) -> Tuple[float, bool]:
+    """
+    (todos created in [low, high), exact) from the daily rollups.
+
+    Days only partly inside the range are pro-rated by the hours they
+    cover, which is exact only when both bounds fall on midnight.
+    """
+    low, high = _naive_utc(low), _naive_utc(high)
+    table = DailyTodoStats.__table__
+    statement = select(table.c.day, table.c.created)
+    if low is not None:
+        statement = statement.where(table.c.day >= low.date())
+    if high is not None:
+        statement = statement.where(table.c.day <= high.date())
+    created, exact = 0.0, True
+    for day, day_created in db.execute(statement):
+        start = datetime.combine(day, datetime.min.time())
+        end = start + timedelta(days=1)
+        share = max(0.0, (min(end, high or end) - max(start, low or start)) / timedelta(days=1))
+        if 0 < share < 1:
+            exact = False
+        created += day_created * share
+    return created, exact
+
+
+def _equal_rows(db: Session, todo_filter: TodoFilter) -> int:
+    """Rows matching the owner/completed filters, from the rollups"""
+    owner_id = todo_filter.equals.get("owner_id")
+    if owner_id is not None:
+        table = OwnerTodoStats.__table__
+        row = db.execute(
+            select(table.c.total, table.c.completed).where(table.c.owner_id == owner_id)
+        ).first()
+        total, completed = row if row is not None else (0, 0)
+    else:
+        table = DailyTodoStats.__table__
+        total, completed = db.execute(
+            select(func.coalesce(func.sum(table.c.created), 0), func.coalesce(func.sum(table.c.completed), 0))
+        ).one()
+    if "completed" not in todo_filter.equals:
+        return total
+    return completed if todo_filter.equals["completed"] else total - completed
+
+
+def _counted(db: Session, todo_filter: TodoFilter) -> Tuple[float, bool]:
+    """(rows matching todo_filter, exact) from the rollups alone"""
+    created = todo_filter.ranges.get("created_at")
+    if created is not None and not todo_filter.equals:
+        rows, exact = _created_between(db, *created)
+    else:
+        rows, exact = _equal_rows(db, todo_filter), True
+        if created is not None:
+            # Assume the filtered todos were created like all the others
+            in_range, _ = _created_between(db, *created)
+            everything, _ = _created_between(db, None, None)
+            rows *= in_range / everything if everything else 0
+            exact = False
+    for key, bounds in todo_filter.ranges.items():
+        if key != "created_at":
+            rows *= RANGE_BOUND_SELECTIVITY ** sum(bound is not None for bound in bounds)
+            exact = False
+    return rows, exact
+
+
+def _explain_rows(db: Session, statement, params: Dict) -> int:
+    """PostgreSQL's row estimate for statement's matches"""
+    compiled = statement.with_only_columns(Todo.id).compile(dialect=db.bind.dialect)
+    plan = db.connection().exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.construct_params(params)
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _estimate(db: Session, todo_filter: TodoFilter) -> float:
+    if db.bind.dialect.name == "postgresql":
+        return _explain_rows(db, todo_filter.count_statement(), todo_filter.filter_params())
+    return _counted(db, todo_filter)[0]
+
+
+# ============================================================================
+# TOTALS
+# ============================================================================
+
+def listing_total(shards, todo_filter: TodoFilter, exact: bool = False) -> Total:
+    """Total rows a GET /api/todos listing matches, from the cheapest source"""
+    if exact:
+        statement, params = todo_filter.count_statement(), todo_filter.filter_params()
+        count = sum(_for_filter(shards, todo_filter, lambda name, db: db.execute(statement, params).scalar()))
+        return Total(count, True, "count")
+
+    equals, ranges = set(todo_filter.equals), set(todo_filter.ranges)
+    if todo_mirror.ready and equals <= MIRROR_EQUALS and ranges <= MIRROR_RANGES:
+        low, high = todo_filter.ranges.get("created_at", (None, None))
+        count = todo_mirror.count(
+            owner_id=todo_filter.equals.get("owner_id"),
+            completed=todo_filter.equals.get("completed"),
+            created_after=low,
+            created_before=high,
+        )
+        return Total(count, True, "mirror")
+
+    counted = _for_filter(shards, todo_filter, lambda name, db: _counted(db, todo_filter))
+    if all(exact for _, exact in counted):
+        return Total(round(sum(rows for rows, _ in counted)), True, "counters")
+
+    floor = 0
+    if config.COUNT_EXACT_UP_TO > 0:
+        statement = todo_filter.count_statement(capped=True)
+        params = {**todo_filter.filter_params(), "cap": config.COUNT_EXACT_UP_TO}
+        capped = _for_filter(shards, todo_filter, lambda name, db: db.execute(statement, params).scalar())
+        if all(count < config.COUNT_EXACT_UP_TO for count in capped):
+            return Total(sum(capped), True, "count")
+        floor = sum(capped)
+
+    count = sum(_for_filter(shards, todo_filter, lambda name, db: _estimate(db, todo_filter)))
+    return Total(max(round(count), floor), False, "estimate")
+
+
+def search_total(shards, term: str, exact: bool = False) -> Total:
+    """
+    Total matches of a search. Substring matches have no statistics: only
+    PostgreSQL's planner offers a (rough) estimate; otherwise the total is
+    unknown unless exact=true.
+    """
+    if exact and todo_mirror.ready and ROW_SEPARATOR not in term and FIELD_SEPARATOR not in term:
+        return Total(todo_mirror.count_matches(term), True, "mirror")
+    params = {"pattern": f"%{term}%"}
+    if exact:
+        counts = shards.scatter(lambda name, db: db.execute(statements.SEARCH_COUNT, params).scalar())
+        return Total(sum(counts.values()), True, "count")
+    if {engine.dialect.name for _, engine in shards.router.engines()} == {"postgresql"}:
+        counts = shards.scatter(lambda name, db: _explain_rows(db, statements.SEARCH_COUNT, params))
+        return Total(sum(counts.values()), False, "estimate")
+    return Total(None, False, "unavailable")
+
+
+def page_total(total: Total, skip: int, returned: int, has_next: bool) -> Total:
+    """
+    Reconcile a total with the page actually read: the last page pins it
+    exactly, and an estimate never contradicts rows the page has seen.
+    """
+    if not has_next and (returned or not skip):
+        return Total(skip + returned, True, total.source if total.exact else "page")
+    if total.value is None:
+        return total
+    seen = skip + returned + (1 if has_next else 0)
+    if has_next and total.value < seen:
+        return Total(seen, False, total.source)
+    if not has_next and total.value > skip:
+        # Past the end: all we know is that there are at most skip rows
+        return Total(skip, False, total.source)
+    return total
@@ -0,0 +1,268 @@
+"""
+Filter and sort engine for GET /api/todos
+
+Query parameters are compiled into a shape: equality filters (owner_id,
+completed), range filters (created/updated ranges, title prefix) and sort
+keys. A shape is only accepted if one of the indexes declared on the todos
+table can serve it without a full scan or a sort step:
+
+  * the index starts with exactly the equality columns (any order)
+  * followed by exactly the sort keys, in order, all ascending or all
+    descending; a range filter is only allowed on the first sort key
+  * without an explicit sort, the result is ordered by the range column,
+    else newest first
+
+Title filters and sorts use lower(title) so they match the expression
+indexes. Each shape's SELECT is built once, with bound parameters, and
+reused for every request of that shape, as is its COUNT (pagination
+totals, see app/utils/counts.py). Prefix ranges are computed by
+incrementing the last character, which is exact for binary collations
+(SQLite's default, PostgreSQL "C"). Prefixes are folded the way the
+database's lower() folds titles: SQLite's built-in lower() only maps ASCII
+letters, PostgreSQL's maps Unicode.
+"""
+import string
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Select, bindparam, func, select
+from sqlalchemy.sql.elements import ColumnClause
+from sqlalchemy.sql.functions import Function
+
+from app.models.todo import Todo
+
+# Sort keys accepted in ?sort= and the index key each one maps to
+SORT_FIELDS = {
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "title": "lower(title)",
+    "completed": "completed",
+}
+# Pre-grammar value of ?sort= ("title" keeps its meaning, now case-insensitive)
+LEGACY_SORTS = {"date": "-created_at"}
+DEFAULT_SORT = "-created_at"
+
+EXPRESSIONS = {
+    "owner_id": Todo.owner_id,
+    "completed": Todo.completed,
+    "created_at": Todo.created_at,
+    "updated_at": Todo.updated_at,
+    "lower(title)": func.lower(Todo.title),
+}
+
+
+# Bound parameter name for each filter key
+PARAM_NAMES = {key: key.replace("lower(title)", "title_lower") for key in EXPRESSIONS}
+
+
+class QueryShapeError(ValueError):
+    """The requested filter/sort combination has no supporting index"""
+
+
+def _index_key(expression) -> str:
+    if isinstance(expression, Function):
+        arguments = ",".join(_index_key(argument) for argument in expression.clauses)
+        return f"{expression.name.lower()}({arguments})"
+    if isinstance(expression, ColumnClause):
+        return expression.name
+    return str(expression)
+
+
+@lru_cache(maxsize=None)
+def supporting_indexes() -> Dict[str, Tuple[str, ...]]:
+    """Index name -> key sequence, read from the todos table definition"""
+    indexes = {
+        index.name: tuple(_index_key(expression) for expression in index.expressions)
+        for index in Todo.__table__.indexes
+    }
+    # Narrowest match first, deterministic across runs
+    return dict(sorted(indexes.items(), key=lambda item: (len(item[1]), item[0])))
+
+
+def parse_sort(spec: Optional[str]) -> List[Tuple[str, bool]]:
+    """'-created_at,title' -> [('created_at', True), ('lower(title)', False)]"""
+    spec = LEGACY_SORTS.get(spec, spec)
+    keys = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        descending = part.startswith("-")
+        name = part.lstrip("+-")
+        if name not in SORT_FIELDS:
+            raise QueryShapeError(f"Unknown sort key '{name}'. Choose from: {', '.join(SORT_FIELDS)}")
+        keys.append((SORT_FIELDS[name], descending))
+    if len({key for key, _ in keys}) != len(keys):
+        raise QueryShapeError("Sort keys must not repeat")
+    return keys
+
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold_title(title: str, dialect: str = "sqlite") -> str:
+    """title as the dialect's lower() returns it"""
+    if dialect == "sqlite":
+        return title.translate(_ASCII_LOWER)
+    return title.lower()
+
+
+def prefix_bounds(prefix: str, dialect: str = "sqlite") -> Tuple[str, Optional[str]]:
+    """Half-open range [low, high) of lower(title) values starting with prefix"""
+    low = fold_title(prefix, dialect)
+    for i in range(len(low) - 1, -1, -1):
+        code = ord(low[i]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            # Surrogates cannot be encoded, and no stored character sorts among them
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return low, low[:i] + chr(code)
+    return low, None
+
+
+def _conditions(equals: Tuple, ranges: Tuple) -> List:
+    conditions = [EXPRESSIONS[key] == bindparam(PARAM_NAMES[key]) for key in equals]
+    for key, has_low, has_high in ranges:
+        if has_low:
+            conditions.append(EXPRESSIONS[key] >= bindparam(f"{PARAM_NAMES[key]}_low"))
+        if has_high:
+            conditions.append(EXPRESSIONS[key] < bindparam(f"{PARAM_NAMES[key]}_high"))
+    return conditions
+
+
+@lru_cache(maxsize=512)
+def _listing_statement(shape: Tuple) -> Select:
+    equals, ranges, sort = shape
+    statement = select(Todo).where(*_conditions(equals, ranges))
+    descending = sort[0][1]
+    order = [EXPRESSIONS[key] for key, _ in sort] + [Todo.id]
+    return (
+        statement
+        .order_by(*(column.desc() if descending else column.asc() for column in order))
+        .offset(bindparam("skip"))
+        .limit(bindparam("limit"))
+    )
+
+
+@lru_cache(maxsize=512)
+def _count_statement(equals: Tuple, ranges: Tuple, capped: bool) -> Select:
+    if capped:
+        # Stops after :cap index entries, so the cost is bounded whatever the table size
+        matches = select(Todo.id).where(*_conditions(equals, ranges)).limit(bindparam("cap")).subquery()
+        return select(func.count()).select_from(matches)
+    return select(func.count()).select_from(Todo).where(*_conditions(equals, ranges))
+
+
+class TodoFilter:
+    """Validated filters and sort for a todo listing"""
+
+    def __init__(
+        self,
+        owner_id: Optional[int] = None,
+        completed: Optional[bool] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        updated_after: Optional[datetime] = None,
+        updated_before: Optional[datetime] = None,
+        title_prefix: Optional[str] = None,
+        sort: Optional[str] = None,
+        dialect: str = "sqlite",
+    ):
+        # Name of the database dialect the statements run on (shards share one)
+        self.dialect = dialect
+        self.equals: Dict[str, object] = {}
+        if owner_id is not None:
+            self.equals["owner_id"] = owner_id
+        if completed is not None:
+            self.equals["completed"] = completed
+
+        # key -> (low, high), low inclusive, high exclusive
+        self.ranges: Dict[str, Tuple[object, object]] = {}
+        if created_after or created_before:
+            self.ranges["created_at"] = (created_after, created_before)
+        if updated_after or updated_before:
+            self.ranges["updated_at"] = (updated_after, updated_before)
+        if title_prefix:
+            self.ranges["lower(title)"] = prefix_bounds(title_prefix, dialect)
+
+        # Sorting on a column pinned by an equality filter is a no-op
+        self.sort = [(key, descending) for key, descending in parse_sort(sort) if key not in self.equals]
+        if not self.sort:
+            # Order by the range column so the range scan returns rows in order
+            if len(self.ranges) == 1:
+                self.sort = [(next(iter(self.ranges)), False)]
+            else:
+                self.sort = parse_sort(DEFAULT_SORT)
+        self.index = self.plan()
+
+    def plan(self, indexes: Optional[Dict[str, Tuple[str, ...]]] = None) -> str:
+        """Name of the index serving this shape; QueryShapeError if there is none"""
+        if len({descending for _, descending in self.sort}) > 1:
+            raise QueryShapeError("All sort keys must use the same direction")
+        equals = set(self.equals)
+        sort_keys = tuple(key for key, _ in self.sort)
+        if len(self.ranges) > 1 or (self.ranges and next(iter(self.ranges)) != sort_keys[0]):
+            raise QueryShapeError("Range filters are only supported on the first sort key")
+        for name, keys in (indexes or supporting_indexes()).items():
+            if set(keys[:len(equals)]) != equals:
+                continue
+            # The sort keys must end the index: the id tie-breaker follows them
+            # (implicitly, as the rowid, on SQLite)
+            if keys[len(equals):] == sort_keys:
+                return name
+        raise QueryShapeError(
+            f"No index supports filtering on {sorted(equals) or 'nothing'} "
+            f"sorted by {', '.join(sort_keys)}"
+        )
+
+    def shape(self) -> Tuple:
+        """Hashable description of which clauses the statement needs"""
+        ranges = tuple((key, low is not None, high is not None) for key, (low, high) in self.ranges.items())
+        return tuple(sorted(self.equals)), ranges, tuple(self.sort)
+
+    def statement(self) -> Select:
+        """Cached SELECT for this shape, with bound parameters (see params())"""
+        return _listing_statement(self.shape())
+
+    def count_statement(self, capped: bool = False) -> Select:
+        """
+        Cached COUNT of the rows this shape matches (see filter_params()).
+        capped counts at most :cap rows.
+        """
+        equals, ranges, _ = self.shape()
+        return _count_statement(equals, ranges, capped)
+
+    def params(self, skip: int, limit: int) -> Dict:
+        return {"skip": skip, "limit": limit, **self.filter_params()}
+
+    def filter_params(self) -> Dict:
+        values = {}
+        for key, value in self.equals.items():
+            values[PARAM_NAMES[key]] = value
+        for key, (low, high) in self.ranges.items():
+            if low is not None:
+                values[f"{PARAM_NAMES[key]}_low"] = low
+            if high is not None:
+                values[f"{PARAM_NAMES[key]}_high"] = high
+        return values
+
+    @property
+    def descending(self) -> bool:
+        # plan() only accepts a single direction for all sort keys
+        return self.sort[0][1]
+
+    def row_key(self, todo) -> Tuple:
+        """The ORDER BY evaluated in Python, for merging pages from several shards"""
+        return tuple(
+            fold_title(todo.title, self.dialect) if key == "lower(title)" else getattr(todo, key)
+            for key, _ in self.sort
+        ) + (todo.id,)
+
+    def describe(self) -> Dict:
+        return {
+            "equals": sorted(self.equals),
+            "ranges": sorted(self.ranges),
+            "sort": [f"-{key}" if descending else key for key, descending in self.sort],
+            "index": self.index,
+        }
@@ -0,0 +1,181 @@
+"""
+Background health monitor
+
+Probes must not hit the database: orchestrators call them every second on
+every pod. Instead a background task pings the database, samples connection
+pool saturation and registered queue depths on an interval, and /livez and
+/readyz answer from the last snapshot.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Periodically refreshed readiness state"""
+
+    def __init__(
+        self,
+        interval: float = config.HEALTH_CHECK_INTERVAL,
+        stale_after: float = config.HEALTH_STALE_AFTER,
+        pool_threshold: float = config.POOL_SATURATION_THRESHOLD,
+        queue_threshold: int = config.QUEUE_DEPTH_THRESHOLD,
+    ):
+        self.interval = interval
+        self.stale_after = stale_after
+        self.pool_threshold = pool_threshold
+        self.queue_threshold = queue_threshold
+        self.started_at = time.monotonic()
+        self._queues: Dict[str, Tuple[Callable[[], int], Optional[int]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._checked_at: Optional[float] = None
+        self.state: Dict = {
+            "ready": False,
+            "database": "unknown",
+            "reasons": ["startup"],
+        }
+
+    def register_queue(self, name: str, depth: Callable[[], int], threshold: Optional[int] = None) -> None:
+        """Report a queue's depth in readiness (e.g. a background writer); threshold defaults to queue_threshold"""
+        self._queues[name] = (depth, threshold)
+
+    def unregister_queue(self, name: str) -> None:
+        self._queues.pop(name, None)
+
+    # ------------------------------------------------------------------
+    # Checks
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _pool_stats(engine) -> Dict:
+        pool = engine.pool
+        if not hasattr(pool, "checkedout") or not hasattr(pool, "size"):
+            return {"class": type(pool).__name__}
+        checked_out = pool.checkedout()
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        return {
+            "class": type(pool).__name__,
+            "checked_out": checked_out,
+            "capacity": capacity,
+            "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+        }
+
+    def _check(self) -> Dict:
+        """Run all checks (blocking; called from a worker thread)"""
+        from database.config import get_engine
+        from database.shards import shard_router
+
+        engine = get_engine()
+        reasons = []
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            database = "connected"
+        except Exception as e:
+            logger.error(f"Health check: database ping failed: {e}")
+            database = "unavailable"
+            reasons.append(f"database: {type(e).__name__}")
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        shards = {}
+        if shard_router.sharded:
+            for name, shard_engine in shard_router.engines():
+                try:
+                    with shard_engine.connect() as connection:
+                        connection.execute(text("SELECT 1"))
+                    shards[name] = "connected"
+                except Exception as e:
+                    logger.error(f"Health check: shard {name} ping failed: {e}")
+                    shards[name] = "unavailable"
+                    reasons.append(f"shard {name}: {type(e).__name__}")
+
+        pool = self._pool_stats(engine)
+        if pool.get("saturation", 0.0) >= self.pool_threshold:
+            reasons.append(f"pool saturation {pool['saturation']:.0%}")
+
+        queues = {}
+        for name, (depth, threshold) in self._queues.items():
+            try:
+                queues[name] = depth()
+            except Exception as e:
+                logger.error(f"Health check: queue '{name}' depth failed: {e}")
+                continue
+            if queues[name] >= (threshold if threshold is not None else self.queue_threshold):
+                reasons.append(f"queue {name} depth {queues[name]}")
+
+        return {
+            "ready": not reasons,
+            "database": database,
+            "database_latency_ms": latency_ms,
+            "shards": shards,
+            "pool": pool,
+            "queues": queues,
+            "reasons": reasons,
+            "checked_at": datetime.utcnow().isoformat(),
+        }
+
+    async def refresh(self) -> Dict:
+        """Run the checks once and publish the new snapshot"""
+        self.state = await run_in_threadpool(self._check)
+        self._checked_at = time.monotonic()
+        return self.state
+
+    # ------------------------------------------------------------------
+    # Probe views
+    # ------------------------------------------------------------------
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def readiness(self) -> Dict:
+        """Last snapshot, downgraded to not-ready if the checker has stalled"""
+        state = dict(self.state)
+        if self._checked_at is not None and time.monotonic() - self._checked_at > self.stale_after:
+            state["ready"] = False
+            state["reasons"] = state.get("reasons", []) + ["health state is stale"]
+        return state
+
+    def liveness(self) -> Dict:
+        return {
+            "alive": self.is_running,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health check failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+health_monitor = HealthMonitor()
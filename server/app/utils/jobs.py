@@ -0,0 +1,491 @@
+"""
+Background jobs
+
+Long operations (purges, imports, reindexing, reconciliation) run outside
+the request that started it. The request stores a row in the `jobs` table
+and answers 202; clients poll GET /api/jobs/{id} and may cancel.
+
+  * job types are registered with @job_type, each with an executor
+    ("thread" for I/O-bound work, "process" for CPU-bound work), a
+    concurrency limit and whether an interrupted run may be resumed
+  * every worker process runs a JobRunner whose dispatcher claims pending
+    rows, respecting the per-type limits and the size of its thread/process
+    pools. Claims and deduplicated submits first lock their kind's row in
+    `job_kinds`, so runners sharing the table count running jobs one at a
+    time and never exceed a limit (or queue a duplicate)
+  * running jobs heartbeat; rows whose runner died are requeued (resumable
+    types, up to JOB_MAX_ATTEMPTS) or failed. A clean shutdown requeues or
+    fails its own running jobs right away
+  * cancellation is cooperative: job functions call ctx.check() between
+    units of work
+
+Job functions take a JobContext and return a JSON-serializable result.
+"""
+import importlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import config
+from app.models.job import JobKindLock, JobRecord
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (PENDING, RUNNING)
+
+
+class JobCancelled(Exception):
+    """Raised by JobContext.check() when cancellation was requested"""
+
+
+class JobInterrupted(Exception):
+    """Raised by JobContext.check() when the runner gave the job up (shutdown)"""
+
+
+# Set while this process's runner shuts down; thread jobs stop at their next check
+_shutting_down = threading.Event()
+
+
+def _session():
+    from database.config import SessionLocal, init_engine
+
+    init_engine()
+    return SessionLocal()
+
+
+def _lock_kind(db, kind: str) -> None:
+    """
+    Lock kind's row until db's transaction ends; must be the transaction's
+    first statement. Counts run after it see every committed claim
+    (PostgreSQL takes a new snapshot per statement under READ COMMITTED,
+    SQLite holds the write lock), and other claims of the kind wait.
+    """
+    lock = update(JobKindLock).where(JobKindLock.kind == kind).values(locked_at=datetime.utcnow())
+    if db.execute(lock).rowcount:
+        return
+    # First job of this kind: create its row, then lock it
+    db.rollback()
+    with _session() as other:
+        other.add(JobKindLock(kind=kind))
+        try:
+            other.commit()
+        except IntegrityError:
+            # Created by another runner meanwhile
+            other.rollback()
+    db.execute(lock)
+
+
+# ============================================================================
+# JOB TYPES
+# ============================================================================
+
+class JobType:
+    """How a kind of job is executed"""
+
+    def __init__(self, kind: str, fn: Callable, executor: str = "thread",
+                 max_concurrency: int = 1, resumable: bool = False):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}'")
+        self.kind = kind
+        self.fn = fn
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.resumable = resumable
+        # Process jobs are looked up again by import path in the child
+        self.target = f"{fn.__module__}:{fn.__qualname__}"
+
+
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def job_type(kind: str, executor: str = "thread", max_concurrency: int = 1, resumable: bool = False):
+    """Register a function as the implementation of a job kind"""
+    def decorator(fn: Callable) -> Callable:
+        JOB_TYPES[kind] = JobType(kind, fn, executor, max_concurrency, resumable)
+        return fn
+    return decorator
+
+
+# ============================================================================
+# CONTEXT (passed to job functions; picklable for process jobs)
+# ============================================================================
+
+class JobContext:
+    """Parameters, progress reporting and cancellation checks for one run"""
+
+    def __init__(self, job_id: str, claim: str, params: Dict, progress: Dict,
+                 interval: float = config.JOB_PROGRESS_INTERVAL):
+        self.id = job_id
+        self.claim = claim
+        self.params = params
+        self.progress = dict(progress)
+        self.interval = interval
+        self._flushed_at = 0.0
+        self._checked_at = 0.0
+
+    def update(self, **progress) -> None:
+        """Record progress; written to the jobs table at most every `interval` seconds"""
+        self.progress.update(progress)
+        if time.monotonic() - self._flushed_at >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._flushed_at = time.monotonic()
+        with _session() as db:
+            db.execute(
+                update(JobRecord)
+                .where(JobRecord.id == self.id, JobRecord.worker == self.claim)
+                .values(progress=dict(self.progress), heartbeat_at=datetime.utcnow())
+            )
+            db.commit()
+
+    def check(self) -> None:
+        """Raise JobCancelled / JobInterrupted if the job should stop"""
+        if _shutting_down.is_set():
+            raise JobInterrupted("Runner is shutting down")
+        if time.monotonic() - self._checked_at < self.interval:
+            return
+        self._checked_at = time.monotonic()
+        with _session() as db:
+            row = db.execute(
+                select(JobRecord.status, JobRecord.worker, JobRecord.cancel_requested)
+                .where(JobRecord.id == self.id)
+            ).one_or_none()
+        if row is None or row.status != RUNNING or row.worker != self.claim:
+            raise JobInterrupted(f"Job {self.id} is no longer owned by this runner")
+        if row.cancel_requested:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+
+def _run_in_process(target: str, ctx: JobContext):
+    """Entry point of process jobs: resolve the function by import path"""
+    module_name, _, name = target.partition(":")
+    fn = getattr(importlib.import_module(module_name), name)
+    try:
+        return fn(ctx)
+    finally:
+        ctx.flush()
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+class JobRunner:
+    """Claims pending jobs from the jobs table and executes them"""
+
+    def __init__(
+        self,
+        threads: int = config.JOB_THREADS,
+        processes: int = config.JOB_PROCESSES,
+        poll_interval: float = config.JOB_POLL_INTERVAL,
+        stale_after: float = config.JOB_STALE_AFTER,
+        max_attempts: int = config.JOB_MAX_ATTEMPTS,
+        retention: timedelta = timedelta(days=config.JOB_RETENTION_DAYS),
+    ):
+        self.threads = threads
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.worker_id = ""
+        self._running: Dict[str, Tuple[str, str, Future]] = {}  # job id -> (claim, executor, future)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._swept_at = 0.0
+
+    # ------------------------------------------------------------------
+    # API used by routes
+    # ------------------------------------------------------------------
+
+    def submit(self, kind: str, params: Optional[Dict] = None, dedupe: bool = False) -> Dict:
+        """Queue a job; with dedupe, return the active job of this kind instead if there is one"""
+        if kind not in JOB_TYPES:
+            raise ValueError(f"Unknown job type '{kind}'")
+        with _session() as db:
+            if dedupe:
+                _lock_kind(db, kind)
+                existing = db.execute(
+                    select(JobRecord).where(JobRecord.kind == kind, JobRecord.status.in_(ACTIVE))
+                    .order_by(JobRecord.created_at).limit(1)
+                ).scalar_one_or_none()
+                if existing is not None:
+                    return existing.to_dict()
+            job = JobRecord(id=uuid.uuid4().hex, kind=kind, params=params or {}, progress={}, status=PENDING)
+            db.add(job)
+            db.commit()
+            logger.info(f"Queued job {job.id} ({kind})")
+            self._wake.set()
+            return job.to_dict()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with _session() as db:
+            job = db.get(JobRecord, job_id)
+            return job.to_dict() if job else None
+
+    def list(self, kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = select(JobRecord).order_by(JobRecord.created_at.desc()).limit(limit)
+        if kind:
+            query = query.where(JobRecord.kind == kind)
+        if status:
+            query = query.where(JobRecord.status == status)
+        with _session() as db:
+            return [job.to_dict() for job in db.execute(query).scalars()]
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a pending job now, or ask a running one to stop"""
+        with _session() as db:
+            db.execute(
+                update(JobRecord).where(JobRecord.id == job_id, JobRecord.status == PENDING)
+                .values(status=CANCELLED, cancel_requested=True, finished_at=datetime.utcnow())
+            )
+            db.execute(
+                update(JobRecord).where(JobRecord.id == job_id, JobRecord.status == RUNNING)
+                .values(cancel_requested=True)
+            )
+            db.commit()
+            job = db.get(JobRecord, job_id)
+            return job.to_dict() if job else None
+
+    def pending_count(self) -> int:
+        with _session() as db:
+            return db.execute(select(func.count()).where(JobRecord.status == PENDING)).scalar()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._dispatcher is not None:
+            return
+        # Set here, not in __init__: the app may be imported before fork
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping.clear()
+        _shutting_down.clear()
+        self._thread_pool = ThreadPoolExecutor(max_workers=max(1, self.threads), thread_name_prefix="job")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Job runner started ({self.threads} threads, {self.processes} processes)")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop claiming jobs and hand running ones back (requeue or fail)"""
+        if self._dispatcher is None:
+            return
+        self._stopping.set()
+        _shutting_down.set()
+        self._wake.set()
+        self._dispatcher.join(timeout)
+        self._dispatcher = None
+        # Thread jobs save their progress and hand themselves back at their
+        # next check; whatever is still running after the timeout (including
+        # process jobs) is released here and notices at its next check
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if all(executor != "thread" for _, executor, _ in self._running.values()):
+                    break
+            time.sleep(0.05)
+        with self._lock:
+            running = dict(self._running)
+        for job_id, (claim, _, _) in running.items():
+            self._release(job_id, claim, "Worker shut down while job was running")
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        logger.info("Job runner stopped")
+
+    # ------------------------------------------------------------------
+    # Dispatcher
+    # ------------------------------------------------------------------
+
+    def _dispatch_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._heartbeat()
+                if time.monotonic() - self._swept_at >= self.stale_after / 2:
+                    self._sweep()
+                self._claim_pending()
+            except Exception as e:
+                logger.error(f"✗ Job dispatcher error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _capacity(self) -> Dict[str, int]:
+        with self._lock:
+            executors = [executor for _, executor, _ in self._running.values()]
+        return {
+            "thread": self.threads - executors.count("thread"),
+            "process": self.processes - executors.count("process"),
+        }
+
+    def _claim_pending(self) -> None:
+        capacity = self._capacity()
+        if max(capacity.values()) <= 0:
+            return
+        with _session() as db:
+            candidates = db.execute(
+                select(JobRecord.id, JobRecord.kind).where(JobRecord.status == PENDING)
+                .order_by(JobRecord.created_at).limit(sum(max(0, c) for c in capacity.values()) * 4)
+            ).all()
+        for job_id, kind in candidates:
+            job_type_ = JOB_TYPES.get(kind)
+            if job_type_ is None:
+                self._finish(job_id, None, FAILED, error=f"Unknown job type '{kind}'")
+                continue
+            if capacity[job_type_.executor] <= 0:
+                continue
+            claimed = self._claim(job_id, job_type_)
+            if claimed is not None:
+                capacity[job_type_.executor] -= 1
+                self._execute(job_type_, claimed)
+
+    def _claim(self, job_id: str, job_type_: JobType) -> Optional[JobContext]:
+        """Move a pending job to running if its type is below its concurrency limit"""
+        claim = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        now = datetime.utcnow()
+        with _session() as db:
+            _lock_kind(db, job_type_.kind)
+            running = db.execute(
+                select(func.count()).select_from(JobRecord)
+                .where(JobRecord.kind == job_type_.kind, JobRecord.status == RUNNING)
+            ).scalar()
+            if running >= job_type_.max_concurrency:
+                db.rollback()
+                return None
+            claimed = db.execute(
+                update(JobRecord)
+                .where(JobRecord.id == job_id, JobRecord.status == PENDING)
+                .values(status=RUNNING, worker=claim, attempts=JobRecord.attempts + 1,
+                        started_at=func.coalesce(JobRecord.started_at, now), heartbeat_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if not claimed:
+                return None
+            job = db.get(JobRecord, job_id)
+            return JobContext(job.id, claim, job.params or {}, job.progress or {})
+
+    def _execute(self, job_type_: JobType, ctx: JobContext) -> None:
+        if job_type_.executor == "process":
+            if self._process_pool is None:
+                # spawn: forking a process that runs threads is unsafe
+                self._process_pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=get_context("spawn"))
+            future = self._process_pool.submit(_run_in_process, job_type_.target, ctx)
+        else:
+            future = self._thread_pool.submit(self._run_in_thread, job_type_.fn, ctx)
+        with self._lock:
+            self._running[ctx.id] = (ctx.claim, job_type_.executor, future)
+        future.add_done_callback(lambda f, ctx=ctx: self._completed(ctx, f))
+        logger.info(f"Job {ctx.id} ({job_type_.kind}) started")
+
+    def _run_in_thread(self, fn: Callable, ctx: JobContext):
+        ctx.check()
+        try:
+            return fn(ctx)
+        finally:
+            ctx.flush()
+
+    def _completed(self, ctx: JobContext, future: Future) -> None:
+        try:
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                self._finish(ctx.id, ctx.claim, SUCCEEDED, result=future.result())
+                logger.info(f"✓ Job {ctx.id} finished")
+            elif isinstance(error, JobCancelled):
+                self._finish(ctx.id, ctx.claim, CANCELLED)
+                logger.info(f"Job {ctx.id} cancelled")
+            elif isinstance(error, JobInterrupted):
+                self._release(ctx.id, ctx.claim, "Worker shut down while job was running")
+            else:
+                self._finish(ctx.id, ctx.claim, FAILED, error=str(error) or type(error).__name__)
+                logger.error(f"✗ Job {ctx.id} failed: {error}")
+        finally:
+            # Only now, so stop() can wait for the final status to be written
+            with self._lock:
+                self._running.pop(ctx.id, None)
+            self._wake.set()
+
+    def _finish(self, job_id: str, claim: Optional[str], status: str,
+                result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        conditions = [JobRecord.id == job_id]
+        if claim is not None:
+            conditions.append(JobRecord.worker == claim)
+        with _session() as db:
+            db.execute(
+                update(JobRecord).where(*conditions)
+                .values(status=status, result=result, error=error, finished_at=datetime.utcnow())
+            )
+            db.commit()
+
+    def _release(self, job_id: str, claim: str, reason: str) -> None:
+        """Give a running job back: requeue if resumable and attempts remain, else fail"""
+        with _session() as db:
+            job = db.get(JobRecord, job_id)
+            if job is None or job.status != RUNNING or job.worker != claim:
+                return
+            job_type_ = JOB_TYPES.get(job.kind)
+            if job_type_ is not None and job_type_.resumable and job.attempts < self.max_attempts:
+                job.status, job.worker = PENDING, None
+                logger.warning(f"Requeued job {job_id} ({job.kind}): {reason}")
+            else:
+                job.status, job.error, job.finished_at = FAILED, reason, datetime.utcnow()
+                logger.warning(f"Failed job {job_id} ({job.kind}): {reason}")
+            db.commit()
+
+    def _heartbeat(self) -> None:
+        with self._lock:
+            claims = [claim for claim, _, _ in self._running.values()]
+        if not claims:
+            return
+        with _session() as db:
+            db.execute(
+                update(JobRecord).where(JobRecord.worker.in_(claims), JobRecord.status == RUNNING)
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            db.commit()
+
+    def _sweep(self) -> None:
+        """Recover jobs whose runner stopped heartbeating; drop old finished jobs"""
+        self._swept_at = time.monotonic()
+        now = datetime.utcnow()
+        with _session() as db:
+            stale = db.execute(
+                select(JobRecord.id, JobRecord.worker).where(
+                    JobRecord.status == RUNNING,
+                    JobRecord.heartbeat_at < now - timedelta(seconds=self.stale_after),
+                )
+            ).all()
+            db.execute(
+                JobRecord.__table__.delete().where(
+                    and_(JobRecord.status.notin_(ACTIVE), JobRecord.finished_at < now - self.retention)
+                )
+            )
+            db.commit()
+        for job_id, claim in stale:
+            self._release(job_id, claim, "Worker stopped while job was running")
+
+
+job_runner = JobRunner()
@@ -0,0 +1,262 @@
+"""
+Worker memory instrumentation and the per-worker memory ceiling
+
+  * rss_bytes(): resident set size of this process (/proc/self/statm; the
+    peak from getrusage where /proc is missing)
+  * RouteMemory: per-route request counts, RSS growth seen while a request
+    ran and net traced allocations. Requests overlap, so growth is shared
+    between the routes in flight; a route that keeps showing up with growth
+    is the one to profile
+  * tracemalloc snapshots (MEMORY_PROFILING): each snapshot is compared with
+    the previous one taken by the same worker, so two calls bracket the
+    traffic in between
+  * MemoryMonitor: checks RSS every MEMORY_CHECK_INTERVAL seconds. Above
+    MEMORY_LIMIT_MB it runs a full collection, and if RSS is still above
+    the limit the worker is recycled once. Under serve.py recycle_hook asks
+    the master to start a replacement before this worker drains; without a
+    supervisor hook the worker sends itself SIGTERM (uvicorn drains
+    in-flight requests) and the process manager restarts it
+"""
+import asyncio
+import gc
+import linecache
+import logging
+import os
+import resource
+import signal
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Set by serve.py in each worker: asks the master for a replacement
+recycle_hook: Optional[Callable[[], None]] = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size, or None if it cannot be read"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (OSError, ValueError):
+        return None
+
+
+def _mb(size: Optional[float]) -> Optional[float]:
+    return round(size / (1024 * 1024), 2) if size is not None else None
+
+
+# ============================================================================
+# PER-ROUTE COUNTERS
+# ============================================================================
+
+class RouteMemory:
+    """RSS growth and net traced allocations per route template"""
+
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, float]] = {}
+
+    def record(self, route: str, rss_growth: int, traced_net: Optional[int]) -> None:
+        counters = self.routes.get(route)
+        if counters is None:
+            counters = self.routes[route] = {
+                "requests": 0, "rss_growth_bytes": 0, "requests_with_growth": 0,
+                "traced_net_bytes": 0, "traced_max_bytes": 0,
+            }
+        counters["requests"] += 1
+        if rss_growth > 0:
+            counters["rss_growth_bytes"] += rss_growth
+            counters["requests_with_growth"] += 1
+        if traced_net is not None:
+            counters["traced_net_bytes"] += traced_net
+            counters["traced_max_bytes"] = max(counters["traced_max_bytes"], traced_net)
+
+    def stats(self) -> List[Dict]:
+        """Routes by RSS growth, largest first"""
+        rows = [{"route": route, **counters} for route, counters in self.routes.items()]
+        return sorted(rows, key=lambda row: row["rss_growth_bytes"], reverse=True)
+
+
+route_memory = RouteMemory()
+
+
+# ============================================================================
+# TRACEMALLOC SNAPSHOTS
+# ============================================================================
+
+# Allocations made by the tracer and the import system are noise in diffs
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+_last_snapshot_at: Optional[float] = None
+
+
+def start_tracing(frames: int = config.MEMORY_TRACE_FRAMES) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info(f"tracemalloc started ({frames} frame(s) per allocation)")
+
+
+def _stat(stat) -> Dict:
+    frame = stat.traceback[0]
+    row = {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        row["size_diff_bytes"] = stat.size_diff
+        row["count_diff"] = stat.count_diff
+    if len(stat.traceback) > 1:
+        row["traceback"] = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    return row
+
+
+def take_snapshot(group_by: str = "lineno", limit: int = 20) -> Dict:
+    """
+    Top allocations now and the change since this worker's previous snapshot.
+
+    Blocking (the snapshot copies every trace); call from a worker thread.
+    """
+    global _last_snapshot, _last_snapshot_at
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running (set MEMORY_PROFILING=true)")
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    now = time.monotonic()
+    result = {
+        "pid": os.getpid(),
+        "group_by": group_by,
+        "traced_bytes": sum(stat.size for stat in snapshot.statistics("filename")),
+        "top": [_stat(stat) for stat in snapshot.statistics(group_by)[:limit]],
+        "diff": None,
+    }
+    if _last_snapshot is not None:
+        result["diff"] = {
+            "seconds": round(now - _last_snapshot_at, 1),
+            "top": [_stat(stat) for stat in snapshot.compare_to(_last_snapshot, group_by)[:limit]],
+        }
+    _last_snapshot, _last_snapshot_at = snapshot, now
+    return result
+
+
+# ============================================================================
+# MEMORY CEILING
+# ============================================================================
+
+class MemoryMonitor:
+    """Checks worker RSS on an interval and recycles the worker above the limit"""
+
+    def __init__(self, limit_mb: float = config.MEMORY_LIMIT_MB, interval: float = config.MEMORY_CHECK_INTERVAL):
+        self.limit = int(limit_mb * 1024 * 1024) if limit_mb > 0 else None
+        self.interval = interval
+        self.started_rss = rss_bytes()
+        self.peak_rss = self.started_rss or 0
+        self.collections = 0
+        self.recycle_requested = False
+        self._task: Optional[asyncio.Task] = None
+
+    def check(self) -> None:
+        """Compare RSS with the limit (blocking: may run gc.collect())"""
+        rss = rss_bytes()
+        if rss is None:
+            return
+        self.peak_rss = max(self.peak_rss, rss)
+        if self.limit is None or rss <= self.limit or self.recycle_requested:
+            return
+        # Much of the excess may be garbage awaiting a full collection
+        gc.collect()
+        self.collections += 1
+        rss = rss_bytes() or rss
+        if rss <= self.limit:
+            return
+        logger.warning(f"Worker {os.getpid()} RSS {_mb(rss)} MB is above the {_mb(self.limit)} MB limit; recycling")
+        self.recycle_requested = True
+        self.recycle()
+
+    @staticmethod
+    def recycle() -> None:
+        if recycle_hook is not None:
+            try:
+                recycle_hook()
+                return
+            except OSError as e:
+                logger.error(f"Could not ask the master to recycle worker {os.getpid()}: {e}")
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def stats(self) -> Dict:
+        rss = rss_bytes()
+        self.peak_rss = max(self.peak_rss, rss or 0)
+        return {
+            "pid": os.getpid(),
+            "rss_mb": _mb(rss),
+            "started_rss_mb": _mb(self.started_rss),
+            "peak_rss_mb": _mb(self.peak_rss),
+            "limit_mb": _mb(self.limit),
+            "collections": self.collections,
+            "recycle_requested": self.recycle_requested,
+            "gc_counts": gc.get_count(),
+            "tracemalloc": {
+                "tracing": tracemalloc.is_tracing(),
+                "current_mb": _mb(tracemalloc.get_traced_memory()[0]) if tracemalloc.is_tracing() else None,
+                "peak_mb": _mb(tracemalloc.get_traced_memory()[1]) if tracemalloc.is_tracing() else None,
+            },
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self.check)
+            except Exception as e:
+                logger.error(f"Memory check failed: {e}")
+
+    def start(self) -> None:
+        self.started_rss = rss_bytes()
+        if self.limit is None or self.is_running:
+            return
+        if self.started_rss is not None and self.started_rss >= self.limit:
+            # Every replacement would be recycled straight away
+            logger.error(f"MEMORY_LIMIT_MB ({_mb(self.limit)} MB) is below the worker's RSS after "
+                         f"startup ({_mb(self.started_rss)} MB); not enforcing it")
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+memory_monitor = MemoryMonitor()
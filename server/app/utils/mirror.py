@@ -0,0 +1,548 @@
+"""
+In-memory columnar mirror of the todos table
+
+For read-heavy deployments, stats, filtered counts and substring search can
+be answered from an in-process copy of each shard's todos instead of SQL:
+
+  * columns: parallel arrays sorted by id (ids, owners and timestamps as
+    int64 microseconds, a flag byte per row) plus interned title and
+    description strings. Deleted rows are flagged dead and dropped when
+    they make up a quarter of the rows
+  * counts: per (owner, completed) and (all owners, completed), a sorted
+    int64 array of created_at, so a count over any created range is two
+    bisects (the stats endpoint without filters is four)
+  * search: rows are packed per chunk of CHUNK_ROWS into one lowercased
+    string, scanned with str.find (C speed) and mapped back to rows by
+    offset. A write only invalidates its chunk, rebuilt on the next search.
+    Searches take the chunks under the lock and scan them outside it, so
+    writes and refreshes never wait for a scan; matches are then read
+    back (and rechecked) under the lock. Terms match literally (no LIKE
+    wildcards) and case-insensitively for all of Unicode, where SQLite's
+    LIKE folds ASCII only
+
+Each worker process loads its own mirror in the background on startup and
+falls back to SQL until then. Writes made by this process are applied from
+the write routes right after commit; writes from other processes (workers,
+jobs, database/move_tenant.py) are picked up every TODO_MIRROR_REFRESH
+seconds from updated_at (an index range scan). Inserts and deletes that do
+not touch updated_at are caught by comparing count(*) and sum(id), a full
+scan, so that only runs every TODO_MIRROR_RECONCILE seconds.
+"""
+import bisect
+import logging
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+
+from app import config
+from app.models.todo import Todo
+
+logger = logging.getLogger(__name__)
+
+LIVE = 1
+COMPLETED = 2
+# completed_at IS NULL
+NO_TIME = -(1 << 63)
+CHUNK_ROWS = 4096
+LOAD_BATCH = 10000
+# Separators inside the search strings; terms containing them go to SQL
+ROW_SEPARATOR = "\x00"
+FIELD_SEPARATOR = "\x1f"
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+COLUMNS = (Todo.id, Todo.title, Todo.description, Todo.completed, Todo.owner_id,
+           Todo.created_at, Todo.updated_at, Todo.completed_at)
+
+
+def to_micros(value: Optional[datetime]) -> int:
+    if value is None:
+        return NO_TIME
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_micros(value: int) -> Optional[datetime]:
+    return None if value == NO_TIME else EPOCH + timedelta(microseconds=value)
+
+
+def _search_text(title: str, description: Optional[str]) -> str:
+    return f"{title.lower()}{FIELD_SEPARATOR}{(description or '').lower()}"
+
+
+class SearchChunk(NamedTuple):
+    """CHUNK_ROWS rows as searched; never modified once built (writes replace it)"""
+    # Lowercased rows joined by ROW_SEPARATOR, and where each row starts
+    text: str
+    offsets: array
+    ids: array
+    owners: array
+
+
+def scan(chunks: List[SearchChunk], term: str, limit: int, accept: Callable[[int], bool]) -> List[int]:
+    """Ids of the first `limit` rows in chunks containing term whose owner is accepted"""
+    term = term.lower()
+    found: List[int] = []
+    for chunk in chunks:
+        text, offsets = chunk.text, chunk.offsets
+        start = text.find(term)
+        while start >= 0:
+            row = bisect.bisect_right(offsets, start) - 1
+            if accept(chunk.owners[row]):
+                found.append(chunk.ids[row])
+                if len(found) >= limit:
+                    return found
+            # One hit per row; continue after this row
+            start = text.find(term, offsets[row + 1]) if row + 1 < len(offsets) else -1
+    return found
+
+
+# ============================================================================
+# ONE SHARD
+# ============================================================================
+
+class TodoColumns:
+    """One shard's todos as parallel arrays sorted by id"""
+
+    def __init__(self):
+        self.ids = array("q")
+        self.owners = array("q")
+        self.created = array("q")
+        self.updated = array("q")
+        self.completed_at = array("q")
+        self.flags = bytearray()
+        self.titles: List[str] = []
+        self.descriptions: List[Optional[str]] = []
+        self.live = 0
+        self.id_sum = 0
+        self.max_updated = NO_TIME
+        # (owner_id or None for everyone, completed) -> sorted created_at
+        self._created_index: Dict[Tuple[Optional[int], bool], array] = {}
+        # chunk number -> its rows as searched
+        self._chunks: Dict[int, SearchChunk] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List) -> "TodoColumns":
+        """Bulk build from rows of COLUMNS sorted by id, one column at a time"""
+        columns = cls()
+        if not rows:
+            return columns
+        ids, titles, descriptions, completed, owners, created, updated, completed_at = zip(*rows)
+        columns.ids = array("q", ids)
+        columns.owners = array("q", owners)
+        columns.created = array("q", map(to_micros, created))
+        columns.updated = array("q", map(to_micros, updated))
+        columns.completed_at = array("q", map(to_micros, completed_at))
+        columns.flags = bytearray(LIVE | COMPLETED if done else LIVE for done in completed)
+        columns.titles = list(map(sys.intern, titles))
+        columns.descriptions = [sys.intern(text) if text else text for text in descriptions]
+        columns.live = len(ids)
+        columns.id_sum = sum(ids)
+        columns.max_updated = max(columns.updated)
+        index: Dict[Tuple[Optional[int], bool], List[int]] = {}
+        for owner_id, done, created_at in zip(owners, completed, columns.created):
+            index.setdefault((None, bool(done)), []).append(created_at)
+            index.setdefault((owner_id, bool(done)), []).append(created_at)
+        columns._created_index = {key: array("q", sorted(values)) for key, values in index.items()}
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _find(self, todo_id: int) -> Tuple[int, bool]:
+        position = bisect.bisect_left(self.ids, todo_id)
+        return position, position < len(self.ids) and self.ids[position] == todo_id
+
+    def _index(self, owner_id: int, completed: bool, created_at: int, add: bool) -> None:
+        for key in ((None, completed), (owner_id, completed)):
+            values = self._created_index.setdefault(key, array("q"))
+            position = bisect.bisect_left(values, created_at)
+            if add:
+                values.insert(position, created_at)
+            elif position < len(values) and values[position] == created_at:
+                del values[position]
+
+    def _invalidate(self, position: int, shifted: bool = False) -> None:
+        first = position // CHUNK_ROWS
+        for chunk in [chunk for chunk in self._chunks if chunk == first or (shifted and chunk > first)]:
+            del self._chunks[chunk]
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def upsert(self, row, force: bool = False) -> bool:
+        """
+        Apply a row (anything with the Todo columns as attributes). Returns
+        False, unless forced, if the mirror holds a newer version or deleted
+        the row later.
+        """
+        updated_at = to_micros(row.updated_at)
+        created_at = to_micros(row.created_at)
+        position, found = self._find(row.id)
+        if found and not force and self.updated[position] > updated_at:
+            return False
+        if found and self.flags[position] & LIVE:
+            self._index(self.owners[position], bool(self.flags[position] & COMPLETED),
+                        self.created[position], add=False)
+        else:
+            if not found:
+                # New ids are appended; an older id copied in by a tenant
+                # move shifts the rows after it
+                for column in (self.ids, self.owners, self.created, self.updated, self.completed_at):
+                    column.insert(position, 0)
+                self.ids[position] = row.id
+                self.flags.insert(position, 0)
+                self.titles.insert(position, "")
+                self.descriptions.insert(position, None)
+            self.live += 1
+            self.id_sum += row.id
+        self.owners[position] = row.owner_id
+        self.created[position] = created_at
+        self.updated[position] = updated_at
+        self.completed_at[position] = to_micros(row.completed_at)
+        self.flags[position] = LIVE | (COMPLETED if row.completed else 0)
+        self.titles[position] = sys.intern(row.title)
+        self.descriptions[position] = sys.intern(row.description) if row.description else row.description
+        self.max_updated = max(self.max_updated, updated_at)
+        self._index(row.owner_id, bool(row.completed), created_at, add=True)
+        self._invalidate(position, shifted=not found and position != len(self.ids) - 1)
+        return True
+
+    def remove(self, todo_id: int) -> bool:
+        position, found = self._find(todo_id)
+        if not found or not self.flags[position] & LIVE:
+            return False
+        self._index(self.owners[position], bool(self.flags[position] & COMPLETED),
+                    self.created[position], add=False)
+        self.flags[position] = 0
+        self.titles[position], self.descriptions[position] = "", None
+        # A refresh that read the row before it was deleted must not revive it
+        self.updated[position] = to_micros(datetime.utcnow())
+        self.live -= 1
+        self.id_sum -= todo_id
+        self._invalidate(position)
+        if len(self.ids) - self.live > max(CHUNK_ROWS, len(self.ids) // 4):
+            self._compact()
+        return True
+
+    def _compact(self) -> None:
+        keep = [position for position, flags in enumerate(self.flags) if flags & LIVE]
+        for name in ("ids", "owners", "created", "updated", "completed_at"):
+            column = getattr(self, name)
+            setattr(self, name, array("q", (column[position] for position in keep)))
+        self.flags = bytearray(self.flags[position] for position in keep)
+        self.titles = [self.titles[position] for position in keep]
+        self.descriptions = [self.descriptions[position] for position in keep]
+        self._chunks.clear()
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def count(self, owner_id: Optional[int] = None, completed: Optional[bool] = None,
+              created_after: Optional[datetime] = None, created_before: Optional[datetime] = None) -> int:
+        """Live rows matching the filters: created_after inclusive, created_before exclusive"""
+        low = to_micros(created_after) if created_after else None
+        high = to_micros(created_before) if created_before else None
+        total = 0
+        for state in ((completed,) if completed is not None else (False, True)):
+            values = self._created_index.get((owner_id, state))
+            if not values:
+                continue
+            start = bisect.bisect_left(values, low) if low is not None else 0
+            end = bisect.bisect_left(values, high) if high is not None else len(values)
+            total += max(0, end - start)
+        return total
+
+    def _chunk(self, chunk: int) -> SearchChunk:
+        cached = self._chunks.get(chunk)
+        if cached is None:
+            first, last = chunk * CHUNK_ROWS, min((chunk + 1) * CHUNK_ROWS, len(self.ids))
+            texts = [
+                _search_text(self.titles[position], self.descriptions[position])
+                if self.flags[position] & LIVE else ""
+                for position in range(first, last)
+            ]
+            offsets, offset = array("q"), 0
+            for text in texts:
+                offsets.append(offset)
+                offset += len(text) + 1
+            cached = self._chunks[chunk] = SearchChunk(
+                ROW_SEPARATOR.join(texts), offsets, self.ids[first:last], self.owners[first:last]
+            )
+        return cached
+
+    def chunks(self) -> List[SearchChunk]:
+        """Every chunk as searched, building those a write invalidated"""
+        return [self._chunk(chunk) for chunk in range((len(self.ids) + CHUNK_ROWS - 1) // CHUNK_ROWS)]
+
+    def search(self, term: str, limit: int, accept: Callable[[int], bool]) -> List[int]:
+        """Ids of the first `limit` live rows whose title or description contains term"""
+        return scan(self.chunks(), term, limit, accept)
+
+    def matching_row(self, todo_id: int, term: str) -> Optional[Dict]:
+        """todo_id's row if it is live and still contains term (lowercased)"""
+        position, found = self._find(todo_id)
+        if not found or not self.flags[position] & LIVE:
+            return None
+        if term not in _search_text(self.titles[position], self.descriptions[position]):
+            return None
+        return self.row(position)
+
+    def row(self, position: int) -> Dict:
+        completed_at = self.completed_at[position]
+        return {
+            "id": self.ids[position],
+            "title": self.titles[position],
+            "description": self.descriptions[position],
+            "completed": bool(self.flags[position] & COMPLETED),
+            "owner_id": self.owners[position],
+            "created_at": from_micros(self.created[position]),
+            "updated_at": from_micros(self.updated[position]),
+            "completed_at": from_micros(completed_at),
+        }
+
+    def memory(self) -> Dict[str, int]:
+        """Approximate bytes held, by part"""
+        arrays = sum(column.itemsize * len(column)
+                     for column in (self.ids, self.owners, self.created, self.updated, self.completed_at))
+        strings, seen = 0, set()
+        for value in self.titles + self.descriptions:
+            if value is not None and id(value) not in seen:
+                seen.add(id(value))
+                strings += sys.getsizeof(value)
+        return {
+            "columns": arrays + len(self.flags),
+            "strings": strings + 8 * (len(self.titles) + len(self.descriptions)),
+            "count_index": sum(values.itemsize * len(values) for values in self._created_index.values()),
+            "search_chunks": sum(
+                sys.getsizeof(chunk.text)
+                + sum(column.itemsize * len(column) for column in (chunk.offsets, chunk.ids, chunk.owners))
+                for chunk in self._chunks.values()
+            ),
+        }
+
+
+# ============================================================================
+# MIRROR (all shards)
+# ============================================================================
+
+class TodoMirror:
+    """Per-shard TodoColumns, loaded and refreshed by a background thread"""
+
+    def __init__(self, enabled: bool = config.TODO_MIRROR_ENABLED,
+                 refresh_interval: float = config.TODO_MIRROR_REFRESH,
+                 reconcile_interval: float = config.TODO_MIRROR_RECONCILE):
+        self.enabled = enabled
+        self.refresh_interval = refresh_interval
+        self.reconcile_interval = reconcile_interval
+        self.columns: Dict[str, TodoColumns] = {}
+        # shard -> when its count(*)/sum(id) was last compared (or it was loaded)
+        self._checked_at: Dict[str, float] = {}
+        self.refreshed_at: Optional[float] = None
+        self.refreshes = 0
+        self.reconciles = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        from database.shards import shard_router
+
+        return self.enabled and bool(self.columns) and set(self.columns) == set(shard_router.shards)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="todo-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            self.columns = {}
+
+    def _run(self) -> None:
+        from database.shards import shard_router
+
+        while not self._stop.is_set():
+            try:
+                for name, engine in shard_router.engines():
+                    if name in self.columns:
+                        self.refresh(name, engine)
+                    else:
+                        self.load(name, engine)
+                self.refreshed_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"✗ Todo mirror refresh failed: {e}")
+            self._stop.wait(self.refresh_interval)
+
+    # ------------------------------------------------------------------
+    # Loading and catching up
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _read_rows(engine: Engine, *conditions):
+        rows, last_id = [], 0
+        with engine.connect() as connection:
+            while True:
+                batch = connection.execute(
+                    select(*COLUMNS).where(Todo.id > last_id, *conditions).order_by(Todo.id).limit(LOAD_BATCH)
+                ).all()
+                rows.extend(batch)
+                if len(batch) < LOAD_BATCH:
+                    return rows
+                last_id = batch[-1].id
+
+    def load(self, name: str, engine: Engine) -> TodoColumns:
+        started = time.perf_counter()
+        columns = TodoColumns.from_rows(self._read_rows(engine))
+        with self._lock:
+            self.columns[name] = columns
+        self._checked_at[name] = time.monotonic()
+        logger.info(f"✓ Todo mirror loaded {columns.live:,} rows from {name} "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return columns
+
+    def refresh(self, name: str, engine: Engine) -> None:
+        """
+        Apply rows changed since the last refresh; every reconcile_interval,
+        also reconcile ids if counts disagree
+        """
+        columns = self.columns[name]
+        # Writes commit up to a request timeout after they take their timestamp
+        since = from_micros(columns.max_updated) - timedelta(seconds=config.REQUEST_TIMEOUT + 1) \
+            if columns.max_updated != NO_TIME else EPOCH
+        changed = self._read_rows(engine, Todo.updated_at >= since)
+        with self._lock:
+            for row in changed:
+                columns.upsert(row)
+        self.refreshes += 1
+        if time.monotonic() - self._checked_at.get(name, 0.0) < self.reconcile_interval:
+            return
+        self._checked_at[name] = time.monotonic()
+        with engine.connect() as connection:
+            count, id_sum = connection.execute(select(func.count(), func.coalesce(func.sum(Todo.id), 0))).one()
+        with self._lock:
+            in_sync = (columns.live, columns.id_sum) == (count, id_sum)
+        if not in_sync:
+            self._reconcile(name, engine)
+
+    def _reconcile(self, name: str, engine: Engine) -> None:
+        """Rows inserted or deleted without a new updated_at (moves, purges, other workers' deletes)"""
+        with engine.connect() as connection:
+            current = set(connection.execute(select(Todo.id)).scalars())
+        with self._lock:
+            columns = self.columns[name]
+            mirrored = {todo_id for todo_id, flags in zip(columns.ids, columns.flags) if flags & LIVE}
+            for todo_id in mirrored - current:
+                columns.remove(todo_id)
+        missing = sorted(current - mirrored)
+        for start in range(0, len(missing), LOAD_BATCH):
+            with engine.connect() as connection:
+                rows = connection.execute(
+                    select(*COLUMNS).where(Todo.id.in_(missing[start:start + LOAD_BATCH]))
+                ).all()
+            with self._lock:
+                for row in rows:
+                    columns.upsert(row, force=True)
+        self.reconciles += 1
+        logger.info(f"Todo mirror reconciled {name}: -{len(mirrored - current)} +{len(missing)} rows")
+
+    # ------------------------------------------------------------------
+    # Write hooks (called by the routes after commit)
+    # ------------------------------------------------------------------
+
+    def apply(self, name: str, row) -> None:
+        with self._lock:
+            columns = self.columns.get(name)
+            if columns is not None:
+                columns.upsert(row)
+
+    def discard(self, name: str, todo_id: int) -> None:
+        with self._lock:
+            columns = self.columns.get(name)
+            if columns is not None:
+                columns.remove(todo_id)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def count(self, **filters) -> int:
+        """Rows matching TodoColumns.count() filters on every shard"""
+        with self._lock:
+            return sum(columns.count(**filters) for columns in self.columns.values())
+
+    def _snapshot(self) -> List[Tuple[str, TodoColumns, List[SearchChunk]]]:
+        with self._lock:
+            return [(name, columns, columns.chunks()) for name, columns in self.columns.items()]
+
+    def search(self, term: str, limit: int) -> List[Dict]:
+        """Todos whose title or description contains term, in shard order then id order"""
+        from database.shards import shard_router
+
+        term = term.lower()
+        rows: List[Dict] = []
+        for name, columns, chunks in self._snapshot():
+            accept = (lambda owner_id, name=name: shard_router.owns(name, owner_id))
+            ids = scan(chunks, term, limit - len(rows), accept)
+            # Rows as they are now: a write since the snapshot may have changed or removed them
+            with self._lock:
+                for todo_id in ids:
+                    row = columns.matching_row(todo_id, term)
+                    if row is not None:
+                        rows.append(row)
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def count_matches(self, term: str) -> int:
+        """Number of todos search() would find without a limit"""
+        from database.shards import shard_router
+
+        return sum(
+            len(scan(chunks, term, sum(len(chunk.ids) for chunk in chunks) + 1,
+                     lambda owner_id, name=name: shard_router.owns(name, owner_id)))
+            for name, _, chunks in self._snapshot()
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = sum(columns.live for columns in self.columns.values())
+            memory: Dict[str, int] = {}
+            for columns in self.columns.values():
+                for part, size in columns.memory().items():
+                    memory[part] = memory.get(part, 0) + size
+        total = sum(memory.values())
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "rows": rows,
+            "bytes": total,
+            "bytes_per_row": round(total / rows, 1) if rows else None,
+            "refreshes": self.refreshes,
+            "reconciles": self.reconciles,
+            "refresh_age_s": round(time.monotonic() - self.refreshed_at, 1) if self.refreshed_at else None,
+        }
+
+
+todo_mirror = TodoMirror()
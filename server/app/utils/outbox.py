@@ -0,0 +1,401 @@
+"""
+Transactional outbox for todo change events
+
+Writing an audit record to a second store from the write routes would add
+its latency to every write, and could record a change that then rolled
+back (or lose one that committed). Instead each write inserts an outbox row
+in its own transaction (record()), and a relay delivers the rows later:
+
+  * the relay is a thread per worker process. It claims up to
+    OUTBOX_BATCH_SIZE of the oldest unclaimed rows on each shard by writing
+    a lease (claimed_by, claimed_until; SKIP LOCKED on PostgreSQL), so
+    several workers share the table. It delivers the batch to every sink
+    and then deletes the rows
+  * at-least-once: a batch is deleted only after every sink accepted it.
+    When a sink fails, the claim is released and the batch is retried, with
+    exponential backoff up to OUTBOX_MAX_BACKOFF. A relay that dies
+    mid-batch leaves its lease to expire. Either way a sink may see an
+    event twice: consumers de-duplicate on (shard, id), and id increases
+    with commit order per shard
+  * sinks are registered with @sink_type and chosen with OUTBOX_SINKS:
+    "file" appends NDJSON and fsyncs before the batch is deleted, "http"
+    POSTs {"events": [...]} to OUTBOX_HTTP_URL, and "pubsub" hands each
+    batch to in-process subscribers (event_bus.subscribe)
+  * the relay is woken by this worker's writes and otherwise polls every
+    OUTBOX_POLL_INTERVAL seconds; a full batch is followed by the next one
+    straight away
+
+Writes by clear-completed are recorded by app/utils/purge.py. Copies made by
+database/move_tenant.py are not changes and are not recorded.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import config
+from app.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+outbox_table = OutboxEvent.__table__
+OUTBOX_INSERT = insert(outbox_table)
+EVENT_COLUMNS = (outbox_table.c.id, outbox_table.c.event, outbox_table.c.todo_id, outbox_table.c.owner_id,
+                 outbox_table.c.payload, outbox_table.c.created_at)
+
+# Delivered counts kept for events_per_second
+THROUGHPUT_WINDOW = 60.0
+
+
+def _jsonable(values: Dict) -> Dict:
+    return {key: value.isoformat() if isinstance(value, (datetime, date)) else value
+            for key, value in values.items()}
+
+
+# ============================================================================
+# SINKS
+# ============================================================================
+
+class Sink:
+    """Destination of outbox events; deliver() raises unless the whole batch was accepted"""
+
+    name = "sink"
+
+    def deliver(self, events: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink(Sink):
+    """Appends events as NDJSON, fsynced before the batch counts as delivered"""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def deliver(self, events: List[Dict]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class HttpSink(Sink):
+    """POSTs {"events": [...]} to a collector; any non-2xx answer fails the batch"""
+
+    name = "http"
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self._client = None
+
+    def deliver(self, events: List[Dict]) -> None:
+        if self._client is None:
+            # Imported on first delivery: most deployments never use this sink
+            import httpx
+
+            self._client = httpx.Client(timeout=self.timeout)
+        self._client.post(self.url, json={"events": events}).raise_for_status()
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class EventBus:
+    """In-process publish/subscribe of delivered batches"""
+
+    def __init__(self):
+        self._subscribers: List[Callable[[List[Dict]], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[List[Dict]], None]) -> Callable[[], None]:
+        """Call callback(events) for every batch; returns the unsubscribe function"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def publish(self, events: List[Dict]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(events)
+
+
+event_bus = EventBus()
+
+
+class PubSubSink(Sink):
+    """Publishes to an EventBus; a subscriber that raises fails the batch"""
+
+    name = "pubsub"
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+
+    def deliver(self, events: List[Dict]) -> None:
+        self.bus.publish(events)
+
+
+SINK_TYPES: Dict[str, Callable[[], Sink]] = {}
+
+
+def sink_type(name: str):
+    """Register a factory for the sink named in OUTBOX_SINKS"""
+    def register(factory: Callable[[], Sink]) -> Callable[[], Sink]:
+        SINK_TYPES[name] = factory
+        return factory
+    return register
+
+
+@sink_type("file")
+def _file_sink() -> Sink:
+    return FileSink(config.OUTBOX_FILE)
+
+
+@sink_type("http")
+def _http_sink() -> Sink:
+    return HttpSink(config.OUTBOX_HTTP_URL)
+
+
+@sink_type("pubsub")
+def _pubsub_sink() -> Sink:
+    return PubSubSink(event_bus)
+
+
+# ============================================================================
+# RELAY
+# ============================================================================
+
+class OutboxRelay:
+    """Claims, delivers and deletes outbox rows in batches"""
+
+    def __init__(
+        self,
+        enabled: bool = config.OUTBOX_ENABLED,
+        sinks: Optional[List[Sink]] = None,
+        engines: Optional[Callable[[], List[Tuple[str, Engine]]]] = None,
+        batch_size: int = config.OUTBOX_BATCH_SIZE,
+        lease: float = config.OUTBOX_LEASE_SECONDS,
+        poll_interval: float = config.OUTBOX_POLL_INTERVAL,
+        max_backoff: float = config.OUTBOX_MAX_BACKOFF,
+    ):
+        self.enabled = enabled
+        self.sinks = sinks
+        self._engines = engines
+        self.batch_size = batch_size
+        self.lease = timedelta(seconds=lease)
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.worker_id: Optional[str] = None
+        self.delivered = 0
+        self.batches = 0
+        self.failures: Dict[str, int] = {}
+        self.last_error: Optional[str] = None
+        self.last_lag_ms: Optional[float] = None
+        self.delivery_ms: Optional[float] = None
+        self._recent: Deque[Tuple[float, int]] = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def engines(self) -> List[Tuple[str, Engine]]:
+        if self._engines is not None:
+            return self._engines()
+        from database.shards import shard_router
+
+        return shard_router.engines()
+
+    def notify(self) -> None:
+        """Wake the relay (after this worker committed outbox rows)"""
+        if self.enabled:
+            self._wake.set()
+
+    # ------------------------------------------------------------------
+    # One batch
+    # ------------------------------------------------------------------
+
+    def _claim(self, engine: Engine) -> List:
+        now = datetime.utcnow()
+        free = or_(outbox_table.c.claimed_until.is_(None), outbox_table.c.claimed_until < now)
+        oldest = (
+            select(outbox_table.c.id).where(free).order_by(outbox_table.c.id)
+            .limit(self.batch_size).with_for_update(skip_locked=True)
+        )
+        with engine.begin() as connection:
+            rows = connection.execute(
+                update(outbox_table)
+                .where(outbox_table.c.id.in_(oldest.scalar_subquery()), free)
+                .values(claimed_by=self.worker_id, claimed_until=now + self.lease)
+                .returning(*EVENT_COLUMNS)
+            ).all()
+        return sorted(rows, key=lambda row: row.id)
+
+    def _release(self, engine: Engine, ids: List[int], delivered: bool) -> None:
+        mine = (outbox_table.c.id.in_(ids), outbox_table.c.claimed_by == self.worker_id)
+        with engine.begin() as connection:
+            if delivered:
+                connection.execute(delete(outbox_table).where(*mine))
+            else:
+                connection.execute(update(outbox_table).where(*mine).values(claimed_by=None, claimed_until=None))
+
+    def relay_batch(self, name: str, engine: Engine) -> int:
+        """Deliver one batch from a shard; the number of events (raises if a sink failed)"""
+        rows = self._claim(engine)
+        if not rows:
+            return 0
+        events = [{**_jsonable(row._asdict()), "shard": name} for row in rows]
+        ids = [row.id for row in rows]
+        started = time.perf_counter()
+        for sink in self.sinks:
+            try:
+                sink.deliver(events)
+            except Exception as e:
+                self.failures[sink.name] = self.failures.get(sink.name, 0) + 1
+                self._release(engine, ids, delivered=False)
+                raise RuntimeError(f"sink '{sink.name}' failed on {len(events)} events from {name}: {e}") from e
+        self._release(engine, ids, delivered=True)
+
+        now = time.monotonic()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.delivery_ms = elapsed_ms if self.delivery_ms is None else 0.8 * self.delivery_ms + 0.2 * elapsed_ms
+        self.last_lag_ms = round((datetime.utcnow() - rows[0].created_at).total_seconds() * 1000, 1)
+        self.delivered += len(rows)
+        self.batches += 1
+        self._recent.append((now, len(rows)))
+        while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW:
+            self._recent.popleft()
+        return len(rows)
+
+    def drain(self) -> int:
+        """Deliver until every shard's outbox is empty (or a sink fails)"""
+        total = 0
+        for name, engine in self.engines():
+            while True:
+                moved = self.relay_batch(name, engine)
+                total += moved
+                if moved < self.batch_size:
+                    break
+        return total
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        backoff = 0.0
+        while not self._stop.is_set():
+            try:
+                full = False
+                for name, engine in self.engines():
+                    full = self.relay_batch(name, engine) == self.batch_size or full
+                backoff = 0.0
+            except Exception as e:
+                self.last_error = str(e)
+                backoff = min(self.max_backoff, max(self.poll_interval, backoff * 2))
+                logger.error(f"Outbox delivery failed, retrying in {backoff:g}s: {e}")
+                self._stop.wait(backoff)
+                continue
+            if not full:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        # Set here, not in __init__: the app may be imported before fork
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        if self.sinks is None:
+            unknown = [name for name in config.OUTBOX_SINKS if name not in SINK_TYPES]
+            if unknown:
+                raise ValueError(f"Unknown OUTBOX_SINKS {', '.join(unknown)}. Choose from: {', '.join(SINK_TYPES)}")
+            self.sinks = [SINK_TYPES[name]() for name in config.OUTBOX_SINKS]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+        logger.info(f"Outbox relay started ({', '.join(sink.name for sink in self.sinks)})")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop after the batch in flight; undelivered rows stay for the next relay"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        for sink in self.sinks or []:
+            sink.close()
+
+    def pending_count(self) -> int:
+        total = 0
+        for _, engine in self.engines():
+            with engine.connect() as connection:
+                total += connection.execute(select(func.count()).select_from(outbox_table)).scalar()
+        return total
+
+    def stats(self) -> Dict:
+        window = sum(count for _, count in self._recent)
+        return {
+            "enabled": self.enabled,
+            "running": self._thread is not None,
+            "sinks": [sink.name for sink in self.sinks or []],
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "mean_batch": round(self.delivered / self.batches, 1) if self.batches else None,
+            "events_per_second": round(window / THROUGHPUT_WINDOW, 2),
+            "delivery_ms": round(self.delivery_ms, 2) if self.delivery_ms is not None else None,
+            "last_lag_ms": self.last_lag_ms,
+            "failures": dict(self.failures),
+            "last_error": self.last_error,
+        }
+
+
+outbox_relay = OutboxRelay()
+
+
+def record(db: Session, event: str, row, changed: Optional[List[str]] = None) -> None:
+    """
+    Add the outbox row for a todo write to db's transaction (nothing when
+    the outbox is disabled). row is the todo as RETURNING gave it; call
+    outbox_relay.notify() after the commit.
+    """
+    if not outbox_relay.enabled:
+        return
+    payload = _jsonable(row._asdict())
+    if changed is not None:
+        payload["changed"] = changed
+    db.execute(OUTBOX_INSERT, {
+        "event": event,
+        "todo_id": row.id,
+        "owner_id": row.owner_id,
+        "payload": payload,
+        "created_at": datetime.utcnow(),
+    })
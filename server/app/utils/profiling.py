@@ -0,0 +1,469 @@
+"""
+On-demand per-request profiling
+
+When PROFILING_ENABLED, a request can be run under a sampling profiler: it
+sends "X-Profile: 1" with the admin token, or it is picked at random (1 in
+PROFILE_SAMPLE_RATE). Nothing is installed when profiling is disabled, and
+requests that are not profiled pay one context variable lookup per hook.
+
+How a request's stacks are found:
+
+  * the profiler middleware and every sync endpoint (which FastAPI runs in
+    the threadpool) register their own frame as an anchor for the duration
+    of the request. A sampler thread wakes every PROFILE_INTERVAL_MS, reads
+    sys._current_frames() of the threads holding anchors and keeps the part
+    of each stack above the anchor, weighted by the wall time since the
+    previous sample. Ticks in which none of the request's frames is running
+    (awaiting I/O, or sync dependencies in the threadpool) are recorded as
+    "(waiting)", so the weights add up to the request's wall time
+  * SQLAlchemy cursor events record every statement executed in the
+    request's context (shard fan-out threads included) with its timing, and
+    samples taken while a statement runs end in a "SQL: <statement>" frame
+
+Profiles are JSON files in PROFILE_DIR, so any worker can serve them, and are
+exported as speedscope JSON (https://www.speedscope.app: the wall-clock
+samples plus one evented SQL timeline per thread) or as collapsed stacks for
+flamegraph.pl.
+"""
+import functools
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Profile of the request being served, if it is profiled
+active_profile: ContextVar[Optional["Profile"]] = ContextVar("active_profile", default=None)
+
+# Distinct consecutive stacks kept per profile; longer requests stop sampling
+MAX_SAMPLES = 20_000
+# Characters of a statement kept in frame names and summaries
+STATEMENT_CHARS = 120
+WAITING = ("(waiting)", "", 0)
+
+PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$")
+
+
+def _statement_name(statement: str) -> str:
+    return "SQL: " + " ".join(statement.split())[:STATEMENT_CHARS]
+
+
+# ============================================================================
+# PROFILE
+# ============================================================================
+
+class Profile:
+    """Samples and SQL statements of one request"""
+
+    def __init__(self, method: str, path: str, trigger: str):
+        self.started_at = datetime.utcnow()
+        # Ids sort by start time, which is how storage prunes and lists them
+        self.id = f"{self.started_at:%Y%m%dT%H%M%S%f}-{secrets.token_hex(4)}"
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.status: Optional[int] = None
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.truncated = False
+        self.ticks = 0
+        # (name, file, line) per frame; samples are stacks of frame indexes
+        # (root first) with their weight in seconds, consecutive repeats of a
+        # stack merged into one sample
+        self.frames: List[Tuple[str, str, int]] = []
+        self.samples: List[Tuple[int, ...]] = []
+        self.weights: List[float] = []
+        self.sql: List[Tuple[str, int, float, float]] = []
+        self._frame_index: Dict[object, int] = {}
+        self._sql_open: Dict[int, Tuple[str, float]] = {}
+        self._last_sample = self.started
+
+    def frame(self, key: object, name: str, file: str = "", line: int = 0) -> int:
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append((name, file, line))
+        return index
+
+    def code_frame(self, code) -> int:
+        index = self._frame_index.get(code)
+        if index is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            index = self.frame(code, name, code.co_filename, code.co_firstlineno)
+        return index
+
+    def add_sample(self, stacks: List[Tuple[int, ...]], now: float) -> None:
+        """Record the stacks seen in one tick, splitting the elapsed time between them"""
+        if self.truncated:
+            return
+        self.ticks += 1
+        elapsed = now - self._last_sample
+        self._last_sample = now
+        if not stacks:
+            stacks = [(self.frame(WAITING, WAITING[0]),)]
+        weight = elapsed / len(stacks)
+        for stack in stacks:
+            if self.samples and self.samples[-1] == stack:
+                self.weights[-1] += weight
+                continue
+            if len(self.samples) >= MAX_SAMPLES:
+                self.truncated = True
+                return
+            self.samples.append(stack)
+            self.weights.append(weight)
+
+    def sql_started(self, thread_id: int, statement: str) -> None:
+        self._sql_open[thread_id] = (statement, time.perf_counter())
+
+    def sql_finished(self, thread_id: int) -> None:
+        opened = self._sql_open.pop(thread_id, None)
+        if opened is not None:
+            statement, started = opened
+            self.sql.append((statement, thread_id, started, time.perf_counter()))
+
+    def sql_running(self, thread_id: int) -> Optional[str]:
+        opened = self._sql_open.get(thread_id)
+        return opened[0] if opened else None
+
+    def to_dict(self) -> Dict:
+        """Stored form: a summary plus the raw frames, samples and statements (times in ms)"""
+        ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+        return {
+            "summary": self.summary(),
+            "frames": [{"name": name, "file": file, "line": line} for name, file, line in self.frames],
+            "samples": [list(stack) for stack in self.samples],
+            "weights": [ms(weight) for weight in self.weights],
+            "sql": [
+                {"statement": statement, "thread": thread_id,
+                 "start": ms(started - self.started), "end": ms(ended - self.started)}
+                for statement, thread_id, started, ended in self.sql
+            ],
+        }
+
+    def summary(self) -> Dict:
+        wall = (self.finished or time.perf_counter()) - self.started
+        by_statement: Dict[str, List[float]] = defaultdict(list)
+        for statement, _, started, ended in self.sql:
+            by_statement[" ".join(statement.split())[:STATEMENT_CHARS]].append(ended - started)
+        top = sorted(by_statement.items(), key=lambda item: sum(item[1]), reverse=True)[:5]
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "wall_ms": round(wall * 1000, 2),
+            "ticks": self.ticks,
+            "samples": len(self.samples),
+            "truncated": self.truncated,
+            "sql": {
+                "count": len(self.sql),
+                "total_ms": round(sum(ended - started for _, _, started, ended in self.sql) * 1000, 2),
+                "top": [{"statement": statement, "count": len(times), "total_ms": round(sum(times) * 1000, 2)}
+                        for statement, times in top],
+            },
+        }
+
+
+# ============================================================================
+# SAMPLER
+# ============================================================================
+
+class Sampler:
+    """
+    Samples the stacks of the threads running profiled requests.
+
+    The thread is started with the first profile and sleeps on a condition
+    while no request is being profiled.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._profiles: Dict[Profile, None] = {}
+        # thread id -> {id(anchor frame): (anchor frame, profile)}
+        self._anchors: Dict[int, Dict[int, Tuple[object, Profile]]] = defaultdict(dict)
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, profile: Profile) -> None:
+        with self._condition:
+            self._profiles[profile] = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def end(self, profile: Profile) -> None:
+        with self._condition:
+            self._profiles.pop(profile, None)
+        profile.finished = time.perf_counter()
+
+    @contextmanager
+    def anchor(self, profile: Profile, frame) -> Iterator[None]:
+        """Attribute the stack above `frame` on this thread to `profile` while the block runs"""
+        thread_id = threading.get_ident()
+        with self._condition:
+            self._anchors[thread_id][id(frame)] = (frame, profile)
+        try:
+            yield
+        finally:
+            with self._condition:
+                anchors = self._anchors[thread_id]
+                anchors.pop(id(frame), None)
+                if not anchors:
+                    del self._anchors[thread_id]
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._profiles:
+                    self._condition.wait()
+            time.sleep(self.interval)
+            try:
+                self._sample()
+            except Exception as e:  # never let a sampling bug kill the thread
+                logger.error(f"Profile sampling failed: {e}")
+
+    def _sample(self) -> None:
+        with self._condition:
+            profiles = list(self._profiles)
+            anchors = {thread_id: dict(frames) for thread_id, frames in self._anchors.items()}
+        frames = sys._current_frames()
+        stacks: Dict[Profile, List[Tuple[int, ...]]] = defaultdict(list)
+        for thread_id, thread_anchors in anchors.items():
+            frame = frames.get(thread_id)
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                anchored = thread_anchors.get(id(frame))
+                if anchored is not None and anchored[0] is frame:
+                    profile = anchored[1]
+                    stack = [profile.code_frame(code) for code in reversed(codes)]
+                    statement = profile.sql_running(thread_id)
+                    if statement is not None:
+                        name = _statement_name(statement)
+                        stack.append(profile.frame(("sql", name), name))
+                    stacks[profile].append(tuple(stack))
+                    break
+                frame = frame.f_back
+        del frames
+        now = time.perf_counter()
+        with self._condition:
+            # A profile that ended meanwhile is being stored; leave it alone
+            for profile in profiles:
+                if profile in self._profiles:
+                    profile.add_sample(stacks.get(profile, []), now)
+
+
+sampler = Sampler(config.PROFILE_INTERVAL_MS / 1000)
+
+
+@contextmanager
+def profiled(profile: Profile, frame) -> Iterator[Profile]:
+    """Profile the block (the caller's request) with `frame` as the anchor on this thread"""
+    token = active_profile.set(profile)
+    sampler.begin(profile)
+    try:
+        with sampler.anchor(profile, frame):
+            yield profile
+    finally:
+        sampler.end(profile)
+        active_profile.reset(token)
+
+
+# ============================================================================
+# HOOKS
+# ============================================================================
+
+def _anchored(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    def run_endpoint_in_thread(*args, **kwargs):
+        profile = active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        with sampler.anchor(profile, sys._getframe()):
+            return endpoint(*args, **kwargs)
+
+    run_endpoint_in_thread.__profiled__ = True
+    return run_endpoint_in_thread
+
+
+def instrument_routes(app) -> int:
+    """
+    Anchor the threadpool stacks of sync endpoints; returns how many were wrapped.
+
+    FastAPI calls dependant.call of each route, so replacing it leaves the
+    route's signature, dependencies and OpenAPI schema untouched.
+    """
+    import asyncio
+
+    from fastapi.routing import APIRoute
+
+    wrapped = 0
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        call = route.dependant.call
+        if call is None or asyncio.iscoroutinefunction(call) or getattr(call, "__profiled__", False):
+            continue
+        route.dependant.call = _anchored(call)
+        wrapped += 1
+    return wrapped
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = active_profile.get()
+    if profile is not None:
+        profile.sql_started(threading.get_ident(), statement)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = active_profile.get()
+    if profile is not None:
+        profile.sql_finished(threading.get_ident())
+
+
+def _handle_error(exception_context) -> None:
+    profile = active_profile.get()
+    if profile is not None:
+        profile.sql_finished(threading.get_ident())
+
+
+def install_sql_hooks() -> None:
+    """Time statements of profiled requests on every engine (main database and shards)"""
+    for name, listener in (("before_cursor_execute", _before_cursor_execute),
+                           ("after_cursor_execute", _after_cursor_execute),
+                           ("handle_error", _handle_error)):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+def _path(profile_id: str, directory: str) -> str:
+    return os.path.join(directory, f"{profile_id}.json")
+
+
+def store(profile: Profile, directory: str = config.PROFILE_DIR, keep: int = config.PROFILE_KEEP) -> str:
+    """Write the profile and prune all but the newest `keep`"""
+    os.makedirs(directory, exist_ok=True)
+    path = _path(profile.id, directory)
+    partial = path + ".partial"
+    with open(partial, "w") as f:
+        json.dump(profile.to_dict(), f, separators=(",", ":"))
+    os.replace(partial, path)
+    stored = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in stored[:-keep] if keep > 0 else []:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+    return path
+
+
+def load(profile_id: str, directory: str = config.PROFILE_DIR) -> Optional[Dict]:
+    """A stored profile, or None if the id is malformed or unknown"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(_path(profile_id, directory)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def summaries(directory: str = config.PROFILE_DIR) -> List[Dict]:
+    """Summaries of the stored profiles, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        stored = load(name[:-len(".json")], directory)
+        if stored is not None:
+            found.append(stored["summary"])
+    return found
+
+
+# ============================================================================
+# EXPORT
+# ============================================================================
+
+def to_speedscope(stored: Dict) -> Dict:
+    """speedscope file: wall-clock samples plus an evented SQL timeline per thread"""
+    summary = stored["summary"]
+    frames = list(stored["frames"])
+    title = f"{summary['method']} {summary['path']}"
+    profiles = [{
+        "type": "sampled",
+        "name": f"{title} (wall time)",
+        "unit": "milliseconds",
+        "startValue": 0,
+        "endValue": round(sum(stored["weights"]), 3),
+        "samples": stored["samples"],
+        "weights": stored["weights"],
+    }]
+
+    statement_frames: Dict[str, int] = {}
+    by_thread: Dict[int, List[Dict]] = defaultdict(list)
+    for query in stored["sql"]:
+        name = _statement_name(query["statement"])
+        if name not in statement_frames:
+            statement_frames[name] = len(frames)
+            frames.append({"name": name})
+        by_thread[query["thread"]].append({**query, "frame": statement_frames[name]})
+    for number, (thread_id, queries) in enumerate(sorted(by_thread.items()), start=1):
+        events = []
+        for query in sorted(queries, key=lambda query: query["start"]):
+            events.append({"type": "O", "frame": query["frame"], "at": query["start"]})
+            events.append({"type": "C", "frame": query["frame"], "at": max(query["start"], query["end"])})
+        profiles.append({
+            "type": "evented",
+            "name": f"{title} SQL (thread {number})",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": summary["wall_ms"],
+            "events": events,
+        })
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{title} {summary['id']}",
+        "exporter": "todo-api",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def to_collapsed(stored: Dict) -> str:
+    """Collapsed stacks ("a;b;c <microseconds>") for flamegraph.pl / inferno"""
+    names = []
+    for frame in stored["frames"]:
+        name = frame["name"]
+        if frame.get("file"):
+            name += f" ({os.path.basename(frame['file'])}:{frame['line']})"
+        names.append(name.replace(";", ","))
+    totals: Dict[str, float] = defaultdict(float)
+    for stack, weight in zip(stored["samples"], stored["weights"]):
+        totals[";".join(names[index] for index in stack)] += weight
+    return "".join(f"{stack} {round(weight * 1000)}\n" for stack, weight in totals.items() if round(weight * 1000))
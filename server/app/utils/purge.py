@@ -0,0 +1,107 @@
+"""
+Chunked purge of completed todos
+
+Deleting every completed todo in one statement holds locks for seconds on a
+large table and produces one huge transaction (WAL bloat). Instead completed
+todos are taken in id order, batch by batch: each transaction selects the
+next batch_size completed ids after the last one handled and deletes (and
+optionally copies to todos_archive first) exactly those, with a pause
+between batches so other writers get the lock. Keyset batches stay full
+however sparse the ids are (a shard's ids span SHARD_ID_SPAN). With the
+outbox enabled, each batch's deletions are recorded in its transaction as
+todo.deleted events without a payload.
+
+Only todos that exist when the purge starts are considered: each shard's
+highest completed id is fixed when the purge reaches it and the last id
+handled is kept in the job's progress, so an interrupted purge resumes
+after it.
+"""
+import logging
+import time
+from typing import Dict
+
+from sqlalchemy import and_, delete, func, insert, literal, select
+from sqlalchemy.engine import Engine
+
+from app import config
+from app.models.outbox import OutboxEvent
+from app.models.todo import ArchivedTodo, Todo
+from app.utils.jobs import JobContext, job_type
+from app.utils.outbox import outbox_relay
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLUMNS = ("title", "description", "completed", "owner_id", "created_at", "updated_at", "completed_at")
+
+
+@job_type("clear_completed", executor="thread", max_concurrency=1, resumable=True)
+def purge_completed(
+    job: JobContext,
+    batch_size: int = config.PURGE_BATCH_SIZE,
+    pause: float = config.PURGE_PAUSE_SECONDS,
+) -> Dict:
+    """Delete (or archive) completed todos in id-ordered batches on every shard, reporting progress on job"""
+    from database.shards import shard_router
+
+    shard_router.configure()
+    totals = {"deleted": 0, "archived": 0, "batches": 0}
+    for name, engine in shard_router.engines():
+        result = _purge_shard(job, name, engine, batch_size, pause)
+        for key in totals:
+            totals[key] += result[key]
+
+    logger.info(f"Purged {totals['deleted']} completed todos in {totals['batches']} batches "
+                f"(archived {totals['archived']})")
+    return totals
+
+
+def _purge_shard(job: JobContext, name: str, engine: Engine, batch_size: int, pause: float) -> Dict:
+    """One shard's purge; its progress is kept under job.progress["shards"][name]"""
+    archive = bool(job.params.get("archive"))
+    shards = dict(job.progress.get("shards", {}))
+    if name not in shards:
+        with engine.connect() as connection:
+            low, high, total = connection.execute(
+                select(func.min(Todo.id), func.max(Todo.id), func.count()).where(Todo.completed.is_(True))
+            ).one()
+        shards[name] = {"total": total, "deleted": 0, "archived": 0, "batches": 0,
+                        "last_id": low - 1 if low is not None else 0, "high": high if high is not None else -1}
+        job.update(shards=shards)
+        job.flush()
+
+    progress = dict(shards[name])
+    deleted, archived, batches = progress["deleted"], progress["archived"], progress["batches"]
+    last_id = progress["last_id"]
+    high = progress["high"]
+    while last_id < high:
+        job.check()
+        with engine.begin() as connection:
+            ids = connection.execute(
+                select(Todo.id)
+                .where(Todo.completed.is_(True), Todo.id > last_id, Todo.id <= high)
+                .order_by(Todo.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            batch = and_(Todo.id.in_(ids), Todo.completed.is_(True))
+            if archive:
+                rows = select(Todo.id, *(getattr(Todo, column) for column in ARCHIVE_COLUMNS),
+                              func.current_timestamp()).where(batch)
+                archived += connection.execute(
+                    insert(ArchivedTodo).from_select(["todo_id", *ARCHIVE_COLUMNS, "archived_at"], rows)
+                ).rowcount
+            if outbox_relay.enabled:
+                events = select(literal("todo.deleted"), Todo.id, Todo.owner_id, func.current_timestamp()).where(batch)
+                connection.execute(
+                    insert(OutboxEvent).from_select(["event", "todo_id", "owner_id", "created_at"], events)
+                )
+            deleted += connection.execute(delete(Todo).where(batch)).rowcount
+        outbox_relay.notify()
+        batches += 1
+        last_id = ids[-1]
+        shards[name] = {**progress, "deleted": deleted, "archived": archived, "batches": batches, "last_id": last_id}
+        job.update(shards=dict(shards))
+        if pause and len(ids) == batch_size and last_id < high:
+            time.sleep(pause)
+    return {"deleted": deleted, "archived": archived, "batches": batches}
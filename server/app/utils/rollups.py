@@ -0,0 +1,440 @@
+"""
+Daily and per-owner rollups of todo activity
+
+todo_stats_daily holds, per UTC day, how many of the current todos were
+created that day, how many were completed that day and their summed time to
+complete. todo_stats_owner holds each owner's current todo count and how
+many of them are completed (pagination totals, see app/utils/counts.py).
+Rows are kept in step with the todos table by row triggers
+(created with the tables, see install_triggers()), so every write path -
+single-statement API writes, the clear-completed purge, ad-hoc SQL - updates
+them in its own transaction without an extra round trip. The seeder drops
+the triggers for its bulk load and calls backfill() instead.
+
+Triggers apply the old row's contribution negatively and the new row's
+positively with an upsert (INSERT ... ON CONFLICT DO UPDATE), so concurrent
+writers never lose increments. Time series are answered from these rows in
+O(days in range); recompute() aggregates the raw table for backfills and
+consistency checks.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List
+
+from sqlalchemy import delete, event, func, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from app.models.stats import DailyTodoStats, OwnerTodoStats
+from app.models.todo import Todo
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("day", "week", "month")
+
+# day -> [created, completed, completion_seconds]
+Deltas = Dict[date, List[float]]
+# owner_id -> [total, completed]
+OwnerCounts = Dict[int, List[int]]
+
+
+# ============================================================================
+# DELTAS
+# ============================================================================
+
+def new_deltas() -> Deltas:
+    return defaultdict(lambda: [0, 0, 0.0])
+
+
+def apply_deltas(connection: Connection, deltas: Deltas) -> None:
+    """Upsert deltas into todo_stats_daily on connection"""
+    rows = [
+        {"day": day, "created": created, "completed": completed, "completion_seconds": seconds}
+        for day, (created, completed, seconds) in sorted(deltas.items())
+        if created or completed or seconds
+    ]
+    if not rows:
+        return
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(DailyTodoStats.__table__)
+    table = DailyTodoStats.__table__
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.day],
+        set_={
+            "created": table.c.created + statement.excluded.created,
+            "completed": table.c.completed + statement.excluded.completed,
+            "completion_seconds": table.c.completion_seconds + statement.excluded.completion_seconds,
+        },
+    )
+    connection.execute(statement, rows)
+
+
+# ============================================================================
+# TRIGGERS
+# ============================================================================
+
+def _sqlite_apply(row: str, sign: int) -> str:
+    """Trigger statements adding (sign=1) or removing (sign=-1) OLD/NEW's contribution"""
+    return f"""
+        INSERT INTO todo_stats_daily (day, created, completed, completion_seconds)
+        SELECT date({row}.created_at), {sign}, 0, 0 WHERE {row}.created_at IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET created = created + excluded.created;
+        INSERT INTO todo_stats_daily (day, created, completed, completion_seconds)
+        SELECT date({row}.completed_at), 0, {sign},
+               {sign} * (julianday({row}.completed_at) - julianday({row}.created_at)) * 86400
+        WHERE {row}.completed_at IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET completed = completed + excluded.completed,
+            completion_seconds = completion_seconds + excluded.completion_seconds;"""
+
+
+def _sqlite_apply_owner(row: str, sign: int) -> str:
+    return f"""
+        INSERT INTO todo_stats_owner (owner_id, total, completed)
+        SELECT {row}.owner_id, {sign}, {sign} * {row}.completed WHERE {row}.owner_id IS NOT NULL
+        ON CONFLICT(owner_id) DO UPDATE SET total = total + excluded.total,
+            completed = completed + excluded.completed;"""
+
+
+TRIGGERS = {
+    "sqlite": [
+        f"""CREATE TRIGGER IF NOT EXISTS todos_stats_daily_insert AFTER INSERT ON todos
+        BEGIN {_sqlite_apply("NEW", 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS todos_stats_daily_update AFTER UPDATE OF created_at, completed_at ON todos
+        WHEN OLD.created_at IS NOT NEW.created_at OR OLD.completed_at IS NOT NEW.completed_at
+        BEGIN {_sqlite_apply("OLD", -1)} {_sqlite_apply("NEW", 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS todos_stats_daily_delete AFTER DELETE ON todos
+        BEGIN {_sqlite_apply("OLD", -1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS todos_stats_owner_insert AFTER INSERT ON todos
+        BEGIN {_sqlite_apply_owner("NEW", 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS todos_stats_owner_update AFTER UPDATE OF owner_id, completed ON todos
+        WHEN OLD.owner_id IS NOT NEW.owner_id OR OLD.completed IS NOT NEW.completed
+        BEGIN {_sqlite_apply_owner("OLD", -1)} {_sqlite_apply_owner("NEW", 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS todos_stats_owner_delete AFTER DELETE ON todos
+        BEGIN {_sqlite_apply_owner("OLD", -1)}
+        END""",
+    ],
+    # Kept in sync with database/migrations/006_todo_stats_triggers.sql and
+    # 008_todo_stats_owner.sql
+    "postgresql": [
+        """CREATE OR REPLACE FUNCTION todo_stats_daily_apply(
+            row_created TIMESTAMP, row_completed TIMESTAMP, sign INTEGER) RETURNS void AS $$
+        BEGIN
+            IF row_created IS NOT NULL THEN
+                INSERT INTO todo_stats_daily AS s (day, created, completed, completion_seconds)
+                VALUES (row_created::date, sign, 0, 0)
+                ON CONFLICT (day) DO UPDATE SET created = s.created + EXCLUDED.created;
+            END IF;
+            IF row_completed IS NOT NULL THEN
+                INSERT INTO todo_stats_daily AS s (day, created, completed, completion_seconds)
+                VALUES (row_completed::date, 0, sign, sign * EXTRACT(EPOCH FROM row_completed - row_created))
+                ON CONFLICT (day) DO UPDATE SET completed = s.completed + EXCLUDED.completed,
+                    completion_seconds = s.completion_seconds + EXCLUDED.completion_seconds;
+            END IF;
+        END $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION todo_stats_daily_trigger() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+                    AND OLD.completed_at IS NOT DISTINCT FROM NEW.completed_at THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM todo_stats_daily_apply(OLD.created_at, OLD.completed_at, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM todo_stats_daily_apply(NEW.created_at, NEW.completed_at, 1);
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS todos_stats_daily ON todos",
+        """CREATE TRIGGER todos_stats_daily
+        AFTER INSERT OR DELETE OR UPDATE OF created_at, completed_at ON todos
+        FOR EACH ROW EXECUTE FUNCTION todo_stats_daily_trigger()""",
+        """CREATE OR REPLACE FUNCTION todo_stats_owner_apply(
+            row_owner INTEGER, row_completed BOOLEAN, sign INTEGER) RETURNS void AS $$
+        BEGIN
+            IF row_owner IS NOT NULL THEN
+                INSERT INTO todo_stats_owner AS s (owner_id, total, completed)
+                VALUES (row_owner, sign, CASE WHEN row_completed THEN sign ELSE 0 END)
+                ON CONFLICT (owner_id) DO UPDATE SET total = s.total + EXCLUDED.total,
+                    completed = s.completed + EXCLUDED.completed;
+            END IF;
+        END $$ LANGUAGE plpgsql""",
+        """CREATE OR REPLACE FUNCTION todo_stats_owner_trigger() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.owner_id IS NOT DISTINCT FROM NEW.owner_id
+                    AND OLD.completed IS NOT DISTINCT FROM NEW.completed THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM todo_stats_owner_apply(OLD.owner_id, OLD.completed, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM todo_stats_owner_apply(NEW.owner_id, NEW.completed, 1);
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS todos_stats_owner ON todos",
+        """CREATE TRIGGER todos_stats_owner
+        AFTER INSERT OR DELETE OR UPDATE OF owner_id, completed ON todos
+        FOR EACH ROW EXECUTE FUNCTION todo_stats_owner_trigger()""",
+    ],
+}
+
+DROP_TRIGGERS = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS todos_stats_daily_insert",
+        "DROP TRIGGER IF EXISTS todos_stats_daily_update",
+        "DROP TRIGGER IF EXISTS todos_stats_daily_delete",
+        "DROP TRIGGER IF EXISTS todos_stats_owner_insert",
+        "DROP TRIGGER IF EXISTS todos_stats_owner_update",
+        "DROP TRIGGER IF EXISTS todos_stats_owner_delete",
+    ],
+    "postgresql": [
+        "DROP TRIGGER IF EXISTS todos_stats_daily ON todos",
+        "DROP TRIGGER IF EXISTS todos_stats_owner ON todos",
+    ],
+}
+
+
+def install_triggers(connection: Connection) -> None:
+    """Create the rollup triggers on todos (idempotent)"""
+    statements = TRIGGERS.get(connection.dialect.name)
+    if statements is None:
+        logger.warning(f"Rollups are not maintained on {connection.dialect.name}")
+        return
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    _fill_owner_counts(connection)
+
+
+def _fill_owner_counts(connection: Connection) -> None:
+    """
+    Fill a new, empty todo_stats_owner from existing todos, so upgrading a
+    database does not leave it counting only the todos written since
+    """
+    table = OwnerTodoStats.__table__
+    if connection.execute(select(table.c.owner_id).limit(1)).first() is not None:
+        return
+    if connection.execute(select(Todo.id).limit(1)).first() is None:
+        return
+    counts = recompute_owners(connection)
+    apply_owner_counts(connection, counts)
+    logger.info(f"Filled per-owner rollups for {len(counts)} owners")
+
+
+def drop_triggers(connection: Connection) -> None:
+    """Remove the rollup triggers, e.g. for a bulk load followed by backfill()"""
+    for statement in DROP_TRIGGERS.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+
+
+def _after_create(metadata, connection: Connection, **kw) -> None:
+    inspector = inspect(connection)
+    if all(inspector.has_table(model.__tablename__) for model in (DailyTodoStats, OwnerTodoStats)):
+        install_triggers(connection)
+
+
+if not event.contains(DailyTodoStats.metadata, "after_create", _after_create):
+    event.listen(DailyTodoStats.metadata, "after_create", _after_create)
+
+
+# ============================================================================
+# RECOMPUTE / BACKFILL
+# ============================================================================
+
+def _as_date(value) -> date:
+    # SQLite returns date() as 'YYYY-MM-DD' text
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def recompute(connection: Connection) -> Deltas:
+    """Aggregate the raw todos table into per-day rows (full scan)"""
+    if connection.dialect.name == "postgresql":
+        elapsed = func.extract("epoch", Todo.completed_at - Todo.created_at)
+    else:
+        elapsed = (func.julianday(Todo.completed_at) - func.julianday(Todo.created_at)) * 86400
+    totals = new_deltas()
+
+    created_day = func.date(Todo.created_at)
+    for day, count in connection.execute(select(created_day, func.count()).group_by(created_day)):
+        totals[_as_date(day)][0] += count
+
+    completed_day = func.date(Todo.completed_at)
+    query = (
+        select(completed_day, func.count(), func.coalesce(func.sum(elapsed), 0))
+        .where(Todo.completed_at.is_not(None))
+        .group_by(completed_day)
+    )
+    for day, count, seconds in connection.execute(query):
+        row = totals[_as_date(day)]
+        row[1] += count
+        row[2] += float(seconds)
+    return totals
+
+
+def recompute_owners(connection: Connection) -> OwnerCounts:
+    """Count each owner's todos in the raw todos table (full scan)"""
+    query = (
+        select(Todo.owner_id, func.count(), func.count().filter(Todo.completed.is_(True)))
+        .where(Todo.owner_id.is_not(None))
+        .group_by(Todo.owner_id)
+    )
+    return {owner_id: [total, completed] for owner_id, total, completed in connection.execute(query)}
+
+
+def apply_owner_counts(connection: Connection, counts: OwnerCounts) -> None:
+    """Insert per-owner rows into an empty todo_stats_owner"""
+    rows = [
+        {"owner_id": owner_id, "total": total, "completed": completed}
+        for owner_id, (total, completed) in sorted(counts.items())
+    ]
+    if rows:
+        connection.execute(OwnerTodoStats.__table__.insert(), rows)
+
+
+def backfill(engine: Engine) -> int:
+    """Rebuild todo_stats_daily and todo_stats_owner from the todos table; returns daily rows written"""
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # Hold off writers so no delta lands between the scan and the swap
+            connection.execute(text("LOCK TABLE todos IN SHARE MODE"))
+        totals = recompute(connection)
+        connection.execute(delete(DailyTodoStats))
+        apply_deltas(connection, totals)
+        owners = recompute_owners(connection)
+        connection.execute(delete(OwnerTodoStats))
+        apply_owner_counts(connection, owners)
+    logger.info(f"Backfilled {len(totals)} daily and {len(owners)} per-owner rollup rows")
+    return len(totals)
+
+
+def stored(connection: Connection) -> Deltas:
+    """Current rollup rows, in the same shape as recompute()"""
+    rows = new_deltas()
+    table = DailyTodoStats.__table__
+    for day, created, completed, seconds in connection.execute(
+        select(table.c.day, table.c.created, table.c.completed, table.c.completion_seconds)
+    ):
+        rows[day] = [created, completed, seconds]
+    return rows
+
+
+def stored_owners(connection: Connection) -> OwnerCounts:
+    table = OwnerTodoStats.__table__
+    return {
+        owner_id: [total, completed]
+        for owner_id, total, completed in connection.execute(
+            select(table.c.owner_id, table.c.total, table.c.completed)
+        )
+        # Owners whose todos were all deleted keep a zero row
+        if total or completed
+    }
+
+
+def compare(engine: Engine, tolerance: float = 1e-3) -> List[str]:
+    """Differences between the rollups and a raw recomputation"""
+    with engine.connect() as connection:
+        expected, actual = recompute(connection), stored(connection)
+        expected_owners, actual_owners = recompute_owners(connection), stored_owners(connection)
+    problems = []
+    for day in sorted(set(expected) | set(actual)):
+        want, have = expected.get(day, [0, 0, 0.0]), actual.get(day, [0, 0, 0.0])
+        if want[0] != have[0] or want[1] != have[1] or abs(want[2] - have[2]) > tolerance * max(1.0, abs(want[2])):
+            problems.append(f"{day}: expected created={want[0]} completed={want[1]} seconds={want[2]:.0f}, "
+                            f"stored created={have[0]} completed={have[1]} seconds={have[2]:.0f}")
+    for owner_id in sorted(set(expected_owners) | set(actual_owners)):
+        want, have = expected_owners.get(owner_id, [0, 0]), actual_owners.get(owner_id, [0, 0])
+        if want != have:
+            problems.append(f"owner {owner_id}: expected total={want[0]} completed={want[1]}, "
+                            f"stored total={have[0]} completed={have[1]}")
+    return problems
+
+
+# ============================================================================
+# TIME SERIES
+# ============================================================================
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, bucket: str) -> date:
+    """Start of the bucket after start's, or date.max past the last one"""
+    try:
+        if bucket == "week":
+            return start + timedelta(days=7)
+        if bucket == "month":
+            return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return start + timedelta(days=1)
+    except OverflowError:
+        return date.max
+
+
+def bucket_count(start: date, end: date, bucket: str) -> int:
+    """Buckets from start's to end's (inclusive), without walking them"""
+    first, last = bucket_start(start, bucket), bucket_start(end, bucket)
+    if last < first:
+        return 0
+    if bucket == "month":
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days // (7 if bucket == "week" else 1) + 1
+
+
+def bucket_sums(connection: Connection, bucket: str, start: date, end: date) -> Deltas:
+    """Rollup rows between start and end (inclusive), summed per bucket start"""
+    table = DailyTodoStats.__table__
+    query = (
+        select(table.c.day, table.c.created, table.c.completed, table.c.completion_seconds)
+        .where(table.c.day >= start, table.c.day <= end)
+    )
+    sums = new_deltas()
+    for day, created, completed, seconds in connection.execute(query):
+        row = sums[bucket_start(_as_date(day), bucket)]
+        row[0] += created
+        row[1] += completed
+        row[2] += seconds
+    return sums
+
+
+def merge_sums(parts: List[Deltas]) -> Deltas:
+    """Add up bucket_sums() from several databases (shards)"""
+    merged = new_deltas()
+    for part in parts:
+        for key, (created, completed, seconds) in part.items():
+            row = merged[key]
+            row[0] += created
+            row[1] += completed
+            row[2] += seconds
+    return merged
+
+
+def build_series(sums: Deltas, bucket: str, start: date, end: date) -> List[Dict]:
+    """One point per bucket from start to end, empty buckets included"""
+    series = []
+    current = bucket_start(start, bucket)
+    # Counted, not compared with end: the bucket after date.max's is date.max
+    for _ in range(bucket_count(start, end, bucket)):
+        created, completed, seconds = sums.get(current, (0, 0, 0.0))
+        series.append({
+            "start": current.isoformat(),
+            "created": created,
+            "completed": completed,
+            "avg_completion_seconds": round(seconds / completed, 1) if completed else None,
+        })
+        current = next_bucket(current, bucket)
+    return series
+
+
+def timeseries(connection: Connection, bucket: str, start: date, end: date) -> List[Dict]:
+    """Created/completed counts per bucket between start and end (inclusive)"""
+    return build_series(bucket_sums(connection, bucket, start, end), bucket, start, end)
@@ -0,0 +1,262 @@
+"""
+Per-owner title index for autocomplete (GET /api/todos/suggest)
+
+Each owner's distinct titles are kept lowercased in a sorted list, so the
+titles starting with a prefix are a bisect followed by a short forward scan:
+O(log n + limit) per keystroke instead of an ILIKE scan of the table.
+
+  * built lazily from the owner's shard on the first suggestion, and
+    rebuilt on use once older than SUGGEST_TTL seconds so writes from other
+    processes show up; concurrent first requests share one build
+  * the write routes apply this process's creates, title changes and
+    deletes right after commit. Writes that arrive while an owner is being
+    built are queued and replayed on the new index (upserts and removals by
+    todo id are idempotent, so a write the build already read is harmless)
+  * bounded by SUGGEST_MEMORY_MB (approximate, see OwnerTitles.bytes): the
+    least recently used owners are evicted first. An owner larger than the
+    whole budget is kept on its own
+"""
+import bisect
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# Approximate bytes per distinct title besides its strings (a list slot and
+# two dict entries) and per todo (a dict entry and its id), measured with
+# tracemalloc by benchmarks/suggest.py
+TITLE_OVERHEAD = 64
+ID_OVERHEAD = 70
+# Whole index per todo for seeded titles (~32 chars), to budget before a build
+ESTIMATED_BYTES_PER_TODO = 190
+
+
+class OwnerTitles:
+    """One owner's distinct titles in lowercase order, with the todos using each"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        # key -> title as last written, and how many todos use it
+        self.titles: Dict[str, str] = {}
+        self.counts: Dict[str, int] = {}
+        self.by_id: Dict[int, str] = {}
+        self.bytes = 0
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, str]]) -> "OwnerTitles":
+        """Build from (id, title) rows, sorting once at the end"""
+        index = cls()
+        for todo_id, title in rows:
+            key = title.lower()
+            if key == title:
+                title = key
+            index.by_id[todo_id] = key
+            if key in index.counts:
+                index.counts[key] += 1
+            else:
+                index.counts[key] = 1
+                index.bytes += index._title_bytes(key, title)
+            index.titles[key] = title
+        index.keys = sorted(index.counts)
+        index.bytes += ID_OVERHEAD * len(index.by_id)
+        return index
+
+    @staticmethod
+    def _title_bytes(key: str, title: str) -> int:
+        # A title that is already lowercase shares the key's string
+        return sys.getsizeof(key) + (sys.getsizeof(title) if title is not key else 0) + TITLE_OVERHEAD
+
+    def _release(self, key: str) -> None:
+        self.counts[key] -= 1
+        if self.counts[key]:
+            return
+        del self.counts[key]
+        self.bytes -= self._title_bytes(key, self.titles.pop(key))
+        position = bisect.bisect_left(self.keys, key)
+        del self.keys[position]
+
+    def upsert(self, todo_id: int, title: str) -> None:
+        key = title.lower()
+        if key == title:
+            title = key
+        previous = self.by_id.get(todo_id)
+        if previous == key:
+            self.titles[key] = title
+            return
+        if previous is None:
+            self.bytes += ID_OVERHEAD
+        else:
+            self._release(previous)
+        self.by_id[todo_id] = key
+        if key in self.counts:
+            self.counts[key] += 1
+        else:
+            self.counts[key] = 1
+            self.bytes += self._title_bytes(key, title)
+            bisect.insort(self.keys, key)
+        self.titles[key] = title
+
+    def remove(self, todo_id: int) -> None:
+        key = self.by_id.pop(todo_id, None)
+        if key is not None:
+            self.bytes -= ID_OVERHEAD
+            self._release(key)
+
+    def suggest(self, prefix: str, limit: int) -> List[str]:
+        """Up to limit distinct titles starting with prefix (lowercase), in order"""
+        keys = self.keys
+        position = bisect.bisect_left(keys, prefix)
+        end = min(len(keys), position + limit)
+        found = []
+        while position < end and keys[position].startswith(prefix):
+            found.append(self.titles[keys[position]])
+            position += 1
+        return found
+
+
+class _Build:
+    """An owner's index being loaded; writes meanwhile are queued in pending"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.pending: List[Tuple[int, Optional[str]]] = []
+        self.result: Optional[OwnerTitles] = None
+        self.error: Optional[BaseException] = None
+
+
+class TitleIndex:
+    """OwnerTitles per owner, least recently used first, within a memory budget"""
+
+    def __init__(self, max_bytes: int = int(config.SUGGEST_MEMORY_MB * 1024 * 1024),
+                 ttl: float = config.SUGGEST_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+        self._owners: "OrderedDict[int, OwnerTitles]" = OrderedDict()
+        self._building: Dict[int, _Build] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, owner_id: int) -> Optional[OwnerTitles]:
+        titles = self._owners.get(owner_id)
+        if titles is None or time.monotonic() - titles.loaded_at >= self.ttl:
+            return None
+        self._owners.move_to_end(owner_id)
+        return titles
+
+    def _evict(self) -> None:
+        # The most recently used owner is last and always stays
+        while self.bytes > self.max_bytes and len(self._owners) > 1:
+            owner_id, titles = self._owners.popitem(last=False)
+            self.bytes -= titles.bytes
+            self.evictions += 1
+            logger.debug(f"Evicted title index of owner {owner_id} ({titles.bytes} bytes)")
+
+    def _load(self, owner_id: int, load: Callable[[], Iterable[Tuple[int, str]]]) -> OwnerTitles:
+        with self._lock:
+            titles = self._fresh(owner_id)
+            if titles is not None:
+                self.hits += 1
+                return titles
+            build = self._building.get(owner_id)
+            leader = build is None
+            if leader:
+                build = self._building[owner_id] = _Build()
+        if not leader:
+            build.done.wait()
+            if build.error is not None:
+                raise build.error
+            return build.result
+
+        try:
+            titles = OwnerTitles.from_rows(load())
+        except BaseException as e:
+            with self._lock:
+                del self._building[owner_id]
+            build.error = e
+            build.done.set()
+            raise
+        with self._lock:
+            for todo_id, title in build.pending:
+                if title is None:
+                    titles.remove(todo_id)
+                else:
+                    titles.upsert(todo_id, title)
+            del self._building[owner_id]
+            previous = self._owners.pop(owner_id, None)
+            if previous is not None:
+                self.bytes -= previous.bytes
+            self._owners[owner_id] = titles
+            self.bytes += titles.bytes
+            self.builds += 1
+            self._evict()
+        build.result = titles
+        build.done.set()
+        return titles
+
+    def suggest(self, owner_id: int, prefix: str, limit: int,
+                load: Callable[[], Iterable[Tuple[int, str]]]) -> List[str]:
+        """
+        Titles of owner_id's todos starting with prefix, ignoring case.
+
+        load() returns the owner's (id, title) rows; it is only called to
+        build the owner's index (blocking: call from a worker thread).
+        """
+        titles = self._load(owner_id, load)
+        with self._lock:
+            return titles.suggest(prefix.lower(), limit)
+
+    # ------------------------------------------------------------------
+    # Writes (from the write routes, after commit)
+    # ------------------------------------------------------------------
+
+    def _apply(self, owner_id: int, todo_id: int, title: Optional[str]) -> None:
+        with self._lock:
+            build = self._building.get(owner_id)
+            if build is not None:
+                build.pending.append((todo_id, title))
+            titles = self._owners.get(owner_id)
+            if titles is None:
+                return
+            before = titles.bytes
+            if title is None:
+                titles.remove(todo_id)
+            else:
+                titles.upsert(todo_id, title)
+            self.bytes += titles.bytes - before
+            self._evict()
+
+    def upsert(self, owner_id: int, todo_id: int, title: str) -> None:
+        self._apply(owner_id, todo_id, title)
+
+    def remove(self, owner_id: int, todo_id: int) -> None:
+        self._apply(owner_id, todo_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._owners.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "owners": len(self._owners),
+                "titles": sum(len(titles.keys) for titles in self._owners.values()),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "builds": self.builds,
+                "evictions": self.evictions,
+            }
+
+
+title_index = TitleIndex()
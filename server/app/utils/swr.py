@@ -0,0 +1,289 @@
+"""
+Stale-while-revalidate for todo reads
+
+GET /api/todos and GET /api/todos/{id} answer from the database whenever it
+answers in time. When it is slow or down they serve the last good response
+for the same request instead of failing:
+
+  * one refresh per distinct request key runs at a time: concurrent
+    identical requests wait on the same refresh (a thundering herd runs
+    one query), and the first to finish stores its response for the key
+  * without a stored response there is nothing to fall back to, so the
+    refresh runs on the request's own thread under its deadline
+  * with one, the refresh runs on a thread pool (SWR_REFRESH_THREADS, as
+    many as the threadpool serving sync routes) and the request waits
+    SWR_LATENCY_BUDGET seconds for it. Past the budget, or if the refresh
+    failed, the stored response is served with `Warning: 110`/`111`, `Age`
+    and `X-Cache: stale`. The refresh carries on and repopulates the key
+    for the next request
+  * refreshes open their own sessions (they can outlive the request); pool
+    refreshes get their own deadline (the read route timeout), so a hung
+    database ties up the pool only until they are cancelled
+  * responses older than SWR_MAX_STALE seconds are never served; stored
+    bodies are kept in an LRU bounded by SWR_CACHE_BYTES per worker
+
+Errors that are answers (404, 400) pass through, and a 404 drops the key.
+This worker's writes discard the todo's key, which also stops refreshes
+that started before the write from storing or sharing their result.
+Listings are too many to discard one by one: their keys include a
+generation of the owner's listings (see StaleCache.generation), and a
+write bumps it so later requests no longer find the old pages.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from app import config
+from database.deadline import remaining, request_deadline
+
+logger = logging.getLogger(__name__)
+
+WARNINGS = {
+    "timeout": '110 - "Response is Stale"',
+    "error": '111 - "Revalidation Failed"',
+}
+
+
+class _Stored(NamedTuple):
+    body: bytes
+    media_type: str
+    stored_at: float
+
+
+class _Flight(NamedTuple):
+    future: Future
+    # key's generation when the refresh started (see StaleCache.discard)
+    generation: int
+
+
+class StaleCache:
+    """Last good response per request key, refreshed single-flight"""
+
+    def __init__(
+        self,
+        enabled: bool = config.SWR_ENABLED,
+        budget: float = config.SWR_LATENCY_BUDGET,
+        max_stale: float = config.SWR_MAX_STALE,
+        max_bytes: int = config.SWR_CACHE_BYTES,
+        threads: int = config.SWR_REFRESH_THREADS,
+        refresh_timeout: float = config.ROUTE_TIMEOUTS["read"],
+    ):
+        self.enabled = enabled
+        self.budget = budget
+        self.max_stale = max_stale
+        self.max_bytes = max_bytes
+        self.threads = threads
+        self.refresh_timeout = refresh_timeout
+        self.size = 0
+        self.fresh = 0
+        self.stale = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.failures = 0
+        self._entries: "OrderedDict[Hashable, _Stored]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        # [generation, refreshes running] per key with a refresh running
+        self._generations: Dict[Hashable, List[int]] = {}
+        # generation per group of keys (see generation / discard_group)
+        self._group_generations: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ------------------------------------------------------------------
+    # Stored responses
+    # ------------------------------------------------------------------
+
+    def _get(self, key: Hashable) -> Optional[_Stored]:
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None:
+                return None
+            if time.monotonic() - stored.stored_at > self.max_stale:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return stored
+
+    def _put(self, key: Hashable, response: Response) -> None:
+        """Store response for key (lock held)"""
+        body = bytes(response.body)
+        if len(body) > self.max_bytes // 4:
+            return
+        self._drop(key)
+        self._entries[key] = _Stored(body, response.media_type, time.monotonic())
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+    def _drop(self, key: Hashable) -> None:
+        stored = self._entries.pop(key, None)
+        if stored is not None:
+            self.size -= len(stored.body)
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Forget key's response (e.g. after this worker changed the todo).
+        Refreshes already running may have read the old row: they no longer
+        store their result, and later requests start a new refresh
+        instead of joining them.
+        """
+        with self._lock:
+            self._drop(key)
+            state = self._generations.get(key)
+            if state is not None:
+                state[0] += 1
+                self._flights.pop(key, None)
+
+    def generation(self, group: Hashable) -> int:
+        """
+        group's current generation. Keys that include it are forgotten
+        together by discard_group(group): later requests build new keys,
+        and responses stored under the old ones age out of the LRU.
+        """
+        with self._lock:
+            return self._group_generations.get(group, 0)
+
+    def discard_group(self, group: Hashable) -> None:
+        """Forget every key built with group's current generation"""
+        with self._lock:
+            self._group_generations[group] = self._group_generations.get(group, 0) + 1
+
+    # ------------------------------------------------------------------
+    # Refreshes
+    # ------------------------------------------------------------------
+
+    def _finish(self, key: Hashable, flight: _Flight) -> bool:
+        """End flight (lock held); True if key was not discarded since it started"""
+        state = self._generations[key]
+        current = state[0] == flight.generation
+        state[1] -= 1
+        if not state[1]:
+            del self._generations[key]
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        return current
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], Response], flight: _Flight,
+                 deadline: Optional[float]) -> None:
+        """Run fetch and resolve flight; deadline=None keeps the caller's"""
+        token = request_deadline.set(deadline) if deadline is not None else None
+        try:
+            response = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._finish(key, flight)
+                if not isinstance(e, HTTPException):
+                    self.failures += 1
+                elif e.status_code == 404:
+                    self._drop(key)
+            flight.future.set_exception(e)
+            return
+        finally:
+            if token is not None:
+                request_deadline.reset(token)
+        with self._lock:
+            if self._finish(key, flight) and response.status_code == 200:
+                self._put(key, response)
+        flight.future.set_result(response)
+
+    def _flight(self, key: Hashable) -> Tuple[_Flight, bool]:
+        """key's refresh in flight, and whether the caller has to start it"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            state = self._generations.setdefault(key, [0, 0])
+            state[1] += 1
+            flight = self._flights[key] = _Flight(Future(), state[0])
+            self.refreshes += 1
+            return flight, True
+
+    def _submit(self, key: Hashable, fetch: Callable[[], Response], flight: _Flight) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="swr-refresh")
+            executor = self._executor
+        executor.submit(self._refresh, key, fetch, flight, time.monotonic() + self.refresh_timeout)
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+
+    def _stale(self, stored: _Stored, reason: str) -> Response:
+        with self._lock:
+            self.stale += 1
+        age = int(time.monotonic() - stored.stored_at)
+        return Response(content=stored.body, media_type=stored.media_type, headers={
+            "Warning": WARNINGS[reason],
+            "Age": str(age),
+            "X-Cache": "stale",
+        })
+
+    def serve(self, key: Hashable, fetch: Callable[[], Response]) -> Response:
+        """
+        fetch()'s response for key, or the stored one when fetch() is too
+        slow or fails. fetch must not use the request's sessions.
+        Blocking: call from a worker thread.
+        """
+        if not self.enabled:
+            return fetch()
+        stored = self._get(key)
+        flight, leader = self._flight(key)
+        if leader:
+            if stored is None:
+                self._refresh(key, fetch, flight, None)
+            else:
+                self._submit(key, fetch, flight)
+        wait = self.budget if stored is not None else remaining()
+        try:
+            response = flight.future.result(timeout=max(0.0, wait) if wait is not None else None)
+        except FutureTimeout:
+            if stored is None:
+                raise TimeoutError(f"No response for {key} before the deadline")
+            logger.warning(f"Serving stale response for {key}: refresh slower than {self.budget}s")
+            return self._stale(stored, "timeout")
+        except HTTPException:
+            raise
+        except Exception as e:
+            if stored is None:
+                raise
+            logger.warning(f"Serving stale response for {key}: refresh failed: {e}")
+            return self._stale(stored, "error")
+        with self._lock:
+            self.fresh += 1
+        # Each waiter gets its own response object (middleware edits headers in place)
+        return Response(content=response.body, status_code=response.status_code, media_type=response.media_type)
+
+    def stop(self) -> None:
+        """Drop queued refreshes; running ones end at their deadline"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, in_flight = len(self._entries), len(self._flights)
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": self.size,
+            "in_flight": in_flight,
+            "fresh": self.fresh,
+            "stale": self.stale,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+
+stale_cache = StaleCache()
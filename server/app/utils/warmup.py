@@ -0,0 +1,207 @@
+"""
+Warm-up before readiness
+
+A fresh worker's first requests pay for connecting to the database,
+configuring the ORM mappers, compiling each statement shape, building the
+pydantic serializers on first use, importing the auth libraries and filling
+the per-owner caches. During a rollout that is a p99 spike on every new
+worker. The lifespan runs these steps before the first health snapshot, so
+/readyz (and serve.py's master, which waits for lifespan startup) only see
+the worker once it is warm:
+
+  * pool: check out WARMUP_CONNECTIONS connections per engine together and
+    return them, so they stay open in the pool
+  * mappers and auth: configure_mappers(), load jose and the bcrypt backend
+  * routes: each hot read route is sent through the app in-process (the
+    middleware, routing, serialization and compression run as for a real
+    request), anonymously and as each of the WARMUP_TOP_TENANTS owners
+    with the most todos (todo_stats_owner). Their suggest indexes are built
+    while they fit the suggest memory budget. Writes are not replayed
+
+Each step is best-effort: a failure is logged and counted and startup
+carries on. Steps still pending after WARMUP_TIMEOUT seconds are skipped.
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers
+from starlette.concurrency import run_in_threadpool
+
+from app import config
+from app.utils import suggest
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Runs the warm-up steps once per worker and keeps their timings"""
+
+    def __init__(
+        self,
+        enabled: bool = config.WARMUP_ENABLED,
+        connections: int = config.WARMUP_CONNECTIONS,
+        top_tenants: int = config.WARMUP_TOP_TENANTS,
+        timeout: float = config.WARMUP_TIMEOUT,
+    ):
+        self.enabled = enabled
+        self.connections = connections
+        self.top_tenants = top_tenants
+        self.timeout = timeout
+        self.steps: Dict[str, float] = {}
+        self.requests = 0
+        self.errors = 0
+        self.skipped: List[str] = []
+        self.total_ms: Optional[float] = None
+        self._deadline = 0.0
+
+    # ------------------------------------------------------------------
+    # Steps (blocking ones run in a worker thread)
+    # ------------------------------------------------------------------
+
+    def _open_pool(self) -> None:
+        from database.config import get_engine
+        from database.shards import shard_router
+
+        engines = {id(engine): engine for _, engine in shard_router.engines()}
+        engines.setdefault(id(get_engine()), get_engine())
+        for engine in engines.values():
+            size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+            opened = []
+            try:
+                for _ in range(min(self.connections, size)):
+                    opened.append(engine.connect())
+            finally:
+                for connection in opened:
+                    connection.close()
+
+    @staticmethod
+    def _load_libraries() -> None:
+        from jose import jwt  # noqa: F401
+        from app.utils.auth import get_pwd_context
+
+        configure_mappers()
+        get_pwd_context().handler("bcrypt").get_backend()
+
+    @staticmethod
+    def _tenants(limit: int) -> List[Tuple[int, str, int]]:
+        """(user id, username, todos) of the owners with the most todos"""
+        from app.models.stats import OwnerTodoStats
+        from app.models.user import User
+        from database.config import SessionLocal
+        from database.shards import ShardSessions, shard_router
+
+        if limit <= 0:
+            return []
+        table = OwnerTodoStats.__table__
+        statement = select(table.c.owner_id, table.c.total).order_by(table.c.total.desc()).limit(limit)
+        shards = ShardSessions(shard_router)
+        try:
+            found = shards.scatter(lambda name, db: db.execute(statement).all())
+        finally:
+            shards.close()
+        totals = sorted((row for rows in found.values() for row in rows), key=lambda row: -row.total)[:limit]
+        if not totals:
+            return []
+        with SessionLocal() as db:
+            names = dict(db.execute(
+                select(User.id, User.username).where(User.id.in_([row.owner_id for row in totals]))
+            ).all())
+        return [(row.owner_id, names[row.owner_id], row.total) for row in totals if row.owner_id in names]
+
+    async def _get(self, client: "httpx.AsyncClient", path: str,
+                   headers: Optional[Dict] = None) -> Optional["httpx.Response"]:
+        if time.monotonic() > self._deadline:
+            self.skipped.append(path)
+            return None
+        self.requests += 1
+        try:
+            response = await client.get(path, headers=headers or {})
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Warm-up request {path} failed: {e}")
+            return None
+        if response.status_code >= 400:
+            self.errors += 1
+            logger.warning(f"Warm-up request {path} returned {response.status_code}")
+        return response
+
+    async def _routes(self, client: "httpx.AsyncClient", headers: Optional[Dict] = None) -> None:
+        """The hot read shapes, as the frontend sends them"""
+        listing = await self._get(client, "/api/todos/?limit=10", headers)
+        await self._get(client, "/api/todos/?limit=10&envelope=true", headers)
+        await self._get(client, "/api/todos/?completed=false&sort=-created_at&limit=10", headers)
+        await self._get(client, "/api/todos/stats", headers)
+        if listing is not None and listing.status_code == 200 and listing.json():
+            await self._get(client, f"/api/todos/{listing.json()[0]['id']}", headers)
+
+    async def _tenant_routes(self, client: "httpx.AsyncClient", tenants: List[Tuple[int, str, int]]) -> None:
+        from app.utils.auth import create_access_token
+
+        # Index the biggest owners' titles while they fit an even share of the budget
+        suggest_share = suggest.title_index.max_bytes / max(1, len(tenants))
+        for user_id, username, todos in tenants:
+            token = create_access_token({"sub": username, "user_id": user_id}, timedelta(minutes=5))
+            headers = {"Authorization": f"Bearer {token}"}
+            await self._get(client, "/api/todos/?owner=me&limit=10", headers)
+            await self._get(client, "/api/todos/?owner=me&limit=10&envelope=true", headers)
+            await self._get(client, "/api/todos/stats?owner=me", headers)
+            if todos * suggest.ESTIMATED_BYTES_PER_TODO <= suggest_share:
+                await self._get(client, "/api/todos/suggest?prefix=a", headers)
+
+    async def _timed(self, name: str, step) -> None:
+        if time.monotonic() > self._deadline:
+            self.skipped.append(name)
+            return
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Warm-up step '{name}' failed: {e}")
+        self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def run(self, app) -> None:
+        """Warm this worker up through app (call from the lifespan, before readiness)"""
+        if not self.enabled:
+            return
+        # Imported here: httpx is a quarter of the app's import time
+        import httpx
+
+        started = time.perf_counter()
+        self._deadline = time.monotonic() + self.timeout
+        tenants: List[Tuple[int, str, int]] = []
+
+        async def load_tenants():
+            tenants.extend(await run_in_threadpool(self._tenants, self.top_tenants))
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+            await self._timed("pool", lambda: run_in_threadpool(self._open_pool))
+            await self._timed("libraries", lambda: run_in_threadpool(self._load_libraries))
+            await self._timed("routes", lambda: self._routes(client))
+            await self._timed("search", lambda: self._get(client, "/api/todos/search/a?limit=1"))
+            await self._timed("tenants", load_tenants)
+            await self._timed("tenant routes", lambda: self._tenant_routes(client, tenants))
+
+        self.total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"✓ Warm-up finished in {self.total_ms} ms ({self.requests} requests, "
+                    f"{len(tenants)} tenants, {self.errors} errors, {len(self.skipped)} skipped)")
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "total_ms": self.total_ms,
+            "steps_ms": self.steps,
+            "requests": self.requests,
+            "errors": self.errors,
+            "skipped": self.skipped,
+        }
+
+
+warmup = Warmup()
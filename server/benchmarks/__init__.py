@@ -0,0 +1,4 @@
+"""
+Performance benchmarks for the Todo API
+Run modules with `python -m benchmarks.<name>` from the server directory
+"""
@@ -0,0 +1,137 @@
+"""
+Admission control benchmark
+
+Measures latency of cheap routes (get/list) on their own, then while a
+search flood from many users runs alongside, with admission control off and
+on. With admission control the cheap routes' p99 should stay close to the
+no-flood baseline while most of the flood is answered 429/503.
+
+Search must be expensive for the flood to matter, so seed data first:
+    python -m database.seed --scale S --reset
+    python -m benchmarks.admission --duration 10
+    python -m benchmarks.admission --target http://127.0.0.1:8000   # server-side toggle not available
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.loadgen import LoadGenerator, parse_mix
+
+CHEAP_MIX = "get=3,list=1"
+FLOOD_MIX = "search=1"
+
+
+@contextlib.asynccontextmanager
+async def client_factory(target: str):
+    """Yield a function that opens new clients against one running app"""
+    async with contextlib.AsyncExitStack() as stack:
+        if target == "asgi":
+            from main import app
+
+            await stack.enter_async_context(app.router.lifespan_context(app))
+
+            def make():
+                transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+                return httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60)
+        else:
+            def make():
+                return httpx.AsyncClient(base_url=target, timeout=60)
+        yield make
+
+
+async def run_phase(make, args: argparse.Namespace, flood: bool) -> Dict:
+    async with contextlib.AsyncExitStack() as stack:
+        cheap = LoadGenerator(
+            await stack.enter_async_context(make()),
+            concurrency=args.concurrency,
+            duration=args.duration,
+            warmup=args.warmup,
+            mix=parse_mix(CHEAP_MIX),
+            prefill=50,
+        )
+        generators = [cheap.run()]
+        if flood:
+            for i in range(args.flood_users):
+                flooder = LoadGenerator(
+                    await stack.enter_async_context(make()),
+                    concurrency=args.flood_concurrency,
+                    duration=args.duration,
+                    warmup=args.warmup,
+                    mix=parse_mix(FLOOD_MIX),
+                    prefill=0,
+                    seed=1000 + i,
+                    # Rejected requests are nearly free for the server, but a
+                    # flooder spinning on them in this process would just burn
+                    # the CPU the cheap client shares with it
+                    honor_retry_after=True,
+                )
+                generators.append(flooder.run())
+        results = await asyncio.gather(*generators)
+
+    flood_statuses: Dict[str, int] = {}
+    for result in results[1:]:
+        for status, count in result["operations"].get("search", {}).get("statuses", {}).items():
+            flood_statuses[status] = flood_statuses.get(status, 0) + count
+    summary = results[0]["summary"]
+    return {
+        "cheap_rps": summary["rps"],
+        "cheap_p50_ms": summary["latency"]["p50_ms"],
+        "cheap_p99_ms": summary["latency"]["p99_ms"],
+        "cheap_errors": summary["errors"],
+        "flood_statuses": flood_statuses,
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    rows = []
+    async with client_factory(args.target) as make:
+        controller = None
+        if args.target == "asgi":
+            from app.middleware.admission import admission_controller
+
+            controller = admission_controller
+            # Measure how the flood is shed, not the cheap client's own quotas
+            controller.rates["read"] = controller.rates["write"] = (1e9, 1e9)
+        phases = [("baseline (no flood)", False, True), ("flood, admission off", True, False),
+                  ("flood, admission on", True, True)]
+        for name, flood, admission in phases:
+            if controller is not None:
+                controller.enabled = admission
+            elif not admission:
+                continue
+            row = {"phase": name, **await run_phase(make, args, flood)}
+            rows.append(row)
+            print(f"  {name}: cheap p99 {row['cheap_p99_ms']:.1f} ms, flood {row['flood_statuses']}")
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cheap-route latency under a search flood")
+    parser.add_argument("--target", default="asgi")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent cheap-route clients")
+    parser.add_argument("--flood-users", type=int, default=16)
+    parser.add_argument("--flood-concurrency", type=int, default=4, help="Concurrent searches per flood user")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    rows = asyncio.run(run(args))
+    print("=" * 72)
+    print(f"{'phase':<24}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for row in rows:
+        print(f"{row['phase']:<24}{row['cheap_rps']:>10.1f}{row['cheap_p50_ms']:>10.2f}"
+              f"{row['cheap_p99_ms']:>10.2f}{row['cheap_errors']:>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
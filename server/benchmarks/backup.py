@@ -0,0 +1,177 @@
+"""
+Backup throughput and writer stalls
+
+Copies a scratch copy of the database while writer threads insert todos at a
+fixed rate, and reports backup throughput next to the writers' commit
+latency during the copy:
+
+  * locked copy: the backup API in a single step (what copying the file
+    under a lock amounts to)
+  * online: the backup API in --pages steps with --pause in between
+  * vacuum: VACUUM INTO
+
+The worst writer stall is the number to watch: it is how long a request that
+writes could hang while a backup runs. --wal repeats the run with the
+scratch copy in WAL mode.
+
+Usage (from the server directory, after seeding):
+    python -m benchmarks.backup
+    python -m benchmarks.backup --pages 512 --pause 0.005 --wal
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.engine import make_url
+
+from app.utils import backup
+
+
+class Writers:
+    """Threads committing one-row inserts at a fixed total rate, recording commit latency"""
+
+    def __init__(self, path: str, threads: int, rate: float):
+        self.path = path
+        self.threads = threads
+        self.interval = threads / rate
+        self.latencies: List[float] = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._workers: List[threading.Thread] = []
+
+    def _run(self) -> None:
+        with closing(sqlite3.connect(self.path, timeout=60, isolation_level=None)) as connection:
+            owner_id = connection.execute("SELECT id FROM users LIMIT 1").fetchone()[0]
+            next_at = time.perf_counter()
+            while not self._stop.is_set():
+                now = datetime.utcnow()
+                started = time.perf_counter()
+                try:
+                    connection.execute("BEGIN IMMEDIATE")
+                    connection.execute(
+                        "INSERT INTO todos (title, description, completed, owner_id, created_at, updated_at) "
+                        "VALUES (?, ?, 0, ?, ?, ?)", ("backup benchmark", "", owner_id, now, now)
+                    )
+                    connection.execute("COMMIT")
+                except sqlite3.OperationalError:
+                    self.errors += 1
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                with self._lock:
+                    self.latencies.append((time.perf_counter() - started) * 1000)
+                next_at += self.interval
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+
+    def __enter__(self) -> "Writers":
+        self._workers = [threading.Thread(target=self._run, daemon=True) for _ in range(self.threads)]
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        for worker in self._workers:
+            worker.join()
+
+
+def measure(source: str, target: str, copy: Callable[[str, str], Dict], threads: int, rate: float) -> Dict:
+    with Writers(source, threads, rate) as writers:
+        time.sleep(0.5)
+        baseline = len(writers.latencies)
+        result = copy(source, target)
+        during = writers.latencies[baseline:]
+    os.remove(target)
+    latencies = sorted(during) or [0.0]
+    return {
+        "seconds": result["seconds"],
+        "mb": round(result["bytes"] / 1e6, 1),
+        "mb_per_second": result["mb_per_second"],
+        "restarts": result.get("restarts", 0),
+        "longest_step_ms": result["longest_step_ms"],
+        "writes": len(during),
+        "write_errors": writers.errors,
+        "write_p50_ms": round(statistics.median(latencies), 2),
+        "write_p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+        "max_stall_ms": round(latencies[-1], 2),
+    }
+
+
+def run(database: str, pages: int, pause: float, threads: int, rate: float, wal: bool) -> List[Dict]:
+    workdir = tempfile.mkdtemp(prefix="backup-bench-")
+    source, target = os.path.join(workdir, "source.db"), os.path.join(workdir, "copy.db")
+    try:
+        with closing(sqlite3.connect(database)) as connection:
+            connection.execute("VACUUM INTO ?", (source,))
+        if wal:
+            with closing(sqlite3.connect(source)) as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+        methods = {
+            "locked copy": lambda s, t: backup.online_backup(s, t, pages=-1, pause=0),
+            "online": lambda s, t: backup.online_backup(s, t, pages=pages, pause=pause),
+            "vacuum": backup.vacuum_into,
+        }
+        rows = []
+        for name, copy in methods.items():
+            row = measure(source, target, copy, threads, rate)
+            rows.append({"method": name, "journal": "wal" if wal else "delete", **row})
+        return rows
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backup throughput and writer stalls under load")
+    parser.add_argument("--url", help="SQLite database URL (defaults to the app's database)")
+    parser.add_argument("--pages", type=int, default=256, help="Pages per online backup step")
+    parser.add_argument("--pause", type=float, default=0.01, help="Seconds between online backup steps")
+    parser.add_argument("--threads", type=int, default=4, help="Writer threads")
+    parser.add_argument("--rate", type=float, default=200, help="Total writes per second")
+    parser.add_argument("--wal", action="store_true", help="Also run with the copy in WAL mode")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        url = make_url(args.url)
+    else:
+        from database.config import load_database_settings
+
+        url = make_url(load_database_settings()[0])
+    if url.get_backend_name() != "sqlite" or not url.database:
+        print("✗ Backups are only benchmarked for SQLite databases")
+        return 1
+
+    rows = run(url.database, args.pages, args.pause, args.threads, args.rate, False)
+    if args.wal:
+        rows += run(url.database, args.pages, args.pause, args.threads, args.rate, True)
+
+    print("=" * 100)
+    print(f"{url.database}: {args.threads} writers at {args.rate:g} writes/s, "
+          f"online steps of {args.pages} pages with {args.pause * 1000:g} ms pauses")
+    print("=" * 100)
+    print(f"{'method':<13}{'journal':<9}{'MB':>8}{'seconds':>9}{'MB/s':>8}{'restarts':>10}"
+          f"{'writes':>8}{'p50 ms':>9}{'p99 ms':>9}{'max stall ms':>14}")
+    for row in rows:
+        print(f"{row['method']:<13}{row['journal']:<9}{row['mb']:>8}{row['seconds']:>9.3f}"
+              f"{row['mb_per_second'] or 0:>8}{row['restarts']:>10}{row['writes']:>8}"
+              f"{row['write_p50_ms']:>9.2f}{row['write_p99_ms']:>9.2f}{row['max_stall_ms']:>14.2f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"database": url.database, "pages": args.pages, "pause": args.pause,
+                       "threads": args.threads, "rate": args.rate, "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
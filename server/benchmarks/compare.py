@@ -0,0 +1,79 @@
+"""
+Compare two load generator result files
+
+Prints per-operation throughput and latency deltas (candidate vs baseline).
+Positive latency deltas and negative rps deltas are regressions.
+"""
+import json
+from typing import Dict, List, Optional, Tuple
+
+METRICS = ("rps", "p50_ms", "p90_ms", "p99_ms", "p99.9_ms")
+
+
+def _metric(stats: Dict, name: str) -> float:
+    if name == "rps":
+        return stats["rps"]
+    return stats["latency"].get(name, 0.0)
+
+
+def _delta(before: float, after: float) -> Optional[float]:
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare_results(baseline: Dict, candidate: Dict) -> List[Dict]:
+    """Return one row per operation (plus TOTAL) with metric deltas"""
+    rows = []
+    pairs: List[Tuple[str, Dict, Dict]] = [
+        (name, baseline["operations"][name], candidate["operations"][name])
+        for name in baseline["operations"]
+        if name in candidate["operations"]
+    ]
+    pairs.append(("TOTAL", baseline["summary"], candidate["summary"]))
+    for name, before, after in pairs:
+        row = {"operation": name}
+        for metric in METRICS:
+            a, b = _metric(before, metric), _metric(after, metric)
+            row[metric] = {"baseline": a, "candidate": b, "delta_pct": _delta(a, b)}
+        rows.append(row)
+    return rows
+
+
+def _format_delta(delta: Optional[float]) -> str:
+    return "n/a" if delta is None else f"{delta:+.1f}%"
+
+
+def compare_files(baseline_path: str, candidate_path: str, fail_on: Optional[float] = None) -> int:
+    """Print a comparison table; return 1 if a regression exceeds fail_on percent"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    for label, result in (("baseline", baseline), ("candidate", candidate)):
+        meta = result["meta"]
+        print(f"{label:<10} {meta.get('target')} concurrency={meta['concurrency']} "
+              f"duration={meta['duration']}s mix={meta['mix']}")
+    if baseline["meta"]["mix"] != candidate["meta"]["mix"]:
+        print("⚠ Request mixes differ; per-operation numbers are not directly comparable")
+
+    print("=" * 78)
+    print(f"{'operation':<10}" + "".join(f"{metric:>13}" for metric in METRICS))
+    regressions = []
+    for row in compare_results(baseline, candidate):
+        cells = []
+        for metric in METRICS:
+            delta = row[metric]["delta_pct"]
+            cells.append(f"{_format_delta(delta):>13}")
+            if fail_on is None or delta is None:
+                continue
+            worse = -delta if metric == "rps" else delta
+            if metric in ("rps", "p99_ms") and worse > fail_on:
+                regressions.append(f"{row['operation']} {metric} {_format_delta(delta)}")
+        print(f"{row['operation']:<10}" + "".join(cells))
+
+    if regressions:
+        print(f"\n✗ Regressions beyond {fail_on}%: " + ", ".join(regressions))
+        return 1
+    return 0
@@ -0,0 +1,111 @@
+"""
+Compression benchmark
+
+CPU cost versus bytes saved for every available encoding at several levels,
+on a list page shaped like a real `get_todos` response (100 todos with
+long descriptions). Also reports the cost of a cache hit (hashing the body
+for its ETag) so it can be compared with compressing on every request.
+
+Usage (from the server directory):
+    python -m benchmarks.compression
+    python -m benchmarks.compression --items 100 --description-chars 500 --out compression.json
+"""
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from app.middleware.compression import ENCODERS
+from benchmarks.loadgen import WORDS
+
+LEVELS = {
+    "gzip": [1, 6, 9],
+    "br": [1, 4, 6, 11],
+    "zstd": [1, 3, 9, 19],
+}
+
+
+def sample_page(items: int, description_chars: int, seed: int = 42) -> bytes:
+    """Serialized list page with the same fields as TodoResponse"""
+    rng = random.Random(seed)
+    created = datetime(2024, 1, 1)
+    todos = []
+    for i in range(items):
+        description = " ".join(rng.choices(WORDS, k=description_chars // 4))[:description_chars]
+        timestamp = (created + timedelta(minutes=i * 7)).isoformat()
+        todos.append({
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 6))),
+            "description": description,
+            "completed": rng.random() < 0.3,
+            "id": 1000 + i,
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        })
+    return json.dumps(todos, separators=(",", ":")).encode()
+
+
+def time_call(fn: Callable[[], object], runs: int) -> float:
+    """Median wall time of fn() in microseconds"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    return statistics.median(samples)
+
+
+def measure(body: bytes, runs: int) -> List[Dict]:
+    rows = []
+    for name, (compress, _) in ENCODERS.items():
+        for level in LEVELS[name]:
+            compressed = compress(body, level)
+            us = time_call(lambda: compress(body, level), runs)
+            rows.append({
+                "encoding": name,
+                "level": level,
+                "bytes": len(compressed),
+                "ratio": round(len(body) / len(compressed), 2),
+                "saved_pct": round(100 * (1 - len(compressed) / len(body)), 1),
+                "compress_us": round(us, 1),
+                "mb_per_s": round(len(body) / us, 1),  # bytes/us == MB/s
+            })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compression CPU cost vs bytes saved")
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--description-chars", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    body = sample_page(args.items, args.description_chars)
+    etag_us = time_call(lambda: hashlib.blake2b(body, digest_size=16).hexdigest(), args.runs)
+    rows = measure(body, args.runs)
+
+    missing = [name for name in LEVELS if name not in ENCODERS]
+    print("=" * 72)
+    print(f"Payload: {args.items} todos, {len(body):,} bytes uncompressed")
+    print(f"ETag hash (cache hit cost): {etag_us:.1f} us")
+    if missing:
+        print(f"Not installed: {', '.join(missing)}")
+    print("=" * 72)
+    print(f"{'encoding':<10}{'level':>6}{'bytes':>10}{'ratio':>8}{'saved':>8}{'us':>10}{'MB/s':>8}")
+    for row in rows:
+        print(f"{row['encoding']:<10}{row['level']:>6}{row['bytes']:>10,}{row['ratio']:>8.2f}"
+              f"{row['saved_pct']:>7.1f}%{row['compress_us']:>10.1f}{row['mb_per_s']:>8.1f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"payload_bytes": len(body), "etag_us": etag_us, "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+HDR-style latency histogram
+
+Values are bucketed on a log-linear scale: every power-of-two range is split
+into 2**significant_bits linear sub-buckets, so the relative error of any
+reported percentile is bounded (~0.8% with the default of 7 bits) no matter
+how wide the recorded range is. Buckets are stored sparsely, keyed by the
+lowest value they can hold, which keeps histograms small and easy to merge.
+"""
+import math
+from typing import Dict, Iterable, List, Optional
+
+
+class LatencyHistogram:
+    """Log-linear histogram of integer latencies (microseconds)"""
+
+    def __init__(self, significant_bits: int = 7):
+        if not 1 <= significant_bits <= 16:
+            raise ValueError("significant_bits must be between 1 and 16")
+        self.significant_bits = significant_bits
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.sum = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _bucket(self, value: int) -> int:
+        """Lowest value that shares a bucket with `value`"""
+        shift = value.bit_length() - self.significant_bits
+        if shift <= 0:
+            return value
+        return (value >> shift) << shift
+
+    def _bucket_width(self, low: int) -> int:
+        shift = low.bit_length() - self.significant_bits
+        return 1 << shift if shift > 0 else 1
+
+    def record(self, value: int, count: int = 1) -> None:
+        """Record a latency value"""
+        if value < 0:
+            raise ValueError("Latency cannot be negative")
+        value = int(value)
+        low = self._bucket(value)
+        self.counts[low] = self.counts.get(low, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """Add all values recorded in another histogram"""
+        if other.significant_bits != self.significant_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        for low, count in other.counts.items():
+            self.counts[low] = self.counts.get(low, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, percent: float) -> int:
+        """Value at the given percentile (highest equivalent value of its bucket)"""
+        if self.total == 0:
+            return 0
+        target = max(1, math.ceil(percent / 100.0 * self.total))
+        seen = 0
+        for low in sorted(self.counts):
+            seen += self.counts[low]
+            if seen >= target:
+                return min(low + self._bucket_width(low) - 1, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def summary(self, percentiles: Iterable[float] = (50, 90, 99, 99.9)) -> Dict[str, float]:
+        """Summary statistics in milliseconds"""
+        result = {
+            "count": self.total,
+            "min_ms": (self.min or 0) / 1000,
+            "mean_ms": round(self.mean / 1000, 3),
+            "max_ms": (self.max or 0) / 1000,
+        }
+        for p in percentiles:
+            result[f"p{p:g}_ms"] = self.percentile(p) / 1000
+        return result
+
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-friendly dict"""
+        return {
+            "unit": "us",
+            "significant_bits": self.significant_bits,
+            "total": self.total,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "buckets": [[low, self.counts[low]] for low in sorted(self.counts)],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencyHistogram":
+        """Rebuild a histogram produced by to_dict()"""
+        histogram = cls(data.get("significant_bits", 7))
+        buckets: List[List[int]] = data.get("buckets", [])
+        for low, count in buckets:
+            histogram.counts[low] = count
+        histogram.total = data.get("total", 0)
+        histogram.sum = data.get("sum", 0)
+        histogram.min = data.get("min")
+        histogram.max = data.get("max")
+        return histogram
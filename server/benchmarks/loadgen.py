@@ -0,0 +1,353 @@
+"""
+Async load generator for the Todo API
+
+Drives a weighted mix of list/get/create/update/delete/search/stats requests
+from a fixed number of concurrent virtual users for a fixed duration, and
+records per-operation latency histograms.
+
+Targets:
+    asgi                    in-process, through httpx.ASGITransport (main.app)
+    http://host:port        a running uvicorn server
+
+Usage (from the server directory):
+    python -m benchmarks.loadgen run --concurrency 32 --duration 30 --out a.json
+    python -m benchmarks.loadgen run --target http://127.0.0.1:8000 \\
+        --mix list=50,get=30,search=20
+    python -m benchmarks.loadgen compare a.json b.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.histogram import LatencyHistogram
+
+OPERATIONS = ("list", "get", "create", "update", "delete", "search", "stats")
+DEFAULT_MIX = "list=35,get=25,create=10,update=10,delete=5,search=10,stats=5"
+API_PREFIX = "/api/todos"
+WORDS = [
+    "buy", "milk", "call", "mom", "write", "report", "fix", "bug", "review",
+    "pull", "request", "plan", "sprint", "book", "flight", "pay", "rent",
+    "clean", "kitchen", "read", "paper", "deploy", "server", "water", "plants",
+]
+# Keep at least this many todos around so get/update/delete always have targets
+MIN_POOL_SIZE = 20
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """Parse 'list=35,get=25,...' into an operation -> weight mapping"""
+    mix: Dict[str, int] = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}'. Choose from: {', '.join(OPERATIONS)}")
+        mix[name] = int(weight) if weight else 1
+        if mix[name] < 0:
+            raise ValueError(f"Weight for '{name}' cannot be negative")
+    if not mix or sum(mix.values()) == 0:
+        raise ValueError("Request mix must contain at least one operation with weight > 0")
+    return mix
+
+
+class OperationStats:
+    """Latency histogram and status counts for one operation"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, status: str, latency_us: int, error: bool) -> None:
+        self.histogram.record(latency_us)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if error:
+            self.errors += 1
+
+    def to_dict(self, elapsed: float) -> Dict:
+        return {
+            "requests": self.histogram.total,
+            "errors": self.errors,
+            "rps": round(self.histogram.total / elapsed, 2) if elapsed else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+            "latency": self.histogram.summary(),
+            "histogram": self.histogram.to_dict(),
+        }
+
+
+class LoadGenerator:
+    """Runs a weighted request mix against an httpx client"""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        concurrency: int = 16,
+        duration: float = 10.0,
+        warmup: float = 1.0,
+        mix: Optional[Dict[str, int]] = None,
+        prefill: int = 100,
+        seed: int = 42,
+        honor_retry_after: bool = False,
+    ):
+        self.client = client
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.mix = mix or parse_mix(DEFAULT_MIX)
+        self.prefill = prefill
+        self.seed = seed
+        self.honor_retry_after = honor_retry_after
+        self.ids: List[int] = []
+        self.stats = {name: OperationStats() for name in self.mix}
+        self._operations = list(self.mix)
+        self._weights = [self.mix[name] for name in self._operations]
+        self._recording = False
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+
+    async def _setup_post(self, url: str, payload: Dict) -> httpx.Response:
+        """POST during setup, waiting out admission-control rejections"""
+        response = await self.client.post(url, json=payload)
+        while response.status_code in (429, 503):
+            await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+            response = await self.client.post(url, json=payload)
+        response.raise_for_status()
+        return response
+
+    async def authenticate(self) -> None:
+        """Register a throwaway benchmark user and attach its bearer token"""
+        credentials = {"username": f"bench-{uuid.uuid4().hex[:12]}", "password": "benchmark"}
+        await self._setup_post("/auth/register", credentials)
+        response = await self._setup_post("/auth/login", credentials)
+        token = response.json()["access_token"]
+        self.client.headers["Authorization"] = f"Bearer {token}"
+
+    async def populate(self) -> None:
+        """Create the initial pool of todos used by get/update/delete"""
+        rng = random.Random(self.seed)
+        for _ in range(self.prefill):
+            response = await self._setup_post(f"{API_PREFIX}/", self._new_todo(rng))
+            self.ids.append(response.json()["id"])
+
+    # ------------------------------------------------------------------
+    # Operations
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _new_todo(rng: random.Random) -> Dict:
+        return {
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 6))),
+            "description": " ".join(rng.choices(WORDS, k=rng.randint(0, 40))) or None,
+            "completed": rng.random() < 0.3,
+        }
+
+    async def _request(self, name: str, rng: random.Random) -> httpx.Response:
+        client = self.client
+        if name == "list":
+            params = {"skip": rng.randint(0, 50), "limit": rng.choice((10, 20, 50, 100))}
+            if rng.random() < 0.3:
+                params["completed"] = rng.choice(("true", "false"))
+            return await client.get(f"{API_PREFIX}/", params=params)
+        if name == "search":
+            return await client.get(f"{API_PREFIX}/search/{rng.choice(WORDS)}", params={"limit": 20})
+        if name == "stats":
+            return await client.get(f"{API_PREFIX}/stats")
+        if name == "create":
+            response = await client.post(f"{API_PREFIX}/", json=self._new_todo(rng))
+            if response.status_code == 201:
+                self.ids.append(response.json()["id"])
+            return response
+        # get/update/delete need an existing id
+        todo_id = rng.choice(self.ids)
+        if name == "get":
+            return await client.get(f"{API_PREFIX}/{todo_id}")
+        if name == "update":
+            return await client.put(f"{API_PREFIX}/{todo_id}", json={"completed": rng.random() < 0.5})
+        with contextlib.suppress(ValueError):
+            self.ids.remove(todo_id)
+        return await client.delete(f"{API_PREFIX}/{todo_id}")
+
+    async def _worker(self, worker_id: int, deadline: float) -> None:
+        rng = random.Random(self.seed * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            name = rng.choices(self._operations, self._weights)[0]
+            if name in ("get", "update", "delete") and len(self.ids) <= MIN_POOL_SIZE:
+                name = "create" if "create" in self.mix else "list"
+                if name not in self.stats:
+                    self.stats[name] = OperationStats()
+            start = time.perf_counter_ns()
+            try:
+                response = await self._request(name, rng)
+                status, error = str(response.status_code), response.status_code >= 500
+            except httpx.HTTPError as e:
+                status, error = type(e).__name__, True
+            latency_us = (time.perf_counter_ns() - start) // 1000
+            if self._recording:
+                self.stats[name].record(status, latency_us, error)
+            if self.honor_retry_after and status in ("429", "503"):
+                await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+
+    async def run(self) -> Dict:
+        """Execute warm-up and measured phases and return the result document"""
+        await self.authenticate()
+        await self.populate()
+
+        start = time.perf_counter()
+        deadline = start + self.warmup + self.duration
+        workers = [
+            asyncio.create_task(self._worker(i, deadline))
+            for i in range(self.concurrency)
+        ]
+        await asyncio.sleep(self.warmup)
+        self._recording = True
+        measured_start = time.perf_counter()
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - measured_start
+
+        overall = LatencyHistogram()
+        for stats in self.stats.values():
+            overall.merge(stats.histogram)
+        errors = sum(stats.errors for stats in self.stats.values())
+
+        return {
+            "meta": {
+                "started_at": datetime.utcnow().isoformat(),
+                "concurrency": self.concurrency,
+                "duration": self.duration,
+                "warmup": self.warmup,
+                "mix": self.mix,
+                "prefill": self.prefill,
+                "seed": self.seed,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+            },
+            "summary": {
+                "requests": overall.total,
+                "errors": errors,
+                "elapsed": round(elapsed, 3),
+                "rps": round(overall.total / elapsed, 2) if elapsed else 0.0,
+                "latency": overall.summary(),
+            },
+            "operations": {
+                name: stats.to_dict(elapsed)
+                for name, stats in self.stats.items()
+                if stats.histogram.total
+            },
+        }
+
+
+# ============================================================================
+# TARGETS
+# ============================================================================
+
+@contextlib.asynccontextmanager
+async def open_client(target: str, timeout: float = 30.0):
+    """Yield an AsyncClient for 'asgi' (in-process) or an http(s) base URL"""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if target == "asgi":
+        from main import app
+
+        # ASGITransport does not emit lifespan events, so run them here
+        async with app.router.lifespan_context(app):
+            # Report server errors as 500 responses instead of raising them
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://benchmark", timeout=timeout
+            ) as client:
+                yield client
+    else:
+        async with httpx.AsyncClient(base_url=target, timeout=timeout, limits=limits) as client:
+            yield client
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict:
+    async with open_client(args.target, args.timeout) as client:
+        generator = LoadGenerator(
+            client,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            warmup=args.warmup,
+            mix=parse_mix(args.mix),
+            prefill=args.prefill,
+            seed=args.seed,
+        )
+        result = await generator.run()
+    result["meta"]["target"] = args.target
+    return result
+
+
+def print_summary(result: Dict) -> None:
+    """Print a human-readable result table"""
+    summary = result["summary"]
+    print("=" * 78)
+    print(f"Target: {result['meta']['target']}  "
+          f"concurrency={result['meta']['concurrency']}  duration={result['meta']['duration']}s")
+    print("=" * 78)
+    print(f"{'operation':<10}{'requests':>10}{'rps':>10}{'errors':>8}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = list(result["operations"].items()) + [("TOTAL", summary)]
+    for name, stats in rows:
+        latency = stats["latency"]
+        print(f"{name:<10}{stats['requests']:>10}{stats['rps']:>10.1f}{stats['errors']:>8}"
+              f"{latency['p50_ms']:>10.2f}{latency['p90_ms']:>10.2f}"
+              f"{latency['p99_ms']:>10.2f}{latency['max_ms']:>10.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Todo API load generator")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run a load test")
+    run_parser.add_argument("--target", default="asgi",
+                            help="'asgi' for in-process, or a base URL such as http://127.0.0.1:8000")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=1.0, help="Unrecorded seconds before measuring")
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    run_parser.add_argument("--prefill", type=int, default=100, help="Todos created before the run")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    run_parser.add_argument("--out", help="Write JSON results to this file")
+
+    compare_parser = subparsers.add_parser("compare", help="Diff two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--fail-on", type=float, default=None,
+                                help="Exit non-zero if p99 or rps regresses by more than this percent")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        from benchmarks.compare import compare_files
+
+        return compare_files(args.baseline, args.candidate, args.fail_on)
+
+    result = asyncio.run(run_benchmark(args))
+    print_summary(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✓ Results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Pagination envelope overhead and total accuracy
+
+Requests GET /api/todos for a set of filter shapes three ways - a bare
+list, ?envelope=true (totals from the mirror, counters or planner
+statistics, see app/utils/counts.py) and ?envelope=true&exact=true
+(COUNT(*)) - and reports the median latency of each, the envelope's
+overhead over the bare list and how far the cheap total is from the exact
+one. Search is measured the same way for a frequent term.
+
+The overhead that matters is on a large table, where COUNT(*) costs what
+the page does not: seed one first (the L scale is 10M todos) and run ANALYZE
+so sqlite_stat1 exists (the seeder does).
+
+Usage (from the server directory, or a scratch directory holding a large
+todos.db with PYTHONPATH pointing at the server directory):
+    python -m database.seed --scale L --reset
+    RATE_LIMIT_ENABLED=false python -m benchmarks.pagination
+    RATE_LIMIT_ENABLED=false python -m benchmarks.pagination --repeat 5 --out pagination.json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.testclient import TestClient
+
+USERNAME = "user0000001"
+PASSWORD = "password"
+
+SHAPES = {
+    "all": "",
+    "completed": "completed=true",
+    "owner": "owner=me",
+    "owner completed": "owner=me&completed=false",
+    "created range": "created_after=2025-03-01T12:00:00&created_before=2025-04-15T06:00:00",
+    "title prefix": "title_prefix=re",
+    "owner updated": "owner=me&updated_after=2025-06-01T00:00:00",
+}
+
+
+def timed(client: TestClient, url: str, headers: Dict, repeat: int) -> Tuple[float, Optional[Dict]]:
+    """Median milliseconds per request and the last response body (None after a 504)"""
+    samples, body = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code == 504:
+            # COUNT(*) over the whole table can outlast the route's deadline
+            return statistics.median(samples), None
+        response.raise_for_status()
+        body = response.json()
+    return statistics.median(samples), body
+
+
+def measure(client: TestClient, base: str, headers: Dict, repeat: int) -> Dict:
+    separator = "&" if "?" in base else "?"
+    plain_ms, _ = timed(client, base, headers, repeat)
+    envelope_ms, envelope = timed(client, f"{base}{separator}envelope=true", headers, repeat)
+    exact_ms, exact = timed(client, f"{base}{separator}envelope=true&exact=true", headers, max(1, repeat // 4))
+    total, true_total = envelope["total"], exact["total"] if exact else None
+    return {
+        "plain_ms": round(plain_ms, 3),
+        "envelope_ms": round(envelope_ms, 3),
+        "exact_ms": round(exact_ms, 3),
+        "overhead_ms": round(envelope_ms - plain_ms, 3),
+        "source": envelope["total_source"],
+        "total": total,
+        "exact_total": true_total,
+        "error_pct": round((total - true_total) / true_total * 100, 1)
+        if total is not None and true_total else None,
+        "exact_timed_out": exact is None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pagination envelope overhead and total accuracy")
+    parser.add_argument("--repeat", type=int, default=20, help="Requests per measurement")
+    parser.add_argument("--limit", type=int, default=20, help="Page size")
+    parser.add_argument("--search", default="report", help="Search term")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    from main import app
+
+    results = []
+    with TestClient(app) as client:
+        login = client.post("/auth/login", json={"username": USERNAME, "password": PASSWORD})
+        if login.status_code != 200:
+            print(f"✗ Could not log in as {USERNAME}; seed the database first (python -m database.seed)")
+            return 1
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        rows = client.get("/api/todos/stats").json()["total"]
+
+        for name, query in SHAPES.items():
+            url = f"/api/todos/?limit={args.limit}" + (f"&{query}" if query else "")
+            results.append({"shape": name, **measure(client, url, headers, args.repeat)})
+        results.append({"shape": f"search '{args.search}'",
+                        **measure(client, f"/api/todos/search/{args.search}?limit={args.limit}", headers,
+                                  args.repeat)})
+
+    print("=" * 96)
+    print(f"{rows:,} todos, page size {args.limit}, median of {args.repeat} requests "
+          f"(exact: {max(1, args.repeat // 4)})")
+    print("=" * 96)
+    print(f"{'shape':<20}{'list ms':>9}{'envelope':>10}{'overhead':>10}{'exact ms':>11}"
+          f"  {'source':<12}{'total':>12}{'exact':>12}{'error':>8}")
+    for row in results:
+        error = f"{row['error_pct']:+.1f}%" if row["error_pct"] is not None else "-"
+        total = f"{row['total']:,}" if row["total"] is not None else "-"
+        exact_total = f"{row['exact_total']:,}" if row["exact_total"] is not None else "504"
+        print(f"{row['shape']:<20}{row['plain_ms']:>9.2f}{row['envelope_ms']:>10.2f}{row['overhead_ms']:>+10.2f}"
+              f"{row['exact_ms']:>11.2f}  {row['source']:<12}{total:>12}{exact_total:>12}{error:>8}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rows": rows, "limit": args.limit, "repeat": args.repeat, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Request profiling overhead
+
+Times the same requests through the app in-process (TestClient) in three
+setups:
+
+  * disabled: the app as served with PROFILING_ENABLED unset
+  * not profiled: profiler middleware, endpoint anchors and SQL hooks
+    installed, but no request is picked
+  * profiled: every request sampled, stored and pruned
+
+The first two should be indistinguishable; the third is what a profiled
+request costs (the sampler interval is PROFILE_INTERVAL_MS).
+
+Usage (from the server directory, after seeding):
+    RATE_LIMIT_ENABLED=false python -m benchmarks.profiling
+    RATE_LIMIT_ENABLED=false python -m benchmarks.profiling --requests 500 --out profiling.json
+"""
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from fastapi.testclient import TestClient
+
+PATHS = ["/", "/api/todos/?limit=50", "/api/todos/stats", "/api/todos/search/qqzzx?limit=10"]
+
+
+class Switch:
+    """ASGI app forwarding to `target`, so setups share one client and one lifespan"""
+
+    def __init__(self, app):
+        self.target = app
+
+    async def __call__(self, scope, receive, send):
+        await self.target(scope, receive, send)
+
+
+def measure(client: TestClient, headers: Dict[str, str], path: str, requests: int) -> Dict:
+    for _ in range(min(20, requests)):
+        client.get(path, headers=headers)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Overhead of on-demand request profiling")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per path and setup")
+    parser.add_argument("--username", default="user0000001")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    import main as server
+    from app import config
+    from app.middleware.profiling import ProfilerMiddleware
+    from app.utils import profiling
+
+    if config.PROFILING_ENABLED:
+        print("✗ Run with PROFILING_ENABLED unset; the benchmark installs the profiler itself")
+        return 1
+
+    directory = tempfile.mkdtemp(prefix="profiles-")
+    results: Dict[str, Dict[str, Dict]] = {}
+    try:
+        switch = Switch(server.app)
+        with TestClient(switch) as client:
+            login = client.post("/auth/login", json={"username": args.username, "password": args.password})
+            if login.status_code != 200:
+                print(f"✗ Login as {args.username} failed; seed the database first (python -m database.seed)")
+                return 1
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            results["disabled"] = {path: measure(client, headers, path, args.requests) for path in PATHS}
+
+            profiling.instrument_routes(server.app)
+            profiling.install_sql_hooks()
+            for name, sample_rate in {"not profiled": 0, "profiled": 1}.items():
+                switch.target = ProfilerMiddleware(server.app, sample_rate=sample_rate, directory=directory)
+                results[name] = {path: measure(client, headers, path, args.requests) for path in PATHS}
+        stored = profiling.summaries(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print("=" * 98)
+    print(f"{args.requests} requests per path, sampling every {config.PROFILE_INTERVAL_MS:g} ms when profiled")
+    print("=" * 98)
+    print(f"{'path':<36}" + "".join(f"{name + ' p50 ms':>20}" for name in results) + f"{'profiled p99 ms':>22}")
+    for path in PATHS:
+        print(f"{path:<36}" + "".join(f"{results[name][path]['p50_ms']:>20.3f}" for name in results)
+              + f"{results['profiled'][path]['p99_ms']:>22.3f}")
+    if stored:
+        newest = stored[0]
+        print(f"\nlast profile: {newest['path']} {newest['wall_ms']} ms wall, {newest['ticks']} ticks, "
+              f"{newest['sql']['count']} statements ({newest['sql']['total_ms']} ms)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"requests": args.requests, "interval_ms": config.PROFILE_INTERVAL_MS, "results": results},
+                      f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
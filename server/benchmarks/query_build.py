@@ -0,0 +1,168 @@
+"""
+Query construction benchmark
+
+Python-side cost per request of the hot read queries, comparing the former
+`db.query(Todo).filter(...)` chains, rebuilt on every call, with the
+prebuilt bound-parameter statements in app/utils/statements.py and the
+per-shape listing statements from TodoFilter.statement().
+
+Two numbers per query:
+
+  * build: constructing the statement and computing its cache key, i.e.
+    the work done before the compiled-statement cache is consulted
+  * execute: the full call against a small in-memory SQLite database, so
+    database time is close to zero and the difference is Python overhead
+
+The compiled-cache hit rate of each variant is reported alongside.
+
+Usage (from the server directory):
+    python -m benchmarks.query_build
+    python -m benchmarks.query_build --runs 2000 --out query_build.json
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, event, insert, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.models.todo import Base, Todo
+from app.models.user import User
+from app.utils import statements
+from app.utils.filters import TodoFilter
+from benchmarks.compression import time_call
+from database.config import StatementCacheStats
+
+SINCE = datetime(2024, 1, 1)
+
+
+# ============================================================================
+# QUERIES
+# ============================================================================
+
+def legacy_queries(db: Session) -> Dict[str, Callable[[], object]]:
+    """The per-request query chains as the routes used to build them"""
+    def get():
+        return db.query(Todo).filter(Todo.id == 42)
+
+    def search():
+        pattern = "%task 1%"
+        return db.query(Todo).filter(or_(Todo.title.ilike(pattern), Todo.description.ilike(pattern))).limit(20)
+
+    def listing():
+        return (
+            db.query(Todo)
+            .filter(Todo.owner_id == 1, Todo.completed == False)  # noqa: E712
+            .filter(Todo.created_at >= SINCE)
+            .order_by(Todo.created_at, Todo.id)
+            .offset(0)
+            .limit(20)
+        )
+
+    return {"get": get, "search": search, "list": listing}
+
+
+def current_queries() -> Dict[str, Callable[[], Tuple]]:
+    """The same queries as the routes now issue them: statement + params"""
+    def get():
+        return statements.TODO_BY_ID, {"todo_id": 42}
+
+    def search():
+        return statements.SEARCH_TODOS, {"pattern": "%task 1%", "limit": 20}
+
+    def listing():
+        todo_filter = TodoFilter(owner_id=1, completed=False, created_after=SINCE)
+        return todo_filter.statement(), todo_filter.params(skip=0, limit=20)
+
+    return {"get": get, "search": search, "list": listing}
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def setup(rows: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User).values(id=1, username="query-build", hashed_password="-"))
+        connection.execute(insert(Todo), [
+            {"title": f"task {i}", "description": "query build", "completed": i % 3 == 0, "owner_id": 1,
+             "created_at": SINCE + timedelta(minutes=i), "updated_at": SINCE + timedelta(minutes=i)}
+            for i in range(rows)
+        ])
+    return engine
+
+
+def measure(engine, runs: int) -> List[Dict]:
+    results = []
+    with Session(engine) as db:
+        variants = {
+            "query chain": {
+                name: (lambda build=build: build()._statement_20(),
+                       lambda build=build: build().all())
+                for name, build in legacy_queries(db).items()
+            },
+            "prebuilt": {
+                name: (lambda build=build: build()[0],
+                       lambda build=build: db.execute(*build()).scalars().all())
+                for name, build in current_queries().items()
+            },
+        }
+        for variant, queries in variants.items():
+            for name, (build, execute) in queries.items():
+                # Both variants must return the same rows
+                if variant == "prebuilt":
+                    legacy = [todo.id for todo in legacy_queries(db)[name]().all()]
+                    assert [todo.id for todo in execute()] == legacy, name
+
+                counter = StatementCacheStats()
+                counter.install(engine)
+                execute()
+                build_us = time_call(lambda: build()._generate_cache_key(), runs)
+                execute_us = time_call(execute, runs)
+                event.remove(engine, "before_cursor_execute", counter.observe)
+                stats = counter.stats()
+                results.append({
+                    "query": name,
+                    "variant": variant,
+                    "build_us": round(build_us, 1),
+                    "execute_us": round(execute_us, 1),
+                    "hit_rate": stats["hit_rate"],
+                })
+                db.expunge_all()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Python-side query construction cost per request")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = measure(setup(args.rows), args.runs)
+
+    print("=" * 64)
+    print(f"in-memory SQLite, {args.rows} rows, median of {args.runs} runs")
+    print("=" * 64)
+    print(f"{'query':<8}{'variant':<14}{'build us':>10}{'execute us':>12}{'cache hits':>12}")
+    for row in sorted(results, key=lambda row: (row["query"], row["variant"])):
+        print(f"{row['query']:<8}{row['variant']:<14}{row['build_us']:>10.1f}"
+              f"{row['execute_us']:>12.1f}{row['hit_rate']:>12.1%}")
+    for query in ("get", "search", "list"):
+        before, after = (row["execute_us"] for row in results
+                         if row["query"] == query and row["variant"] in ("query chain", "prebuilt"))
+        print(f"✓ {query}: {before - after:.0f} us saved per request ({before / after:.1f}x)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rows": args.rows, "runs": args.runs, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
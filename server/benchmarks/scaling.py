@@ -0,0 +1,123 @@
+"""
+Worker scaling benchmark
+
+Starts serve.py with 1, 2, 4, ... N workers and runs the same load against
+each, reporting throughput and latency per worker count and the speedup
+relative to one worker.
+
+Usage (from the server directory):
+    python -m benchmarks.scaling --max-workers 8 --duration 15
+    python -m benchmarks.scaling --workers 1,2,3,4 --mix list=60,get=40 --out scaling.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.loadgen import LoadGenerator, open_client, parse_mix
+from benchmarks.startup import SERVER_DIR, _free_port
+
+# Read-heavy by default: SQLite serializes writers across processes
+DEFAULT_MIX = "list=45,get=35,search=10,stats=5,create=5"
+
+
+def worker_counts(max_workers: int) -> List[int]:
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+    return counts
+
+
+def start_server(workers: int, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--log-level", "warning"],
+        cwd=SERVER_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, "LOG_LEVEL": "WARNING"},
+    )
+    deadline = time.monotonic() + timeout
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+        while time.monotonic() < deadline:
+            try:
+                if client.get("/readyz").status_code == 200:
+                    # Give the remaining workers time to finish their lifespan startup
+                    time.sleep(0.5 + 0.1 * workers)
+                    return process
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"serve.py with {workers} workers did not become ready")
+
+
+async def measure(target: str, args: argparse.Namespace) -> Dict:
+    async with open_client(target) as client:
+        generator = LoadGenerator(
+            client,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            warmup=args.warmup,
+            mix=parse_mix(args.mix),
+            prefill=args.prefill,
+        )
+        return await generator.run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure throughput scaling across worker counts")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--workers", help="Explicit comma-separated worker counts (overrides --max-workers)")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--prefill", type=int, default=200)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    counts = [int(n) for n in args.workers.split(",")] if args.workers else worker_counts(args.max_workers)
+    rows = []
+    for workers in counts:
+        port = _free_port()
+        process = start_server(workers, port)
+        try:
+            result = asyncio.run(measure(f"http://127.0.0.1:{port}", args))
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+        summary = result["summary"]
+        rows.append({
+            "workers": workers,
+            "rps": summary["rps"],
+            "errors": summary["errors"],
+            "p50_ms": summary["latency"]["p50_ms"],
+            "p99_ms": summary["latency"]["p99_ms"],
+        })
+        print(f"  {workers} workers: {summary['rps']:.1f} req/s, p99 {summary['latency']['p99_ms']:.1f} ms")
+
+    base = rows[0]["rps"] or 1
+    print("=" * 60)
+    print(f"{'workers':>8}{'rps':>12}{'speedup':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for row in rows:
+        row["speedup"] = round(row["rps"] / base, 2)
+        print(f"{row['workers']:>8}{row['rps']:>12.1f}{row['speedup']:>9.2f}x"
+              f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['errors']:>8}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"concurrency": args.concurrency, "mix": args.mix, "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
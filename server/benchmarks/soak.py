@@ -0,0 +1,152 @@
+"""
+Memory soak test
+
+Runs the mixed load-generator workload for a long time (an hour by default)
+and samples the server's RSS every --sample-every seconds. After --settle
+seconds (caches, pools and the allocator's arenas filling up) growth must
+stay bounded:
+
+  * the last quarter's peak may exceed the first post-settle median by at
+    most --max-growth-mb
+  * the least-squares slope over the post-settle samples, in MB per hour,
+    is reported alongside
+
+Exits non-zero when growth exceeds the bound, so it can gate a release.
+
+Targets:
+    asgi                    in-process; RSS of this process (server and
+                            load generator share it)
+    http://host:port        a running server; pass --pid of one worker
+                            (started with --workers 1) to read its RSS
+
+Usage (from the server directory, after seeding):
+    RATE_LIMIT_ENABLED=false python -m benchmarks.soak
+    RATE_LIMIT_ENABLED=false python -m benchmarks.soak --duration 600 --settle 60 --max-growth-mb 16
+    python -m benchmarks.soak --target http://127.0.0.1:8000 --pid 12345
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.loadgen import DEFAULT_MIX, LoadGenerator, open_client, parse_mix
+
+
+def rss_reader(pid: Optional[int]) -> Callable[[], int]:
+    """RSS in bytes of pid (default: this process) from /proc"""
+    path = f"/proc/{pid or 'self'}/statm"
+    page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def read() -> int:
+        with open(path, "rb") as f:
+            return int(f.read().split()[1]) * page_size
+
+    read()  # fail early without /proc or with a bad pid
+    return read
+
+
+async def sample(read: Callable[[], int], every: float, samples: List[Tuple[float, int]], started: float) -> None:
+    while True:
+        samples.append((round(time.perf_counter() - started, 1), read()))
+        await asyncio.sleep(every)
+
+
+def slope_mb_per_hour(points: List[Tuple[float, int]]) -> float:
+    if len(points) < 2:
+        return 0.0
+    xs = [t for t, _ in points]
+    ys = [rss / (1024 * 1024) for _, rss in points]
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if not spread:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread * 3600
+
+
+def verdict(samples: List[Tuple[float, int]], settle: float, max_growth_mb: float) -> Dict:
+    settled = [point for point in samples if point[0] >= settle]
+    if len(settled) < 8:
+        return {"ok": False, "reason": "too few samples after --settle; run longer or sample more often"}
+    window = max(2, len(settled) // 4)
+    baseline = statistics.median(rss for _, rss in settled[:window])
+    peak = max(rss for _, rss in settled[-window:])
+    growth_mb = (peak - baseline) / (1024 * 1024)
+    return {
+        "ok": growth_mb <= max_growth_mb,
+        "baseline_mb": round(baseline / (1024 * 1024), 1),
+        "final_peak_mb": round(peak / (1024 * 1024), 1),
+        "growth_mb": round(growth_mb, 1),
+        "max_growth_mb": max_growth_mb,
+        "slope_mb_per_hour": round(slope_mb_per_hour(settled), 2),
+    }
+
+
+async def soak(args: argparse.Namespace) -> Dict:
+    read = rss_reader(args.pid)
+    samples: List[Tuple[float, int]] = []
+    async with open_client(args.target, args.timeout) as client:
+        generator = LoadGenerator(client, concurrency=args.concurrency, duration=args.duration,
+                                  warmup=0, mix=parse_mix(args.mix), prefill=args.prefill)
+        started = time.perf_counter()
+        sampler = asyncio.create_task(sample(read, args.sample_every, samples, started))
+        try:
+            result = await generator.run()
+        finally:
+            sampler.cancel()
+    samples.append((round(time.perf_counter() - started, 1), read()))
+    return {
+        "target": args.target,
+        "duration": args.duration,
+        "requests": result["summary"]["requests"],
+        "errors": result["summary"]["errors"],
+        "rps": result["summary"]["rps"],
+        "verdict": verdict(samples, args.settle, args.max_growth_mb),
+        "samples": samples,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the mixed workload for a long time and check RSS growth")
+    parser.add_argument("--target", default="asgi", help="'asgi' for in-process, or a base URL")
+    parser.add_argument("--pid", type=int, help="Server worker pid to watch (required for a URL target)")
+    parser.add_argument("--duration", type=float, default=3600, help="Seconds of load")
+    parser.add_argument("--settle", type=float, default=300, help="Seconds before growth is measured")
+    parser.add_argument("--sample-every", type=float, default=10, help="Seconds between RSS samples")
+    parser.add_argument("--max-growth-mb", type=float, default=32, help="Allowed RSS growth after --settle")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--prefill", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--out", help="Write JSON results (with every RSS sample) to this file")
+    args = parser.parse_args(argv)
+
+    if args.target != "asgi" and args.pid is None:
+        parser.error("--pid is required with a URL target")
+
+    result = asyncio.run(soak(args))
+    outcome = result["verdict"]
+
+    print("=" * 78)
+    print(f"Target: {args.target}  {args.duration:g}s at concurrency {args.concurrency}: "
+          f"{result['requests']} requests ({result['rps']} rps), {result['errors']} errors")
+    print("=" * 78)
+    if "reason" in outcome:
+        print(f"✗ {outcome['reason']}")
+    else:
+        print(f"RSS after settling: {outcome['baseline_mb']} MB -> {outcome['final_peak_mb']} MB peak "
+              f"in the last quarter ({outcome['growth_mb']:+} MB, slope {outcome['slope_mb_per_hour']:+} MB/h)")
+        mark = "✓" if outcome["ok"] else "✗"
+        print(f"{mark} growth {outcome['growth_mb']} MB (limit {outcome['max_growth_mb']} MB)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if outcome["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Startup benchmark
+
+Measures how long a fresh worker takes to become useful:
+  * import cost of `main`, from `python -X importtime` (median of N runs),
+    with the slowest modules by self time
+  * time to first request: spawn uvicorn and poll until a real API request
+    succeeds
+
+Exits non-zero when a target is missed, so it can guard against import-time
+regressions in CI.
+
+Usage (from the server directory):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --first-request-target-ms 1000 --out startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+# Targets for a warm file cache on a developer laptop
+IMPORT_TARGET_MS = 1000
+FIRST_REQUEST_TARGET_MS = 2000
+FIRST_REQUEST_PATH = "/api/todos/?limit=1"
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Parse `-X importtime` output into (module, self_us, cumulative_us)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure_import(module: str = "main", runs: int = 5) -> Dict:
+    """Import `module` in fresh interpreters and report its cumulative import time"""
+    totals = []
+    rows: List[Tuple[str, int, int]] = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=SERVER_DIR, capture_output=True, text=True, check=True,
+        )
+        rows = parse_importtime(completed.stderr)
+        totals.append(next(cumulative for name, _, cumulative in rows if name == module))
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:15]
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(statistics.median(totals) / 1000, 1),
+        "min_ms": round(min(totals) / 1000, 1),
+        "modules_imported": len(rows),
+        "slowest_self_ms": [
+            {"module": name, "self_ms": round(self_us / 1000, 2), "cumulative_ms": round(cum_us / 1000, 2)}
+            for name, self_us, cum_us in slowest
+        ],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(path: str = FIRST_REQUEST_PATH, timeout: float = 30.0) -> Dict:
+    """Spawn uvicorn and time until `path` first answers 200"""
+    port = _free_port()
+    started = time.perf_counter()
+    # Startup without the warm-up stage, which benchmarks/warmup.py measures
+    env = {**os.environ, "WARMUP_ENABLED": "false"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited early: {process.stderr.read().decode()}")
+                try:
+                    if client.get(path).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+            else:
+                raise RuntimeError(f"No successful response within {timeout}s")
+        first_request_ms = (time.perf_counter() - started) * 1000
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"path": path, "first_request_ms": round(first_request_ms, 1)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure import and time-to-first-request")
+    parser.add_argument("--runs", type=int, default=5, help="Import measurements to take the median of")
+    parser.add_argument("--import-target-ms", type=float, default=IMPORT_TARGET_MS)
+    parser.add_argument("--first-request-target-ms", type=float, default=FIRST_REQUEST_TARGET_MS)
+    parser.add_argument("--path", default=FIRST_REQUEST_PATH, help="Request that must succeed")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    imports = measure_import("main", args.runs)
+    first_request = measure_first_request(args.path)
+
+    print("=" * 60)
+    print(f"import main (median of {imports['runs']}): {imports['median_ms']} ms "
+          f"({imports['modules_imported']} modules), target {args.import_target_ms:g} ms")
+    print(f"time to first request {first_request['path']}: {first_request['first_request_ms']} ms, "
+          f"target {args.first_request_target_ms:g} ms")
+    print("=" * 60)
+    print("Slowest modules by self time:")
+    for row in imports["slowest_self_ms"]:
+        print(f"  {row['self_ms']:>8.2f} ms  {row['module']}")
+
+    result = {
+        "import": imports,
+        "first_request": first_request,
+        "targets": {
+            "import_ms": args.import_target_ms,
+            "first_request_ms": args.first_request_target_ms,
+        },
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    missed = []
+    if imports["median_ms"] > args.import_target_ms:
+        missed.append("import")
+    if first_request["first_request_ms"] > args.first_request_target_ms:
+        missed.append("first request")
+    if missed:
+        print(f"\n✗ Missed target: {', '.join(missed)}")
+        return 1
+    print("\n✓ Startup within targets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Title autocomplete: in-memory prefix index vs an indexed SQL prefix query
+
+Generates one owner's titles with the seeder's generator (1M by default),
+builds app/utils/suggest.py's OwnerTitles from them and reports:
+
+  * build time, the index's own byte estimate and what tracemalloc saw
+  * lookup latency (median and p99) for 1-4 character prefixes taken from
+    the titles, plus prefixes with no match
+  * upsert/remove latency (a title change mid-list shifts the sorted list)
+  * the same lookups in SQL on an in-memory SQLite copy, using the
+    (owner_id, lower(title)) index GET /api/todos?title_prefix= uses, with
+    every answer checked against the index
+
+Usage (from the server directory):
+    python -m benchmarks.suggest
+    python -m benchmarks.suggest --titles 200000 --lookups 2000 --out suggest.json
+"""
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import create_engine, func, insert, select
+
+from app.models.todo import Todo
+from app.models.user import User  # noqa: F401  (resolves Todo.owner)
+from app.utils.filters import prefix_bounds
+from app.utils.suggest import OwnerTitles
+from database.seed import DatasetGenerator, DatasetSpec
+
+OWNER_ID = 1
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50_us": round(statistics.median(samples), 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+        "max_us": round(samples[-1], 2),
+    }
+
+
+def generate(count: int, seed: int) -> List[Tuple[int, str]]:
+    spec = DatasetSpec(users=1, todos=count, seed=seed)
+    rows, todo_id = [], 0
+    for batch in DatasetGenerator(spec).todo_batches(10_000):
+        for row in batch:
+            todo_id += 1
+            rows.append((todo_id, row["title"]))
+    return rows
+
+
+def build(rows: List[Tuple[int, str]]) -> Tuple[OwnerTitles, float, int]:
+    """The index, seconds to build it and the bytes tracemalloc saw it keep"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    # Copies, so the strings the index keeps are traced like a database read
+    titles = OwnerTitles.from_rows((todo_id, title.encode().decode()) for todo_id, title in rows)
+    elapsed = time.perf_counter() - started
+    traced = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return titles, elapsed, traced
+
+
+def prefixes(rows: List[Tuple[int, str]], lookups: int, rng: random.Random) -> Dict[str, List[str]]:
+    """lookups prefixes per length, drawn from the titles, plus misses"""
+    sample = [title.lower() for _, title in rng.sample(rows, min(len(rows), lookups))]
+    shapes = {f"{length} char": [title[:length] for title in sample] for length in range(1, 5)}
+    shapes["miss"] = [f"\x7f{title[:3]}" for title in sample]
+    return shapes
+
+
+def time_lookups(titles: OwnerTitles, shapes: Dict[str, List[str]], limit: int) -> Dict[str, Dict]:
+    results = {}
+    for name, batch in shapes.items():
+        samples = []
+        for prefix in batch:
+            started = time.perf_counter()
+            titles.suggest(prefix, limit)
+            samples.append((time.perf_counter() - started) * 1e6)
+        results[name] = percentiles(samples)
+    return results
+
+
+def time_writes(titles: OwnerTitles, rows: List[Tuple[int, str]], count: int, rng: random.Random) -> Dict:
+    upserts, removals = [], []
+    next_id = len(rows) + 1
+    for _, title in rng.sample(rows, min(len(rows), count)):
+        started = time.perf_counter()
+        titles.upsert(next_id, f"{title} (copy {next_id})")
+        upserts.append((time.perf_counter() - started) * 1e6)
+        started = time.perf_counter()
+        titles.remove(next_id)
+        removals.append((time.perf_counter() - started) * 1e6)
+        next_id += 1
+    return {"upsert": percentiles(upserts), "remove": percentiles(removals)}
+
+
+def sql_lookups(rows: List[Tuple[int, str]], shapes: Dict[str, List[str]], titles: OwnerTitles,
+                limit: int, per_shape: int) -> Dict[str, Dict]:
+    """The same prefixes against SQLite's lower(title) index; answers checked against the index"""
+    engine = create_engine("sqlite://")
+    Todo.metadata.create_all(engine, tables=[User.__table__, Todo.__table__])
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), [{
+            "id": OWNER_ID, "username": "owner", "hashed_password": "-",
+        }])
+        for start in range(0, len(rows), 50_000):
+            connection.execute(insert(Todo.__table__), [
+                {"id": todo_id, "title": title, "owner_id": OWNER_ID} for todo_id, title in rows[start:start + 50_000]
+            ])
+        connection.exec_driver_sql("ANALYZE")
+
+    lowered = func.lower(Todo.title)
+    results = {}
+    with engine.connect() as connection:
+        for name, batch in shapes.items():
+            samples, mismatches = [], 0
+            for prefix in batch[:per_shape]:
+                low, high = prefix_bounds(prefix)
+                statement = (
+                    select(func.min(Todo.title)).where(Todo.owner_id == OWNER_ID, lowered >= low)
+                    .group_by(lowered).order_by(lowered).limit(limit)
+                )
+                if high is not None:
+                    statement = statement.where(lowered < high)
+                started = time.perf_counter()
+                found = connection.execute(statement).scalars().all()
+                samples.append((time.perf_counter() - started) * 1e6)
+                if [title.lower() for title in found] != [title.lower() for title in titles.suggest(prefix, limit)]:
+                    mismatches += 1
+            results[name] = {**percentiles(samples), "mismatches": mismatches}
+    engine.dispose()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Title autocomplete index vs SQL prefix query")
+    parser.add_argument("--titles", type=int, default=1_000_000, help="Titles for the owner")
+    parser.add_argument("--lookups", type=int, default=5000, help="Prefixes per shape")
+    parser.add_argument("--sql-lookups", type=int, default=500, help="Prefixes per shape against SQL (0 = skip)")
+    parser.add_argument("--limit", type=int, default=10, help="Suggestions per lookup")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    rows = generate(args.titles, args.seed)
+    print(f"Generated {len(rows):,} titles in {time.perf_counter() - started:.1f}s")
+
+    titles, build_seconds, traced = build(rows)
+    shapes = prefixes(rows, args.lookups, rng)
+    lookups = time_lookups(titles, shapes, args.limit)
+    writes = time_writes(titles, rows, args.lookups, rng)
+    sql = sql_lookups(rows, shapes, titles, args.limit, args.sql_lookups) if args.sql_lookups > 0 else {}
+
+    print("=" * 78)
+    print(f"{len(rows):,} titles, {len(titles.keys):,} distinct; built in {build_seconds:.2f}s")
+    print(f"Estimated {titles.bytes / 1024 / 1024:.1f} MB, traced {traced / 1024 / 1024:.1f} MB "
+          f"({traced / len(rows):.0f} bytes per todo)")
+    print("=" * 78)
+    print(f"{'lookup':<10}{'index p50':>12}{'p99':>10}{'max':>10}{'sql p50':>12}{'p99':>10}{'match':>8}")
+    for name, row in lookups.items():
+        line = f"{name:<10}{row['p50_us']:>10.1f}us{row['p99_us']:>8.1f}us{row['max_us']:>8.1f}us"
+        if name in sql:
+            match = "✓" if not sql[name]["mismatches"] else f"✗ {sql[name]['mismatches']}"
+            line += f"{sql[name]['p50_us']:>10.1f}us{sql[name]['p99_us']:>8.1f}us{match:>8}"
+        print(line)
+    for name, row in writes.items():
+        print(f"{name:<10}{row['p50_us']:>10.1f}us{row['p99_us']:>8.1f}us{row['max_us']:>8.1f}us")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "titles": len(rows), "distinct": len(titles.keys), "build_seconds": round(build_seconds, 3),
+                "estimated_bytes": titles.bytes, "traced_bytes": traced,
+                "lookups": lookups, "writes": writes, "sql": sql,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
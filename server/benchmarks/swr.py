@@ -0,0 +1,205 @@
+"""
+Stale-while-revalidate under injected database faults
+
+Drives GET /api/todos (lists and envelopes, anonymous and per owner) and
+GET /api/todos/{id} through the app in-process from --concurrency threads
+over a fixed set of --keys request shapes, while a fault injector hooked
+into every engine (before_cursor_execute) plays the database:
+
+  * healthy: statements run normally
+  * slow: every statement first sleeps --slow-delay seconds (longer than
+    SWR_LATENCY_BUDGET)
+  * down: every statement raises OperationalError, as a refused connection
+  * recovered: healthy again
+
+Each phase lasts --phase-seconds and runs once with the stale cache off and
+once on. Reported per phase: fresh, stale and 5xx responses, latency
+p50/p99 and statements per request (identical requests share a refresh).
+With the cache on, a shape that was answered before the fault must not see
+a 5xx during it and no stale response may be served while healthy; the
+exit status is non-zero otherwise.
+
+Usage (from the server directory, after seeding):
+    python -m benchmarks.swr
+    python -m benchmarks.swr --concurrency 32 --phase-seconds 5 --out swr.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Before the app is imported: no warm-up requests, no rate limiting
+os.environ.setdefault("WARMUP_ENABLED", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from sqlalchemy import event, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+PHASES = ("healthy", "slow", "down", "recovered")
+
+
+class FaultInjector:
+    """Slows down or fails every statement on the hooked engines"""
+
+    def __init__(self, engines, slow_delay: float):
+        self.mode = "healthy"
+        self.slow_delay = slow_delay
+        self.statements = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements += 1
+        if self.mode == "slow":
+            time.sleep(self.slow_delay)
+        elif self.mode == "down":
+            raise OperationalError(statement, parameters, ConnectionRefusedError("injected: database down"))
+
+
+def request_shapes(keys: int, seed: int) -> List[Tuple[str, Dict]]:
+    """keys distinct (path, headers) reads"""
+    from app.models.todo import Todo
+    from app.utils.auth import create_access_token
+    from app.utils.warmup import Warmup
+    from database.config import SessionLocal
+
+    rng = random.Random(seed)
+    tenants = [
+        {"Authorization": f"Bearer {create_access_token({'sub': name, 'user_id': user_id}, timedelta(hours=1))}"}
+        for user_id, name, _ in Warmup._tenants(5)
+    ]
+    with SessionLocal() as db:
+        ids = db.execute(select(Todo.id).order_by(Todo.id.desc()).limit(1000)).scalars().all()
+    shapes = [
+        lambda: ("/api/todos/?limit=10", {}),
+        lambda: (f"/api/todos/?skip={rng.randrange(0, 50, 10)}&limit=10", {}),
+        lambda: ("/api/todos/?completed=false&sort=-created_at&limit=20", {}),
+        lambda: ("/api/todos/?limit=20&envelope=true", {}),
+        lambda: (f"/api/todos/{rng.choice(ids)}", {}),
+        lambda: (f"/api/todos/{rng.choice(ids)}", {}),
+    ]
+    if tenants:
+        shapes += [
+            lambda: ("/api/todos/?owner=me&limit=10", rng.choice(tenants)),
+            lambda: ("/api/todos/?owner=me&limit=10&envelope=true", rng.choice(tenants)),
+        ]
+    found: Dict[Tuple, Tuple[str, Dict]] = {}
+    while len(found) < keys:
+        path, headers = rng.choice(shapes)()
+        found[(path, headers.get("Authorization"))] = (path, headers)
+    return list(found.values())
+
+
+def run_phase(client, reads: List[Tuple[str, Dict]], injector: FaultInjector, phase: str,
+              concurrency: int, seconds: float, seed: int) -> Dict:
+    injector.mode = "healthy" if phase == "recovered" else phase
+    statements_before = injector.statements
+    samples: List[Tuple[float, int, bool]] = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed + index)
+        while time.monotonic() < stop_at:
+            path, headers = rng.choice(reads)
+            started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples.append((elapsed, response.status_code, response.headers.get("X-Cache") == "stale"))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(ms for ms, _, _ in samples)
+    return {
+        "phase": phase,
+        "requests": len(samples),
+        "fresh": sum(1 for _, status, stale in samples if status < 500 and not stale),
+        "stale": sum(1 for _, status, stale in samples if stale),
+        "errors": sum(1 for _, status, _ in samples if status >= 500),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2) if latencies else None,
+        "statements_per_request": round((injector.statements - statements_before) / max(1, len(samples)), 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stale-while-revalidate under injected database faults")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+    parser.add_argument("--keys", type=int, default=20, help="Distinct request shapes")
+    parser.add_argument("--phase-seconds", type=float, default=3.0)
+    parser.add_argument("--slow-delay", type=float, default=1.5, help="Seconds added to each statement when slow")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    from fastapi.testclient import TestClient
+
+    import main as server
+    from app.utils.swr import stale_cache
+    from database.config import get_engine
+    from database.shards import shard_router
+
+    results: Dict[str, List[Dict]] = {}
+    failures: List[str] = []
+    with TestClient(server.app) as client:
+        engines = {id(engine): engine for _, engine in shard_router.engines()}
+        engines.setdefault(id(get_engine()), get_engine())
+        injector = FaultInjector(engines.values(), args.slow_delay)
+        reads = request_shapes(args.keys, args.seed)
+
+        for enabled in (False, True):
+            stale_cache.enabled = enabled
+            mode = "swr" if enabled else "off"
+            results[mode] = [
+                run_phase(client, reads, injector, phase, args.concurrency, args.phase_seconds, args.seed)
+                for phase in PHASES
+            ]
+            # Let refreshes still sleeping on the slow phase finish before the next run
+            injector.mode = "healthy"
+            time.sleep(args.slow_delay)
+        stale_cache.enabled = True
+        cache_stats = stale_cache.stats()
+
+    for row in results["swr"]:
+        if row["phase"] in ("slow", "down") and row["errors"]:
+            failures.append(f"{row['errors']} 5xx while {row['phase']} with a stale response available")
+        if row["phase"] == "healthy" and row["stale"]:
+            failures.append(f"{row['stale']} stale responses while healthy")
+
+    print("=" * 84)
+    print(f"{len(reads)} request shapes, {args.concurrency} threads, {args.phase_seconds}s per phase, "
+          f"slow = +{args.slow_delay}s per statement")
+    print("=" * 84)
+    print(f"{'cache':<7}{'phase':<11}{'requests':>9}{'fresh':>8}{'stale':>8}{'5xx':>8}"
+          f"{'p50 ms':>10}{'p99 ms':>10}{'stmts/req':>11}")
+    for mode, rows in results.items():
+        for row in rows:
+            print(f"{mode:<7}{row['phase']:<11}{row['requests']:>9}{row['fresh']:>8}{row['stale']:>8}"
+                  f"{row['errors']:>8}{row['p50_ms'] or 0:>10.2f}{row['p99_ms'] or 0:>10.2f}"
+                  f"{row['statements_per_request']:>11.2f}")
+    print(f"\nstale cache: {cache_stats}")
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures:
+        print("✓ No 5xx for cached shapes during the faults, no stale responses while healthy")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"concurrency": args.concurrency, "keys": len(reads), "results": results,
+                       "stale_cache": cache_stats}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
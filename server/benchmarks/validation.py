@@ -0,0 +1,145 @@
+"""
+Schema validation microbenchmark
+
+Cost per 1,000 todos of the request and response paths, before and after
+the move to pydantic v2-native schemas:
+
+  * input, before: v1-style @validator schema per item, then the route's
+    validate_todo_*/sanitize_* second pass
+  * input, after: TodoCreateList.validate_python() over the whole list
+  * output, before: FastAPI's response_model path for List[TodoResponse]
+    (validate, dump to Python objects, json.dumps)
+  * output, after: TodoResponseList validate + dump_json()
+
+The "before" schema is reproduced here so the comparison keeps working
+after the old code is gone.
+
+Usage (from the server directory):
+    python -m benchmarks.validation
+    python -m benchmarks.validation --items 1000 --runs 50 --out validation.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import warnings
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel, Field
+
+from app.models.schemas import TodoCreateList, TodoResponse, TodoResponseList
+from app.models.todo import Todo
+from app.models.user import User  # noqa: F401  (resolves Todo.owner)
+from app.utils.validators import (
+    sanitize_description,
+    sanitize_title,
+    validate_todo_description,
+    validate_todo_title,
+)
+from benchmarks.compression import sample_page, time_call
+
+with warnings.catch_warnings():
+    # v1-style validators are deprecated in pydantic 2; that is the point here
+    warnings.simplefilter("ignore")
+    from pydantic import validator
+
+    class LegacyTodoCreate(BaseModel):
+        """TodoCreate as it was before the v2 port"""
+        title: str = Field(..., min_length=1, max_length=255)
+        description: Optional[str] = Field(None, max_length=500)
+        completed: bool = Field(False)
+
+        @validator('title')
+        def title_not_empty(cls, v):
+            if not v or not v.strip():
+                raise ValueError('Title cannot be empty')
+            return v.strip()
+
+        @validator('description')
+        def description_strip(cls, v):
+            if v:
+                return v.strip()
+            return v
+
+
+def legacy_input(payloads: List[Dict]) -> List[Dict]:
+    validated = []
+    for payload in payloads:
+        todo = LegacyTodoCreate(**payload)
+        if not validate_todo_title(todo.title) or not validate_todo_description(todo.description):
+            raise ValueError("invalid todo")
+        validated.append({
+            "title": sanitize_title(todo.title),
+            "description": sanitize_description(todo.description),
+            "completed": todo.completed,
+        })
+    return validated
+
+
+def legacy_output(todos: List[Todo], field) -> bytes:
+    content = asyncio.run(serialize_response(field=field, response_content=todos, is_coroutine=False))
+    return JSONResponse(content).body
+
+
+def current_output(todos: List[Todo]) -> bytes:
+    return TodoResponseList.dump_json(TodoResponseList.validate_python(todos, from_attributes=True))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Validation cost per 1,000 todos, before and after")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--description-chars", type=int, default=120)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    records = json.loads(sample_page(args.items, args.description_chars))
+    payloads = [
+        {"title": f"  {r['title']} ", "description": r["description"], "completed": r["completed"]}
+        for r in records
+    ]
+    now = datetime(2024, 1, 1)
+    todos = [
+        Todo(id=r["id"], title=r["title"], description=r["description"], completed=r["completed"],
+             owner_id=1, created_at=now, updated_at=now + timedelta(hours=1),
+             completed_at=now + timedelta(hours=1) if r["completed"] else None)
+        for r in records
+    ]
+    field = create_response_field(name="response", type_=List[TodoResponse], mode="serialization")
+
+    # Both paths must agree before their speed is worth comparing
+    assert legacy_input(payloads) == TodoCreateList.dump_python(TodoCreateList.validate_python(payloads))
+    assert json.loads(legacy_output(todos, field)) == json.loads(current_output(todos))
+
+    scale = 1000 / args.items
+    rows = [
+        ("input", "before", time_call(lambda: legacy_input(payloads), args.runs)),
+        ("input", "after", time_call(lambda: TodoCreateList.validate_python(payloads), args.runs)),
+        ("output", "before", time_call(lambda: legacy_output(todos, field), args.runs)),
+        ("output", "after", time_call(lambda: current_output(todos), args.runs)),
+    ]
+    results = [{"path": path, "version": version, "ms_per_1000": round(us * scale / 1000, 3)}
+               for path, version, us in rows]
+
+    print("=" * 48)
+    print(f"{args.items} todos, median of {args.runs} runs")
+    print("=" * 48)
+    print(f"{'path':<8}{'version':<10}{'ms / 1,000 todos':>20}")
+    for row in results:
+        print(f"{row['path']:<8}{row['version']:<10}{row['ms_per_1000']:>20.3f}")
+    for path in ("input", "output"):
+        before, after = (row["ms_per_1000"] for row in results if row["path"] == path)
+        print(f"✓ {path}: {before / after:.1f}x faster")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"items": args.items, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
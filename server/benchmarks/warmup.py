@@ -0,0 +1,151 @@
+"""
+First-requests latency with and without the warm-up stage
+
+Starts uvicorn with WARMUP_ENABLED=false and then =true (app/utils/warmup.py),
+waits until /readyz answers 200 and immediately sends the first --requests
+requests: a mix of listings, envelopes, stats, single todos and title
+suggestions as the top tenants and anonymously, the way traffic lands on a
+new worker during a rollout. Reports time to ready and the latency
+distribution of those first requests per mode, pooled over --runs starts.
+
+Usage (from the server directory, after seeding):
+    python -m benchmarks.warmup
+    python -m benchmarks.warmup --runs 5 --concurrency 4 --out warmup.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.startup import SERVER_DIR, _free_port
+
+TOP_TENANTS = 5
+
+
+def tenant_headers() -> List[Tuple[int, Dict]]:
+    """(owner id, auth headers) of the owners the warm-up primes"""
+    from app.utils.auth import create_access_token
+    from app.utils.warmup import Warmup
+    from main import init_database
+
+    # Same schema and counters as a server start (todo_stats_owner is filled on startup)
+    init_database()
+    return [
+        (user_id, {"Authorization": "Bearer " + create_access_token({"sub": name, "user_id": user_id},
+                                                                    timedelta(hours=1))})
+        for user_id, name, _ in Warmup._tenants(TOP_TENANTS)
+    ]
+
+
+def request_mix(tenants: List[Tuple[int, Dict]], count: int, seed: int) -> List[Tuple[str, Dict]]:
+    """count (path, headers) pairs, the same for every run"""
+    rng = random.Random(seed)
+    shapes = [
+        lambda headers: ("/api/todos/?owner=me&limit=10", headers),
+        lambda headers: ("/api/todos/?owner=me&limit=20&envelope=true", headers),
+        lambda headers: ("/api/todos/stats?owner=me", headers),
+        lambda headers: (f"/api/todos/suggest?prefix={rng.choice('abcdefghilmnoprst')}", headers),
+        lambda headers: ("/api/todos/?limit=10", {}),
+        lambda headers: ("/api/todos/?completed=false&sort=-created_at&limit=10", {}),
+        lambda headers: ("/api/todos/stats", {}),
+        lambda headers: (f"/api/todos/{rng.randint(1, 1000)}", {}),
+    ]
+    return [rng.choice(shapes)(rng.choice(tenants)[1] if tenants else {}) for _ in range(count)]
+
+
+def run_once(warm: bool, mix: List[Tuple[str, Dict]], concurrency: int, timeout: float) -> Dict:
+    port = _free_port()
+    env = {**os.environ, "WARMUP_ENABLED": "true" if warm else "false", "RATE_LIMIT_ENABLED": "false"}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Server exited early: {process.stderr.read().decode()}")
+                try:
+                    if client.get("/readyz").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+            else:
+                raise RuntimeError(f"Not ready within {timeout}s")
+            ready_ms = (time.perf_counter() - started) * 1000
+
+            def timed(request: Tuple[str, Dict]) -> float:
+                path, headers = request
+                request_started = time.perf_counter()
+                response = client.get(path, headers=headers)
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{path} returned {response.status_code}")
+                return (time.perf_counter() - request_started) * 1000
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                samples = list(executor.map(timed, mix))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"ready_ms": ready_ms, "samples": samples}
+
+
+def summarize(runs: List[Dict]) -> Dict:
+    samples = sorted(sample for run in runs for sample in run["samples"])
+    firsts = [run["samples"][0] for run in runs]
+    return {
+        "ready_ms": round(statistics.median(run["ready_ms"] for run in runs), 1),
+        "first_ms": round(statistics.median(firsts), 2),
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95)], 2),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+        "max_ms": round(samples[-1], 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="First-requests latency with and without warm-up")
+    parser.add_argument("--requests", type=int, default=100, help="Requests measured after readiness")
+    parser.add_argument("--runs", type=int, default=3, help="Server starts per mode")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for readiness")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    mix = request_mix(tenant_headers(), args.requests, args.seed)
+    results = {}
+    for warm in (False, True):
+        runs = [run_once(warm, mix, args.concurrency, args.timeout) for _ in range(args.runs)]
+        results["warm-up" if warm else "cold"] = summarize(runs)
+
+    print("=" * 80)
+    print(f"First {args.requests} requests after /readyz, {args.runs} starts per mode, "
+          f"concurrency {args.concurrency}")
+    print("=" * 80)
+    print(f"{'mode':<10}{'ready ms':>10}{'first':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for mode, row in results.items():
+        print(f"{mode:<10}{row['ready_ms']:>10.0f}{row['first_ms']:>9.2f}{row['mean_ms']:>9.2f}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['max_ms']:>9.2f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"requests": args.requests, "runs": args.runs, "concurrency": args.concurrency,
+                       "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Rebuild or verify the daily and per-owner todo rollups
+
+The rollups in todo_stats_daily and todo_stats_owner are maintained on
+every write; run this after loading data outside the API (or after
+migrations 005 and 008) to rebuild them from the todos table, or with --verify to compare them with a raw
+recomputation without changing anything (exits non-zero on a mismatch).
+Without --url every todo shard (SHARD_URLS, see database/shards.py) is
+processed in turn.
+
+Usage (from the server directory):
+    python -m database.backfill_stats
+    python -m database.backfill_stats --verify
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.todo import Base
+from app.models.user import User  # noqa: F401  (resolves Todo.owner)
+from app.utils import rollups
+from database.seed import build_engine
+from database.shards import shard_router
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild or verify the daily and per-owner todo rollups")
+    parser.add_argument("--verify", action="store_true", help="Only compare rollups with the todos table")
+    parser.add_argument("--url", help="Database URL (defaults to the app's configured database)")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        engines = [(args.url.split("@")[-1], build_engine(args.url))]
+        if not args.verify:
+            Base.metadata.create_all(bind=engines[0][1])
+    else:
+        shard_router.configure()
+        engines = shard_router.engines()
+        if not args.verify:
+            Base.metadata.create_all(bind=build_engine(None))
+            shard_router.create_tables()
+
+    failed = False
+    for name, engine in engines:
+        if not args.verify:
+            days = rollups.backfill(engine)
+            print(f"✓ {name}: {days:,} daily rollup rows and per-owner counts rebuilt")
+
+        problems = rollups.compare(engine)
+        if problems:
+            failed = True
+            print(f"✗ {name}: {len(problems)} days differ from the todos table:")
+            for problem in problems[:20]:
+                print(f"  {problem}")
+        else:
+            print(f"✓ {name}: rollups match the todos table")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Back up, snapshot or restore the SQLite databases
+
+Makes consistent copies while the API keeps running (see app/utils/backup.py):
+online backups in small steps by default, --vacuum for compacted VACUUM INTO
+snapshots. Without --url every SQLite database the app uses (the main
+database and any todo shards) is copied into --dir.
+
+--restore copies a snapshot back into a database. The live database is first
+backed up next to the snapshots, then locked for the duration of the copy;
+stop the API first unless requests may wait that long.
+
+Usage (from the server directory):
+    python -m database.backup
+    python -m database.backup --vacuum
+    python -m database.backup --list
+    python -m database.backup --restore backups/todos-20240101T000000Z.db
+    python -m database.backup --restore backups/shard1-20240101T000000Z.db --database shard1
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.engine import make_url
+
+from app import config
+from app.utils import backup
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Back up, snapshot or restore the SQLite databases")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--vacuum", action="store_true", help="Compacted snapshot with VACUUM INTO")
+    action.add_argument("--restore", metavar="SNAPSHOT", help="Copy SNAPSHOT back into the database")
+    action.add_argument("--list", action="store_true", help="List snapshots in --dir")
+    parser.add_argument("--url", help="SQLite database URL (defaults to the app's databases)")
+    parser.add_argument("--database", default="main", help="Database to restore into (main or a shard name)")
+    parser.add_argument("--dir", default=config.BACKUP_DIR, help="Snapshot directory")
+    parser.add_argument("--pages", type=int, default=config.BACKUP_PAGES_PER_STEP, help="Pages per backup step")
+    parser.add_argument("--pause", type=float, default=config.BACKUP_STEP_PAUSE, help="Seconds between steps")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for snapshot in backup.snapshots(args.dir):
+            print(f"{snapshot['name']:<40} {snapshot['bytes']:>14,} bytes  {snapshot['modified']}")
+        return 0
+
+    if args.url:
+        url = make_url(args.url)
+        if url.get_backend_name() != "sqlite" or not url.database:
+            print("✗ --url must name a SQLite database file")
+            return 1
+        databases = [(args.database, os.path.abspath(url.database))]
+    else:
+        databases = backup.databases()
+    if not databases:
+        print("✗ No SQLite databases configured (use pg_dump for PostgreSQL)")
+        return 1
+
+    if args.restore:
+        targets = [path for name, path in databases if name == args.database]
+        if not targets:
+            print(f"✗ unknown database '{args.database}'. Choose from: {', '.join(name for name, _ in databases)}")
+            return 1
+        try:
+            backup.verify(args.restore)
+            safety = backup.snapshot_path(targets[0], args.dir).replace(".db", "-pre-restore.db")
+            backup.online_backup(targets[0], safety, args.pages, args.pause)
+            print(f"✓ current {args.database} database saved to {safety}")
+            result = backup.restore(args.restore, targets[0])
+        except (backup.BackupError, OSError) as e:
+            print(f"✗ restore failed: {e}")
+            return 1
+        print(f"✓ {args.database} restored from {args.restore} ({result['bytes']:,} bytes, {result['seconds']}s)")
+        return 0
+
+    failed = False
+    for name, path in databases:
+        target = backup.snapshot_path(path, args.dir)
+        try:
+            if args.vacuum:
+                result = backup.vacuum_into(path, target)
+            else:
+                result = backup.online_backup(path, target, args.pages, args.pause)
+        except (backup.BackupError, OSError) as e:
+            failed = True
+            print(f"✗ {name}: {e}")
+            continue
+        details = f", {result['steps']} steps, {result['restarts']} restarts" if result["mode"] == "online" else ""
+        print(f"✓ {name}: {target} ({result['bytes']:,} bytes in {result['seconds']}s, "
+              f"{result['mb_per_second']} MB/s, longest lock {result['longest_step_ms']:.1f} ms{details})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
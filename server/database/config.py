@@ -1,47 +1,344 @@
+"""
+Database engine and session configuration
+
+Nothing is done at import time: the environment is read and the engine is
+created on first use (normally from the application lifespan), so importing
+the app stays cheap. `engine` and `DATABASE_URL` remain importable as module
+attributes for backward compatibility.
+"""
+import logging
 import os
-from sqlalchemy import create_engine
+import sys
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-from dotenv import load_dotenv
+from sqlalchemy.pool import QueuePool
+
+from database import deadline
+
+logger = logging.getLogger(__name__)
+
+
+class PoolWaitStats:
+    """
+    Exponentially weighted average of connection checkout wait.
+
+    Checkouts only happen under traffic, so the average also decays with
+    time, halving every half_life seconds: admission control sheds on it,
+    and a worker shedding every request would otherwise never see it fall.
+    """
+
+    def __init__(self, alpha: float = 0.2, half_life: float = float(os.getenv("DB_POOL_WAIT_HALF_LIFE", "5"))):
+        self.alpha = alpha
+        self.half_life = half_life
+        self.max_ms = 0.0
+        self._ewma_ms = 0.0
+        self._updated_at = time.monotonic()
+
+    def _decayed(self, now: float) -> float:
+        if self.half_life <= 0:
+            return self._ewma_ms
+        return self._ewma_ms * 0.5 ** ((now - self._updated_at) / self.half_life)
+
+    @property
+    def ewma_ms(self) -> float:
+        return self._decayed(time.monotonic())
+
+    def observe(self, seconds: float) -> None:
+        now = time.monotonic()
+        ms = seconds * 1000
+        ewma = self._decayed(now)
+        self._ewma_ms = ewma + self.alpha * (ms - ewma)
+        self._updated_at = now
+        self.max_ms = max(self.max_ms, ms)
+
+
+pool_wait = PoolWaitStats()
+
+
+class IdentityMapStats:
+    """
+    Identity-map size of request sessions, recorded when they close.
+
+    Rows are counted as the session loads them (the identity map is weak,
+    so by the time the session closes most objects have already left it);
+    objects still held at close are counted separately. Loading thousands
+    of ORM objects in one request is the usual cause of memory spikes
+    after big list or search requests; sessions above warn_at are logged.
+    """
+
+    def __init__(self, warn_at: int = int(os.getenv("SESSION_IDENTITY_WARN", "1000")), alpha: float = 0.2):
+        self.warn_at = warn_at
+        self.alpha = alpha
+        self.sessions = 0
+        self.loaded = 0
+        self.ewma = 0.0
+        self.max = 0
+        self.held_max = 0
+        self.over_limit = 0
+
+    @staticmethod
+    def _on_load(session, instance) -> None:
+        session.info["loaded"] = session.info.get("loaded", 0) + 1
+
+    def install(self, session_factory: sessionmaker) -> None:
+        if not event.contains(session_factory, "loaded_as_persistent", self._on_load):
+            event.listen(session_factory, "loaded_as_persistent", self._on_load)
+
+    def observe(self, session) -> None:
+        loaded = session.info.pop("loaded", 0)
+        held = len(session.identity_map)
+        size = max(loaded, held)
+        self.sessions += 1
+        self.loaded += loaded
+        self.ewma += self.alpha * (size - self.ewma)
+        self.max = max(self.max, size)
+        self.held_max = max(self.held_max, held)
+        if size > self.warn_at:
+            self.over_limit += 1
+            logger.warning(f"Session loaded {loaded} objects ({held} still held at close)")
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": self.sessions,
+            "mean_loaded": round(self.loaded / self.sessions, 2) if self.sessions else 0.0,
+            "ewma": round(self.ewma, 2),
+            "max": self.max,
+            "held_at_close_max": self.held_max,
+            "warn_at": self.warn_at,
+            "over_limit": self.over_limit,
+        }
+
+
+identity_maps = IdentityMapStats()
+
+
+class StatementCacheStats:
+    """Compiled-statement cache hits and misses, counted per execution"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+        # Main engine and shard engines; disposed engines drop out
+        self.engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+    def observe(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if context is None:
+            return
+        if context.cache_hit is CacheStats.CACHE_HIT:
+            self.hits += 1
+        elif context.cache_hit is CacheStats.CACHE_MISS:
+            self.misses += 1
+        else:
+            # exec_driver_sql(), DDL, or a statement that has no cache key
+            self.uncached += 1
+
+    def install(self, engine: Engine) -> None:
+        self.engines.add(engine)
+        if not event.contains(engine, "before_cursor_execute", self.observe):
+            event.listen(engine, "before_cursor_execute", self.observe)
+
+    def stats(self) -> Dict:
+        cached = self.hits + self.misses
+        sizes = [len(engine._compiled_cache) for engine in list(self.engines)
+                 if getattr(engine, "_compiled_cache", None) is not None]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_rate": round(self.hits / cached, 4) if cached else None,
+            "size": sum(sizes),
+        }
+
 
-# Load environment variables
-load_dotenv()
+statement_cache = StatementCacheStats()
 
-# Determine database type from environment or use SQLite by default
-use_postgresql = os.getenv("USE_POSTGRESQL", "false").lower() == "true"
 
-if use_postgresql:
-    # PostgreSQL configuration
-    DATABASE_URL = os.getenv(
-        "DATABASE_URL",
-        f"postgresql://{os.getenv('DATABASE_USER', 'postgres')}:{os.getenv('DATABASE_PASSWORD', 'password')}@{os.getenv('DATABASE_HOST', 'localhost')}:{os.getenv('DATABASE_PORT', '5432')}/{os.getenv('DATABASE_NAME', 'todoapp')}"
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection
+    and refuses checkouts for requests whose deadline has already passed
+    """
+
+    def _do_get(self):
+        if deadline.expired():
+            raise exc.TimeoutError("Request deadline exceeded before a connection was checked out")
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - started)
+
+
+_engine: Optional[Engine] = None
+
+# Driver for URLs that name none: psycopg 3 can prepare statements server-side
+POSTGRESQL_DRIVER = "psycopg"
+
+# Create session factory; bound to the engine by init_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def with_driver(database_url: str) -> str:
+    """Spell out the default PostgreSQL driver in a URL that names none"""
+    for prefix in ("postgresql://", "postgres://"):
+        if database_url.startswith(prefix):
+            return f"postgresql+{POSTGRESQL_DRIVER}://" + database_url[len(prefix):]
+    return database_url
+
+
+def load_database_settings() -> Tuple[str, Dict]:
+    """Read the database URL and pool options from the environment"""
+    from dotenv import load_dotenv
+
+    # Load environment variables
+    load_dotenv()
+
+    # Determine database type from environment or use SQLite by default
+    use_postgresql = os.getenv("USE_POSTGRESQL", "false").lower() == "true"
+
+    if use_postgresql:
+        # PostgreSQL configuration
+        database_url = with_driver(os.getenv(
+            "DATABASE_URL",
+            f"postgresql://{os.getenv('DATABASE_USER', 'postgres')}:{os.getenv('DATABASE_PASSWORD', 'password')}@{os.getenv('DATABASE_HOST', 'localhost')}:{os.getenv('DATABASE_PORT', '5432')}/{os.getenv('DATABASE_NAME', 'todoapp')}"
+        ))
+    else:
+        # SQLite configuration (default)
+        database_url = "sqlite:///./todos.db"
+
+    return database_url, pool_settings(database_url)
+
+
+def pool_settings(database_url: str) -> Dict:
+    """Pool and connect options for a database URL (also used for shards)"""
+    # Upper bound on waiting for a connection (pool checkout, connect, SQLite lock)
+    connection_timeout = int(os.getenv("DB_CONNECTION_TIMEOUT", "10"))
+
+    if not database_url.startswith("sqlite"):
+        # One connection per concurrent request; StaticPool would share a single
+        # connection between worker threads
+        pool_config = {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "20")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "40")),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "3600")),
+            "pool_pre_ping": True,
+            "pool_timeout": connection_timeout,
+            "connect_args": {"connect_timeout": connection_timeout},
+        }
+        if database_url.startswith("postgresql+psycopg://"):
+            # psycopg 3 prepares a statement server-side once it has run this
+            # many times on a connection; "none" disables it (e.g. behind
+            # PgBouncer in transaction mode)
+            threshold = os.getenv("DB_PREPARE_THRESHOLD", "5")
+            pool_config["connect_args"]["prepare_threshold"] = (
+                None if threshold.lower() == "none" else int(threshold)
+            )
+        return pool_config
+
+    # File databases get SQLAlchemy's default QueuePool so concurrent
+    # requests never share a sqlite3 connection
+    return {
+        "connect_args": {"check_same_thread": False, "timeout": connection_timeout},
+        "poolclass": InstrumentedQueuePool,
+        "pool_timeout": connection_timeout,
+    }
+
+
+def _set_journal_mode(engine: Engine, mode: str) -> None:
+    """
+    Switch SQLite files to a journal mode (persistent in the file). In WAL
+    mode readers, including online backups (app/utils/backup.py), never
+    block writers.
+    """
+    if mode not in ("delete", "truncate", "persist", "wal"):
+        raise ValueError(f"Unsupported DB_SQLITE_JOURNAL_MODE '{mode}'")
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"PRAGMA journal_mode={mode}")
+
+
+def create_configured_engine(database_url: str, session_factory: sessionmaker) -> Engine:
+    """
+    Create an engine with the app's pool, cache and deadline settings and
+    bind session_factory to it
+    """
+    database_url = with_driver(database_url)
+    engine = create_engine(
+        database_url,
+        echo=os.getenv("DEBUG", "False") == "True",
+        # Compiled SQL per statement shape; the hot queries are prebuilt
+        # (app/utils/statements.py) so each shape compiles once
+        query_cache_size=int(os.getenv("DB_QUERY_CACHE_SIZE", "500")),
+        **pool_settings(database_url)
     )
-    pool_config = {"poolclass": StaticPool}
-else:
-    # SQLite configuration (default)
-    DATABASE_URL = "sqlite:///./todos.db"
-    pool_config = {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool}
+    session_factory.configure(bind=engine)
+    statement_cache.install(engine)
+    identity_maps.install(session_factory)
+    journal_mode = os.getenv("DB_SQLITE_JOURNAL_MODE", "").lower()
+    if journal_mode and engine.dialect.name == "sqlite":
+        _set_journal_mode(engine, journal_mode)
+    # Cancel queries that outlive the request deadline
+    deadline.install(engine, session_factory)
+    return engine
 
-print(f"Using database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL}")
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    echo=os.getenv("DEBUG", "False") == "True",
-    **pool_config
-)
+def init_engine() -> Engine:
+    """Create the engine (once) and bind the session factory to it"""
+    global _engine
+    if _engine is None:
+        database_url, _ = load_database_settings()
+        logger.info(f"Using database: {database_url.split('@')[1] if '@' in database_url else database_url}")
+        _engine = create_configured_engine(database_url, SessionLocal)
+    return _engine
+
+
+def dispose_engine(close: bool = True) -> None:
+    """
+    Drop pooled connections and forget the engine.
+
+    Call with close=False in a forked child: the parent's connections must
+    not be closed (or used) by the child, only abandoned.
+    """
+    global _engine
+    # Shard engines (database/shards.py) go with the main one
+    shards = sys.modules.get("database.shards")
+    if shards is not None:
+        shards.shard_router.dispose(close=close)
+    if _engine is not None:
+        _engine.dispose(close=close)
+        _engine = None
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
     """Dependency for getting database session"""
+    if _engine is None:
+        init_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
+        identity_maps.observe(db)
         db.close()
 
-def get_engine():
+
+def get_engine() -> Engine:
     """Get the database engine"""
-    return engine
+    return init_engine()
+
+
+def __getattr__(name):
+    # Lazy module attributes kept for `from database.config import engine`
+    if name == "engine":
+        return init_engine()
+    if name == "DATABASE_URL":
+        return init_engine().url.render_as_string(hide_password=False)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
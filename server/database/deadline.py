@@ -0,0 +1,72 @@
+"""
+Request deadlines for database work
+
+The deadline middleware stores an absolute deadline (time.monotonic()) in a
+context variable. Context variables are copied into the threadpool that runs
+sync routes and dependencies, so the database layer can read the deadline of
+the request it is serving and stop work once it has passed:
+
+  * PostgreSQL: each transaction sets `SET LOCAL statement_timeout` to the
+    remaining budget, so the server cancels the query
+  * SQLite: a progress handler interrupts the running statement
+  * pool checkouts fail immediately once the deadline has passed
+
+Work outside a request (startup, health checks, seeding) has no deadline.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Absolute time.monotonic() deadline of the current request, if any
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# SQLite calls the progress handler every N virtual machine instructions
+SQLITE_PROGRESS_INTERVAL = 10_000
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    budget = remaining()
+    return budget is not None and budget <= 0
+
+
+def _sqlite_progress_handler() -> int:
+    # Runs on the thread executing the statement; non-zero aborts it with
+    # sqlite3.OperationalError("interrupted")
+    return 1 if expired() else 0
+
+
+def _on_sqlite_connect(dbapi_connection, connection_record) -> None:
+    dbapi_connection.set_progress_handler(_sqlite_progress_handler, SQLITE_PROGRESS_INTERVAL)
+
+
+def _on_session_begin(session, transaction, connection) -> None:
+    budget = remaining()
+    if budget is None or connection.dialect.name != "postgresql":
+        return
+    # SET LOCAL ends with the transaction, so pooled connections stay clean
+    timeout_ms = max(1, int(budget * 1000))
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+def install(engine, session_factory) -> None:
+    """Register deadline enforcement on an engine and its session factory"""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _on_sqlite_connect)
+    elif engine.dialect.name == "postgresql":
+        if not event.contains(session_factory, "after_begin", _on_session_begin):
+            event.listen(session_factory, "after_begin", _on_session_begin)
+    else:
+        logger.warning(f"Request deadlines are not enforced for {engine.dialect.name}")
@@ -0,0 +1,16 @@
+-- Cold storage for todos cleared with DELETE /api/todos/clear-completed?archive=true
+
+CREATE TABLE IF NOT EXISTS todos_archive (
+    id SERIAL PRIMARY KEY,
+    todo_id INTEGER NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    completed BOOLEAN NOT NULL,
+    owner_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_todos_archive_todo_id ON todos_archive(todo_id);
+CREATE INDEX IF NOT EXISTS ix_todos_archive_owner_id ON todos_archive(owner_id);
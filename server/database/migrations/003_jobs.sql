@@ -0,0 +1,21 @@
+-- Background jobs: status, progress and results (see app/utils/jobs.py)
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    kind VARCHAR(64) NOT NULL,
+    params JSON NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    progress JSON NOT NULL,
+    result JSON,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    worker VARCHAR(128),
+    heartbeat_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_kind_status ON jobs(kind, status);
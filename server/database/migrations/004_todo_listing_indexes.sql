@@ -0,0 +1,13 @@
+-- Supporting indexes for the GET /api/todos filter/sort grammar
+-- (equality on owner_id/completed, then one sort key; see app/utils/filters.py)
+
+CREATE INDEX IF NOT EXISTS idx_todos_updated_at ON todos(updated_at);
+CREATE INDEX IF NOT EXISTS idx_todos_title_lower ON todos(lower(title));
+CREATE INDEX IF NOT EXISTS idx_todos_completed_updated ON todos(completed, updated_at);
+CREATE INDEX IF NOT EXISTS idx_todos_completed_title_lower ON todos(completed, lower(title));
+CREATE INDEX IF NOT EXISTS idx_todos_owner_created ON todos(owner_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_todos_owner_updated ON todos(owner_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_todos_owner_title_lower ON todos(owner_id, lower(title));
+CREATE INDEX IF NOT EXISTS idx_todos_owner_completed_created ON todos(owner_id, completed, created_at);
+CREATE INDEX IF NOT EXISTS idx_todos_owner_completed_updated ON todos(owner_id, completed, updated_at);
+CREATE INDEX IF NOT EXISTS idx_todos_owner_completed_title_lower ON todos(owner_id, completed, lower(title));
@@ -0,0 +1,15 @@
+-- Completion timestamps and daily rollups for /api/todos/stats/timeseries
+-- (see app/utils/rollups.py). Run `python -m database.backfill_stats` afterwards.
+
+ALTER TABLE todos ADD COLUMN completed_at TIMESTAMP;
+ALTER TABLE todos_archive ADD COLUMN completed_at TIMESTAMP;
+
+-- Completed todos were last updated when they were completed
+UPDATE todos SET completed_at = updated_at WHERE completed AND completed_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS todo_stats_daily (
+    day DATE PRIMARY KEY,
+    created INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    completion_seconds DOUBLE PRECISION NOT NULL DEFAULT 0
+);
@@ -0,0 +1,40 @@
+-- Maintain todo_stats_daily with row triggers instead of application hooks,
+-- so single-statement writes (INSERT/UPDATE/DELETE ... RETURNING) and bulk
+-- deletes keep the rollups current. Same definitions as TRIGGERS in
+-- app/utils/rollups.py. Run `python -m database.backfill_stats` afterwards.
+
+CREATE OR REPLACE FUNCTION todo_stats_daily_apply(
+    row_created TIMESTAMP, row_completed TIMESTAMP, sign INTEGER) RETURNS void AS $$
+BEGIN
+    IF row_created IS NOT NULL THEN
+        INSERT INTO todo_stats_daily AS s (day, created, completed, completion_seconds)
+        VALUES (row_created::date, sign, 0, 0)
+        ON CONFLICT (day) DO UPDATE SET created = s.created + EXCLUDED.created;
+    END IF;
+    IF row_completed IS NOT NULL THEN
+        INSERT INTO todo_stats_daily AS s (day, created, completed, completion_seconds)
+        VALUES (row_completed::date, 0, sign, sign * EXTRACT(EPOCH FROM row_completed - row_created))
+        ON CONFLICT (day) DO UPDATE SET completed = s.completed + EXCLUDED.completed,
+            completion_seconds = s.completion_seconds + EXCLUDED.completion_seconds;
+    END IF;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION todo_stats_daily_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+            AND OLD.completed_at IS NOT DISTINCT FROM NEW.completed_at THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM todo_stats_daily_apply(OLD.created_at, OLD.completed_at, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM todo_stats_daily_apply(NEW.created_at, NEW.completed_at, 1);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS todos_stats_daily ON todos;
+CREATE TRIGGER todos_stats_daily
+AFTER INSERT OR DELETE OR UPDATE OF created_at, completed_at ON todos
+FOR EACH ROW EXECUTE FUNCTION todo_stats_daily_trigger();
@@ -0,0 +1,12 @@
+-- Tenant directory for sharding todos by owner (see database/shards.py).
+-- Lives in the main database next to users; shards hold todos,
+-- todos_archive and todo_stats_daily and are created by the app on startup
+-- (or from 001/002/005/006 with the todos.owner_id foreign key dropped).
+
+CREATE TABLE IF NOT EXISTS tenant_shards (
+    owner_id INTEGER PRIMARY KEY,
+    shard VARCHAR(64) NOT NULL,
+    state VARCHAR(16) NOT NULL DEFAULT 'active',
+    target VARCHAR(64),
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
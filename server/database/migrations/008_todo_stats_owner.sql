@@ -0,0 +1,41 @@
+-- Per-owner todo counts for pagination totals (see app/utils/counts.py),
+-- maintained by row triggers like todo_stats_daily. Same definitions as
+-- TRIGGERS in app/utils/rollups.py. Run `python -m database.backfill_stats`
+-- afterwards. Shards need the table and trigger too.
+
+CREATE TABLE IF NOT EXISTS todo_stats_owner (
+    owner_id INTEGER PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION todo_stats_owner_apply(
+    row_owner INTEGER, row_completed BOOLEAN, sign INTEGER) RETURNS void AS $$
+BEGIN
+    IF row_owner IS NOT NULL THEN
+        INSERT INTO todo_stats_owner AS s (owner_id, total, completed)
+        VALUES (row_owner, sign, CASE WHEN row_completed THEN sign ELSE 0 END)
+        ON CONFLICT (owner_id) DO UPDATE SET total = s.total + EXCLUDED.total,
+            completed = s.completed + EXCLUDED.completed;
+    END IF;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION todo_stats_owner_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.owner_id IS NOT DISTINCT FROM NEW.owner_id
+            AND OLD.completed IS NOT DISTINCT FROM NEW.completed THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM todo_stats_owner_apply(OLD.owner_id, OLD.completed, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM todo_stats_owner_apply(NEW.owner_id, NEW.completed, 1);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS todos_stats_owner ON todos;
+CREATE TRIGGER todos_stats_owner
+AFTER INSERT OR DELETE OR UPDATE OF owner_id, completed ON todos
+FOR EACH ROW EXECUTE FUNCTION todo_stats_owner_trigger();
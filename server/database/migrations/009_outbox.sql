@@ -0,0 +1,14 @@
+-- Transactional outbox of todo changes (see app/utils/outbox.py): rows are
+-- written with each create/update/delete and removed once delivered. Shards
+-- need the table too.
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id SERIAL PRIMARY KEY,
+    event VARCHAR(32) NOT NULL,
+    todo_id INTEGER NOT NULL,
+    owner_id INTEGER,
+    payload JSON,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claimed_by VARCHAR(128),
+    claimed_until TIMESTAMP
+);
@@ -0,0 +1,8 @@
+-- Per-kind lock rows for the job runner (see app/utils/jobs.py): claims and
+-- deduplicated submits lock their kind's row before counting jobs, so
+-- runners sharing the jobs table cannot exceed a concurrency limit
+
+CREATE TABLE IF NOT EXISTS job_kinds (
+    kind VARCHAR(64) PRIMARY KEY,
+    locked_at TIMESTAMP
+);
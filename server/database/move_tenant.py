@@ -0,0 +1,281 @@
+"""
+Online tenant moves between todo shards
+
+Moves owners' todos (and archived todos) to another shard while the API
+keeps serving them:
+
+  1. each owner is marked "moving" in tenant_shards: reads continue from
+     the current shard, writes get 503 with Retry-After
+  2. after a grace period (every process has re-read the directory and
+     in-flight writes have finished), rows are copied in id batches with
+     their ids, then counts and the latest updated_at are compared
+  3. the directory is switched to the target shard
+  4. after another grace period the rows left on the source are deleted
+
+A failed copy removes the partial copy and restores the owner's previous
+directory entry; an interrupted run is resumed by running it again. Daily
+rollups follow through the triggers on both shards.
+
+Besides single moves:
+
+  * --park [SHARD] records every user without a directory entry on SHARD
+    (default: where the current SHARD_URLS ring places them). Run it before
+    enabling sharding on a database that already holds todos (SHARD = the
+    shard naming that database), or before adding a shard (with the old
+    SHARD_URLS), so no tenant's data becomes unreachable.
+  * --rebalance moves every parked tenant to the shard the ring now picks
+    and drops the entries. Pins made with --owner/--to are left alone.
+
+Usage (from the server directory, with SHARD_URLS set as for the API):
+    python -m database.move_tenant --owner 42 --to shard2
+    python -m database.move_tenant --park shard0
+    python -m database.move_tenant --rebalance --grace 0
+    python -m database.move_tenant --list
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+
+from app import config
+from app.models.shard import TenantShard
+from app.models.todo import ArchivedTodo, Todo
+from app.models.user import User
+from database.config import init_engine
+from database.shards import ACTIVE, MOVING, ShardRouter, shard_router
+
+# Directory entries written by --park; --rebalance moves these tenants only
+PARKED = "parked"
+
+# owner_id -> (shard, state, target)
+Entry = Tuple[str, str, Optional[str]]
+
+
+# ============================================================================
+# DIRECTORY
+# ============================================================================
+
+def read_directory(engine: Engine) -> Dict[int, Entry]:
+    """Directory rows straight from the main database (no process cache)"""
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(TenantShard.owner_id, TenantShard.shard, TenantShard.state, TenantShard.target)
+        ).all()
+    return {owner_id: (shard, state, target) for owner_id, shard, state, target in rows}
+
+
+def write_entries(engine: Engine, entries: Dict[int, Optional[Entry]]) -> None:
+    """Replace directory rows; None removes the owner's row (back to the ring)"""
+    if not entries:
+        return
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(delete(TenantShard).where(TenantShard.owner_id.in_(list(entries))))
+        rows = [
+            {"owner_id": owner_id, "shard": shard, "state": state, "target": target, "updated_at": now}
+            for owner_id, entry in entries.items() if entry is not None
+            for shard, state, target in [entry]
+        ]
+        if rows:
+            connection.execute(insert(TenantShard), rows)
+
+
+def wait(grace: float, reason: str) -> None:
+    if grace > 0:
+        print(f"  waiting {grace:g}s for {reason}...")
+        time.sleep(grace)
+
+
+# ============================================================================
+# COPY / VERIFY / DELETE
+# ============================================================================
+
+def _fingerprint(engine: Engine, owner_id: int) -> Tuple:
+    with engine.connect() as connection:
+        todos = connection.execute(
+            select(func.count(), func.max(Todo.updated_at)).where(Todo.owner_id == owner_id)
+        ).one()
+        archived = connection.execute(
+            select(func.count()).select_from(ArchivedTodo).where(ArchivedTodo.owner_id == owner_id)
+        ).scalar()
+    return tuple(todos) + (archived,)
+
+
+def remove_rows(engine: Engine, owner_id: int, batch_size: int) -> int:
+    """Delete an owner's todos and archived todos from one shard, in batches"""
+    removed = 0
+    for model in (Todo, ArchivedTodo):
+        while True:
+            with engine.begin() as connection:
+                ids = connection.execute(
+                    select(model.id).where(model.owner_id == owner_id).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                removed += connection.execute(delete(model).where(model.id.in_(ids))).rowcount
+    return removed
+
+
+def copy_rows(source: Engine, target: Engine, owner_id: int, batch_size: int) -> int:
+    """Copy an owner's rows from source to target; todo ids are kept"""
+    # Leftovers of an earlier failed attempt
+    remove_rows(target, owner_id, batch_size)
+    copied = 0
+    for model, keep_ids in ((Todo, True), (ArchivedTodo, False)):
+        table = model.__table__
+        columns = [column for column in table.c if keep_ids or column.name != "id"]
+        last_id = 0
+        while True:
+            with source.connect() as connection:
+                rows = connection.execute(
+                    select(table).where(table.c.owner_id == owner_id, table.c.id > last_id)
+                    .order_by(table.c.id).limit(batch_size)
+                ).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            with target.begin() as connection:
+                connection.execute(insert(table), [{c.name: row[c.name] for c in columns} for row in rows])
+            copied += len(rows)
+    return copied
+
+
+# ============================================================================
+# MOVES
+# ============================================================================
+
+def move(router: ShardRouter, targets: Dict[int, str], pin: bool, grace: float, batch_size: int) -> int:
+    """
+    Move owners to targets[owner_id]. With pin, the new placement is kept in
+    the directory; otherwise the entry is dropped and the ring decides (which
+    must then agree with the target). Returns the number of failed owners.
+    """
+    main_engine = init_engine()
+    directory = read_directory(main_engine)
+    plan: Dict[int, Tuple[str, str, Optional[Entry]]] = {}
+    settled: Dict[int, Optional[Entry]] = {}
+    for owner_id, target in sorted(targets.items()):
+        entry = directory.get(owner_id)
+        if entry and entry[1] == MOVING:
+            # An interrupted move: start over from the shard still serving reads
+            entry = (entry[0], ACTIVE, None)
+        source = entry[0] if entry else router.ring.lookup(owner_id)
+        if source == target:
+            settled[owner_id] = (target, ACTIVE, None) if pin else None
+            continue
+        plan[owner_id] = (source, target, entry)
+    write_entries(main_engine, settled)
+    if not plan:
+        print("✓ nothing to move")
+        return 0
+
+    print(f"Moving {len(plan)} tenant(s)")
+    write_entries(main_engine, {owner_id: (source, MOVING, target) for owner_id, (source, target, _) in plan.items()})
+    wait(grace, "every process to pause writes")
+
+    failed, moved = 0, {}
+    for owner_id, (source, target, previous) in plan.items():
+        source_engine, target_engine = router.shards[source].engine, router.shards[target].engine
+        try:
+            copied = copy_rows(source_engine, target_engine, owner_id, batch_size)
+            expected, actual = _fingerprint(source_engine, owner_id), _fingerprint(target_engine, owner_id)
+            if expected != actual:
+                raise RuntimeError(f"copy mismatch: source {expected}, target {actual}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ owner {owner_id}: {source} -> {target} failed: {e}")
+            remove_rows(target_engine, owner_id, batch_size)
+            write_entries(main_engine, {owner_id: previous})
+            continue
+        moved[owner_id] = (source, target)
+        print(f"  owner {owner_id}: {copied:,} rows copied {source} -> {target}")
+
+    write_entries(main_engine, {
+        owner_id: (target, ACTIVE, None) if pin else None for owner_id, (_, target) in moved.items()
+    })
+    wait(grace, "every process to read from the new shards")
+
+    for owner_id, (source, _) in moved.items():
+        remove_rows(router.shards[source].engine, owner_id, batch_size)
+    print(f"✓ {len(moved)} tenant(s) moved" + (f", ✗ {failed} failed" if failed else ""))
+    return failed
+
+
+def park(router: ShardRouter, shard: Optional[str]) -> int:
+    """Record every user without a directory entry on shard (default: its ring shard)"""
+    main_engine = init_engine()
+    directory = read_directory(main_engine)
+    with main_engine.connect() as connection:
+        owners = connection.execute(select(User.id)).scalars().all()
+    entries = {
+        owner_id: (shard or router.ring.lookup(owner_id), PARKED, None)
+        for owner_id in owners if owner_id not in directory
+    }
+    write_entries(main_engine, entries)
+    print(f"✓ {len(entries):,} tenant(s) parked")
+    return len(entries)
+
+
+def print_directory(router: ShardRouter) -> None:
+    directory = read_directory(init_engine())
+    for name, engine in router.engines():
+        with engine.connect() as connection:
+            owners, todos = connection.execute(select(func.count(func.distinct(Todo.owner_id)), func.count())).one()
+        print(f"{name:<12} {owners:>8,} owners {todos:>12,} todos")
+    for owner_id, (shard, state, target) in sorted(directory.items()):
+        print(f"  owner {owner_id:<8} {shard:<12} {state}{f' -> {target}' if target else ''}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Move tenants between todo shards while the API is running")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--owner", type=int, nargs="+", help="Owner id(s) to move (and pin) to --to")
+    action.add_argument("--park", nargs="?", const="", metavar="SHARD",
+                        help="Record unlisted users on SHARD (default: their ring shard)")
+    action.add_argument("--rebalance", action="store_true", help="Move parked tenants to their ring shard")
+    action.add_argument("--list", action="store_true", help="Show rows per shard and the directory")
+    parser.add_argument("--to", help="Target shard for --owner")
+    parser.add_argument("--grace", type=float, default=config.SHARD_DIRECTORY_TTL + config.REQUEST_TIMEOUT,
+                        help="Seconds to wait after each directory change (0 if the API is stopped)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    shard_router.configure()
+    if not shard_router.sharded:
+        print("✗ SHARD_URLS is not set; there is nothing to move between")
+        return 1
+    # Directory table and shard schemas, as the API creates them on startup
+    TenantShard.__table__.create(init_engine(), checkfirst=True)
+    shard_router.create_tables()
+
+    if args.list:
+        print_directory(shard_router)
+        return 0
+    if args.park is not None:
+        if args.park and args.park not in shard_router.shards:
+            print(f"✗ unknown shard '{args.park}'")
+            return 1
+        park(shard_router, args.park or None)
+        return 0
+    if args.rebalance:
+        parked = [owner_id for owner_id, (_, state, _) in read_directory(init_engine()).items() if state == PARKED]
+        targets = {owner_id: shard_router.ring.lookup(owner_id) for owner_id in parked}
+        return 1 if move(shard_router, targets, False, args.grace, args.batch_size) else 0
+
+    if args.to not in shard_router.shards:
+        print(f"✗ --to must name a shard: {', '.join(shard_router.shards)}")
+        return 1
+    targets = {owner_id: args.to for owner_id in args.owner}
+    return 1 if move(shard_router, targets, True, args.grace, args.batch_size) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
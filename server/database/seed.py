@@ -0,0 +1,423 @@
+"""
+Deterministic dataset generator for benchmarking
+
+Generates users and todos from a seed so that the same arguments always
+produce byte-identical tables. Rows are written with bulk Core inserts, or
+with COPY on PostgreSQL.
+
+Usage (from the server directory):
+    python -m database.seed --scale S --reset
+    python -m database.seed --scale M --owner-skew 1.1 --completed-ratio 0.4 --reset
+    python -m database.seed --users 500 --todos 250000 --method copy --reset
+
+The dataset goes to one database, users and todos alike. With SHARD_URLS
+set the app would look for todos on the shards, so the seeder refuses to
+run against the configured database; pass --url to seed one database
+explicitly (e.g. an unsharded benchmark copy).
+"""
+
+import argparse
+import bisect
+import csv
+import hashlib
+import io
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, delete, func, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app import config
+from app.models.todo import Base, Todo
+from app.models.user import User
+from app.utils import rollups
+
+# Named scale factors: (users, todos)
+SCALE_FACTORS: Dict[str, Tuple[int, int]] = {
+    "S": (100, 100_000),
+    "M": (1_000, 1_000_000),
+    "L": (10_000, 10_000_000),
+}
+
+# All timestamps are generated relative to this fixed instant
+EPOCH = datetime(2025, 1, 1)
+HISTORY_DAYS = 365
+SEED_PASSWORD = "password"
+
+WORDS = (
+    "buy milk call mom write report fix bug review pull request plan sprint book "
+    "flight pay rent clean kitchen read paper deploy server water plants update "
+    "docs email team schedule meeting prepare slides renew passport order gift "
+    "walk dog refactor module backup database check logs grocery list invoice "
+    "client follow up draft proposal cancel subscription tidy garage"
+).split()
+# Texts are sliced out of one long corpus, which is much faster than joining
+# random words per row while staying deterministic
+CORPUS_SIZE = 1 << 16
+
+
+def build_corpus(rng: random.Random) -> str:
+    words = []
+    size = 0
+    while size < CORPUS_SIZE:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+class LengthDistribution:
+    """Log-normal text length with a given mean, clamped to [minimum, maximum]"""
+
+    def __init__(self, mean: float, maximum: int, minimum: int = 1, sigma: float = 0.6):
+        self.mu = math.log(max(mean, 1)) - sigma ** 2 / 2
+        self.sigma = sigma
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def sample(self, rng: random.Random) -> int:
+        length = int(rng.lognormvariate(self.mu, self.sigma))
+        return min(max(length, self.minimum), self.maximum)
+
+
+class DatasetSpec:
+    """Parameters that fully determine a generated dataset"""
+
+    def __init__(
+        self,
+        users: int,
+        todos: int,
+        seed: int = 42,
+        completed_ratio: float = 0.3,
+        owner_skew: float = 1.0,
+        title_mean: float = 32,
+        title_max: int = 255,
+        description_ratio: float = 0.6,
+        description_mean: float = 120,
+        description_max: int = 500,
+    ):
+        if users < 1:
+            raise ValueError("At least one user is required")
+        if not 0 <= completed_ratio <= 1 or not 0 <= description_ratio <= 1:
+            raise ValueError("Ratios must be between 0 and 1")
+        self.users = users
+        self.todos = todos
+        self.seed = seed
+        self.completed_ratio = completed_ratio
+        self.owner_skew = owner_skew
+        self.title_mean = title_mean
+        self.title_max = title_max
+        self.description_ratio = description_ratio
+        self.description_mean = description_mean
+        self.description_max = description_max
+
+    def to_dict(self) -> Dict:
+        return dict(vars(self))
+
+    def fingerprint(self) -> str:
+        """Short hash identifying the dataset; equal fingerprints mean equal data"""
+        payload = json.dumps(self.to_dict(), sort_keys=True).encode()
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+
+class DatasetGenerator:
+    """Yields deterministic user and todo rows for a DatasetSpec"""
+
+    def __init__(self, spec: DatasetSpec, first_user_id: int = 1):
+        self.spec = spec
+        self.first_user_id = first_user_id
+        # Owner skew: Zipf weights over user rank (0 = uniform)
+        weights = [1.0 / (rank ** spec.owner_skew) for rank in range(1, spec.users + 1)]
+        self._owner_cum_weights = list(itertools.accumulate(weights))
+
+    def users(self, password_hash: str) -> Iterator[Dict]:
+        for i in range(self.spec.users):
+            user_id = self.first_user_id + i
+            yield {"id": user_id, "username": f"user{user_id:07d}", "hashed_password": password_hash}
+
+    def todo_batches(self, batch_size: int) -> Iterator[List[Dict]]:
+        spec = self.spec
+        rng = random.Random(spec.seed)
+        corpus = build_corpus(rng)
+        corpus_limit = len(corpus) - max(spec.title_max, spec.description_max)
+        titles = LengthDistribution(spec.title_mean, spec.title_max)
+        descriptions = LengthDistribution(spec.description_mean, spec.description_max)
+        cum_weights = self._owner_cum_weights
+        total_weight = cum_weights[-1]
+        first_user_id = self.first_user_id
+        history_seconds = HISTORY_DAYS * 86400
+
+        def text_of(length: int) -> str:
+            start = rng.randrange(corpus_limit)
+            return corpus[start:start + length].strip() or "todo"
+
+        remaining = spec.todos
+        while remaining > 0:
+            batch = []
+            for _ in range(min(batch_size, remaining)):
+                created_at = EPOCH + timedelta(seconds=rng.randrange(history_seconds))
+                completed = rng.random() < spec.completed_ratio
+                # Completed todos were last touched when they were completed
+                updated_at = created_at + timedelta(seconds=rng.randrange(14 * 86400)) if completed else created_at
+                owner_rank = bisect.bisect_left(cum_weights, rng.random() * total_weight)
+                batch.append({
+                    "title": text_of(titles.sample(rng)),
+                    "description": (
+                        text_of(descriptions.sample(rng))
+                        if rng.random() < spec.description_ratio else None
+                    ),
+                    "completed": completed,
+                    "owner_id": first_user_id + min(owner_rank, spec.users - 1),
+                    "created_at": created_at,
+                    "updated_at": updated_at,
+                    "completed_at": updated_at if completed else None,
+                })
+            remaining -= len(batch)
+            yield batch
+
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+
+TODO_COLUMNS = ("title", "description", "completed", "owner_id", "created_at", "updated_at", "completed_at")
+
+
+def insert_batch(connection: Connection, rows: List[Dict]) -> None:
+    """Bulk insert through a Core executemany"""
+    connection.execute(insert(Todo.__table__), rows)
+
+
+def copy_batch(connection: Connection, rows: List[Dict]) -> None:
+    """Stream a batch through PostgreSQL COPY ... FROM STDIN"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            row["title"],
+            row["description"] if row["description"] is not None else r"\N",
+            "t" if row["completed"] else "f",
+            row["owner_id"],
+            row["created_at"].isoformat(),
+            row["updated_at"].isoformat(),
+            row["completed_at"].isoformat() if row["completed_at"] is not None else r"\N",
+        ])
+    statement = f"COPY todos ({', '.join(TODO_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    with connection.connection.cursor() as cursor, cursor.copy(statement) as copy:
+        copy.write(buffer.getvalue())
+
+
+def reset_tables(engine: Engine) -> None:
+    print("Removing existing users and todos...")
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            connection.execute(text("TRUNCATE todos, users RESTART IDENTITY"))
+        else:
+            # SQLite rowids restart from max(id) + 1, i.e. 1 on an empty table
+            connection.execute(delete(Todo.__table__))
+            connection.execute(delete(User.__table__))
+
+
+def _check_empty(engine: Engine) -> None:
+    with engine.connect() as connection:
+        existing = connection.execute(select(func.count()).select_from(Todo.__table__)).scalar()
+        existing += connection.execute(select(func.count()).select_from(User.__table__)).scalar()
+    if existing:
+        raise RuntimeError("Tables are not empty; pass --reset to generate a reproducible dataset")
+
+
+def seed(
+    engine: Engine,
+    spec: DatasetSpec,
+    method: str = "auto",
+    batch_size: int = 10_000,
+    reset: bool = False,
+    drop_indexes: bool = True,
+) -> Dict:
+    """Generate and write a dataset; returns timing statistics"""
+    if method == "auto":
+        method = "copy" if engine.dialect.driver == "psycopg" else "insert"
+    if method == "copy" and engine.dialect.driver != "psycopg":
+        raise ValueError("COPY is only available on PostgreSQL with psycopg 3")
+    Base.metadata.create_all(bind=engine)
+    # Refuse before touching the triggers: a populated database keeps them
+    if not reset:
+        _check_empty(engine)
+
+    # Per-row rollup triggers would dominate a bulk load (and a reset);
+    # the rollups are rebuilt once at the end instead
+    with engine.begin() as connection:
+        rollups.drop_triggers(connection)
+    loaded = False
+    try:
+        stats = _write_dataset(engine, spec, method, batch_size, reset, drop_indexes)
+        loaded = True
+    finally:
+        # Also on failure: without the triggers every later write would
+        # silently skip the rollups
+        with engine.begin() as connection:
+            rollups.install_triggers(connection)
+        if not loaded:
+            print("✗ Seeding failed; rollup triggers reinstalled, run "
+                  "python -m database.backfill_stats to rebuild the rollups")
+
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    return stats
+
+
+def _write_dataset(
+    engine: Engine,
+    spec: DatasetSpec,
+    method: str,
+    batch_size: int,
+    reset: bool,
+    drop_indexes: bool,
+) -> Dict:
+    """Write users and todos with the rollup triggers dropped, then backfill the rollups"""
+    if reset:
+        reset_tables(engine)
+    write_batch = copy_batch if method == "copy" else insert_batch
+
+    generator = DatasetGenerator(spec)
+
+    from app.utils.auth import get_password_hash
+
+    # Hash once; every seeded user shares the same password
+    password_hash = get_password_hash(SEED_PASSWORD)
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        users = list(generator.users(password_hash))
+        for chunk_start in range(0, len(users), batch_size):
+            connection.execute(insert(User.__table__), users[chunk_start:chunk_start + batch_size])
+        if engine.dialect.name == "postgresql":
+            connection.execute(text(
+                "SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users))"
+            ))
+    print(f"✓ {spec.users:,} users written")
+
+    # Building secondary indexes once after the load is far cheaper than
+    # maintaining them row by row
+    indexes = list(Todo.__table__.indexes) if drop_indexes else []
+    with engine.begin() as connection:
+        for index in indexes:
+            # Reflection skips expression indexes, so checkfirst would miss them
+            connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+    written = 0
+    todo_started = time.perf_counter()
+    with engine.connect() as connection:
+        if engine.dialect.name == "sqlite":
+            # Skip fsync per batch; an interrupted load is simply regenerated
+            connection.exec_driver_sql("PRAGMA synchronous = OFF")
+        for batch in generator.todo_batches(batch_size):
+            write_batch(connection, batch)
+            connection.commit()
+            written += len(batch)
+            elapsed = time.perf_counter() - todo_started
+            print(f"\r  {written:,}/{spec.todos:,} todos ({written / elapsed:,.0f} rows/s)", end="", flush=True)
+    print()
+    with engine.begin() as connection:
+        for index in indexes:
+            index.create(connection)
+    todo_elapsed = time.perf_counter() - todo_started
+
+    # Rebuilt before the triggers go back (seed() reinstalls them): installing
+    # them fills an empty per-owner table on its own
+    rollup_days = rollups.backfill(engine)
+    print(f"✓ {rollup_days:,} daily rollup rows rebuilt")
+
+    return {
+        "fingerprint": spec.fingerprint(),
+        "method": method,
+        "users": spec.users,
+        "todos": written,
+        "seconds": round(time.perf_counter() - started, 2),
+        "todo_rows_per_sec": round(written / todo_elapsed) if todo_elapsed else 0,
+        "spec": spec.to_dict(),
+    }
+
+
+def build_engine(url: Optional[str]) -> Engine:
+    if not url:
+        from database.config import get_engine
+
+        return get_engine()
+    from database.config import with_driver
+
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return create_engine(with_driver(url), connect_args=connect_args)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a deterministic benchmark dataset")
+    parser.add_argument("--scale", choices=sorted(SCALE_FACTORS), default="S",
+                        help="Named size: " + ", ".join(
+                            f"{name}={users:,} users/{todos:,} todos"
+                            for name, (users, todos) in SCALE_FACTORS.items()))
+    parser.add_argument("--users", type=int, help="Override the scale's user count")
+    parser.add_argument("--todos", type=int, help="Override the scale's todo count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--completed-ratio", type=float, default=0.3)
+    parser.add_argument("--owner-skew", type=float, default=1.0,
+                        help="Zipf exponent for todos per owner (0 = uniform)")
+    parser.add_argument("--title-mean", type=float, default=32, help="Mean title length in chars")
+    parser.add_argument("--title-max", type=int, default=255)
+    parser.add_argument("--description-ratio", type=float, default=0.6,
+                        help="Fraction of todos that have a description")
+    parser.add_argument("--description-mean", type=float, default=120)
+    parser.add_argument("--description-max", type=int, default=500)
+    parser.add_argument("--method", choices=("auto", "insert", "copy"), default="auto",
+                        help="auto uses COPY on PostgreSQL (psycopg 3) and bulk inserts elsewhere")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--url", help="Database URL (defaults to the app's configured database; required "
+                                      "when SHARD_URLS is set, as the seeder does not distribute todos over shards)")
+    parser.add_argument("--reset", action="store_true", help="Delete existing users and todos first")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="Maintain todo indexes during the load instead of rebuilding them afterwards")
+    parser.add_argument("--manifest", help="Write the dataset parameters and timings to this JSON file")
+    args = parser.parse_args(argv)
+    if not args.url and config.SHARD_URLS:
+        parser.error("SHARD_URLS is set but todos are not distributed over shards; "
+                     "pass --url to seed a single database")
+
+    users, todos = SCALE_FACTORS[args.scale]
+    spec = DatasetSpec(
+        users=args.users or users,
+        todos=args.todos if args.todos is not None else todos,
+        seed=args.seed,
+        completed_ratio=args.completed_ratio,
+        owner_skew=args.owner_skew,
+        title_mean=args.title_mean,
+        title_max=args.title_max,
+        description_ratio=args.description_ratio,
+        description_mean=args.description_mean,
+        description_max=args.description_max,
+    )
+    print(f"Generating dataset {spec.fingerprint()}: {spec.users:,} users, {spec.todos:,} todos")
+
+    result = seed(
+        build_engine(args.url), spec, args.method, args.batch_size, args.reset,
+        drop_indexes=not args.keep_indexes,
+    )
+    print(f"✓ Done in {result['seconds']}s ({result['todo_rows_per_sec']:,} todo rows/s, {result['method']})")
+
+    if args.manifest:
+        with open(args.manifest, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"✓ Manifest written to {args.manifest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+"""
+Horizontal sharding of todos by owner
+
+Todos, their archive and their daily rollups can be spread over several
+databases, listed in SHARD_URLS as "name=url" pairs. Users, jobs and the
+tenant directory stay in the main database (database/config.py). Without
+SHARD_URLS the main database is the only shard and nothing changes.
+
+  * placement: a consistent-hash ring over shard names (SHARD_VNODES points
+    per shard) maps owner_id to a shard, so adding a shard only moves the
+    owners that land on its points
+  * directory: tenant_shards rows override the ring for pinned (hot)
+    tenants and mark tenants being moved; each process caches it and
+    re-reads it every SHARD_DIRECTORY_TTL seconds
+  * ids: shard N allocates todo ids from [N * SHARD_ID_SPAN, (N + 1) *
+    SHARD_ID_SPAN), so ids stay unique when rows are copied to another
+    shard and an id's block names the shard that most likely holds it
+  * scatter-gather: queries without an owner run on every shard in
+    parallel (ShardSessions.scatter()) and are merged by the caller
+
+Writes for a tenant being moved are refused with TenantMovingError (503 in
+the API) until database/move_tenant.py has switched it over. During the
+switch a tenant's rows briefly exist on both shards; row reads drop copies
+found on a shard that does not currently own the tenant (owns()), while
+aggregate stats may count them twice for that window.
+"""
+import bisect
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import (
+    BigInteger, Column, ForeignKeyConstraint, Integer, MetaData, Table, func, insert, select, text, update,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import config
+from app.models.outbox import OutboxEvent
+from app.models.shard import TenantShard
+from app.models.stats import DailyTodoStats, OwnerTodoStats
+from app.models.todo import ArchivedTodo, Todo
+from app.utils import rollups
+from database.config import SessionLocal, create_configured_engine, identity_maps, init_engine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_SHARD = "default"
+ACTIVE = "active"
+MOVING = "moving"
+
+
+class TenantMovingError(Exception):
+    """Writes to a tenant are paused while it moves between shards"""
+
+
+def parse_shard_urls(value: str) -> List[Tuple[str, str]]:
+    """'a=sqlite:///./a.db,b=postgresql://...' -> [(name, url)]; bare URLs are named shardN"""
+    shards = []
+    for index, item in enumerate(part.strip() for part in value.split(",") if part.strip()):
+        name, sep, url = item.partition("=")
+        if not sep or "://" in name:
+            name, url = f"shard{index}", item
+        shards.append((name.strip(), url.strip()))
+    names = [name for name, _ in shards]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate shard names in SHARD_URLS: {names}")
+    return shards
+
+
+# ============================================================================
+# PLACEMENT
+# ============================================================================
+
+class HashRing:
+    """Consistent hashing of owner ids onto shard names"""
+
+    def __init__(self, names: Iterable[str], vnodes: int = config.SHARD_VNODES):
+        points = sorted((self._hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._keys = [key for key, _ in points]
+        self._names = [name for _, name in points]
+        self.lookup = lru_cache(maxsize=65536)(self._lookup)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def _lookup(self, owner_id: int) -> str:
+        index = bisect.bisect(self._keys, self._hash(str(owner_id))) % len(self._keys)
+        return self._names[index]
+
+
+# ============================================================================
+# SCHEMA
+# ============================================================================
+
+# SQLite has no sequences: each SQLite shard keeps its last allocated todo id
+# here, so ids freed by a tenant moving away are never handed out again
+id_counter_metadata = MetaData()
+todo_id_counter = Table(
+    "todo_id_counter", id_counter_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("last_id", BigInteger, nullable=False),
+)
+
+
+@lru_cache(maxsize=None)
+def shard_metadata() -> MetaData:
+    """The tables that live on every shard, without the foreign key to users"""
+    metadata = MetaData()
+    for table in (Todo.__table__, ArchivedTodo.__table__, DailyTodoStats.__table__,
+                  OwnerTodoStats.__table__, OutboxEvent.__table__):
+        copy = table.to_metadata(metadata)
+        for constraint in [c for c in copy.constraints if isinstance(c, ForeignKeyConstraint)]:
+            copy.constraints.discard(constraint)
+        for column in copy.columns:
+            column.foreign_keys.clear()
+    return metadata
+
+
+# ============================================================================
+# ROUTER
+# ============================================================================
+
+class Shard:
+    def __init__(self, name: str, index: int, engine: Engine, session_factory: sessionmaker):
+        self.name = name
+        self.index = index
+        self.engine = engine
+        self.session_factory = session_factory
+        self.id_base = index * config.SHARD_ID_SPAN
+
+
+class ShardRouter:
+    """Maps owners and todo ids to shards; one per process"""
+
+    def __init__(self):
+        self.shards: Dict[str, Shard] = {}
+        self.sharded = False
+        self.ring: Optional[HashRing] = None
+        self._directory: Dict[int, Tuple[str, str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def unsharded(cls, engine: Engine) -> "ShardRouter":
+        """A router with engine as the only shard (scripts and benchmarks)"""
+        router = cls()
+        router.shards = {DEFAULT_SHARD: Shard(DEFAULT_SHARD, 0, engine, sessionmaker(bind=engine))}
+        router.ring = HashRing([DEFAULT_SHARD], 1)
+        return router
+
+    def configure(self) -> None:
+        """Create the shard engines (once) from SHARD_URLS"""
+        if self.shards:
+            return
+        with self._lock:
+            if self.shards:
+                return
+            main_engine = init_engine()
+            specs = parse_shard_urls(config.SHARD_URLS)
+            shards = {}
+            if not specs:
+                shards[DEFAULT_SHARD] = Shard(DEFAULT_SHARD, 0, main_engine, SessionLocal)
+            for index, (name, url) in enumerate(specs):
+                if url == main_engine.url.render_as_string(hide_password=False):
+                    # The main database doubles as a shard (e.g. the original
+                    # single database while tenants are spread out)
+                    shards[name] = Shard(name, index, main_engine, SessionLocal)
+                else:
+                    factory = sessionmaker(autocommit=False, autoflush=False)
+                    shards[name] = Shard(name, index, create_configured_engine(url, factory), factory)
+                logger.info(f"Shard {name}: {url.split('@')[-1]}")
+            self.ring = HashRing(shards, config.SHARD_VNODES)
+            self.sharded = bool(specs)
+            self.shards = shards
+
+    def dispose(self, close: bool = True) -> None:
+        """Drop the shard pools and forget them; called by dispose_engine()"""
+        with self._lock:
+            for shard in self.shards.values():
+                if shard.session_factory is not SessionLocal:
+                    shard.engine.dispose(close=close)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self.shards = {}
+            self.sharded = False
+            self._directory = {}
+            self._loaded_at = None
+
+    def create_tables(self) -> None:
+        """Create the shard tables, rollup triggers and id ranges on every shard"""
+        for shard in self.shards.values():
+            with shard.engine.begin() as connection:
+                if shard.session_factory is not SessionLocal:
+                    # Table by table: create_all() would try to sort on the
+                    # (removed) foreign key to users
+                    for table in shard_metadata().tables.values():
+                        table.create(connection, checkfirst=True)
+                    rollups.install_triggers(connection)
+                if self.sharded:
+                    self._prepare_ids(connection, shard)
+
+    def _prepare_ids(self, connection: Connection, shard: Shard) -> None:
+        if connection.dialect.name == "postgresql":
+            sequence = connection.execute(text("SELECT pg_get_serial_sequence('todos', 'id')")).scalar()
+            last_value = connection.execute(text(f"SELECT last_value FROM {sequence}")).scalar()
+            if last_value < shard.id_base:
+                connection.execute(text("SELECT setval(:sequence, :value)"),
+                                   {"sequence": sequence, "value": shard.id_base})
+            return
+        todo_id_counter.create(connection, checkfirst=True)
+        in_range = select(func.max(Todo.id)).where(
+            Todo.id >= shard.id_base, Todo.id < shard.id_base + config.SHARD_ID_SPAN
+        ).scalar_subquery()
+        if connection.execute(select(todo_id_counter.c.last_id)).first() is None:
+            connection.execute(insert(todo_id_counter).values(
+                id=1, last_id=func.coalesce(in_range, shard.id_base)
+            ))
+
+    # ------------------------------------------------------------------
+    # Directory
+    # ------------------------------------------------------------------
+
+    def directory(self) -> Dict[int, Tuple[str, str]]:
+        """owner_id -> (shard, state), cached for SHARD_DIRECTORY_TTL seconds"""
+        if not self.sharded:
+            return {}
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at >= config.SHARD_DIRECTORY_TTL:
+            with self._lock:
+                if self._loaded_at is None or now - self._loaded_at >= config.SHARD_DIRECTORY_TTL:
+                    with init_engine().connect() as connection:
+                        rows = connection.execute(
+                            select(TenantShard.owner_id, TenantShard.shard, TenantShard.state)
+                        ).all()
+                    self._directory = {owner_id: (shard, state) for owner_id, shard, state in rows}
+                    self._loaded_at = now
+        return self._directory
+
+    def refresh(self) -> None:
+        """Re-read the directory on next use"""
+        self._loaded_at = None
+
+    def shard_for(self, owner_id: int) -> str:
+        """Name of the shard currently serving owner_id"""
+        if not self.sharded:
+            return next(iter(self.shards))
+        entry = self.directory().get(owner_id)
+        return entry[0] if entry else self.ring.lookup(owner_id)
+
+    def owns(self, name: str, owner_id: int) -> bool:
+        return not self.sharded or self.shard_for(owner_id) == name
+
+    def moving(self) -> List[int]:
+        return [owner_id for owner_id, (_, state) in self.directory().items() if state == MOVING]
+
+    def check_writable(self, owner_id: int) -> None:
+        entry = self.directory().get(owner_id)
+        if entry and entry[1] == MOVING:
+            raise TenantMovingError(f"Owner {owner_id} is being moved to another shard")
+
+    # ------------------------------------------------------------------
+    # Ids
+    # ------------------------------------------------------------------
+
+    def candidates(self, todo_id: int) -> List[str]:
+        """Shards to look for a todo id in, most likely first"""
+        names = list(self.shards)
+        if not self.sharded:
+            return names
+        home = [name for name in names if self.shards[name].index == todo_id // config.SHARD_ID_SPAN]
+        return home + [name for name in names if name not in home]
+
+    def allocate_id(self, name: str, db: Session) -> Optional[int]:
+        """
+        Next todo id on SQLite shards (None: let the database assign it).
+
+        Runs in the caller's transaction, so the counter row stays locked
+        until the insert commits.
+        """
+        if not self.sharded or db.get_bind().dialect.name != "sqlite":
+            return None
+        return db.execute(
+            update(todo_id_counter).values(last_id=todo_id_counter.c.last_id + 1)
+            .returning(todo_id_counter.c.last_id)
+        ).scalar_one()
+
+    # ------------------------------------------------------------------
+    # Scatter-gather
+    # ------------------------------------------------------------------
+
+    def engines(self) -> List[Tuple[str, Engine]]:
+        return [(name, shard.engine) for name, shard in self.shards.items()]
+
+    def scatter(self, fn: Callable[[str], T], names: Optional[List[str]] = None) -> Dict[str, T]:
+        """Run fn(name) for every shard, in parallel when there are several"""
+        names = names or list(self.shards)
+        if len(names) == 1:
+            return {names[0]: fn(names[0])}
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=4 * len(self.shards),
+                                                        thread_name_prefix="shard-scatter")
+        # Each call gets a copy of the request context (deadline, ...)
+        futures = {name: self._executor.submit(contextvars.copy_context().run, fn, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+    def stats(self) -> Dict:
+        directory = self.directory()
+        return {
+            "sharded": self.sharded,
+            "shards": list(self.shards),
+            "directory_entries": len(directory),
+            "moving": sum(1 for _, state in directory.values() if state == MOVING),
+        }
+
+
+shard_router = ShardRouter()
+
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+
+class ShardSessions:
+    """Sessions on the todo shards for one request, opened on first use"""
+
+    def __init__(self, router: ShardRouter, sessions: Optional[Dict[str, Session]] = None):
+        self.router = router
+        self._sessions: Dict[str, Session] = dict(sessions or {})
+        self._owned = sessions is None
+
+    @classmethod
+    def single(cls, db: Session) -> "ShardSessions":
+        """Use db as the only shard (scripts and benchmarks with their own engine)"""
+        return cls(ShardRouter.unsharded(db.get_bind()), {DEFAULT_SHARD: db})
+
+    @property
+    def dialect(self) -> str:
+        """Dialect name of the shards (they share one)"""
+        return next(iter(self.router.shards.values())).engine.dialect.name
+
+    def get(self, name: str) -> Session:
+        if name not in self._sessions:
+            self._sessions[name] = self.router.shards[name].session_factory()
+        return self._sessions[name]
+
+    def for_owner(self, owner_id: int) -> Tuple[str, Session]:
+        name = self.router.shard_for(owner_id)
+        return name, self.get(name)
+
+    def home(self, owner_id: Optional[int]) -> Optional[Session]:
+        """The one session able to answer for owner_id, or None if all shards must be asked"""
+        if owner_id is not None:
+            return self.for_owner(owner_id)[1]
+        if not self.router.sharded:
+            return self.get(next(iter(self.router.shards)))
+        return None
+
+    def candidates(self, todo_id: int) -> Iterator[Tuple[str, Session]]:
+        for name in self.router.candidates(todo_id):
+            yield name, self.get(name)
+
+    def scatter(self, fn: Callable[[str, Session], T]) -> Dict[str, T]:
+        """Run fn(name, session) on every shard; sessions are opened here, used there"""
+        names = list(self.router.shards)
+        sessions = {name: self.get(name) for name in names}
+        return self.router.scatter(lambda name: fn(name, sessions[name]), names)
+
+    def owned(self, name: str, todos: List) -> List:
+        """Drop rows found on a shard that no longer serves their owner (moves in progress)"""
+        if not self.router.sharded:
+            return todos
+        return [todo for todo in todos if self.router.owns(name, todo.owner_id)]
+
+    def close(self) -> None:
+        if self._owned:
+            for session in self._sessions.values():
+                identity_maps.observe(session)
+                session.close()
+        self._sessions.clear()
+
+
+def get_shards():
+    """Dependency for getting per-request shard sessions"""
+    shard_router.configure()
+    sessions = ShardSessions(shard_router)
+    try:
+        yield sessions
+    finally:
+        sessions.close()
@@ -4,17 +4,41 @@ A RESTful API for managing todos with SQLite/PostgreSQL
 """
 import logging
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Dict
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
-from database.config import engine
+from database.config import dispose_engine, identity_maps, init_engine, statement_cache
+from database.shards import shard_router
+from app import config
 from app.models.todo import Base
+from app.models import shard  # noqa: F401  (tenant_shards directory table)
 from app.routes import todos
 from app.routes import auth as auth_routes
+from app.routes import health as health_routes
+from app.routes import jobs as job_routes
+from app.routes import backups as backup_routes
+from app.routes import profiles as profile_routes
+from app.routes import memory as memory_routes
+from app.middleware.admission import AdmissionControlMiddleware, admission_controller
+from app.middleware.compression import CompressionMiddleware, compressed_cache
+from app.middleware.deadline import DeadlineMiddleware
+from app.middleware.memory import MemoryMiddleware
+from app.middleware.profiling import ProfilerMiddleware
+from app.utils.health import health_monitor
+from app.utils.jobs import job_runner
+from app.utils.memory import memory_monitor, start_tracing
+from app.utils.mirror import todo_mirror
+from app.utils.outbox import outbox_relay
+from app.utils.suggest import title_index
+from app.utils.swr import stale_cache
+from app.utils.warmup import warmup
+from app.utils import profiling
 
 # Configure logging
 logging.basicConfig(
@@ -27,19 +51,71 @@ logger = logging.getLogger(__name__)
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 USE_POSTGRESQL = os.getenv("USE_POSTGRESQL", "false").lower() == "true"
+# Skip create_all on startup when the schema is managed by migrations
+DB_CREATE_TABLES = os.getenv("DB_CREATE_TABLES", "true").lower() == "true"
 
 # Initialize database tables
 def init_database():
     """Initialize database tables on startup"""
     try:
         logger.info("Initializing database...")
-        Base.metadata.create_all(bind=engine)
+        engine = init_engine()
+        shard_router.configure()
+        if DB_CREATE_TABLES:
+            Base.metadata.create_all(bind=engine)
+            shard_router.create_tables()
         logger.info("✓ Database initialized successfully")
+        if shard_router.sharded:
+            logger.info(f"Todos sharded by owner over: {', '.join(shard_router.shards)}")
         logger.info(f"Using database: {'PostgreSQL' if USE_POSTGRESQL else 'SQLite'}")
     except Exception as e:
         logger.error(f"✗ Error initializing database: {e}")
         raise
 
+
+# ============================================================================
+# LIFESPAN
+# ============================================================================
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown"""
+    logger.info("=" * 60)
+    logger.info("🚀 Todo API Starting...")
+    logger.info(f"Environment: {ENVIRONMENT}")
+    logger.info(f"Debug Mode: {DEBUG}")
+    logger.info("=" * 60)
+    if config.MEMORY_PROFILING:
+        start_tracing()
+    await run_in_threadpool(init_database)
+    job_runner.start()
+    todo_mirror.start()
+    outbox_relay.start()
+    health_monitor.register_queue("jobs", job_runner.pending_count)
+    if outbox_relay.enabled:
+        health_monitor.register_queue("outbox", outbox_relay.pending_count, config.OUTBOX_PENDING_THRESHOLD)
+    # Readiness stays "startup" until the first refresh, after the warm-up
+    await warmup.run(app)
+    await health_monitor.refresh()
+    health_monitor.start()
+    memory_monitor.start()
+
+    yield
+
+    await memory_monitor.stop()
+    await health_monitor.stop()
+    health_monitor.unregister_queue("jobs")
+    health_monitor.unregister_queue("outbox")
+    await run_in_threadpool(job_runner.stop)
+    await run_in_threadpool(outbox_relay.stop)
+    await run_in_threadpool(todo_mirror.stop)
+    stale_cache.stop()
+    dispose_engine()
+    logger.info("=" * 60)
+    logger.info("🛑 Todo API Shutting Down...")
+    logger.info("=" * 60)
+
+
 # Create FastAPI application
 app = FastAPI(
     title="Todo API",
@@ -47,9 +123,21 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
+# Per-request deadlines, propagated to DB statement timeouts (innermost, so
+# rejected requests never start a deadline)
+app.add_middleware(DeadlineMiddleware)
+
+# Rate limiting and load shedding (added before CORS so rejections still
+# carry CORS headers)
+app.add_middleware(AdmissionControlMiddleware)
+
+# Negotiated gzip/brotli/zstd with ETags and a cache of compressed bodies
+app.add_middleware(CompressionMiddleware)
+
 # Configure CORS
 cors_origins = [
     "http://localhost:5173",      # Vite dev server
@@ -72,28 +160,14 @@ app.add_middleware(
     max_age=600,
 )
 
+# Per-route RSS and allocation counters
+if config.MEMORY_PROFILING:
+    app.add_middleware(MemoryMiddleware)
 
-# ============================================================================
-# EVENT HANDLERS
-# ============================================================================
-
-@app.on_event("startup")
-async def startup_event():
-    """Application startup event"""
-    logger.info("=" * 60)
-    logger.info("🚀 Todo API Starting...")
-    logger.info(f"Environment: {ENVIRONMENT}")
-    logger.info(f"Debug Mode: {DEBUG}")
-    logger.info("=" * 60)
-    init_database()
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Application shutdown event"""
-    logger.info("=" * 60)
-    logger.info("🛑 Todo API Shutting Down...")
-    logger.info("=" * 60)
+# On-demand request profiling (outermost, so the whole stack is sampled);
+# not installed at all unless enabled
+if config.PROFILING_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
 
 
 # ============================================================================
@@ -122,6 +196,17 @@ def get_info():
         "environment": ENVIRONMENT,
         "debug": DEBUG,
         "database": "PostgreSQL" if USE_POSTGRESQL else "SQLite",
+        "admission": admission_controller.stats(),
+        "compression_cache": compressed_cache.stats(),
+        "statement_cache": statement_cache.stats(),
+        "shards": shard_router.stats(),
+        "todo_mirror": todo_mirror.stats(),
+        "title_index": title_index.stats(),
+        "stale_cache": stale_cache.stats(),
+        "warmup": warmup.stats(),
+        "outbox": outbox_relay.stats(),
+        "memory": memory_monitor.stats(),
+        "identity_maps": identity_maps.stats(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -131,38 +216,31 @@ def get_info():
 # ============================================================================
 
 @app.get("/health", response_model=Dict)
-def health_check():
+async def health_check():
     """
     Health check endpoint
-    Returns application and database status
+    Returns application and database status from the background health
+    monitor; see /livez and /readyz for orchestrator probes
     """
-    try:
-        from database.config import SessionLocal
-        db = SessionLocal()
-        
-        # Test database connection
-        db.execute("SELECT 1")
-        db.close()
-        
+    state = health_monitor.readiness()
+    if state["ready"]:
         return {
             "status": "healthy",
             "service": "todo-api",
             "timestamp": datetime.utcnow().isoformat(),
-            "database": "connected",
+            "database": state["database"],
             "version": "1.0.0"
         }
-    
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return JSONResponse(
-            status_code=503,
-            content={
-                "status": "unhealthy",
-                "service": "todo-api",
-                "error": str(e),
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
+
+    return JSONResponse(
+        status_code=503,
+        content={
+            "status": "unhealthy",
+            "service": "todo-api",
+            "error": "; ".join(state["reasons"]),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    )
 
 
 # ============================================================================
@@ -170,9 +248,22 @@ def health_check():
 # ============================================================================
 
 
-# Include todos and auth routers
+# Include todos, auth, probe, job and backup routers
 app.include_router(todos.router)
 app.include_router(auth_routes.router)
+app.include_router(health_routes.router)
+app.include_router(job_routes.router)
+app.include_router(backup_routes.router)
+
+if config.PROFILING_ENABLED:
+    app.include_router(profile_routes.router)
+    # After every route is registered: sync endpoints are wrapped in place
+    profiling.instrument_routes(app)
+    profiling.install_sql_hooks()
+    logger.info("Request profiling enabled (/debug/profiles)")
+
+if config.MEMORY_PROFILING:
+    app.include_router(memory_routes.router)
 
 logger.info("Routes registered successfully")
 
@@ -0,0 +1,306 @@
+"""
+Production launcher for the Todo API
+
+Runs N uvicorn workers behind one listening socket:
+
+  * the app is imported once in the master and inherited by forked workers
+    (--no-preload imports it in each worker instead)
+  * database tables are created once in the master; each worker builds its
+    own connection pool after fork
+  * SIGHUP replaces workers one at a time, waiting for each replacement to
+    finish startup before draining the old one (zero-downtime restart)
+  * SIGTERM/SIGINT drain in-flight requests, then kill whatever is left
+    after --graceful-timeout seconds
+  * workers that die unexpectedly are respawned
+  * a worker above its memory limit (MEMORY_LIMIT_MB) asks for a
+    replacement over its startup pipe and is drained once it is ready
+
+With --preload, SIGHUP recycles workers with the code already loaded; to
+deploy new code with a rolling restart run with --no-preload.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    kill -HUP <master pid>     # rolling restart
+    kill -TERM <master pid>    # graceful shutdown
+"""
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("serve")
+
+APP = "main:app"
+
+# Worker -> master messages on the startup pipe
+READY = b"1"
+RECYCLE = b"R"
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def load_app(target: str = APP):
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    uvicorn server that reports to the master once startup has finished,
+    and later asks it for a replacement when recycling itself
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if self.should_exit:
+            os.close(self.ready_fd)
+            return
+        os.write(self.ready_fd, READY)
+        from app.utils import memory
+
+        memory.recycle_hook = lambda: os.write(self.ready_fd, RECYCLE)
+
+
+class Master:
+    """Forks, supervises and restarts uvicorn workers"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.app = None
+        self.sock: Optional[socket.socket] = None
+        self.workers: Dict[int, int] = {}  # pid -> ready pipe read end
+        self.shutting_down = False
+        self.restart_requested = False
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _run_worker(self, ready_fd: int) -> None:
+        """Body of a forked worker; never returns"""
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        from database.config import dispose_engine
+
+        # Abandon (never close) any connections inherited from the master
+        dispose_engine(close=False)
+        app = self.app if self.app is not None else load_app()
+        config = uvicorn.Config(
+            app,
+            log_level=self.args.log_level,
+            timeout_graceful_shutdown=self.args.graceful_timeout,
+            timeout_keep_alive=self.args.keep_alive,
+            lifespan="on",
+        )
+        server = WorkerServer(config, ready_fd)
+        code = 0
+        try:
+            server.run(sockets=[self.sock])
+        except BaseException:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def spawn(self) -> int:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._run_worker(write_fd)
+        os.close(write_fd)
+        self.workers[pid] = read_fd
+        logger.info(f"Spawned worker {pid}")
+        return pid
+
+    def wait_ready(self, pid: int, timeout: float) -> bool:
+        """Block until the worker finished lifespan startup"""
+        import select
+
+        read_fd = self.workers[pid]
+        ready, _, _ = select.select([read_fd], [], [], timeout)
+        return bool(ready) and os.read(read_fd, 1) == READY
+
+    def recycle_requests(self) -> List[int]:
+        """Workers that asked to be replaced since the last call"""
+        import select
+
+        pids = {read_fd: pid for pid, read_fd in self.workers.items()}
+        readable, _, _ = select.select(list(pids), [], [], 0)
+        # READY from respawned workers is skipped; b"" means the worker exited
+        return [pids[read_fd] for read_fd in readable if os.read(read_fd, 1) == RECYCLE]
+
+    def reap(self) -> List[int]:
+        exited = []
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            read_fd = self.workers.pop(pid, None)
+            if read_fd is not None:
+                os.close(read_fd)
+            exited.append(pid)
+            logger.info(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+        return exited
+
+    def stop_workers(self, pids: List[int], deadline: float) -> None:
+        """SIGTERM, wait for a graceful exit until the deadline, then SIGKILL"""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            remaining -= set(self.reap())
+            time.sleep(0.05)
+        for pid in remaining:
+            logger.warning(f"Worker {pid} did not drain in time; killing")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while remaining:
+            remaining -= set(self.reap())
+            time.sleep(0.01)
+
+    def replace(self, old_pid: int) -> bool:
+        """Start a replacement, wait until it is ready, then drain old_pid"""
+        new_pid = self.spawn()
+        if not self.wait_ready(new_pid, self.args.startup_timeout):
+            logger.error(f"Replacement worker {new_pid} failed to start; keeping {old_pid}")
+            self.stop_workers([new_pid], time.monotonic() + 1)
+            return False
+        self.stop_workers([old_pid], time.monotonic() + self.args.graceful_timeout + 1)
+        return True
+
+    def rolling_restart(self) -> None:
+        logger.info("Rolling restart requested")
+        for old_pid in list(self.workers):
+            if self.shutting_down:
+                return
+            if not self.replace(old_pid):
+                return
+        logger.info("Rolling restart complete")
+
+    # ------------------------------------------------------------------
+    # Master loop
+    # ------------------------------------------------------------------
+
+    def _on_terminate(self, signum, frame) -> None:
+        self.shutting_down = True
+
+    def _on_hangup(self, signum, frame) -> None:
+        self.restart_requested = True
+
+    def prepare(self) -> None:
+        """Import the app and create the schema once, before any fork"""
+        create_tables = os.getenv("DB_CREATE_TABLES", "true").lower() == "true"
+        if not self.args.preload:
+            # Keep the master free of app modules so workers import fresh code
+            if create_tables:
+                subprocess.run([sys.executable, "-c", "import main; main.init_database()"], check=True)
+        else:
+            import main
+            from database.config import dispose_engine
+
+            if create_tables:
+                main.init_database()
+                dispose_engine()
+            main.DB_CREATE_TABLES = False
+            self.app = load_app()
+        # Workers must not race each other on create_all
+        os.environ["DB_CREATE_TABLES"] = "false"
+
+    def run(self) -> int:
+        self.prepare()
+        self.sock = bind_socket(self.args.host, self.args.port)
+        signal.signal(signal.SIGTERM, self._on_terminate)
+        signal.signal(signal.SIGINT, self._on_terminate)
+        signal.signal(signal.SIGHUP, self._on_hangup)
+        logger.info(f"Master {os.getpid()} listening on {self.args.host}:{self.args.port} "
+                    f"with {self.args.workers} workers (preload={self.args.preload})")
+
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        while not self.shutting_down:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            for pid in self.recycle_requests():
+                if not self.shutting_down and pid in self.workers:
+                    logger.info(f"Worker {pid} asked to be recycled")
+                    self.replace(pid)
+            self.reap()
+            # Respawn crashed workers
+            for _ in range(self.args.workers - len(self.workers)):
+                if not self.shutting_down:
+                    self.spawn()
+            time.sleep(0.2)
+
+        logger.info(f"Draining {len(self.workers)} workers (deadline {self.args.graceful_timeout}s)")
+        self.stop_workers(list(self.workers), time.monotonic() + self.args.graceful_timeout)
+        self.sock.close()
+        logger.info("Shutdown complete")
+        return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the Todo API with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or default_workers(),
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="Seconds a worker may spend draining in-flight requests")
+    parser.add_argument("--startup-timeout", type=float, default=60.0,
+                        help="Seconds a replacement worker may take to start during a rolling restart")
+    parser.add_argument("--keep-alive", type=int, default=5, help="HTTP keep-alive timeout in seconds")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="Import the app in each worker instead of once in the master")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        # Windows: fall back to uvicorn's own process manager
+        logger.warning("fork() is unavailable; using uvicorn's multiprocess mode without preload")
+        uvicorn.run(APP, host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+        return 0
+
+    return Master(args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Shared fixtures
+
+The app runs against a fresh SQLite file in a temporary directory (the
+default database URL is ./todos.db), without warm-up or rate limiting.
+"""
+import os
+import sys
+
+import pytest
+
+# Add server directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Read by app.config on import, so set before the app is imported
+os.environ.setdefault("WARMUP_ENABLED", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+TEST_USER = {"username": "tester", "password": "password"}
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database_dir(tmp_path_factory):
+    """Work in a temporary directory so ./todos.db is a throwaway database"""
+    directory = tmp_path_factory.mktemp("server")
+    previous = os.getcwd()
+    os.chdir(directory)
+    yield directory
+    os.chdir(previous)
+
+
+@pytest.fixture(scope="session")
+def app(database_dir):
+    import main
+
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    # 5xx come back as responses, as a real client would see them
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    client.post("/auth/register", json=TEST_USER)
+    token = client.post("/auth/login", json=TEST_USER).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def engine(client):
+    from database.config import get_engine
+
+    return get_engine()
@@ -0,0 +1,106 @@
+"""Admission control: shedding recovers on its own, rate limits survive a missing shared backend"""
+import asyncio
+import importlib.util
+import os
+import time
+
+import pytest
+
+from app import config
+from app.middleware import admission
+from app.middleware.admission import AdmissionController, MemoryBackend
+from database.config import PoolWaitStats
+
+
+class Unreachable:
+    """A shared backend whose store is down"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        self.calls += 1
+        raise ConnectionError("store unreachable")
+
+
+def admit(controller, route_class: str = "read", identity: str = "user:1"):
+    return asyncio.run(controller.admit(route_class, identity))
+
+
+def test_pool_wait_average_decays_without_checkouts():
+    stats = PoolWaitStats(half_life=0.1)
+    stats.observe(1.0)
+    assert stats.ewma_ms == pytest.approx(200, rel=0.05)
+
+    time.sleep(0.3)
+    assert stats.ewma_ms < 30
+    # New checkouts blend into the decayed average, not the stale one
+    stats.observe(0.0)
+    assert stats.ewma_ms < 25
+
+
+def test_pool_wait_shedding_recovers_without_traffic(monkeypatch):
+    stats = PoolWaitStats(half_life=0.1)
+    monkeypatch.setattr(admission, "pool_wait", stats)
+    controller = AdmissionController(enabled=True, rate_limits={}, pool_wait_ms=50, backend=MemoryBackend())
+    for _ in range(20):
+        stats.observe(0.5)
+
+    assert admit(controller, "search")[0] == 503
+    assert admit(controller, "write")[0] == 503
+    assert admit(controller, "read") is None
+
+    # Shed requests check nothing out; the average still falls back under the threshold
+    time.sleep(0.6)
+    assert admit(controller, "search") is None
+    assert admit(controller, "write") is None
+
+
+def test_unreachable_backend_falls_back_to_in_process_buckets():
+    backend = Unreachable()
+    controller = AdmissionController(enabled=True, rate_limits={"read": "1/2"}, backend=backend, backend_retry=60)
+
+    assert admit(controller) is None
+    assert admit(controller) is None
+    status, _, retry_after = admit(controller)
+    assert status == 429 and retry_after > 0
+    # The store is not asked again until backend_retry has passed
+    assert backend.calls == 1
+    assert controller.stats()["backend_errors"] == 1
+
+
+def test_unreachable_backend_is_retried():
+    backend = Unreachable()
+    controller = AdmissionController(enabled=True, rate_limits={"read": "100/100"}, backend=backend,
+                                     backend_retry=0.1)
+    admit(controller)
+    admit(controller)
+    time.sleep(0.15)
+    admit(controller)
+    assert backend.calls == 2
+
+
+@pytest.mark.skipif(importlib.util.find_spec("redis") is not None, reason="redis is installed")
+def test_missing_redis_package_falls_back_to_in_process_buckets(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_BACKEND_URL", "redis://localhost:6379/0")
+    controller = AdmissionController(enabled=True, rate_limits={"read": "1/1"})
+
+    assert admit(controller) is None
+    assert admit(controller)[0] == 429
+    assert isinstance(controller.backend, MemoryBackend)
+
+
+@pytest.mark.skipif(not os.getenv("TEST_REDIS_URL"), reason="set TEST_REDIS_URL to test against Redis")
+def test_redis_buckets_are_shared_between_workers():
+    url = os.environ["TEST_REDIS_URL"]
+    identity = f"user:test-{time.time_ns()}"
+    workers = [AdmissionController(enabled=True, rate_limits={"read": "0.01/2"},
+                                   backend=admission.RedisBackend(url)) for _ in range(2)]
+
+    async def take_all():
+        # One event loop: the redis client's connections belong to it
+        return [await worker.admit("read", identity) for worker in workers + workers]
+
+    first, second, third, fourth = asyncio.run(take_all())
+    assert first is None and second is None
+    assert third[0] == 429 and fourth[0] == 429
@@ -0,0 +1,85 @@
+"""Compression: large bodies are compressed off the event loop, small ones inline"""
+import threading
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.middleware import compression
+from app.middleware.compression import CompressedCache, CompressionMiddleware
+
+SMALL = b'{"title": "small"}' * 100
+LARGE = b'{"title": "large"}' * 10000
+
+
+@pytest.fixture
+def compressed_on(monkeypatch):
+    """Client for an app behind CompressionMiddleware; records the threads gzip ran on"""
+    threads = {"loop": None, "gzip": []}
+
+    def recording_gzip(data, level):
+        threads["gzip"].append(threading.current_thread())
+        return gzip_one_shot(data, level)
+
+    class RecordingStream(compression.GzipStream):
+        def compress(self, chunk):
+            threads["gzip"].append(threading.current_thread())
+            return super().compress(chunk)
+
+    gzip_one_shot = compression.ENCODERS["gzip"][0]
+    monkeypatch.setitem(compression.ENCODERS, "gzip", (recording_gzip, RecordingStream))
+
+    async def small(request):
+        threads["loop"] = threading.current_thread()
+        return Response(SMALL, media_type="application/json")
+
+    async def large(request):
+        threads["loop"] = threading.current_thread()
+        return Response(LARGE, media_type="application/json")
+
+    async def stream(request):
+        threads["loop"] = threading.current_thread()
+
+        async def chunks():
+            yield SMALL
+            yield LARGE
+
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    app = Starlette(routes=[Route("/small", small), Route("/large", large), Route("/stream", stream)])
+    middleware = CompressionMiddleware(app, minimum_size=1024, levels={"gzip": 6},
+                                       cache=CompressedCache(1 << 20), thread_min_size=64 * 1024)
+    return TestClient(middleware, headers={"Accept-Encoding": "gzip"}), threads
+
+
+def test_small_bodies_are_compressed_on_the_event_loop(compressed_on):
+    client, threads = compressed_on
+    response = client.get("/small")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == SMALL
+    assert threads["gzip"] == [threads["loop"]]
+
+
+def test_large_bodies_are_compressed_on_a_worker_thread(compressed_on):
+    client, threads = compressed_on
+    response = client.get("/large")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == LARGE
+    assert len(threads["gzip"]) == 1 and threads["gzip"][0] is not threads["loop"]
+    # Cached by ETag: the second request does not compress again
+    assert client.get("/large").content == LARGE
+    assert len(threads["gzip"]) == 1
+
+
+def test_large_streamed_chunks_are_compressed_on_a_worker_thread(compressed_on):
+    client, threads = compressed_on
+    response = client.get("/stream")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == SMALL + LARGE
+    on_loop, off_loop = threads["gzip"]
+    assert on_loop is threads["loop"] and off_loop is not threads["loop"]
@@ -0,0 +1,43 @@
+"""Database URLs and pool options"""
+import pytest
+
+from database.config import load_database_settings, pool_settings, with_driver
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("postgresql://u:p@db/todoapp", "postgresql+psycopg://u:p@db/todoapp"),
+    ("postgres://u:p@db/todoapp", "postgresql+psycopg://u:p@db/todoapp"),
+    ("postgresql+psycopg://u:p@db/todoapp", "postgresql+psycopg://u:p@db/todoapp"),
+    ("postgresql+psycopg2://u:p@db/todoapp", "postgresql+psycopg2://u:p@db/todoapp"),
+    ("sqlite:///./todos.db", "sqlite:///./todos.db"),
+])
+def test_urls_without_a_driver_use_psycopg(url, expected):
+    assert with_driver(url) == expected
+
+
+def test_postgresql_prepares_statements_by_default(monkeypatch):
+    monkeypatch.setenv("USE_POSTGRESQL", "true")
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    url, settings = load_database_settings()
+
+    assert url.startswith("postgresql+psycopg://")
+    assert settings["connect_args"]["prepare_threshold"] == 5
+
+
+@pytest.mark.parametrize("threshold, expected", [("1", 1), ("none", None)])
+def test_prepare_threshold_is_configurable(monkeypatch, threshold, expected):
+    monkeypatch.setenv("DB_PREPARE_THRESHOLD", threshold)
+    assert pool_settings("postgresql+psycopg://db/todoapp")["connect_args"]["prepare_threshold"] == expected
+    assert "prepare_threshold" not in pool_settings("postgresql+psycopg2://db/todoapp")["connect_args"]
+
+
+def test_seeding_the_configured_database_is_refused_when_sharded(monkeypatch, capsys):
+    from app import config
+    from database import seed
+
+    monkeypatch.setattr(config, "SHARD_URLS", "a=sqlite:///./a.db,b=sqlite:///./b.db")
+    with pytest.raises(SystemExit) as exited:
+        seed.main(["--users", "1", "--todos", "1"])
+
+    assert exited.value.code == 2
+    assert "--url" in capsys.readouterr().err
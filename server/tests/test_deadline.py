@@ -0,0 +1,85 @@
+"""Request deadlines: slow queries are interrupted and their workers freed"""
+import sqlite3
+import threading
+import time
+
+import pytest
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from database.config import get_db
+
+# Several seconds of SQLite work; the deadlines below are a fraction of that
+SLOW_QUERY = text(
+    "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 20000000) SELECT count(*) FROM n"
+)
+
+router = APIRouter(prefix="/test-deadline")
+errors = []
+
+
+@router.get("/slow")
+def slow_query(db: Session = Depends(get_db)):
+    try:
+        return db.execute(SLOW_QUERY).scalar()
+    except Exception as e:
+        errors.append(e)
+        raise HTTPException(status_code=500, detail="Failed to run the slow query")
+
+
+@pytest.fixture(scope="module")
+def slow_client(app, client):
+    app.include_router(router)
+    errors.clear()
+    return client
+
+
+def _interrupted(error: Exception) -> bool:
+    original = getattr(error, "orig", None)
+    return isinstance(original, sqlite3.OperationalError) and "interrupted" in str(original)
+
+
+def test_slow_query_times_out_with_504(slow_client, engine):
+    errors.clear()
+    started = time.monotonic()
+    response = slow_client.get("/test-deadline/slow", headers={"X-Request-Timeout": "0.5"})
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request deadline exceeded"}
+    # The route itself finished (TestClient waits for it), not just the response
+    assert elapsed < 3
+    assert len(errors) == 1 and _interrupted(errors[0])
+    assert engine.pool.checkedout() == 0
+
+
+def test_concurrent_slow_queries_free_their_workers(slow_client, engine):
+    errors.clear()
+    statuses = []
+
+    def call():
+        response = slow_client.get("/test-deadline/slow", headers={"X-Request-Timeout": "0.3"})
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    elapsed = time.monotonic() - started
+
+    assert statuses == [504] * 8
+    assert elapsed < 5
+    assert len(errors) == 8 and all(_interrupted(error) for error in errors)
+    assert engine.pool.checkedout() == 0
+    # The connections went back usable: an ordinary read succeeds right away
+    assert slow_client.get("/api/todos/?limit=1").status_code == 200
+
+
+def test_queries_without_a_deadline_are_not_interrupted(engine):
+    with engine.connect() as connection:
+        assert connection.execute(text(
+            "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 200000) SELECT count(*) FROM n"
+        )).scalar() == 200000
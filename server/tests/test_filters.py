@@ -0,0 +1,40 @@
+"""Title prefix ranges match what lower(title) stores"""
+import pytest
+
+from app.utils.filters import prefix_bounds
+
+
+@pytest.mark.parametrize("prefix, dialect, bounds", [
+    ("Buy", "sqlite", ("buy", "buz")),
+    # SQLite's lower() leaves non-ASCII letters alone, PostgreSQL's folds them
+    ("Élan", "sqlite", ("Élan", "Élao")),
+    ("Élan", "postgresql", ("élan", "élao")),
+    # The next code point would be a surrogate, which cannot be encoded
+    ("a\ud7ff", "sqlite", ("a\ud7ff", "a\ue000")),
+    ("a\U0010ffff", "sqlite", ("a\U0010ffff", "b")),
+    ("\U0010ffff", "sqlite", ("\U0010ffff", None)),
+])
+def test_prefix_bounds(prefix, dialect, bounds):
+    assert prefix_bounds(prefix, dialect) == bounds
+    low, high = bounds
+    if high is not None:
+        high.encode("utf-8")
+
+
+def test_non_ascii_prefixes_find_their_todos(client, auth_headers):
+    titles = ["Élan vital", "élan", "Ébauche", "Zoë's list", "Eagle"]
+    for title in titles:
+        client.post("/api/todos/", json={"title": title}, headers=auth_headers)
+
+    def found(prefix):
+        response = client.get("/api/todos/", params={"owner": "me", "title_prefix": prefix, "limit": 100},
+                              headers=auth_headers)
+        assert response.status_code == 200
+        return sorted(todo["title"] for todo in response.json())
+
+    # Non-ASCII letters are matched as written, ASCII ones case-insensitively
+    assert found("É") == ["Ébauche", "Élan vital"]
+    assert found("Él") == ["Élan vital"]
+    assert found("é") == ["élan"]
+    assert found("zo") == ["Zoë's list"]
+    assert found("E") == ["Eagle"]
@@ -0,0 +1,252 @@
+"""Background jobs: claims shared by several runners, cancellation and resume"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func, select, update
+
+from app.models.job import JobRecord
+from app.utils import jobs
+from app.utils.jobs import JobRunner, job_type
+
+active = {"now": 0, "max": 0}
+active_lock = threading.Lock()
+release = threading.Event()
+processed = []
+
+
+@job_type("test_limited", executor="thread", max_concurrency=2)
+def limited_job(ctx):
+    with active_lock:
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+    try:
+        release.wait(5)
+        return {"done": ctx.params["n"]}
+    finally:
+        with active_lock:
+            active["now"] -= 1
+
+
+@job_type("test_resumable", executor="thread", max_concurrency=1, resumable=True)
+def resumable_job(ctx):
+    for n in range(ctx.progress.get("done", 0), ctx.params["n"]):
+        ctx.check()
+        processed.append(n)
+        ctx.update(done=n + 1)
+        time.sleep(0.01)
+    return {"processed": ctx.params["n"]}
+
+
+def wait_until(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.02)
+
+
+def statuses(engine, kind: str):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(JobRecord.status).where(JobRecord.kind == kind).order_by(JobRecord.created_at)
+        ).scalars().all()
+
+
+def stop_heartbeats(engine, job_id: str) -> None:
+    """Make job_id look as if its runner died five minutes ago"""
+    with engine.begin() as connection:
+        connection.execute(
+            update(JobRecord).where(JobRecord.id == job_id)
+            .values(heartbeat_at=datetime.utcnow() - timedelta(minutes=5))
+        )
+
+
+@pytest.fixture
+def runners(engine):
+    """JobRunners on the app's jobs table, with the app's own runner stopped"""
+    jobs.job_runner.stop()
+    started = []
+
+    def start(count: int = 2, dispatch: bool = True, **options):
+        """count runners; without dispatch, claims are only made by the test"""
+        options.setdefault("poll_interval", 0.05)
+        created = []
+        for n in range(count):
+            runner = JobRunner(**options)
+            if dispatch:
+                runner.start()
+                started.append(runner)
+            else:
+                runner.worker_id = f"test:{n}"
+            created.append(runner)
+        return created
+
+    yield start
+    release.set()
+    for runner in started:
+        runner.stop()
+    with engine.begin() as connection:
+        connection.execute(delete(JobRecord).where(JobRecord.kind.like("test_%")))
+    release.clear()
+    active.update(now=0, max=0)
+    processed.clear()
+    jobs.job_runner.start()
+
+
+# ============================================================================
+# Claims
+# ============================================================================
+
+def test_two_runners_share_the_concurrency_limit(runners, engine):
+    first, second = runners(2, threads=4, processes=0)
+    for n in range(8):
+        (first if n % 2 else second).submit("test_limited", {"n": n})
+
+    wait_until(lambda: statuses(engine, "test_limited").count("running") == 2)
+    # Both runners have free threads and pending jobs to claim, but the limit holds
+    time.sleep(0.3)
+    assert statuses(engine, "test_limited").count("running") == 2
+    assert active["max"] <= 2
+
+    release.set()
+    wait_until(lambda: statuses(engine, "test_limited") == ["succeeded"] * 8)
+    assert active["max"] == 2
+
+
+def test_concurrent_claims_stay_within_the_limit(runners, engine):
+    first, second = runners(2, dispatch=False)
+    ids = [first.submit("test_limited", {"n": n})["id"] for n in range(12)]
+    barrier = threading.Barrier(len(ids))
+    claimed = []
+
+    def claim(index: int) -> None:
+        runner = (first, second)[index % 2]
+        barrier.wait()
+        if runner._claim(ids[index], jobs.JOB_TYPES["test_limited"]) is not None:
+            claimed.append(ids[index])
+
+    threads = [threading.Thread(target=claim, args=(i,)) for i in range(len(ids))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(claimed) == 2
+    assert statuses(engine, "test_limited").count("running") == 2
+
+
+def test_concurrent_deduplicated_submits_queue_one_job(runners, engine):
+    first, second = runners(2, dispatch=False)
+    barrier = threading.Barrier(8)
+    submitted = []
+
+    def submit(index: int) -> None:
+        barrier.wait()
+        submitted.append((first, second)[index % 2].submit("test_limited", {"n": index}, dedupe=True)["id"])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(set(submitted)) == 1
+    with engine.connect() as connection:
+        assert connection.execute(
+            select(func.count()).where(JobRecord.kind == "test_limited")
+        ).scalar() == 1
+
+
+# ============================================================================
+# Recovery
+# ============================================================================
+
+def test_jobs_of_a_dead_runner_are_requeued_until_max_attempts(runners, engine):
+    dead, survivor = runners(2, dispatch=False, stale_after=30, max_attempts=2)
+    job_id = survivor.submit("test_resumable", {"n": 1})["id"]
+
+    assert dead._claim(job_id, jobs.JOB_TYPES["test_resumable"]) is not None
+    stop_heartbeats(engine, job_id)
+    survivor._sweep()
+    job = survivor.get(job_id)
+    assert (job["status"], job["attempts"]) == ("pending", 1)
+
+    assert dead._claim(job_id, jobs.JOB_TYPES["test_resumable"]) is not None
+    stop_heartbeats(engine, job_id)
+    survivor._sweep()
+    job = survivor.get(job_id)
+    assert (job["status"], job["attempts"]) == ("failed", 2)
+    assert job["error"] == "Worker stopped while job was running"
+
+
+def test_jobs_of_a_dead_runner_fail_unless_resumable(runners, engine):
+    dead, survivor = runners(2, dispatch=False, stale_after=30)
+    job_id = survivor.submit("test_limited", {"n": 1})["id"]
+
+    assert dead._claim(job_id, jobs.JOB_TYPES["test_limited"]) is not None
+    stop_heartbeats(engine, job_id)
+    survivor._sweep()
+    assert survivor.get(job_id)["status"] == "failed"
+
+
+def test_heartbeats_keep_a_running_job_claimed(runners, engine):
+    live, = runners(1, threads=1, processes=0)
+    sweeper, = runners(1, dispatch=False, stale_after=30)
+    job_id = live.submit("test_limited", {"n": 1})["id"]
+    wait_until(lambda: statuses(engine, "test_limited") == ["running"])
+
+    stop_heartbeats(engine, job_id)
+    with engine.connect() as connection:
+        def heartbeat_at():
+            return connection.execute(select(JobRecord.heartbeat_at).where(JobRecord.id == job_id)).scalar()
+
+        wait_until(lambda: heartbeat_at() > datetime.utcnow() - timedelta(seconds=30))
+    sweeper._sweep()
+    assert statuses(engine, "test_limited") == ["running"]
+
+    release.set()
+    wait_until(lambda: statuses(engine, "test_limited") == ["succeeded"])
+
+
+# ============================================================================
+# Cancellation and resume
+# ============================================================================
+
+def test_cancel_pending_job(runners, engine):
+    runner, = runners(1, dispatch=False)
+    job_id = runner.submit("test_resumable", {"n": 10})["id"]
+
+    job = runner.cancel(job_id)
+    assert (job["status"], job["cancel_requested"]) == ("cancelled", True)
+    assert runner._claim(job_id, jobs.JOB_TYPES["test_resumable"]) is None
+    assert runner.cancel("missing") is None
+
+
+def test_cancel_running_job_stops_at_its_next_check(runners, engine):
+    runner, = runners(1, threads=1, processes=0)
+    job_id = runner.submit("test_resumable", {"n": 1000})["id"]
+    wait_until(lambda: processed)
+
+    assert runner.cancel(job_id)["cancel_requested"]
+    wait_until(lambda: statuses(engine, "test_resumable") == ["cancelled"])
+    assert len(processed) < 1000
+    assert runner.get(job_id)["finished_at"] is not None
+
+
+def test_interrupted_job_resumes_from_its_progress(runners, engine):
+    first, = runners(1, threads=1, processes=0)
+    job_id = first.submit("test_resumable", {"n": 60})["id"]
+    wait_until(lambda: len(processed) >= 10)
+
+    first.stop()
+    job = first.get(job_id)
+    assert (job["status"], job["attempts"]) == ("pending", 1)
+    assert job["progress"]["done"] == len(processed) < 60
+
+    runners(1, threads=1, processes=0)
+    wait_until(lambda: statuses(engine, "test_resumable") == ["succeeded"])
+    # Every item was processed exactly once across the two attempts
+    assert processed == list(range(60))
+    job = first.get(job_id)
+    assert (job["attempts"], job["result"]) == (2, {"processed": 60})
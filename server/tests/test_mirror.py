@@ -0,0 +1,97 @@
+"""Columnar mirror: searches do not block writes, full-scan reconciliation is rate limited"""
+import threading
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event, insert, select
+
+from app.models.todo import Todo
+from app.models.user import User
+from app.utils import mirror
+from app.utils.mirror import TodoMirror
+from database.shards import shard_router
+
+
+@pytest.fixture
+def loaded(engine, client, auth_headers):
+    """A TodoMirror loaded from the test database, and a term five todos contain"""
+    term = f"needle {uuid.uuid4().hex[:8]}"
+    with engine.begin() as connection:
+        owner_id = connection.execute(select(User.id).where(User.username == "tester")).scalar_one()
+        connection.execute(insert(Todo), [
+            {"title": f"mirror {term} {n}", "description": "haystack", "owner_id": owner_id} for n in range(5)
+        ])
+    todo_mirror = TodoMirror(enabled=True, refresh_interval=60, reconcile_interval=60)
+    (name, shard_engine), = shard_router.engines()
+    todo_mirror.load(name, shard_engine)
+    return todo_mirror, name, term
+
+
+def row_like(found, **changes):
+    return SimpleNamespace(**{**found, **changes})
+
+
+def test_writes_are_applied_while_a_search_scans(loaded, monkeypatch):
+    todo_mirror, name, term = loaded
+    target = todo_mirror.search(term, 1)[0]
+    applied = threading.Event()
+
+    def scan_while_writing(*args):
+        # Runs where search() scans: a write from another thread must not wait for it
+        writer = threading.Thread(target=lambda: (
+            todo_mirror.apply(name, row_like(target, title="renamed", updated_at=target["updated_at"])),
+            applied.set(),
+        ))
+        writer.start()
+        writer.join(2)
+        return real_scan(*args)
+
+    real_scan = mirror.scan
+    monkeypatch.setattr(mirror, "scan", scan_while_writing)
+    rows = todo_mirror.search(term, 10)
+
+    assert applied.is_set()
+    # The renamed row was in the snapshot but no longer matches, so it is left out
+    assert target["id"] not in [row["id"] for row in rows]
+    assert len(rows) == 4
+    assert all(term in row["title"] for row in rows)
+
+
+def test_search_sees_removals_made_during_the_scan(loaded, monkeypatch):
+    todo_mirror, name, term = loaded
+    removed = todo_mirror.search(term, 1)[0]["id"]
+    real_scan = mirror.scan
+
+    def scan_then_remove(*args):
+        found = real_scan(*args)
+        todo_mirror.discard(name, removed)
+        return found
+
+    monkeypatch.setattr(mirror, "scan", scan_then_remove)
+    assert removed not in [row["id"] for row in todo_mirror.search(term, 10)]
+    monkeypatch.setattr(mirror, "scan", real_scan)
+    assert todo_mirror.count_matches(term) == 4
+
+
+def test_count_comparison_runs_only_every_reconcile_interval(loaded, engine):
+    todo_mirror, name, term = loaded
+    (_, shard_engine), = shard_router.engines()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(shard_engine, "before_cursor_execute", record)
+    try:
+        for _ in range(3):
+            todo_mirror.refresh(name, shard_engine)
+        full_scans = [statement for statement in statements if "sum(todos.id)" in statement]
+        assert full_scans == []
+
+        todo_mirror.reconcile_interval = 0
+        todo_mirror.refresh(name, shard_engine)
+        assert len([statement for statement in statements if "sum(todos.id)" in statement]) == 1
+    finally:
+        event.remove(shard_engine, "before_cursor_execute", record)
+    assert todo_mirror.refreshes == 4
@@ -0,0 +1,130 @@
+"""Rollups kept by the triggers match live aggregates over todos"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func, insert, select, update
+
+from app.models.todo import Todo
+from app.models.user import User
+from app.utils import rollups
+
+
+def bucket_of(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def as_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+@pytest.fixture(scope="module")
+def history(client, auth_headers, engine):
+    """Todos written through the API and, with past timestamps, through SQL; returns the first day"""
+    created = [
+        client.post("/api/todos/", json={"title": f"rollup {i}"}, headers=auth_headers).json()
+        for i in range(6)
+    ]
+    for todo in created[:4]:
+        client.put(f"/api/todos/{todo['id']}", json={"completed": True}, headers=auth_headers)
+    client.put(f"/api/todos/{created[1]['id']}", json={"completed": False}, headers=auth_headers)
+    client.delete(f"/api/todos/{created[2]['id']}", headers=auth_headers)
+    client.delete(f"/api/todos/{created[5]['id']}", headers=auth_headers)
+
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    with engine.begin() as connection:
+        owner_id = connection.execute(select(User.id).where(User.username == "tester")).scalar_one()
+        ids = connection.execute(insert(Todo).returning(Todo.id), [
+            {
+                "title": f"past {days}",
+                "owner_id": owner_id,
+                "completed": days % 3 == 0,
+                "created_at": today - timedelta(days=days),
+                "updated_at": today - timedelta(days=days),
+                "completed_at": today - timedelta(days=days // 2, hours=5) if days % 3 == 0 else None,
+            }
+            for days in range(1, 120, 4)
+        ]).scalars().all()
+        # Moved in time, completed late, uncompleted and deleted: every trigger path
+        connection.execute(update(Todo).where(Todo.id == ids[0]).values(created_at=today - timedelta(days=150)))
+        connection.execute(update(Todo).where(Todo.id == ids[1]).values(
+            completed=True, completed_at=today - timedelta(days=2)))
+        connection.execute(update(Todo).where(Todo.id == ids[3]).values(completed=False, completed_at=None))
+        connection.execute(delete(Todo).where(Todo.id.in_(ids[5:8])))
+    return (today - timedelta(days=150)).date()
+
+
+def test_triggers_match_recompute_and_backfill(history, engine):
+    assert rollups.compare(engine) == []
+
+    with engine.connect() as connection:
+        maintained = rollups.stored(connection)
+    rollups.backfill(engine)
+    with engine.connect() as connection:
+        rebuilt = rollups.stored(connection)
+
+    assert rollups.compare(engine) == []
+    # Triggers leave zero rows behind for days whose todos were all deleted
+    maintained = {day: row for day, row in maintained.items() if any(row)}
+    assert set(maintained) == set(rebuilt)
+    for day, (created, completed, seconds) in rebuilt.items():
+        assert maintained[day][:2] == [created, completed]
+        assert maintained[day][2] == pytest.approx(seconds, rel=1e-6)
+
+
+@pytest.mark.parametrize("bucket", ["day", "week", "month"])
+def test_timeseries_matches_group_by(history, client, engine, bucket):
+    today = datetime.utcnow().date()
+    response = client.get(f"/api/todos/stats/timeseries?bucket={bucket}&from={history}&to={today}")
+    assert response.status_code == 200
+
+    expected = {}
+    elapsed = (func.julianday(Todo.completed_at) - func.julianday(Todo.created_at)) * 86400
+    with engine.connect() as connection:
+        created_day = func.date(Todo.created_at)
+        for day, count in connection.execute(select(created_day, func.count()).group_by(created_day)):
+            row = expected.setdefault(bucket_of(as_date(day), bucket), [0, 0, 0.0])
+            row[0] += count
+        completed_day = func.date(Todo.completed_at)
+        for day, count, seconds in connection.execute(
+            select(completed_day, func.count(), func.sum(elapsed))
+            .where(Todo.completed_at.is_not(None))
+            .group_by(completed_day)
+        ):
+            row = expected.setdefault(bucket_of(as_date(day), bucket), [0, 0, 0.0])
+            row[1] += count
+            row[2] += seconds
+
+    series = response.json()["series"]
+    assert series[0]["start"] == bucket_of(history, bucket).isoformat()
+    for point in series:
+        created, completed, seconds = expected.get(date.fromisoformat(point["start"]), [0, 0, 0.0])
+        assert (point["created"], point["completed"]) == (created, completed), point["start"]
+        if completed:
+            assert point["avg_completion_seconds"] == pytest.approx(seconds / completed, abs=0.1)
+        else:
+            assert point["avg_completion_seconds"] is None
+    assert response.json()["totals"]["created"] == sum(
+        row[0] for start, row in expected.items() if bucket_of(history, bucket) <= start <= today
+    )
+
+
+def test_timeseries_rejects_huge_ranges_quickly(client):
+    started = datetime.utcnow()
+    response = client.get("/api/todos/stats/timeseries?from=0001-01-01&to=9999-12-30")
+    assert response.status_code == 400
+    assert (datetime.utcnow() - started).total_seconds() < 1
+
+
+@pytest.mark.parametrize("bucket, start, points", [
+    ("day", "9999-12-01", 31),
+    ("week", "9999-12-01", 5),
+    ("month", "9999-01-01", 12),
+])
+def test_timeseries_ends_on_the_last_date(client, bucket, start, points):
+    response = client.get(f"/api/todos/stats/timeseries?bucket={bucket}&from={start}&to=9999-12-31")
+    assert response.status_code == 200
+    assert len(response.json()["series"]) == points
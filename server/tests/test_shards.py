@@ -0,0 +1,158 @@
+"""Shard router: per-shard id blocks and scatter-gather listings merged in order"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import config
+from app.models.todo import Todo
+from app.routes.todos import _list_todos
+from app.utils.filters import TodoFilter
+from database.shards import HashRing, Shard, ShardRouter, ShardSessions, shard_metadata
+
+NAMES = ("a", "b", "c")
+
+
+@pytest.fixture
+def router(tmp_path, engine):
+    """A sharded ShardRouter over three fresh SQLite databases; tables are created by the test"""
+    router = ShardRouter()
+    for index, name in enumerate(NAMES):
+        shard_engine = create_engine(f"sqlite:///{tmp_path / name}.db", connect_args={"check_same_thread": False})
+        router.shards[name] = Shard(name, index, shard_engine, sessionmaker(bind=shard_engine))
+    router.ring = HashRing(NAMES)
+    router.sharded = True
+    yield router
+    router.dispose()
+
+
+def allocate(router: ShardRouter, name: str) -> int:
+    with router.shards[name].session_factory() as db:
+        todo_id = router.allocate_id(name, db)
+        db.commit()
+    return todo_id
+
+
+# ============================================================================
+# Ids
+# ============================================================================
+
+def test_each_shard_allocates_from_its_own_block(router):
+    router.create_tables()
+
+    for index, name in enumerate(NAMES):
+        base = index * config.SHARD_ID_SPAN
+        ids = [allocate(router, name) for _ in range(3)]
+        assert ids == [base + 1, base + 2, base + 3]
+        # The block names the shard to look in first
+        assert router.candidates(ids[0])[0] == name
+
+
+def test_allocation_continues_after_the_highest_id_in_the_block(router):
+    base = config.SHARD_ID_SPAN
+    with router.shards["b"].engine.begin() as connection:
+        for table in shard_metadata().tables.values():
+            table.create(connection)
+        connection.execute(insert(Todo.__table__), [
+            # One id in b's block, one left behind in another block by a move
+            {"id": base + 50, "title": "existing", "owner_id": 1},
+            {"id": 2 * base + 7, "title": "moved in", "owner_id": 1},
+        ])
+    router.create_tables()
+
+    assert allocate(router, "b") == base + 51
+    assert allocate(router, "a") == 1
+
+
+def test_concurrent_allocations_are_unique(router):
+    router.create_tables()
+    allocated = []
+
+    def allocate_several():
+        for _ in range(10):
+            allocated.append(allocate(router, "c"))
+
+    threads = [threading.Thread(target=allocate_several) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    base = 2 * config.SHARD_ID_SPAN
+    assert sorted(allocated) == list(range(base + 1, base + 61))
+
+
+def test_unsharded_router_leaves_ids_to_the_database(engine):
+    router = ShardRouter.unsharded(engine)
+    with router.shards["default"].session_factory() as db:
+        assert router.allocate_id("default", db) is None
+    assert router.candidates(config.SHARD_ID_SPAN + 1) == ["default"]
+
+
+# ============================================================================
+# Scatter-gather
+# ============================================================================
+
+@pytest.fixture
+def spread(router):
+    """Todos for 30 owners on their shards, plus copies left on the wrong shard; returns the placed rows"""
+    router.create_tables()
+    started = datetime(2025, 1, 1)
+    placed = []
+    for n in range(90):
+        owner_id = n % 30 + 1
+        name = router.shard_for(owner_id)
+        placed.append({
+            "id": allocate(router, name),
+            "title": f"{'Shard' if n % 2 else 'shard'} todo {n % 7}",
+            "owner_id": owner_id,
+            # Every timestamp is shared by several rows: ties are broken by id
+            "created_at": started + timedelta(minutes=n % 11),
+            "updated_at": started + timedelta(minutes=n % 13),
+            "completed": n % 3 == 0,
+        })
+    for row in placed:
+        with router.shards[router.shard_for(row["owner_id"])].engine.begin() as connection:
+            connection.execute(insert(Todo.__table__), [row])
+
+    for row in placed[:5]:
+        home = router.shard_for(row["owner_id"])
+        elsewhere = next(name for name in NAMES if name != home)
+        with router.shards[elsewhere].engine.begin() as connection:
+            connection.execute(insert(Todo.__table__), [{**row, "title": "stale copy"}])
+    return placed
+
+
+@pytest.mark.parametrize("sort, key, descending", [
+    (None, lambda row: (row["created_at"], row["id"]), True),
+    ("title", lambda row: (row["title"].lower(), row["id"]), False),
+    ("-updated_at", lambda row: (row["updated_at"], row["id"]), True),
+])
+@pytest.mark.parametrize("skip, limit", [(0, 10), (25, 10), (85, 10)])
+def test_scattered_listing_matches_a_global_sort(router, spread, sort, key, descending, skip, limit):
+    shards = ShardSessions(router)
+    try:
+        todo_filter = TodoFilter(sort=sort)
+        response = _list_todos(shards, todo_filter, skip, limit, envelope=False, exact=False)
+    finally:
+        shards.close()
+
+    expected = sorted(spread, key=key, reverse=descending)[skip:skip + limit]
+    listed = json.loads(response.body)
+    assert [todo["id"] for todo in listed] == [row["id"] for row in expected]
+    assert "stale copy" not in [todo["title"] for todo in listed]
+
+
+def test_scatter_runs_every_shard_in_parallel(router):
+    router.create_tables()
+    barrier = threading.Barrier(len(NAMES), timeout=5)
+
+    def wait_for_the_others(name):
+        # Only returns if every shard's call runs at the same time
+        barrier.wait()
+        return name.upper()
+
+    assert router.scatter(wait_for_the_others) == {name: name.upper() for name in NAMES}
@@ -0,0 +1,21 @@
+"""Startup stays lean: modules deferred to first use are not imported with the app"""
+import os
+import subprocess
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFERRED = ("app.utils.helpers", "httpx", "jose", "passlib")
+
+
+def test_importing_the_app_defers_heavy_modules():
+    script = f"import sys, main; print(','.join(m for m in {DEFERRED!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=SERVER_DIR, capture_output=True, text=True,
+                            env={**os.environ, "WARMUP_ENABLED": "false"}, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_envelope_loads_pagination_on_first_use(client):
+    response = client.get("/api/todos/?limit=1&envelope=true")
+    assert response.status_code == 200
+    assert {"page", "pages", "has_next"} <= set(response.json())
@@ -0,0 +1,220 @@
+"""Stale-while-revalidate: stale fallbacks, single-flight refreshes and invalidation"""
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app.utils.swr import StaleCache
+
+
+def body(value: str) -> Response:
+    return Response(content=f'"{value}"'.encode(), media_type="application/json")
+
+
+def failing():
+    raise RuntimeError("database down")
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def cache():
+    cache = StaleCache(enabled=True, budget=0.2, max_stale=60, max_bytes=1 << 20, threads=4, refresh_timeout=5)
+    yield cache
+    cache.stop()
+
+
+# ============================================================================
+# StaleCache
+# ============================================================================
+
+def test_failed_refresh_serves_stale(cache):
+    assert cache.serve("k", lambda: body("good")).body == b'"good"'
+
+    response = cache.serve("k", failing)
+
+    assert response.status_code == 200
+    assert response.body == b'"good"'
+    assert response.headers["Warning"].startswith("111")
+    assert response.headers["X-Cache"] == "stale"
+    assert int(response.headers["Age"]) >= 0
+
+
+def test_hung_refresh_serves_stale_after_budget_and_repopulates(cache):
+    cache.serve("k", lambda: body("good"))
+    release = threading.Event()
+
+    def hanging():
+        release.wait(5)
+        return body("newer")
+
+    started = time.monotonic()
+    response = cache.serve("k", hanging)
+    elapsed = time.monotonic() - started
+
+    assert response.body == b'"good"'
+    assert response.headers["Warning"].startswith("110")
+    assert response.headers["X-Cache"] == "stale"
+    assert cache.budget <= elapsed < cache.budget + 1
+    # The refresh carries on and stores its result for the next request
+    release.set()
+    wait_until(lambda: not cache.stats()["in_flight"])
+    assert cache.serve("k", failing).body == b'"newer"'
+
+
+def test_no_stored_response_raises(cache):
+    with pytest.raises(RuntimeError):
+        cache.serve("k", failing)
+
+
+def test_concurrent_identical_requests_share_one_refresh(cache):
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return body("shared")
+
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(cache.serve("k", fetch))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: cache.stats()["coalesced"] == 9)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [response.body for response in responses] == [b'"shared"'] * 10
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_not_found_drops_the_key(cache):
+    cache.serve("k", lambda: body("good"))
+
+    def gone():
+        raise HTTPException(status_code=404, detail="Todo not found")
+
+    with pytest.raises(HTTPException) as raised:
+        cache.serve("k", gone)
+    assert raised.value.status_code == 404
+    assert cache.stats()["entries"] == 0
+    # Nothing left to fall back to
+    with pytest.raises(RuntimeError):
+        cache.serve("k", failing)
+
+
+def test_discard_during_refresh_is_not_undone(cache):
+    release = threading.Event()
+
+    def before_write():
+        release.wait(5)
+        return body("before write")
+
+    first = []
+    thread = threading.Thread(target=lambda: first.append(cache.serve("k", before_write)))
+    thread.start()
+    wait_until(lambda: cache.stats()["in_flight"] == 1)
+
+    cache.discard("k")
+    # A request after the write does not join the refresh that read the old row
+    assert cache.serve("k", lambda: body("after write")).body == b'"after write"'
+    release.set()
+    thread.join(5)
+
+    assert first[0].body == b'"before write"'
+    assert cache.serve("k", failing).body == b'"after write"'
+
+
+def test_discard_group_forgets_keys_built_with_its_generation(cache):
+    def key():
+        return ("todos", 1, cache.generation(("todos", 1)))
+
+    cache.serve(key(), lambda: body("old page"))
+    other = ("todos", 2, cache.generation(("todos", 2)))
+    cache.serve(other, lambda: body("other owner"))
+
+    cache.discard_group(("todos", 1))
+    with pytest.raises(RuntimeError):
+        cache.serve(key(), failing)
+    assert cache.serve(other, failing).body == b'"other owner"'
+
+
+# ============================================================================
+# Routes with the database failing
+# ============================================================================
+
+@contextmanager
+def database_down(engine):
+    def refuse(conn, cursor, statement, parameters, context, executemany):
+        raise OperationalError(statement, parameters, ConnectionRefusedError("injected: database down"))
+
+    event.listen(engine, "before_cursor_execute", refuse)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", refuse)
+
+
+def test_reads_survive_the_database_going_down(client, auth_headers, engine):
+    todo = client.post("/api/todos/", json={"title": "survives outages"}, headers=auth_headers).json()
+    listing = client.get("/api/todos/?owner=me&limit=5", headers=auth_headers)
+    assert client.get(f"/api/todos/{todo['id']}").status_code == 200
+
+    with database_down(engine):
+        single = client.get(f"/api/todos/{todo['id']}")
+        stale_listing = client.get("/api/todos/?owner=me&limit=5", headers=auth_headers)
+        never_read = client.get("/api/todos/?owner=me&limit=7", headers=auth_headers)
+
+    assert single.status_code == 200
+    assert single.json()["title"] == "survives outages"
+    assert single.headers["Warning"].startswith("111")
+    assert single.headers["X-Cache"] == "stale"
+    assert stale_listing.status_code == 200 and stale_listing.json() == listing.json()
+    assert never_read.status_code == 500
+    assert client.get(f"/api/todos/{todo['id']}").headers.get("X-Cache") is None
+
+
+def test_writes_discard_the_stored_todo(client, auth_headers, engine):
+    todo = client.post("/api/todos/", json={"title": "before"}, headers=auth_headers).json()
+    client.get(f"/api/todos/{todo['id']}")
+    client.put(f"/api/todos/{todo['id']}", json={"title": "after"}, headers=auth_headers)
+    assert client.get(f"/api/todos/{todo['id']}").json()["title"] == "after"
+
+    client.delete(f"/api/todos/{todo['id']}", headers=auth_headers)
+    with database_down(engine):
+        # The deleted todo is not resurrected from the cache
+        assert client.get(f"/api/todos/{todo['id']}").status_code == 500
+
+
+def test_writes_discard_stored_listings(client, auth_headers, engine):
+    kept = client.post("/api/todos/", json={"title": "listed kept"}, headers=auth_headers).json()
+    renamed = client.post("/api/todos/", json={"title": "listed before"}, headers=auth_headers).json()
+    deleted = client.post("/api/todos/", json={"title": "listed deleted"}, headers=auth_headers).json()
+    for path in ("/api/todos/?owner=me&limit=3", "/api/todos/?limit=3"):
+        assert client.get(path, headers=auth_headers).status_code == 200
+
+    client.put(f"/api/todos/{renamed['id']}", json={"title": "listed after"}, headers=auth_headers)
+    client.delete(f"/api/todos/{deleted['id']}", headers=auth_headers)
+    with database_down(engine):
+        # The pages read before the writes are not served any more
+        for path in ("/api/todos/?owner=me&limit=3", "/api/todos/?limit=3"):
+            assert client.get(path, headers=auth_headers).status_code == 500
+
+    listing = client.get("/api/todos/?owner=me&limit=3", headers=auth_headers).json()
+    with database_down(engine):
+        stale_listing = client.get("/api/todos/?owner=me&limit=3", headers=auth_headers)
+    assert stale_listing.json() == listing
+    titles = [todo["title"] for todo in listing]
+    assert "listed after" in titles and kept["title"] in titles and "listed deleted" not in titles